@@ -6,11 +6,24 @@ from aws_cdk import Aspects
 from cdk_nag import AwsSolutionsChecks, NagSuppressions
 
 from cdk.crowd_2d_skeleton_example_stack import Crowd2DSkeletonExampleStack
+from cdk.libs.assets import build_javascript_assets
+from cdk.libs.lambda_profiles import load_lambda_profiles
 from cdk.libs.utils import download_crowd_2d_skeleton
 
 download_crowd_2d_skeleton()
+javascript_assets = build_javascript_assets()
 app = cdk.App()
-stack = Crowd2DSkeletonExampleStack(app, "Crowd2DSkeletonExampleStackStack")
+# Profiles written by scripts/benchmarks/bench_lambda_sizing.py, given with
+# cdk synth -c lambda_profiles=<path>.
+lambda_profiles_path = app.node.try_get_context("lambda_profiles")
+stack = Crowd2DSkeletonExampleStack(
+    app,
+    "Crowd2DSkeletonExampleStackStack",
+    javascript_assets=javascript_assets,
+    lambda_profiles=(
+        load_lambda_profiles(lambda_profiles_path) if lambda_profiles_path else None
+    ),
+)
 Aspects.of(app).add(AwsSolutionsChecks())
 NagSuppressions.add_stack_suppressions(
     stack,
@@ -1,10 +1,12 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 from os import path
+from typing import Optional
 
 from aws_cdk import (
     Duration,
     RemovalPolicy,
+    Size,
     Stack,
     aws_cloudfront,
     aws_iam,
@@ -16,11 +18,70 @@ from aws_cdk import (
 from cdk_nag import NagSuppressions
 from constructs import Construct
 
+from cdk.libs.assets import (
+    ASSET_BUILD_DIR,
+    ASSET_KEY_PREFIX,
+    IMMUTABLE_CACHE_CONTROL,
+    hosted_asset_key,
+)
+from cdk.libs.lambda_profiles import (
+    DEFAULT_LAMBDA_PROFILES,
+    LambdaProfile,
+    validate_lambda_profile,
+)
+
+
+def _lambda_profile_options(profile: LambdaProfile) -> dict:
+    """Returns the aws_lambda.Function options set by a profile."""
+    return {
+        "memory_size": profile.memory_size,
+        "architecture": (
+            aws_lambda.Architecture.ARM_64
+            if profile.architecture == "arm64"
+            else aws_lambda.Architecture.X86_64
+        ),
+        "timeout": Duration.seconds(profile.timeout_seconds),
+        "reserved_concurrent_executions": profile.reserved_concurrency,
+        "ephemeral_storage_size": Size.mebibytes(profile.ephemeral_storage_mb),
+    }
+
+
+def _invocation_target(function: aws_lambda.Function, profile: LambdaProfile):
+    """Returns the function, or its alias with provisioned concurrency."""
+    if not profile.provisioned_concurrency:
+        return function
+    return function.add_alias(
+        "live", provisioned_concurrent_executions=profile.provisioned_concurrency
+    )
+
 
 class Crowd2DSkeletonExampleStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        javascript_assets: Optional[dict] = None,
+        lambda_profiles: Optional[dict] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Args:
+            javascript_assets: manifest of the crowd-2d-skeleton.js assets
+                built by cdk.libs.assets.build_javascript_assets, None to
+                host the bundle under its unversioned name only
+            lambda_profiles: {<lambda name>: LambdaProfile} of the lambdas
+                whose default profile is replaced, see
+                cdk.libs.lambda_profiles
+        """
         super().__init__(scope, construct_id, **kwargs)
 
+        profiles = dict(DEFAULT_LAMBDA_PROFILES)
+        for name, profile in (lambda_profiles or {}).items():
+            if name not in profiles:
+                raise ValueError(f"Unknown lambda {name} in lambda_profiles")
+            validate_lambda_profile(name, profile)
+            profiles[name] = profile
+
         bucket = aws_s3.Bucket(
             self,
             "Bucket",
@@ -35,6 +96,14 @@ class Crowd2DSkeletonExampleStack(Stack):
                     allowed_origins=["*"],
                 )
             ],
+            lifecycle_rules=[
+                # Consolidated output cached by the post-annotation lambda
+                # for retried requests, see result_cache.py.
+                aws_s3.LifecycleRule(
+                    tag_filters={"consolidation-cache": "true"},
+                    expiration=Duration.days(7),
+                )
+            ],
         )
 
         origin_access_identity = aws_cloudfront.OriginAccessIdentity(
@@ -94,7 +163,8 @@ class Crowd2DSkeletonExampleStack(Stack):
             not_resources=[
                 bucket.arn_for_objects(
                     "infrastructure/ground_truth_templates/crowd-2d-skeleton.js"
-                )
+                ),
+                bucket.arn_for_objects(f"{ASSET_KEY_PREFIX}*"),
             ],  # Deny access to all objects
             effect=aws_iam.Effect.DENY,
             principals=[
@@ -129,13 +199,54 @@ class Crowd2DSkeletonExampleStack(Stack):
             },
         )
 
+        # Modules shared by the annotation lambdas, importable from both
+        # through the layer's python/ directory.
+        lambda_layer = aws_lambda.LayerVersion(
+            self,
+            "annotation_lambda_layer",
+            code=aws_lambda.Code.from_asset(path.join("cdk", "lambda_layer")),
+            compatible_runtimes=[aws_lambda.Runtime.PYTHON_3_10],
+            compatible_architectures=[
+                aws_lambda.Architecture.X86_64,
+                aws_lambda.Architecture.ARM_64,
+            ],
+        )
+
+        # Image dimensions published by scripts/index_image_dimensions.py.
+        image_index_prefix = "labeling_jobs/image_index"
+        image_index_environment = {
+            "IMAGE_INDEX_S3_URI": f"s3://{bucket.bucket_name}/{image_index_prefix}"
+        }
+
         pre_annotation_lambda = aws_lambda.Function(
             self,
             "pre_annotation_lambda",
             runtime=aws_lambda.Runtime.PYTHON_3_10,
             code=aws_lambda.Code.from_asset(path.join("cdk", "pre_annotation_lambda")),
             handler="lambda_function.lambda_handler",
-            timeout=Duration.seconds(30),
+            layers=[lambda_layer],
+            environment=image_index_environment,
+            **_lambda_profile_options(profiles["pre_annotation_lambda"]),
+        )
+        pre_annotation_target = _invocation_target(
+            pre_annotation_lambda, profiles["pre_annotation_lambda"]
+        )
+        pre_annotation_lambda.add_to_role_policy(
+            aws_iam.PolicyStatement(
+                effect=aws_iam.Effect.ALLOW,
+                actions=["s3:GetObject"],
+                resources=[bucket.arn_for_objects(f"{image_index_prefix}/*")],
+            )
+        )
+        # Without ListBucket, reads of a missing index fail as AccessDenied
+        # rather than NoSuchKey.
+        pre_annotation_lambda.add_to_role_policy(
+            aws_iam.PolicyStatement(
+                effect=aws_iam.Effect.ALLOW,
+                actions=["s3:ListBucket"],
+                resources=[bucket.bucket_arn],
+                conditions={"StringLike": {"s3:prefix": [f"{image_index_prefix}/*"]}},
+            )
         )
 
         post_annotation_lambda = aws_lambda.Function(
@@ -145,7 +256,12 @@ class Crowd2DSkeletonExampleStack(Stack):
             code=aws_lambda.Code.from_asset(path.join("cdk", "post_annotation_lambda")),
             role=lambda_role,
             handler="lambda_function.lambda_handler",
-            timeout=Duration.seconds(30),
+            layers=[lambda_layer],
+            environment=image_index_environment,
+            **_lambda_profile_options(profiles["post_annotation_lambda"]),
+        )
+        post_annotation_target = _invocation_target(
+            post_annotation_lambda, profiles["post_annotation_lambda"]
         )
 
         sagemaker_ground_truth_labeling_job_role = aws_iam.Role(
@@ -169,12 +285,31 @@ class Crowd2DSkeletonExampleStack(Stack):
                 actions=["s3:*"],
             )
         )
+        # The post-annotation lambda reads its cached output and checkpoints
+        # under the job output, and the image index, with this role. Without
+        # ListBucket, reads of keys not stored yet fail as AccessDenied
+        # rather than NoSuchKey.
+        sagemaker_ground_truth_labeling_job_role.add_to_policy(
+            aws_iam.PolicyStatement(
+                effect=aws_iam.Effect.ALLOW,
+                actions=["s3:ListBucket"],
+                resources=[bucket.bucket_arn],
+                conditions={
+                    "StringLike": {
+                        "s3:prefix": [
+                            "labeling_jobs/output/*",
+                            f"{image_index_prefix}/*",
+                        ]
+                    }
+                },
+            )
+        )
         sagemaker_ground_truth_labeling_job_role.add_to_policy(
             aws_iam.PolicyStatement(
                 effect=aws_iam.Effect.ALLOW,
                 resources=[
-                    pre_annotation_lambda.function_arn,
-                    post_annotation_lambda.function_arn,
+                    pre_annotation_target.function_arn,
+                    post_annotation_target.function_arn,
                 ],
                 actions=["lambda:InvokeFunction"],
             )
@@ -191,6 +326,32 @@ class Crowd2DSkeletonExampleStack(Stack):
             destination_key_prefix="infrastructure/ground_truth_templates/",
         )
 
+        # The content-hashed bundle, with its Content-Encoding. The immutable
+        # Cache-Control is honoured by CloudFront for up to the default
+        # maximum TTL of a year. Earlier bundles are kept for templates still
+        # pointing to them.
+        hosted_javascript_key = (
+            "infrastructure/ground_truth_templates/crowd-2d-skeleton.js"
+        )
+        if javascript_assets is not None:
+            encoding = javascript_assets["encoding"]
+            aws_s3_deployment.BucketDeployment(
+                self,
+                f"crowd-2d-skeleton-js-{encoding}",
+                prune=False,
+                sources=[
+                    aws_s3_deployment.Source.asset(path.join(ASSET_BUILD_DIR, encoding))
+                ],
+                destination_bucket=bucket,
+                destination_key_prefix=ASSET_KEY_PREFIX,
+                content_type="application/javascript",
+                content_encoding=encoding,
+                cache_control=[
+                    aws_s3_deployment.CacheControl.from_string(IMMUTABLE_CACHE_CONTROL)
+                ],
+            )
+            hosted_javascript_key = hosted_asset_key(javascript_assets)
+
         cloudfront_domain_name = distribution.distribution_domain_name
         aws_ssm.StringParameter(
             self,
@@ -203,7 +364,7 @@ class Crowd2DSkeletonExampleStack(Stack):
             self,
             "hosted_javascript_url",
             parameter_name="/crowd_2d_skeleton_example_stack/hosted_javascript_url",
-            string_value=f"{cloudfront_domain_name}/infrastructure/ground_truth_templates/crowd-2d-skeleton.js",
+            string_value=f"{cloudfront_domain_name}/{hosted_javascript_key}",
         )
 
         aws_ssm.StringParameter(
@@ -217,14 +378,14 @@ class Crowd2DSkeletonExampleStack(Stack):
             self,
             "pre_annotation_lambda_arn",
             parameter_name="/crowd_2d_skeleton_example_stack/pre_annotation_lambda_arn",
-            string_value=pre_annotation_lambda.function_arn,
+            string_value=pre_annotation_target.function_arn,
         )
 
         aws_ssm.StringParameter(
             self,
             "post_annotation_lambda_arn",
             parameter_name="/crowd_2d_skeleton_example_stack/post_annotation_lambda_arn",
-            string_value=post_annotation_lambda.function_arn,
+            string_value=post_annotation_target.function_arn,
         )
 
         aws_ssm.StringParameter(
@@ -0,0 +1,124 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""JSON encoding and decoding shared by the annotation Lambdas.
+
+    Task data crosses several JSON layers: the pre-annotation lambda passes
+    annotations to the UI as a JSON string (initial_values) inside the task
+    input, and the UI returns a JSON content string whose
+    original_annotations and no_changes_needed are JSON strings again. This
+    module decodes each layer once, sharing decoded values between the
+    workers of a data object, and serializes through the fastest available
+    backend.
+
+    orjson is used when it is installed, the json module otherwise. The
+    JSON_BACKEND environment variable forces a backend ("orjson" or "json");
+    the default "auto" picks orjson when available.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = os.environ.get("JSON_BACKEND", "auto")
+if JSON_BACKEND == "auto":
+    JSON_BACKEND = "json" if orjson is None else "orjson"
+elif JSON_BACKEND == "orjson" and orjson is None:
+    raise ImportError("JSON_BACKEND is orjson but orjson is not installed")
+
+# Fields of the UI's annotation content which hold JSON encoded strings.
+NESTED_CONTENT_FIELDS = (
+    "original_annotations",
+    "updated_annotations",
+    "no_changes_needed",
+)
+# Marks a value missing from a DecodeCache, which can hold None for "null".
+_MISSING = object()
+
+if JSON_BACKEND == "orjson":
+
+    def loads(data):
+        """Decodes a JSON document from str or bytes."""
+        return orjson.loads(data)
+
+    def dumps_bytes(value):
+        """Encodes value as compact UTF-8 JSON."""
+        return orjson.dumps(value)
+
+    def dumps(value):
+        """Encodes value as a compact JSON string."""
+        return orjson.dumps(value).decode("utf-8")
+
+    def encoded_size(value):
+        """Returns the size in bytes of value encoded as JSON."""
+        return len(orjson.dumps(value))
+
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def loads(data):
+        """Decodes a JSON document from str or bytes."""
+        return json.loads(data)
+
+    def dumps_bytes(value):
+        """Encodes value as compact UTF-8 JSON."""
+        return _encoder.encode(value).encode("utf-8")
+
+    def dumps(value):
+        """Encodes value as a compact JSON string."""
+        return _encoder.encode(value)
+
+    def encoded_size(value):
+        """Returns the size in bytes of value encoded as JSON."""
+        # The encoder escapes non-ASCII characters, so characters are bytes.
+        return len(_encoder.encode(value))
+
+
+class DecodeCache(object):
+    """Decodes JSON strings, returning the cached value for repeated strings.
+
+    Used per data object: every worker is shown the same original
+    annotations, so their content carries the same JSON string which is
+    decoded only once. Decoded values are shared and must not be
+    mutated.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self):
+        self._values = {}
+
+    def decode(self, value):
+        """Returns value decoded if it is a JSON string, otherwise unchanged."""
+        if not isinstance(value, (str, bytes)):
+            return value
+        decoded = self._values.get(value, _MISSING)
+        if decoded is _MISSING:
+            decoded = self._values[value] = loads(value)
+        return decoded
+
+
+def decode_annotation_content(content, cache=None):
+    """Decodes a worker's annotation content and the JSON strings nested in it.
+
+    Args:
+        content: annotationData.content string submitted by the UI
+        cache: DecodeCache shared by the workers of the data object
+
+    Returns:
+        dict with NESTED_CONTENT_FIELDS decoded
+    """
+    if cache is None:
+        cache = DecodeCache()
+    decoded = loads(content)
+    for field in NESTED_CONTENT_FIELDS:
+        if field in decoded:
+            decoded[field] = cache.decode(decoded[field])
+    return decoded
+
+
+def encode_initial_values(annotations):
+    """Encodes annotations as the initial_values string read by the UI."""
+    return dumps(annotations)
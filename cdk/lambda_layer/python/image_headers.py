@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Image dimensions read from the first bytes of JPEG and PNG files.
+
+    Width and height sit in the PNG IHDR chunk and in the JPEG start of
+    frame segment, and the EXIF orientation in the JPEG APP1 segment before
+    it, so only the start of a file is needed. read_image_header returns
+    None when the bytes given end before the dimensions, so that callers
+    reading ranges of an object can ask for more.
+"""
+import struct
+
+JPEG_SIGNATURE = b"\xff\xd8"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Start of frame markers, which hold the image dimensions. DHT (C4), JPG
+# (C8) and DAC (CC) share the range but are not frames.
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field.
+STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+SOS_MARKER = 0xDA
+APP1_MARKER = 0xE1
+ORIENTATION_TAG = 0x0112
+# EXIF orientations which swap the width and height of the stored image.
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def read_image_header(data):
+    """Reads the dimensions and orientation of an image from its first bytes.
+
+    Args:
+        data: bytes from the start of a JPEG or PNG file
+
+    Returns:
+        (width, height, orientation) of the stored image, orientation being
+        the EXIF orientation (1 when absent), or None when data ends before
+        the dimensions
+
+    Raises:
+        ValueError: if data is not the start of a JPEG or PNG file
+    """
+    if data.startswith(PNG_SIGNATURE):
+        if len(data) < 24:
+            return None
+        if data[12:16] != b"IHDR":
+            raise ValueError("PNG file does not start with an IHDR chunk")
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height, 1
+    if data.startswith(JPEG_SIGNATURE):
+        return _read_jpeg_header(data)
+    if len(data) < len(PNG_SIGNATURE):
+        return None
+    raise ValueError("Not a JPEG or PNG file")
+
+
+def displayed_size(width, height, orientation):
+    """Returns (width, height) of an image as displayed with its orientation."""
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def _read_jpeg_header(data):
+    orientation = 1
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            return None
+        if data[pos] != 0xFF:
+            raise ValueError(f"Invalid JPEG marker at byte {pos}")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Markers may be preceded by any number of 0xFF fill bytes.
+            pos += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            pos += 2
+            continue
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        if marker in SOF_MARKERS:
+            if pos + 9 > len(data):
+                return None
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return width, height, orientation
+        if marker == SOS_MARKER:
+            raise ValueError("JPEG file has no frame header before its scan")
+        if marker == APP1_MARKER:
+            start, end = pos + 4, pos + 2 + length
+            segment = data[start:end]
+            if segment.startswith(b"Exif\x00\x00"):
+                exif_orientation = _read_exif_orientation(segment[6:])
+                if exif_orientation is None and end > len(data):
+                    return None
+                orientation = exif_orientation or orientation
+        pos += 2 + length
+
+
+def _read_exif_orientation(tiff):
+    """Returns the orientation tag of a TIFF header's first IFD.
+
+    Returns None when tiff ends before the tag or the IFD does not hold
+    it.
+    """
+    if len(tiff) < 8:
+        return None
+    byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if byte_order is None:
+        return None
+    (ifd_offset,) = struct.unpack(byte_order + "I", tiff[4:8])
+    if ifd_offset + 2 > len(tiff):
+        return None
+    (entries,) = struct.unpack_from(byte_order + "H", tiff, ifd_offset)
+    for i in range(entries):
+        entry = ifd_offset + 2 + 12 * i
+        if entry + 12 > len(tiff):
+            return None
+        tag, value_type = struct.unpack_from(byte_order + "HH", tiff, entry)
+        if tag == ORIENTATION_TAG and value_type == 3:
+            (value,) = struct.unpack_from(byte_order + "H", tiff, entry + 8)
+            return value if 1 <= value <= 8 else 1
+    return None
@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Index of image dimensions, sharded in S3 for lookups from the Lambdas.
+
+    scripts/index_image_dimensions.py reads the headers of the images under
+    S3 prefixes (see image_headers) and publishes their dimensions under an
+    index prefix:
+
+        <prefix>/index.json            {"format": INDEX_FORMAT, "shards": <int>}
+        <prefix>/shards/<shard>.json   {<image s3 uri>: [width, height, orientation]}
+
+    Images are assigned to shards by a hash of their S3 URI, so a lookup
+    reads a single small shard whatever the size of the index, and shards
+    are kept in memory for later lookups. An index or shard which cannot be
+    read is remembered as empty, so that lookups do not repeat the failing
+    request. Width and height are those of the stored image; image_size
+    applies the EXIF orientation.
+"""
+import hashlib
+from collections import OrderedDict
+
+from codec import loads
+from image_headers import displayed_size
+
+INDEX_FORMAT = "image-index-v1"
+INDEX_NAME = "index.json"
+SHARD_PREFIX = "shards"
+
+
+def shard_of(s3_uri, shards):
+    """Returns the shard number of an image's S3 URI."""
+    digest = hashlib.md5(s3_uri.encode("utf-8"), usedforsecurity=False).digest()
+    return int.from_bytes(digest[:4], "big") % shards
+
+
+def shard_name(shard):
+    """Returns the name of a shard object relative to the index prefix."""
+    return f"{SHARD_PREFIX}/{shard:04x}.json"
+
+
+class ImageIndex(object):
+    """Looks up image dimensions in an index published to S3.
+
+    Args:
+        index_s3_uri: S3 URI of the index prefix
+        max_shards: number of shards kept in memory
+    """
+
+    def __init__(self, index_s3_uri, max_shards=64):
+        self.index_s3_uri = index_s3_uri.rstrip("/")
+        self.max_shards = max_shards
+        self.shards = None
+        self._cache = OrderedDict()
+
+    def _read(self, read_object, name):
+        try:
+            data = read_object(f"{self.index_s3_uri}/{name}")
+            return None if data is None else loads(data)
+        except Exception as e:
+            print(f" Failed to read {self.index_s3_uri}/{name}")
+            print(" error: {}".format(e))
+            return None
+
+    def lookup(self, s3_uri, read_object):
+        """Returns (width, height, orientation) of an image, or None.
+
+        Args:
+            s3_uri: S3 URI of the image
+            read_object: callable returning the content of an S3 URI, or
+                None when it does not exist. Errors it raises are logged
+                and treated as a missing object.
+        """
+        if self.shards is None:
+            index = self._read(read_object, INDEX_NAME)
+            if index is None or index.get("format") != INDEX_FORMAT:
+                print(f"No image index found at {self.index_s3_uri}")
+                self.shards = 0
+            else:
+                self.shards = index["shards"]
+        if not self.shards:
+            return None
+
+        shard = shard_of(s3_uri, self.shards)
+        entries = self._cache.get(shard)
+        if entries is None:
+            entries = self._read(read_object, shard_name(shard)) or {}
+            self._cache[shard] = entries
+            if len(self._cache) > self.max_shards:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(shard)
+        entry = entries.get(s3_uri)
+        return None if entry is None else tuple(entry)
+
+    def image_size(self, s3_uri, read_object):
+        """Returns (width, height) of an image as displayed, or None."""
+        entry = self.lookup(s3_uri, read_object)
+        return None if entry is None else displayed_size(*entry)
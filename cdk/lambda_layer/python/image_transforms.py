@@ -0,0 +1,177 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Mapping of skeleton coordinates between an image and its web derivatives.
+
+    scripts/create_example_labeling_job.py can produce derivatives of the
+    images to label: upright, size-capped JPEGs which load much faster than
+    the originals. A derivative is the original, as displayed with its EXIF
+    orientation applied, rotated counter-clockwise by a multiple of 90
+    degrees and then scaled. Tiles of an image (see tiles) are derivatives
+    of a region of it, cropped before being rotated and scaled.
+
+    The pre-annotation lambda maps annotations of a manifest item into the
+    derivative it serves, and passes the ImageTransform to the UI template,
+    which submits it back with the worker's annotations. The post-annotation
+    lambda uses it to map annotations back into original image coordinates.
+    Transforms are passed as:
+
+        {"width": <int>, "height": <int>, "rotation": <0, 90, 180 or 270>,
+         "scale": <number>, "crop": [x, y, width, height]}
+
+    where width and height are those of the original as displayed, and the
+    optional crop is the region of it the derivative shows.
+    Manifest items list their derivatives next to the original's size:
+
+        {"source-ref": <original>,
+         "image_size": {"width": <int>, "height": <int>},
+         "derivatives": [{"source-ref": <derivative>, "rotation": <int>,
+                          "scale": <number>}]}
+"""
+from codec import dumps, loads
+
+
+class ImageTransform(object):
+    """Transform from original image coordinates into a derivative's.
+
+    Args:
+        width: width of the original image as displayed, in pixels
+        height: height of the original image as displayed, in pixels
+        rotation: counter-clockwise rotation in degrees, a multiple of 90
+        scale: derivative pixels per original pixel, after rotation
+        crop: optional (x, y, width, height) region of the original, as
+            displayed, which the derivative shows
+    """
+
+    __slots__ = ("width", "height", "rotation", "scale", "crop")
+
+    def __init__(self, width, height, rotation=0, scale=1.0, crop=None):
+        if rotation % 90:
+            raise ValueError(f"Rotation must be a multiple of 90, not {rotation}")
+        self.width = width
+        self.height = height
+        self.rotation = int(rotation) % 360
+        self.scale = scale
+        self.crop = None if crop is None else tuple(crop)
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(
+            value["width"],
+            value["height"],
+            value.get("rotation", 0),
+            value["scale"],
+            value.get("crop"),
+        )
+
+    @classmethod
+    def from_content(cls, content):
+        """Returns the transform submitted with a worker's annotation content.
+
+        Returns:
+            ImageTransform, or None when the worker was shown the original
+        """
+        value = content.get("image_transform")
+        if not value:
+            return None
+        if isinstance(value, str):
+            value = loads(value)
+        return cls.from_dict(value)
+
+    def to_dict(self):
+        value = {
+            "width": self.width,
+            "height": self.height,
+            "rotation": self.rotation,
+            "scale": self.scale,
+        }
+        if self.crop is not None:
+            value["crop"] = list(self.crop)
+        return value
+
+    def encode(self):
+        """Encodes the transform as the string passed through the UI."""
+        return dumps(self.to_dict())
+
+    def _source_size(self):
+        """Returns (width, height) of the part of the original shown."""
+        if self.crop is not None:
+            return self.crop[2], self.crop[3]
+        return self.width, self.height
+
+    def _offset(self):
+        if self.crop is not None:
+            return self.crop[0], self.crop[1]
+        return 0, 0
+
+    def derivative_size(self):
+        """Returns (width, height) of the derivative in pixels."""
+        width, height = self._source_size()
+        if self.rotation in (90, 270):
+            width, height = height, width
+        return round(width * self.scale), round(height * self.scale)
+
+    def to_derivative(self, skeletons):
+        """Maps skeletons from original into derivative coordinates, in place."""
+        (w, h), (dx, dy), s = self._source_size(), self._offset(), self.scale
+        for skeleton in skeletons:
+            xs, ys = skeleton.xs, skeleton.ys
+            for i, (x, y) in enumerate(zip(xs, ys)):
+                x, y = x - dx, y - dy
+                if self.rotation == 90:
+                    x, y = y, w - x
+                elif self.rotation == 180:
+                    x, y = w - x, h - y
+                elif self.rotation == 270:
+                    x, y = h - y, x
+                xs[i] = x * s
+                ys[i] = y * s
+        return skeletons
+
+    def to_original(self, skeletons):
+        """Maps skeletons from derivative into original coordinates, in place."""
+        (w, h), (dx, dy), s = self._source_size(), self._offset(), self.scale
+        for skeleton in skeletons:
+            xs, ys = skeleton.xs, skeleton.ys
+            for i, (x, y) in enumerate(zip(xs, ys)):
+                x, y = x / s, y / s
+                if self.rotation == 90:
+                    x, y = w - y, x
+                elif self.rotation == 180:
+                    x, y = w - x, h - y
+                elif self.rotation == 270:
+                    x, y = y, h - x
+                xs[i] = x + dx
+                ys[i] = y + dy
+        return skeletons
+
+
+def select_derivative(data_object, max_dimension):
+    """Selects the derivative of a manifest item to show to workers.
+
+    Args:
+        data_object: manifest item, see the module docstring
+        max_dimension: longest side in pixels of the derivative to serve.
+            The largest derivative within it is selected, or the smallest
+            one if none is.
+
+    Returns:
+        (s3_uri, ImageTransform) of the derivative, or None when the manifest
+        item has no derivatives and the original is to be shown
+    """
+    derivatives = data_object.get("derivatives")
+    image_size = data_object.get("image_size")
+    if not derivatives or not image_size or not max_dimension:
+        return None
+    candidates = []
+    for derivative in derivatives:
+        transform = ImageTransform(
+            image_size["width"],
+            image_size["height"],
+            derivative.get("rotation", 0),
+            derivative["scale"],
+        )
+        candidates.append((max(transform.derivative_size()), derivative, transform))
+    candidates.sort(key=lambda candidate: candidate[0])
+    fitting = [c for c in candidates if c[0] <= max_dimension]
+    _, derivative, transform = fitting[-1] if fitting else candidates[0]
+    return derivative["source-ref"], transform
@@ -0,0 +1,314 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Skeleton annotation model shared by the annotation Lambdas.
+
+    Annotations coming back from the crowd-2d-skeleton UI are accepted either
+    as skeleton instances, each with a list of keypoints:
+
+        [{"id": <string>, "keypoints": [{"label": <string>, "x": <number>, "y": <number>}]}]
+
+    or as a flat list of keypoints tagged with the skeleton they belong to:
+
+        [{"skeletonId": <string>, "label": <string>, "x": <number>, "y": <number>}]
+
+    Both are parsed into Skeleton objects holding one x and one y array with
+    a slot per keypoint class, ordered as the keypointClasses of
+    cdk/ground_truth_templates/crowd_2d_skeleton_template.html
+    (KEYPOINT_LABELS). Keypoints which were not placed are NaN.
+
+    Skeletons can also be serialized in a compact form for output manifests:
+
+        {"format": COMPACT_FORMAT, "labels": [...], "precision": <int or null>,
+         "ids": [...], "masks": [...], "xs": [...], "ys": [...]}
+
+    Each mask has bit i set when keypoint class i is placed, and xs and ys
+    hold the coordinates of the placed keypoints only. Without a precision
+    the coordinates are stored as is, so decoding is lossless. With a
+    precision they are rounded to that many decimals, stored as integers and
+    delta encoded, which shrinks dense crowds considerably.
+"""
+import math
+from array import array
+
+KEYPOINT_LABELS = (
+    "top_of_head",
+    "front_of_face",
+    "right_shoulder",
+    "right_elbow",
+    "right_wrist",
+    "left_shoulder",
+    "left_elbow",
+    "left_wrist",
+    "left_hip",
+    "left_knee",
+    "left_ankle",
+    "left_heel",
+    "left_toe",
+    "right_hip",
+    "right_knee",
+    "right_ankle",
+    "right_heel",
+    "right_toe",
+)
+KEYPOINT_INDEX = {label: i for i, label in enumerate(KEYPOINT_LABELS)}
+COMPACT_FORMAT = "crowd-2d-skeleton/compact-v1"
+
+_label_indexes = {KEYPOINT_LABELS: KEYPOINT_INDEX}
+
+
+def keypoint_labels_from_classes(keypoint_classes):
+    """Returns the keypoint labels in the order of a template's keypointClasses.
+
+    Args:
+        keypoint_classes: decoded keypointClasses attribute of the
+            crowd-2d-skeleton element, a list of {"label": <string>, ...}
+    """
+    return tuple(keypoint_class["label"] for keypoint_class in keypoint_classes)
+
+
+def _label_index(labels):
+    index = _label_indexes.get(labels)
+    if index is None:
+        index = _label_indexes[labels] = {label: i for i, label in enumerate(labels)}
+    return index
+
+
+def _number(value):
+    """Returns value as an int when it has no fractional part, for shorter JSON."""
+    return int(value) if value.is_integer() else value
+
+
+class Skeleton(object):
+    """A skeleton instance with one optional point per keypoint class.
+
+    Args:
+        skeleton_id: id of the skeleton in the UI
+        xs: array("d") of x coordinates, NaN for keypoints not placed
+        ys: array("d") of y coordinates, NaN for keypoints not placed
+    """
+
+    __slots__ = ("id", "xs", "ys")
+
+    def __init__(self, skeleton_id, xs, ys):
+        self.id = skeleton_id
+        self.xs = xs
+        self.ys = ys
+
+    @classmethod
+    def from_points(cls, skeleton_id, points):
+        """Creates a skeleton from a list of (x, y) tuples or None."""
+        xs = array("d", (math.nan if p is None else p[0] for p in points))
+        ys = array("d", (math.nan if p is None else p[1] for p in points))
+        return cls(skeleton_id, xs, ys)
+
+    @property
+    def points(self):
+        """List of (x, y) tuples, None for keypoints not placed."""
+        return [
+            None if x != x else (x, y)  # NaN is the only value not equal to itself
+            for x, y in zip(self.xs, self.ys)
+        ]
+
+    def placed(self):
+        """Returns the indexes of the placed keypoints."""
+        return [i for i, x in enumerate(self.xs) if x == x]
+
+    def bounds(self):
+        """Returns (min_x, min_y, max_x, max_y) of the placed keypoints, or None."""
+        xs = [x for x in self.xs if x == x]
+        ys = [y for y in self.ys if y == y]
+        if not xs:
+            return None
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def scale(self):
+        """Returns the diagonal of the keypoint bounding box in pixels."""
+        bounds = self.bounds()
+        if bounds is None:
+            return 0.0
+        return math.hypot(bounds[2] - bounds[0], bounds[3] - bounds[1])
+
+    def __eq__(self, other):
+        if not isinstance(other, Skeleton):
+            return NotImplemented
+        return self.id == other.id and self.points == other.points
+
+    def __repr__(self):
+        return "Skeleton({!r}, {!r})".format(self.id, self.points)
+
+
+def is_compact(annotations):
+    """Returns True when annotations are in the compact serialized form."""
+    return isinstance(annotations, dict) and annotations.get("format") == COMPACT_FORMAT
+
+
+def parse_skeletons(annotations, labels=KEYPOINT_LABELS):
+    """Parses UI or compact annotations into skeleton instances.
+
+    Args:
+        annotations: list of annotations in either UI format, or a dict in
+            the compact form.
+        labels: keypoint labels in template order
+
+    Returns:
+        (skeletons, flat) where skeletons is a list of Skeleton and flat is
+        True when the annotations were a flat keypoint list.
+    """
+    if is_compact(annotations):
+        return decode_skeletons(annotations, labels), False
+
+    skeletons = []
+    if not annotations:
+        return skeletons, False
+
+    flat = not all(isinstance(a, dict) and "keypoints" in a for a in annotations)
+    if flat:
+        grouped = {}
+        for keypoint in annotations:
+            skeleton_id = keypoint.get("skeletonId", keypoint.get("skeleton_id"))
+            grouped.setdefault(skeleton_id, []).append(keypoint)
+        instances = [{"id": k, "keypoints": v} for k, v in grouped.items()]
+    else:
+        instances = annotations
+
+    label_index = _label_index(labels)
+    for i, instance in enumerate(instances):
+        xs = array("d", [math.nan]) * len(labels)
+        ys = array("d", [math.nan]) * len(labels)
+        for keypoint in instance["keypoints"]:
+            index = label_index.get(keypoint.get("label"))
+            if index is None or keypoint.get("x") is None or keypoint.get("y") is None:
+                continue
+            xs[index] = float(keypoint["x"])
+            ys[index] = float(keypoint["y"])
+        skeletons.append(Skeleton(instance.get("id", str(i)), xs, ys))
+    return skeletons, flat
+
+
+def format_skeletons(skeletons, flat=False, labels=KEYPOINT_LABELS):
+    """Formats skeleton instances back into UI annotations.
+
+    Args:
+        skeletons: list of Skeleton
+        flat: emit a flat keypoint list instead of skeleton instances
+        labels: keypoint labels in template order
+
+    Returns:
+        list of annotations
+    """
+    annotations = []
+    for skeleton in skeletons:
+        keypoints = [
+            {"label": labels[i], "x": _number(x), "y": _number(y)}
+            for i, (x, y) in enumerate(zip(skeleton.xs, skeleton.ys))
+            if x == x
+        ]
+        if flat:
+            for keypoint in keypoints:
+                keypoint["skeletonId"] = skeleton.id
+            annotations.extend(keypoints)
+        else:
+            annotations.append({"id": skeleton.id, "keypoints": keypoints})
+    return annotations
+
+
+def encode_skeletons(skeletons, precision=None, labels=KEYPOINT_LABELS):
+    """Serializes skeletons into the compact form.
+
+    Args:
+        skeletons: list of Skeleton
+        precision: number of decimals to keep. None keeps the coordinates
+            exactly; an int quantizes and delta encodes them.
+        labels: keypoint labels in template order
+
+    Returns:
+        dict in the compact form, see the module docstring
+    """
+    masks = []
+    xs = []
+    ys = []
+    for skeleton in skeletons:
+        mask = 0
+        for i, (x, y) in enumerate(zip(skeleton.xs, skeleton.ys)):
+            if x == x:
+                mask |= 1 << i
+                xs.append(x)
+                ys.append(y)
+        masks.append(mask)
+
+    if precision is None:
+        xs = [_number(x) for x in xs]
+        ys = [_number(y) for y in ys]
+    else:
+        scale = 10**precision
+        xs = _delta_encode(round(x * scale) for x in xs)
+        ys = _delta_encode(round(y * scale) for y in ys)
+    return {
+        "format": COMPACT_FORMAT,
+        "labels": list(labels),
+        "precision": precision,
+        "ids": [skeleton.id for skeleton in skeletons],
+        "masks": masks,
+        "xs": xs,
+        "ys": ys,
+    }
+
+
+def decode_skeletons(compact, labels=KEYPOINT_LABELS):
+    """Deserializes skeletons from the compact form.
+
+        Keypoints are remapped by label when the compact form was written
+        with a different keypoint class order than labels.
+
+    Args:
+        compact: dict in the compact form
+        labels: keypoint labels in template order
+
+    Returns:
+        list of Skeleton
+    """
+    precision = compact.get("precision")
+    if precision is None:
+        xs = array("d", compact["xs"])
+        ys = array("d", compact["ys"])
+    else:
+        scale = 10**precision
+        xs = array("d", (v / scale for v in _delta_decode(compact["xs"])))
+        ys = array("d", (v / scale for v in _delta_decode(compact["ys"])))
+
+    encoded_labels = tuple(compact.get("labels", labels))
+    label_index = _label_index(labels)
+    slots = [label_index.get(label) for label in encoded_labels]
+
+    skeletons = []
+    offset = 0
+    for skeleton_id, mask in zip(compact["ids"], compact["masks"]):
+        skeleton_xs = array("d", [math.nan]) * len(labels)
+        skeleton_ys = array("d", [math.nan]) * len(labels)
+        for i, slot in enumerate(slots):
+            if not mask >> i & 1:
+                continue
+            if slot is not None:
+                skeleton_xs[slot] = xs[offset]
+                skeleton_ys[slot] = ys[offset]
+            offset += 1
+        skeletons.append(Skeleton(skeleton_id, skeleton_xs, skeleton_ys))
+    return skeletons
+
+
+def _delta_encode(values):
+    encoded = []
+    previous = 0
+    for value in values:
+        encoded.append(value - previous)
+        previous = value
+    return encoded
+
+
+def _delta_decode(values):
+    decoded = []
+    previous = 0
+    for value in values:
+        previous += value
+        decoded.append(previous)
+    return decoded
@@ -0,0 +1,149 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Metrics and payload logging shared by the annotation Lambdas.
+
+    Metrics are written to the function's log as a single CloudWatch Embedded
+    Metric Format (EMF) line per invocation, which CloudWatch turns into
+    metrics without any API calls. See
+    https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+
+    Logging of full events and payloads is opt-in and controlled with the
+    following environment variables:
+
+    LOG_PAYLOADS: "true" to log events and payloads (default "false")
+    LOG_PAYLOAD_SAMPLE_RATE: fraction of invocations which log (default 1.0)
+    LOG_PAYLOAD_MAX_BYTES: logged payloads are truncated to this size
+        (default 4096)
+"""
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "Crowd2DSkeleton")
+
+
+class Metrics(object):
+    """Collects metrics for one invocation and emits them as an EMF line.
+
+    Args:
+        namespace: CloudWatch metrics namespace
+        dimensions: dict of dimension name to value. Defaults to the
+            FunctionName of the running Lambda.
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, dimensions=None):
+        if dimensions is None:
+            dimensions = {
+                "FunctionName": os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "local")
+            }
+        self.namespace = namespace
+        self.dimensions = dimensions
+        self.values = {}
+        self.units = {}
+        # Time spent in nested timers for each active timer, so that phases
+        # are reported exclusive of the phases nested inside them.
+        self._nested = []
+
+    def add(self, name, value, unit="Count"):
+        """Adds value to the metric name, creating it if needed."""
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    @contextmanager
+    def timer(self, phase):
+        """Adds the time spent in the with block to the metric <phase>Time.
+
+        Time spent in timers nested inside the block is not included.
+        """
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.add(f"{phase}Time", (elapsed - nested) * 1000, "Milliseconds")
+
+    def timed_iter(self, phase, iterable):
+        """Yields from iterable, adding the time spent producing items to <phase>Time."""
+        iterator = iter(iterable)
+        while True:
+            with self.timer(phase):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def emit(self):
+        """Prints the collected metrics as an EMF log line."""
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(self.dimensions)],
+                        "Metrics": [
+                            {"Name": name, "Unit": self.units[name]}
+                            for name in self.values
+                        ],
+                    }
+                ],
+            },
+            **self.dimensions,
+        }
+        for name, value in self.values.items():
+            document[name] = round(value, 3) if isinstance(value, float) else value
+        print(json.dumps(document))
+
+
+class MeteredStream(object):
+    """Wraps a binary stream, recording read time and bytes in metrics.
+
+    Args:
+        stream: file-like object with read(size)
+        metrics: Metrics receiving <phase>Time and the bytes read
+        phase: name of the phase, e.g. "S3Fetch"
+        bytes_metric: name of the metric counting the bytes read
+    """
+
+    def __init__(self, stream, metrics, phase, bytes_metric):
+        self.stream = stream
+        self.metrics = metrics
+        self.phase = phase
+        self.bytes_metric = bytes_metric
+
+    def read(self, size=-1):
+        with self.metrics.timer(self.phase):
+            data = self.stream.read(size)
+        self.metrics.add(self.bytes_metric, len(data), "Bytes")
+        return data
+
+
+class PayloadLogger(object):
+    """Logs events and payloads when enabled and sampled for this invocation."""
+
+    def __init__(self, enabled=None, sample_rate=None, max_bytes=None):
+        if enabled is None:
+            enabled = os.environ.get("LOG_PAYLOADS", "false").lower() == "true"
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("LOG_PAYLOAD_MAX_BYTES", "4096"))
+        # Sampling is decided once so an invocation logs all or nothing.
+        self.enabled = enabled and random.random() < sample_rate  # nosec B311
+        self.max_bytes = max_bytes
+
+    def log(self, label, value):
+        """Logs value as JSON under label, truncated to max_bytes."""
+        if not self.enabled:
+            return
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        if len(text) > self.max_bytes:
+            text = f"{text[:self.max_bytes]}... [truncated {len(text) - self.max_bytes} characters]"
+        print(f"{label}: {text}")
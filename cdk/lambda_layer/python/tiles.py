@@ -0,0 +1,320 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Crowd tiling: labeling dense images one overlapping region at a time.
+
+    Images of dense crowds are hard to annotate as a whole, so
+    scripts/create_example_labeling_job.py can split them into regions with
+    plan_tiles and write one manifest item per region. Every item holds the
+    annotations of the whole image, and its tile:
+
+        {"source-ref": <original>, "annotations": [...],
+         "image_size": {"width": <int>, "height": <int>},
+         "tile": {"source-ref": <crop>, "region": [x, y, width, height],
+                  "core": [x0, y0, x1, y1], "index": <int>, "count": <int>,
+                  "layout": [[region, core], ...],
+                  "rotation": <int>, "scale": <number>}}
+
+    where the crop is an image of the region, rotated and scaled as an
+    image derivative (see image_transforms), and coordinates are those of
+    the original as displayed. Regions overlap so that people cut by the
+    edge of one region are whole in its neighbour. Their cores partition
+    the image instead: each instance belongs to the one tile whose core
+    holds the centre of its keypoints. Core edges on the image border are
+    null, the core extending indefinitely beyond them. The layout lists the
+    region and core of every tile of the image, so that an instance whose
+    centre lies in a core whose region does not show it falls back to the
+    first tile whose region holds it, rather than to a tile whose worker
+    never saw it.
+
+    The pre-annotation lambda serves the crop with the instances that have
+    a keypoint in the region, and passes the tile to the UI template, which
+    submits it back. The post-annotation lambda maps the worker's
+    annotations back into whole-image coordinates and keeps the instances
+    the tile owns, so that together the labels of an image's tiles hold
+    every instance once. Instances which already existed are assigned by
+    the centre of their original keypoints, so the tiles sharing them agree
+    on their owner however they were edited.
+"""
+import math
+
+from codec import dumps, loads
+from image_transforms import ImageTransform
+
+
+def _centre(skeleton):
+    bounds = skeleton.bounds()
+    if bounds is None:
+        return None
+    return (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+
+
+def _in_core(core, x, y):
+    x0, y0, x1, y1 = core
+    return (
+        (x0 is None or x >= x0)
+        and (x1 is None or x < x1)
+        and (y0 is None or y >= y0)
+        and (y1 is None or y < y1)
+    )
+
+
+def _inside(region, skeleton):
+    """Returns the number of placed keypoints of skeleton inside region."""
+    x, y, width, height = region
+    return sum(
+        1
+        for kx, ky in zip(skeleton.xs, skeleton.ys)
+        if x <= kx <= x + width and y <= ky <= y + height
+    )
+
+
+class Tile(object):
+    """A region of an image labeled as its own task.
+
+    Args:
+        region: (x, y, width, height) of the region, in pixels of the
+            original as displayed
+        core: (x0, y0, x1, y1) of the part of the image the tile owns, None
+            for edges on the image border
+        index: index of the tile among the tiles of its image
+        count: number of tiles of the image
+        layout: optional ((region, core), ...) of every tile of the image,
+            by index. Without it, instances are assigned by their centre
+            alone.
+    """
+
+    __slots__ = ("region", "core", "index", "count", "layout")
+
+    def __init__(self, region, core, index=0, count=1, layout=None):
+        self.region = tuple(region)
+        self.core = tuple(core)
+        self.index = index
+        self.count = count
+        self.layout = (
+            None
+            if layout is None
+            else tuple((tuple(region), tuple(core)) for region, core in layout)
+        )
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(
+            value["region"],
+            value["core"],
+            value["index"],
+            value["count"],
+            value.get("layout"),
+        )
+
+    @classmethod
+    def from_content(cls, content):
+        """Returns the tile submitted with a worker's annotation content.
+
+        Returns:
+            Tile, or None when the worker was shown the whole image
+        """
+        value = content.get("tile")
+        if not value:
+            return None
+        if isinstance(value, str):
+            value = loads(value)
+        return cls.from_dict(value)
+
+    def to_dict(self):
+        value = {
+            "region": list(self.region),
+            "core": list(self.core),
+            "index": self.index,
+            "count": self.count,
+        }
+        if self.layout is not None:
+            value["layout"] = [
+                [list(region), list(core)] for region, core in self.layout
+            ]
+        return value
+
+    def encode(self):
+        """Encodes the tile as the string passed through the UI."""
+        return dumps(self.to_dict())
+
+    def transform(self, image_size, rotation=0, scale=1.0):
+        """Returns the ImageTransform of the tile's crop.
+
+        Args:
+            image_size: {"width", "height"} of the original as displayed
+            rotation: counter-clockwise rotation of the crop in degrees
+            scale: crop pixels per original pixel
+        """
+        return ImageTransform(
+            image_size["width"], image_size["height"], rotation, scale, self.region
+        )
+
+    def in_core(self, x, y):
+        return _in_core(self.core, x, y)
+
+    def visible(self, skeletons):
+        """Returns the skeletons with a placed keypoint inside the region."""
+        return [skeleton for skeleton in skeletons if _inside(self.region, skeleton)]
+
+    def owner(self, skeleton):
+        """Returns the index of the tile owning a skeleton, or None.
+
+        The owner is the tile whose core holds the skeleton's centre. When
+        the region of that tile does not show the skeleton, it is the first
+        tile whose region holds the most of its keypoints instead, if any
+        region holds one.
+
+        Args:
+            skeleton: Skeleton in whole-image coordinates
+        """
+        centre = _centre(skeleton)
+        # Instances without any keypoint belong to no tile.
+        if centre is None:
+            return None
+        if self.layout is None:
+            return self.index if self.in_core(*centre) else None
+        core_owner = next(
+            (i for i, (_, core) in enumerate(self.layout) if _in_core(core, *centre)),
+            None,
+        )
+        if core_owner is not None and _inside(self.layout[core_owner][0], skeleton):
+            return core_owner
+        inside = [_inside(region, skeleton) for region, _ in self.layout]
+        if not max(inside):
+            return core_owner
+        return inside.index(max(inside))
+
+    def ownership(self, skeletons, originals=()):
+        """Returns for each skeleton whether the tile owns it, see owner.
+
+        Args:
+            skeletons: list of Skeleton in whole-image coordinates
+            originals: Skeleton instances the worker started from, in
+                whole-image coordinates. Skeletons with the id of one of
+                them which has keypoints are assigned by it.
+        """
+        by_id = {
+            original.id: original
+            for original in originals
+            if original.bounds() is not None
+        }
+        return [
+            self.owner(by_id.get(skeleton.id, skeleton)) == self.index
+            for skeleton in skeletons
+        ]
+
+    def owned(self, skeletons, originals=()):
+        """Returns the skeletons the tile owns, see ownership."""
+        return [
+            skeleton
+            for skeleton, owned in zip(skeletons, self.ownership(skeletons, originals))
+            if owned
+        ]
+
+
+def select_tile(data_object):
+    """Returns the tile of a manifest item to show to workers.
+
+    Args:
+        data_object: manifest item, see the module docstring
+
+    Returns:
+        (s3_uri, ImageTransform, Tile) of the tile's crop, or None when the
+        manifest item is not a tile
+    """
+    value = data_object.get("tile")
+    image_size = data_object.get("image_size")
+    if not value or not image_size:
+        return None
+    tile = Tile.from_dict(value)
+    transform = tile.transform(
+        image_size, value.get("rotation", 0), value.get("scale", 1.0)
+    )
+    return value["source-ref"], transform, tile
+
+
+def _crossings(cut, intervals):
+    return sum(1 for start, end in intervals if start < cut < end)
+
+
+def _plan_cuts(length, tile_size, overlap, intervals):
+    """Returns the positions between the cores along one axis.
+
+    Cuts are spread evenly, then each is moved, within a quarter of the
+    spacing, to where it crosses the fewest intervals, preferring the
+    nearest such position.
+    """
+    if length <= tile_size:
+        return []
+    count = math.ceil((length - overlap) / (tile_size - overlap))
+    spacing = length / count
+    window = spacing / 4
+    cuts = []
+    for k in range(1, count):
+        even = k * spacing
+        candidates = [even] + [
+            edge
+            for start, end in intervals
+            for edge in (start - 0.5, end + 0.5)
+            if abs(edge - even) <= window
+        ]
+        cuts.append(
+            min(
+                candidates,
+                key=lambda cut: (_crossings(cut, intervals), abs(cut - even)),
+            )
+        )
+    return cuts
+
+
+def plan_tiles(image_size, tile_size, overlap, skeletons=()):
+    """Splits an image into overlapping tiles.
+
+        Without skeletons the image is cut into an even grid. With them,
+        the cuts between cores are moved off the instances where possible,
+        and each region is grown to hold the whole of every instance its
+        core owns.
+
+    Args:
+        image_size: (width, height) of the image as displayed
+        tile_size: longest side of a tile in pixels, before it is grown to
+            hold instances, and the size up to which images are not split
+        overlap: pixels shared by neighbouring regions
+        skeletons: existing Skeleton instances in image coordinates
+
+    Returns:
+        list of Tile, a single one covering the image when it is not split
+    """
+    if overlap >= tile_size:
+        raise ValueError(f"Overlap {overlap} must be smaller than tile {tile_size}")
+    width, height = image_size
+    boxes = [b for b in (skeleton.bounds() for skeleton in skeletons) if b]
+    x_cuts = _plan_cuts(width, tile_size, overlap, [(b[0], b[2]) for b in boxes])
+    y_cuts = _plan_cuts(height, tile_size, overlap, [(b[1], b[3]) for b in boxes])
+    x_edges = [None, *x_cuts, None]
+    y_edges = [None, *y_cuts, None]
+    count = (len(x_edges) - 1) * (len(y_edges) - 1)
+
+    tiles = []
+    for j in range(len(y_edges) - 1):
+        for i in range(len(x_edges) - 1):
+            core = (x_edges[i], y_edges[j], x_edges[i + 1], y_edges[j + 1])
+            tile = Tile((0, 0, width, height), core, len(tiles), count)
+            half = overlap / 2
+            left = 0 if core[0] is None else core[0] - half
+            top = 0 if core[1] is None else core[1] - half
+            right = width if core[2] is None else core[2] + half
+            bottom = height if core[3] is None else core[3] + half
+            for box in boxes:
+                if tile.in_core((box[0] + box[2]) / 2, (box[1] + box[3]) / 2):
+                    left, top = min(left, box[0]), min(top, box[1])
+                    right, bottom = max(right, box[2]), max(bottom, box[3])
+            left, top = max(0, math.floor(left)), max(0, math.floor(top))
+            right = min(width, math.ceil(right))
+            bottom = min(height, math.ceil(bottom))
+            tile.region = (left, top, right - left, bottom - top)
+            tiles.append(tile)
+    layout = [(tile.region, tile.core) for tile in tiles]
+    for tile in tiles:
+        tile.layout = tuple(layout)
+    return tiles
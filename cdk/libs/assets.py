@@ -0,0 +1,139 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This module builds the crowd-2d-skeleton.js assets hosted by the stack.
+
+    The bundle is minified, named after the hash of its content and
+    precompressed, and served with its Content-Encoding and an immutable
+    Cache-Control: a new bundle gets a new name, so browsers never need to
+    check a cached one again. S3 cannot pick an encoding per request, so a
+    single variant is built, in the directory of its encoding under
+    ASSET_BUILD_DIR: brotli, which browsers accept over HTTPS and fetch()
+    decodes, or gzip without brotli.
+
+    Minification requires rjsmin and brotli requires brotli, both installed
+    with the stack's requirements.txt; without them the bundle is hosted as
+    released and gzipped.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CROWD_2D_SKELETON_JS_PATH = "cdk/ground_truth_templates/crowd-2d-skeleton.js"
+ASSET_BUILD_DIR = "cdk/build/crowd_2d_skeleton"
+ASSET_MANIFEST = "asset-manifest.json"
+ASSET_KEY_PREFIX = "infrastructure/ground_truth_templates/assets/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# File name suffix of the hosted variant, keyed by Content-Encoding.
+VARIANT_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Bundles whose lines are this long on average are minified already.
+MINIFIED_LINE_LENGTH = 1000
+HASH_LENGTH = 16
+
+
+def minify_javascript(code: bytes) -> bytes:
+    """Returns the minified code, or the code itself if it cannot be made smaller."""
+    if rjsmin is None or len(code) / (code.count(b"\n") + 1) >= MINIFIED_LINE_LENGTH:
+        return code
+    minified = rjsmin.jsmin(code)
+    return minified if len(minified) < len(code) else code
+
+
+def hosted_encoding() -> str:
+    """Returns the Content-Encoding of the variant to host."""
+    return "br" if brotli is not None else "gzip"
+
+
+def compress(code: bytes, encoding: str) -> bytes:
+    """Returns code compressed with the Content-Encoding encoding."""
+    if encoding == "br":
+        return brotli.compress(code, mode=brotli.MODE_TEXT, quality=11)
+    return gzip.compress(code, 9, mtime=0)
+
+
+def _read_manifest(build_dir: str) -> Optional[dict]:
+    """Returns the manifest of a complete build in build_dir, or None.
+
+    A build made without rjsmin or brotli is not complete once they are
+    installed.
+    """
+    try:
+        with open(os.path.join(build_dir, ASSET_MANIFEST), "r") as file_handle:
+            manifest = json.load(file_handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("encoding") != hosted_encoding():
+        return None
+    if rjsmin is not None and not manifest.get("minifier"):
+        return None
+    path = os.path.join(build_dir, manifest["encoding"], manifest["file"])
+    if not os.path.exists(path) or os.path.getsize(path) != manifest["size"]:
+        return None
+    return manifest
+
+
+def build_javascript_assets(
+    source_path: str = CROWD_2D_SKELETON_JS_PATH, build_dir: str = ASSET_BUILD_DIR
+) -> dict:
+    """Builds the content-hashed, precompressed variant of a JavaScript bundle.
+
+    Args:
+        source_path: path of the bundle
+        build_dir: directory the variant is written to, replaced unless it
+            already holds the variant of the same bundle
+
+    Returns:
+        the asset manifest, also written to build_dir:
+
+        {"source": <bundle name>, "source_sha256": <hex>, "sha256": <hex>,
+         "minifier": <whether rjsmin was used>,
+         "encoding": <Content-Encoding>, "file": <file name>, "size": <bytes>}
+    """
+    with open(source_path, "rb") as file_handle:
+        source = file_handle.read()
+    source_digest = hashlib.sha256(source).hexdigest()
+    built = _read_manifest(build_dir)
+    if built is not None and built.get("source_sha256") == source_digest:
+        return built
+
+    code = minify_javascript(source)
+    digest = hashlib.sha256(code).hexdigest()
+    stem, extension = os.path.splitext(os.path.basename(source_path))
+    name = f"{stem}.{digest[:HASH_LENGTH]}{extension}"
+
+    encoding = hosted_encoding()
+    data = compress(code, encoding)
+
+    shutil.rmtree(build_dir, ignore_errors=True)
+    manifest = {
+        "source": os.path.basename(source_path),
+        "source_sha256": source_digest,
+        "sha256": digest,
+        "minifier": rjsmin is not None,
+        "encoding": encoding,
+        "file": name + VARIANT_SUFFIXES[encoding],
+        "size": len(data),
+    }
+    os.makedirs(os.path.join(build_dir, encoding))
+    with open(os.path.join(build_dir, encoding, manifest["file"]), "wb") as file_handle:
+        file_handle.write(data)
+    with open(os.path.join(build_dir, ASSET_MANIFEST), "w") as file_handle:
+        json.dump(manifest, file_handle, indent=2)
+    return manifest
+
+
+def hosted_asset_key(manifest: dict) -> str:
+    """Returns the S3 key of the hosted variant."""
+    return ASSET_KEY_PREFIX + manifest["file"]
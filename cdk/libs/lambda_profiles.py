@@ -0,0 +1,116 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This module defines the performance profiles of the stack's lambdas.
+
+    A profile sets the memory, architecture, timeout, concurrency and
+    ephemeral storage of a lambda. The defaults match what the stack
+    deployed before profiles existed. Profiles recommended by
+    scripts/benchmarks/bench_lambda_sizing.py are written as JSON, and
+    loaded with load_lambda_profiles, see app.py:
+
+    {"pre_annotation_lambda": {"memory_size": 256, ...}, ...}
+
+    Fields missing from the JSON keep their default.
+"""
+import json
+from typing import NamedTuple, Optional
+
+ARCHITECTURES = ("x86_64", "arm64")
+MIN_MEMORY_SIZE = 128
+MAX_MEMORY_SIZE = 10240
+MAX_TIMEOUT_SECONDS = 900
+MIN_EPHEMERAL_STORAGE_MB = 512
+MAX_EPHEMERAL_STORAGE_MB = 10240
+
+
+class LambdaProfile(NamedTuple):
+    """Performance settings of a lambda.
+
+    Args:
+        memory_size: memory in MB, which also sets the share of vCPU
+        architecture: "x86_64" or "arm64"
+        timeout_seconds: maximum duration of an invocation
+        reserved_concurrency: concurrent executions reserved for, and
+            limiting, the lambda. None leaves it unreserved
+        provisioned_concurrency: execution environments kept initialized,
+            through a "live" alias which is then the ARN Ground Truth invokes
+        ephemeral_storage_mb: size of /tmp in MB
+    """
+
+    memory_size: int = 128
+    architecture: str = "x86_64"
+    timeout_seconds: int = 30
+    reserved_concurrency: Optional[int] = None
+    provisioned_concurrency: int = 0
+    ephemeral_storage_mb: int = 512
+
+
+DEFAULT_LAMBDA_PROFILES = {
+    "pre_annotation_lambda": LambdaProfile(),
+    "post_annotation_lambda": LambdaProfile(),
+}
+
+
+def validate_lambda_profile(name: str, profile: LambdaProfile) -> None:
+    """Checks a profile against the limits of Lambda.
+
+    Raises:
+        ValueError: If a setting is out of the range Lambda accepts.
+    """
+    errors = []
+    if not MIN_MEMORY_SIZE <= profile.memory_size <= MAX_MEMORY_SIZE:
+        errors.append(f"memory_size must be {MIN_MEMORY_SIZE} to {MAX_MEMORY_SIZE} MB")
+    if profile.architecture not in ARCHITECTURES:
+        errors.append(f"architecture must be one of {', '.join(ARCHITECTURES)}")
+    if not 1 <= profile.timeout_seconds <= MAX_TIMEOUT_SECONDS:
+        errors.append(f"timeout_seconds must be 1 to {MAX_TIMEOUT_SECONDS}")
+    if profile.reserved_concurrency is not None and profile.reserved_concurrency < 0:
+        errors.append("reserved_concurrency must not be negative")
+    if profile.provisioned_concurrency < 0:
+        errors.append("provisioned_concurrency must not be negative")
+    if (
+        profile.reserved_concurrency is not None
+        and profile.provisioned_concurrency > profile.reserved_concurrency
+    ):
+        errors.append("provisioned_concurrency must not exceed reserved_concurrency")
+    if (
+        not MIN_EPHEMERAL_STORAGE_MB
+        <= profile.ephemeral_storage_mb
+        <= MAX_EPHEMERAL_STORAGE_MB
+    ):
+        errors.append(
+            f"ephemeral_storage_mb must be {MIN_EPHEMERAL_STORAGE_MB} "
+            f"to {MAX_EPHEMERAL_STORAGE_MB} MB"
+        )
+    if errors:
+        raise ValueError(f"Invalid profile of {name}: {'; '.join(errors)}")
+
+
+def load_lambda_profiles(path: str) -> dict:
+    """Reads lambda profiles from a JSON file.
+
+    Args:
+        path: path of the JSON file
+
+    Returns:
+        {<lambda name>: LambdaProfile} for every lambda of the stack
+
+    Raises:
+        ValueError: If the file names an unknown lambda or field, or a
+            setting is out of range.
+    """
+    with open(path, "r") as file_handle:
+        settings = json.load(file_handle)
+    profiles = dict(DEFAULT_LAMBDA_PROFILES)
+    for name, fields in settings.items():
+        if name not in profiles:
+            raise ValueError(f"Unknown lambda {name} in {path}")
+        unknown = set(fields) - set(LambdaProfile._fields)
+        if unknown:
+            raise ValueError(
+                f"Unknown settings of {name}: {', '.join(sorted(unknown))}"
+            )
+        profiles[name] = profiles[name]._replace(**fields)
+    for name, profile in profiles.items():
+        validate_lambda_profile(name, profile)
+    return profiles
@@ -2,43 +2,234 @@
 # SPDX-License-Identifier: MIT-0
 """This module contains utility functions used for cdk stacks.
 """
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Optional
+
 import requests
 
+GITHUB_API_URL = "https://api.github.com/repos/aws-samples/sagemaker-ground-truth-crowd-2d-skeleton-component"
+ASSET_NAME = "crowd-2d-skeleton.js"
+LOCAL_FILE_PATH = "cdk/ground_truth_templates/crowd-2d-skeleton.js"
+
+# Release tag of the component to use, "latest" for the latest release.
+CROWD_2D_SKELETON_VERSION = os.environ.get("CROWD_2D_SKELETON_VERSION", "latest")
+# Expected SHA-256 of the asset, checked when set.
+CROWD_2D_SKELETON_SHA256 = os.environ.get("CROWD_2D_SKELETON_SHA256", "")
+# "true" to use the cached asset without any request.
+CROWD_2D_SKELETON_OFFLINE = os.environ.get("CROWD_2D_SKELETON_OFFLINE", "false")
+# Directory of the content-addressed cache of downloaded assets.
+CROWD_2D_SKELETON_CACHE_DIR = os.environ.get(
+    "CROWD_2D_SKELETON_CACHE_DIR", "cdk/build/crowd_2d_skeleton_cache"
+)
+# Seconds during which the latest release is not checked again.
+CROWD_2D_SKELETON_MAX_AGE_SECONDS = float(
+    os.environ.get("CROWD_2D_SKELETON_MAX_AGE_SECONDS", "3600")
+)
+# Connect and read timeouts of each request.
+REQUEST_TIMEOUT = (3.05, 20)
+INDEX_FILE = "index.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AssetCache(object):
+    """Content-addressed cache of downloaded release assets.
+
+    Assets are stored as blobs/<sha256>.js. index.json records the ETag of
+    each release looked up, when it was last checked and the SHA-256 of its
+    asset, and the SHA-256 of each version of an asset downloaded.
 
-def download_crowd_2d_skeleton():
+    Args:
+        cache_dir: directory of the cache
     """
-    Downloads the 'crowd-2d-skeleton.js' asset from the latest release of the crowd 2d skeleton component on GitHub.
 
-    This function uses the GitHub API to fetch the latest release information, retrieves the download URL
-    for the 'crowd-2d-skeleton.js' asset, and downloads it to a specified local file path.
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.index = {"releases": {}, "assets": {}}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as file_handle:
+                    self.index.update(json.load(file_handle))
+            except ValueError:
+                print(f"Ignoring the unreadable cache index {self.index_path}")
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", f"{sha256}.js")
+
+    def verified_blob(self, sha256: Optional[str]) -> Optional[str]:
+        """Returns the path of a cached blob whose content matches its name."""
+        if not sha256:
+            return None
+        blob_path = self.blob_path(sha256)
+        if not os.path.exists(blob_path):
+            return None
+        if file_sha256(blob_path) != sha256:
+            print(f"Removing the corrupted cached asset {blob_path}")
+            os.remove(blob_path)
+            return None
+        return blob_path
+
+    def add_blob(self, content: bytes) -> str:
+        sha256 = hashlib.sha256(content).hexdigest()
+        blob_path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        temp_path = blob_path + ".tmp"
+        with open(temp_path, "wb") as file_handle:
+            file_handle.write(content)
+        os.replace(temp_path, blob_path)
+        return sha256
+
+    def save(self) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as file_handle:
+            json.dump(self.index, file_handle, indent=2)
+        os.replace(temp_path, self.index_path)
+
+
+def _release_url(api_url: str, version: str) -> str:
+    if version == "latest":
+        return f"{api_url}/releases/latest"
+    return f"{api_url}/releases/tags/{version}"
+
+
+def _fetch_asset(
+    cache: AssetCache,
+    session: requests.Session,
+    api_url: str,
+    version: str,
+    timeout: tuple,
+) -> str:
+    """Looks up a release, downloading its asset unless it is cached.
 
     Returns:
-        None: The function saves the asset to the local file path.
+        the SHA-256 of the asset
+    """
+    release_url = _release_url(api_url, version)
+    cached = cache.index["releases"].get(release_url, {})
+    headers = {"Accept": "application/vnd.github+json"}
+    if cached.get("etag") and cache.verified_blob(cached.get("sha256")):
+        headers["If-None-Match"] = cached["etag"]
+    response = session.get(release_url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        cached["checked_at"] = time.time()
+        return cached["sha256"]
+    response.raise_for_status()
 
-    Raises:
-        Exception: If there is an issue with the HTTP requests or if the asset is not found in the release.
+    asset = None
+    for release_asset in response.json().get("assets", []):
+        if release_asset.get("name") == ASSET_NAME:
+            asset = release_asset
+            break
+    if asset is None:
+        raise RuntimeError(f"The '{ASSET_NAME}' asset was not found in the release.")
+
+    # GitHub gives the digest of newer assets as "sha256:<hex>".
+    digest = (asset.get("digest") or "").partition("sha256:")[2] or None
+    asset_key = f"{asset['browser_download_url']}@{asset.get('updated_at')}"
+    sha256 = digest or cache.index["assets"].get(asset_key)
+    if not cache.verified_blob(sha256):
+        download = session.get(asset["browser_download_url"], timeout=timeout)
+        download.raise_for_status()
+        content = download.content
+        if asset.get("size") is not None and len(content) != asset["size"]:
+            raise RuntimeError(
+                f"Downloaded {len(content)} bytes of '{ASSET_NAME}' "
+                f"instead of {asset['size']}"
+            )
+        if digest and hashlib.sha256(content).hexdigest() != digest:
+            raise RuntimeError(f"The downloaded '{ASSET_NAME}' does not match {digest}")
+        sha256 = cache.add_blob(content)
+    cache.index["assets"][asset_key] = sha256
+    cache.index["releases"][release_url] = {
+        "etag": response.headers.get("ETag"),
+        "tag": response.json().get("tag_name"),
+        "sha256": sha256,
+        "checked_at": time.time(),
+    }
+    return sha256
+
+
+def download_crowd_2d_skeleton(
+    version: str = CROWD_2D_SKELETON_VERSION,
+    expected_sha256: str = CROWD_2D_SKELETON_SHA256,
+    offline: bool = CROWD_2D_SKELETON_OFFLINE.lower() == "true",
+    cache_dir: str = CROWD_2D_SKELETON_CACHE_DIR,
+    local_file_path: str = LOCAL_FILE_PATH,
+    max_age_seconds: float = CROWD_2D_SKELETON_MAX_AGE_SECONDS,
+    api_url: str = GITHUB_API_URL,
+    timeout: tuple = REQUEST_TIMEOUT,
+) -> str:
     """
-    # Using the GitHub API we can get the latest release of the crowd 2d skeleton component
-    url = "https://api.github.com/repos/aws-samples/sagemaker-ground-truth-crowd-2d-skeleton-component/releases/latest"
+    Downloads the 'crowd-2d-skeleton.js' asset from a release of the crowd 2d skeleton component on GitHub.
 
-    response = requests.get(url)
-    asset_url = None
+    Assets are kept in a local content-addressed cache. A pinned release
+    whose asset is cached, or the latest release checked less than
+    max_age_seconds ago, is used without any request; otherwise the release
+    is looked up with a conditional request, and its asset is downloaded
+    only if it is not cached. Downloads are checked against the size and
+    digest GitHub gives for the asset. When GitHub cannot be reached in
+    time, or when offline, the cached asset is used.
 
-    for asset in response.json().get("assets", []):
-        if asset.get("name") == "crowd-2d-skeleton.js":
-            asset_url = asset.get("browser_download_url")
-            break
+    Args:
+        version: release tag, or "latest"
+        expected_sha256: SHA-256 the asset must have, not checked if empty
+        offline: use the cached asset without any request
+        cache_dir: directory of the cache
+        local_file_path: path the asset is written to
+        max_age_seconds: time during which the latest release is not
+            checked again
+        api_url: GitHub API URL of the component's repository
+        timeout: connect and read timeouts of each request
 
-    if asset_url:
-        response = requests.get(asset_url)
+    Returns:
+        the SHA-256 of the asset written to local_file_path
 
-        # Specify the local file path where you want to save the downloaded file
-        local_file_path = "cdk/ground_truth_templates/crowd-2d-skeleton.js"
+    Raises:
+        RuntimeError: If the asset is not found in the release, fails its
+            integrity checks, or cannot be downloaded and is not cached.
+    """
+    cache = AssetCache(cache_dir)
+    release_url = _release_url(api_url, version)
+    cached = cache.index["releases"].get(release_url, {})
+    sha256 = cached.get("sha256")
+    fresh = version != "latest" or (
+        time.time() - cached.get("checked_at", 0) < max_age_seconds
+    )
+    if offline or not (fresh and cache.verified_blob(sha256)):
+        if offline:
+            print(f"Offline: using the cached '{ASSET_NAME}' of release {version}")
+        else:
+            try:
+                with requests.Session() as session:
+                    sha256 = _fetch_asset(cache, session, api_url, version, timeout)
+                cache.save()
+            except requests.exceptions.RequestException as e:
+                print(f"Could not reach GitHub ({e}), using the cached '{ASSET_NAME}'")
 
-        # Open the local file in binary write mode and write the content
-        with open(local_file_path, "wb") as file:
-            file.write(response.content)
-    else:
-        raise Exception(
-            "The 'crowd-2d-skeleton.js' asset was not found in the release."
+    blob_path = cache.verified_blob(sha256)
+    if blob_path is None:
+        raise RuntimeError(
+            f"The '{ASSET_NAME}' asset of release {version} could not be "
+            f"downloaded and is not cached in {cache_dir}."
+        )
+    if expected_sha256 and sha256 != expected_sha256.lower():
+        raise RuntimeError(
+            f"The '{ASSET_NAME}' asset of release {version} has SHA-256 {sha256} "
+            f"instead of {expected_sha256}."
         )
+    # The file is only rewritten when its content changes.
+    if not os.path.exists(local_file_path) or file_sha256(local_file_path) != sha256:
+        shutil.copyfile(blob_path, local_file_path)
+    return sha256
@@ -0,0 +1,154 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Structural diff between the original and updated skeleton annotations.
+
+    Skeletons are aligned first by id, as the UI keeps the id of skeletons
+    which were edited, and then spatially through
+    keypoint_consolidation.match_skeletons for skeletons whose id changed.
+    Skeletons left unaligned are reported as added or removed.
+
+    A keypoint counts as moved when it is displaced by more than
+    MOVE_TOLERANCE pixels, so float formatting or key order differences in
+    the submitted JSON do not count as modifications.
+"""
+import math
+from collections import Counter
+
+from keypoint_consolidation import (
+    MATCH_DISTANCE_RATIO,
+    MIN_SKELETON_SCALE,
+    match_skeletons,
+)
+from skeletons import KEYPOINT_LABELS
+
+MOVE_TOLERANCE = 0.5
+
+
+def align_skeletons(original, updated):
+    """Pairs original skeletons with their updated counterparts.
+
+    Args:
+        original: list of Skeleton
+        updated: list of Skeleton
+
+    Returns:
+        list of (original index, updated index) pairs
+    """
+    pairs = []
+    updated_by_id = {}
+    for index, skeleton in enumerate(updated):
+        updated_by_id.setdefault(skeleton.id, []).append(index)
+    original_id_counts = Counter(skeleton.id for skeleton in original)
+    unaligned_original = []
+    aligned_updated = set()
+    for index, skeleton in enumerate(original):
+        candidates = updated_by_id.get(skeleton.id)
+        if (
+            skeleton.id is not None
+            and original_id_counts[skeleton.id] == 1
+            and candidates
+            and len(candidates) == 1
+        ):
+            pairs.append((index, candidates[0]))
+            aligned_updated.add(candidates[0])
+        else:
+            unaligned_original.append(index)
+
+    unaligned_updated = [i for i in range(len(updated)) if i not in aligned_updated]
+    if unaligned_original and unaligned_updated:
+        references = [original[i] for i in unaligned_original]
+        candidates = [updated[i] for i in unaligned_updated]
+        thresholds = [
+            MATCH_DISTANCE_RATIO * max(s.scale(), MIN_SKELETON_SCALE)
+            for s in references
+        ]
+        for r, c in match_skeletons(references, candidates, thresholds):
+            pairs.append((unaligned_original[r], unaligned_updated[c]))
+    return sorted(pairs)
+
+
+def diff_skeletons(original, updated, tolerance=MOVE_TOLERANCE):
+    """Computes change statistics between original and updated skeletons.
+
+    Args:
+        original: list of Skeleton the worker started from
+        updated: list of Skeleton submitted by the worker
+        tolerance: displacement in pixels above which a keypoint has moved
+
+    Returns:
+        dict with the counts of added/removed skeletons and of moved,
+        added and removed keypoints, plus one entry per aligned skeleton
+        that changed with the displacement of each moved keypoint.
+    """
+    pairs = align_skeletons(original, updated)
+
+    # Gather every aligned keypoint pair into flat arrays and compute all
+    # displacements in one pass.
+    pair_index = []
+    label_index = []
+    displacement = []
+    added_keypoints = [0] * len(pairs)
+    removed_keypoints = [0] * len(pairs)
+    for p, (o, u) in enumerate(pairs):
+        before, after = original[o], updated[u]
+        for k, (x0, y0, x1, y1) in enumerate(
+            zip(before.xs, before.ys, after.xs, after.ys)
+        ):
+            # NaN marks keypoints which are not placed.
+            if x0 != x0:
+                if x1 == x1:
+                    added_keypoints[p] += 1
+            elif x1 != x1:
+                removed_keypoints[p] += 1
+            else:
+                pair_index.append(p)
+                label_index.append(k)
+                displacement.append(math.hypot(x1 - x0, y1 - y0))
+
+    moved = {}
+    total = [0.0] * len(pairs)
+    counted = [0] * len(pairs)
+    for p, k, d in zip(pair_index, label_index, displacement):
+        total[p] += d
+        counted[p] += 1
+        if d > tolerance:
+            moved.setdefault(p, {})[KEYPOINT_LABELS[k]] = round(d, 2)
+
+    changed_skeletons = []
+    for p, (o, u) in enumerate(pairs):
+        if p not in moved and not added_keypoints[p] and not removed_keypoints[p]:
+            continue
+        changed_skeletons.append(
+            {
+                "original_id": original[o].id,
+                "updated_id": updated[u].id,
+                "mean_displacement": round(total[p] / counted[p], 2)
+                if counted[p]
+                else 0.0,
+                "moved_keypoints": moved.get(p, {}),
+                "added_keypoints": added_keypoints[p],
+                "removed_keypoints": removed_keypoints[p],
+            }
+        )
+
+    aligned_original = {o for o, _ in pairs}
+    aligned_updated = {u for _, u in pairs}
+    return {
+        "added_skeletons": len(updated) - len(aligned_updated),
+        "removed_skeletons": len(original) - len(aligned_original),
+        "moved_keypoints": sum(len(m) for m in moved.values()),
+        "added_keypoints": sum(added_keypoints),
+        "removed_keypoints": sum(removed_keypoints),
+        "changed_skeletons": changed_skeletons,
+    }
+
+
+def is_modified(diff):
+    """Returns True when a diff from diff_skeletons contains any change."""
+    return bool(
+        diff["added_skeletons"]
+        or diff["removed_skeletons"]
+        or diff["moved_keypoints"]
+        or diff["added_keypoints"]
+        or diff["removed_keypoints"]
+    )
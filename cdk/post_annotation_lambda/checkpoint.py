@@ -0,0 +1,199 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checkpointing of consolidation progress for batches which outlast a timeout.
+
+    Consolidated responses are written to S3 in chunks as a batch is
+    processed, followed by a small manifest recording how many data objects
+    of the payload have been processed. When the time left in the invocation
+    runs short the pending chunk is written and DeadlineExceeded is raised,
+    so the invocation fails before Lambda times it out and Ground Truth
+    retries it. The retry loads the checkpointed responses, skips the data
+    objects they cover and carries on from there, so large batches converge
+    across retries instead of failing at the same point every time.
+
+    Only data objects consolidated successfully are checkpointed: progress
+    stops at the first failure, so that a retry consolidates the failed
+    data object again rather than skipping it for good.
+
+    Checkpoints are stored per request key (see
+    result_cache.result_cache_key), so a changed payload never resumes from
+    a stale checkpoint. Objects are tagged like the result cache so the same
+    lifecycle rule expires them.
+"""
+import time
+
+from codec import dumps_bytes, loads
+from result_cache import CACHE_OBJECT_TAGGING
+from s3_helper import S3Client
+
+CHECKPOINT_KEY_PREFIX = "consolidation_checkpoints"
+MANIFEST_NAME = "checkpoint.json"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when consolidation stops early to checkpoint before a timeout."""
+
+
+class ConsolidationCheckpoint(object):
+    """Consolidation progress of one request, stored in S3.
+
+    Args:
+        s3_client: S3Client used to read and write the checkpoint
+        checkpoint_s3_uri: S3 URI of the request's checkpoint prefix
+        chunk_size: number of responses written per chunk
+    """
+
+    def __init__(self, s3_client, checkpoint_s3_uri, chunk_size=50):
+        self.s3_client = s3_client
+        self.bucket, prefix = S3Client.bucket_key_from_s3_uri(checkpoint_s3_uri)
+        self.prefix = prefix.strip("/")
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.processed = 0
+        self.counts = {"success": 0, "failure": 0}
+        self.pending = []
+        # Set once a data object failed; later responses are not recorded.
+        self.stopped = False
+
+    def _uri(self, name):
+        return "s3://{}/{}/{}".format(self.bucket, self.prefix, name)
+
+    def _put(self, name, value):
+        self.s3_client.put_object_to_s3(
+            dumps_bytes(value),
+            self.bucket,
+            "{}/{}".format(self.prefix, name),
+            "application/json",
+            tagging=CACHE_OBJECT_TAGGING,
+        )
+
+    def load(self):
+        """Reads the manifest of an earlier attempt, if any.
+
+        A manifest which cannot be read counts as no checkpoint: without
+        s3:ListBucket, S3 answers a read of a manifest not written yet with
+        AccessDenied rather than NoSuchKey.
+
+        Returns:
+            number of data objects at the start of the payload which were
+            already processed
+        """
+        try:
+            manifest = self.s3_client.get_object_from_s3(self._uri(MANIFEST_NAME))
+            if manifest is not None:
+                manifest = loads(manifest)
+                chunks = manifest["chunks"]
+                processed = manifest["processed"]
+                counts = manifest["counts"]
+        except Exception as e:
+            print(" Failed to read checkpoint {}".format(self._uri(MANIFEST_NAME)))
+            print(" error: {}".format(e))
+            manifest = None
+        if manifest is not None:
+            self.chunks = chunks
+            self.processed = processed
+            self.counts = counts
+        return self.processed
+
+    def iter_resumed_responses(self):
+        """Yields the responses checkpointed by earlier attempts, in order."""
+        for chunk in self.chunks:
+            yield from loads(self.s3_client.get_object_from_s3(self._uri(chunk)))
+
+    def add(self, response, counts):
+        """Records a response, writing a chunk once chunk_size are pending.
+
+        Responses are no longer recorded once counts show a failure which
+        the checkpoint does not cover.
+
+        Args:
+            response: consolidation response of the last data object
+            counts: success and failure counts including that data object
+        """
+        if counts["failure"] > self.counts["failure"]:
+            self.stopped = True
+        if self.stopped:
+            return
+        self.pending.append(response)
+        if len(self.pending) >= self.chunk_size:
+            self.save(counts)
+
+    def save(self, counts):
+        """Writes pending responses and the manifest of the progress recorded.
+
+        Args:
+            counts: success and failure counts of the batch so far. Once a
+                data object failed, the data objects recorded before it are
+                saved instead.
+        """
+        if self.stopped:
+            counts = {
+                "success": self.counts["success"] + len(self.pending),
+                "failure": self.counts["failure"],
+            }
+        processed = counts["success"] + counts["failure"]
+        if processed == self.processed:
+            return
+        if self.pending:
+            chunk = "chunk-{:08d}.json".format(processed)
+            self._put(chunk, self.pending)
+            self.chunks.append(chunk)
+            self.pending = []
+        self.processed = processed
+        self.counts = dict(counts)
+        self._put(
+            MANIFEST_NAME,
+            {"processed": processed, "counts": self.counts, "chunks": self.chunks},
+        )
+
+
+def iter_checkpointed_responses(
+    responses, checkpoint, counts, context, margin_ms, metrics
+):
+    """Yields checkpointed responses, then new ones while time allows.
+
+        Before each new response is pulled, the time left must cover
+        margin_ms plus the slowest pull so far; otherwise progress is saved
+        and DeadlineExceeded raised. The first pull is not counted as it
+        includes fetching the payload and skipping resumed data objects.
+
+    Args:
+        responses: iterator of new consolidation responses, which updates
+            counts as it consumes data objects
+        checkpoint: ConsolidationCheckpoint, already loaded
+        counts: success and failure counts, including resumed data objects
+        context: Lambda context, or None for no deadline
+        margin_ms: time kept in reserve for returning the response
+        metrics: telemetry.Metrics receiving CheckpointTime
+    """
+    with metrics.timer("Checkpoint"):
+        resumed = list(checkpoint.iter_resumed_responses())
+    metrics.add("ResumedObjects", checkpoint.processed)
+    yield from resumed
+
+    slowest_ms = 0.0
+    first = True
+    iterator = iter(responses)
+    while True:
+        if (
+            context is not None
+            and context.get_remaining_time_in_millis() < margin_ms + slowest_ms
+        ):
+            with metrics.timer("Checkpoint"):
+                checkpoint.save(counts)
+            metrics.add("CheckpointedObjects", checkpoint.processed)
+            raise DeadlineExceeded(
+                "Stopped after {} data objects to checkpoint before the "
+                "timeout".format(checkpoint.processed)
+            )
+        start = time.perf_counter()
+        try:
+            response = next(iterator)
+        except StopIteration:
+            return
+        if not first:
+            slowest_ms = max(slowest_ms, (time.perf_counter() - start) * 1000)
+        first = False
+        with metrics.timer("Checkpoint"):
+            checkpoint.add(response, counts)
+        yield response
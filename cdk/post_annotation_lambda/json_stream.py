@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Incremental JSON helpers used by the Post-Annotation Lambda.
+
+    The consolidation payload is a single JSON array which can grow to
+    hundreds of megabytes for dense crowd batches. iter_json_array parses
+    that array one element at a time from a binary stream, so only one data
+    object needs to be held in memory at any point.
+"""
+import codecs
+import json
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+
+
+def iter_json_array(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the elements of a top-level JSON array read from a binary stream.
+
+    Args:
+        stream: file-like object with a read(size) method returning bytes,
+            e.g. the StreamingBody of an S3 GetObject response.
+        chunk_size: number of bytes to read from the stream at a time.
+
+    Yields:
+        Each decoded element of the array, in order.
+
+    Raises:
+        ValueError: If the stream does not contain a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill(size):
+        nonlocal buffer, position, eof
+        data = stream.read(size)
+        if not data:
+            eof = True
+            buffer = buffer[position:] + utf8.decode(b"", final=True)
+        else:
+            buffer = buffer[position:] + utf8.decode(data)
+        position = 0
+
+    def next_token():
+        # Skip whitespace and return the next significant character, reading
+        # more data if the buffer runs dry.
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if eof:
+                return None
+            fill(chunk_size)
+
+    if next_token() != "[":
+        raise ValueError("Expected the payload to be a JSON array.")
+    position += 1
+
+    if next_token() == "]":
+        return
+
+    while True:
+        if next_token() is None:
+            raise ValueError("Malformed JSON array: unexpected end of payload.")
+        # Elements larger than the buffer are retried with a doubling read
+        # size so that a single large element is decoded in linear time.
+        read_size = chunk_size
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill(read_size)
+                read_size *= 2
+                continue
+            if not eof and (end == len(buffer) or buffer[end] not in _DELIMITERS):
+                # A scalar such as a number may continue in the next chunk.
+                fill(read_size)
+                continue
+            break
+        position = end
+        yield element
+
+        token = next_token()
+        if token == ",":
+            position += 1
+        elif token == "]":
+            return
+        else:
+            raise ValueError(
+                "Malformed JSON array: expected ',' or ']' but found {!r}.".format(
+                    token
+                )
+            )
@@ -0,0 +1,337 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Consolidation of skeleton annotations from multiple workers.
+
+    When NumberOfHumanWorkersPerDataObject is greater than one, every worker
+    submits their own set of skeletons for the same image. Consolidation runs
+    in three steps:
+
+    1. Skeletons are matched across workers. Each worker's skeletons are
+       assigned to the skeletons consolidated so far by an optimal (Hungarian)
+       assignment on the mean keypoint distance. Skeletons which do not match
+       anything start a new consolidated skeleton.
+    2. Each keypoint of a consolidated skeleton is merged with a robust
+       estimator, the coordinate-wise median by default.
+    3. Per-keypoint agreement is reported as the fraction of workers whose
+       keypoint lies within a radius of the merged keypoint.
+"""
+import math
+import statistics
+from array import array
+
+from skeletons import KEYPOINT_LABELS, Skeleton
+
+# Two skeletons only match when their mean keypoint distance is below this
+# fraction of the skeleton size (the diagonal of its keypoint bounding box).
+MATCH_DISTANCE_RATIO = 0.5
+# A worker agrees on a keypoint when it lies within this fraction of the
+# skeleton size from the merged keypoint.
+AGREEMENT_DISTANCE_RATIO = 0.1
+# Lower bound, in pixels, for the skeleton size used by both ratios above.
+MIN_SKELETON_SCALE = 20.0
+
+_UNMATCHABLE = float("inf")
+
+ESTIMATORS = {
+    "median": statistics.median,
+    "mean": statistics.fmean,
+}
+
+
+def linear_sum_assignment(cost):
+    """Solves the rectangular linear assignment problem.
+
+        Shortest augmenting path implementation of the Hungarian algorithm,
+        O(n^2 * m) for an n x m cost matrix.
+
+    Args:
+        cost: list of rows of finite costs.
+
+    Returns:
+        list of (row, column) pairs of the minimum cost assignment. Every row
+        is assigned when there are at least as many columns as rows, and vice
+        versa.
+    """
+    if not cost or not cost[0]:
+        return []
+    transposed = len(cost) > len(cost[0])
+    if transposed:
+        cost = [list(column) for column in zip(*cost)]
+    n, m = len(cost), len(cost[0])
+
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    assigned_row = [0] * (m + 1)  # 1-based row assigned to each column
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        assigned_row[0] = row
+        column = 0
+        min_value = [math.inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column] = True
+            current_row = assigned_row[column]
+            delta = math.inf
+            next_column = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                reduced = cost[current_row - 1][j - 1] - u[current_row] - v[j]
+                if reduced < min_value[j]:
+                    min_value[j] = reduced
+                    way[j] = column
+                if min_value[j] < delta:
+                    delta = min_value[j]
+                    next_column = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[assigned_row[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_value[j] -= delta
+            column = next_column
+            if assigned_row[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            assigned_row[column] = assigned_row[previous]
+            column = previous
+
+    pairs = [(assigned_row[j] - 1, j - 1) for j in range(1, m + 1) if assigned_row[j]]
+    if transposed:
+        pairs = [(j, i) for i, j in pairs]
+    return sorted(pairs)
+
+
+def skeleton_distance(a, b):
+    """Returns the mean distance between the keypoints placed on both skeletons."""
+    total = 0.0
+    shared = 0
+    for xa, ya, xb, yb in zip(a.xs, a.ys, b.xs, b.ys):
+        distance = math.hypot(xa - xb, ya - yb)
+        # NaN for keypoints missing on either skeleton.
+        if distance == distance:
+            total += distance
+            shared += 1
+    if not shared:
+        return _UNMATCHABLE
+    return total / shared
+
+
+class SpatialGrid(object):
+    """Uniform grid index of bounding boxes.
+
+    Args:
+        cell_size: width and height of a grid cell in pixels.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.boxes = {}
+
+    def _cells(self, box):
+        size = self.cell_size
+        for i in range(math.floor(box[0] / size), math.floor(box[2] / size) + 1):
+            for j in range(math.floor(box[1] / size), math.floor(box[3] / size) + 1):
+                yield i, j
+
+    def insert(self, key, box):
+        """Adds a (min_x, min_y, max_x, max_y) box; None boxes are ignored."""
+        if box is None:
+            return
+        self.boxes[key] = box
+        for cell in self._cells(box):
+            self.cells.setdefault(cell, []).append(key)
+
+    def query(self, box, distance):
+        """Returns the sorted keys of boxes within distance of box."""
+        expanded = (
+            box[0] - distance,
+            box[1] - distance,
+            box[2] + distance,
+            box[3] + distance,
+        )
+        found = set()
+        for cell in self._cells(expanded):
+            found.update(self.cells.get(cell, ()))
+        return sorted(
+            key
+            for key in found
+            if max(
+                box[0] - self.boxes[key][2],
+                self.boxes[key][0] - box[2],
+                box[1] - self.boxes[key][3],
+                self.boxes[key][1] - box[3],
+            )
+            <= distance
+        )
+
+
+def match_skeletons(references, candidates, thresholds):
+    """Optimally matches candidate skeletons to reference skeletons.
+
+        Every keypoint distance between two skeletons is at least the gap
+        between their bounding boxes, so only candidates whose boxes are
+        within the threshold, found through a SpatialGrid, are compared
+        keypoint by keypoint. The remaining pairs form small
+        connected groups in crowd scenes, each solved with its own
+        assignment problem instead of one assignment over every skeleton.
+
+    Args:
+        references: list of Skeleton
+        candidates: list of Skeleton
+        thresholds: maximum mean keypoint distance for each reference
+
+    Returns:
+        list of (reference index, candidate index) pairs
+    """
+    boxes = [candidate.bounds() for candidate in candidates]
+    # Cells at least a quarter of the largest box keep the number of cells
+    # each box covers small.
+    cell_size = max(
+        [MIN_SKELETON_SCALE, *thresholds]
+        + [max(b[2] - b[0], b[3] - b[1]) / 4 for b in boxes if b is not None]
+    )
+    grid = SpatialGrid(cell_size)
+    for c, box in enumerate(boxes):
+        grid.insert(c, box)
+
+    edges = {}
+    for r, reference in enumerate(references):
+        box = reference.bounds()
+        if box is None:
+            continue
+        threshold = thresholds[r]
+        for c in grid.query(box, threshold):
+            distance = skeleton_distance(reference, candidates[c])
+            if distance <= threshold:
+                edges[(r, c)] = distance
+
+    # Group the candidate pairs into connected components.
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for r, c in edges:
+        parent[find(("r", r))] = find(("c", c))
+    components = {}
+    for r, c in edges:
+        rows, columns = components.setdefault(find(("r", r)), (set(), set()))
+        rows.add(r)
+        columns.add(c)
+
+    pairs = []
+    for rows, columns in components.values():
+        rows, columns = sorted(rows), sorted(columns)
+        if len(rows) == 1 and len(columns) == 1:
+            pairs.append((rows[0], columns[0]))
+            continue
+        # Pairs above the threshold get a cost larger than any valid
+        # assignment so that they are only chosen when nothing else is left.
+        unmatched_cost = 1.0 + 2 * sum(edges.values())
+        cost = [[edges.get((r, c), unmatched_cost) for c in columns] for r in rows]
+        for i, j in linear_sum_assignment(cost):
+            if (rows[i], columns[j]) in edges:
+                pairs.append((rows[i], columns[j]))
+    return sorted(pairs)
+
+
+class _Cluster(object):
+    """Skeletons from different workers believed to be the same person."""
+
+    def __init__(self, worker_index, skeleton):
+        self.members = [(worker_index, skeleton)]
+        self.merged = skeleton
+
+    def add(self, worker_index, skeleton, estimator):
+        self.members.append((worker_index, skeleton))
+        self.merged = merge_skeletons(
+            self.merged.id, [s for _, s in self.members], estimator
+        )
+
+    def scale(self):
+        return max(self.merged.scale(), MIN_SKELETON_SCALE)
+
+
+def merge_skeletons(skeleton_id, skeletons, estimator=statistics.median):
+    """Merges the keypoints of matched skeletons with a robust estimator."""
+    xs = array("d", [math.nan]) * len(KEYPOINT_LABELS)
+    ys = array("d", [math.nan]) * len(KEYPOINT_LABELS)
+    for index in range(len(KEYPOINT_LABELS)):
+        placed = [s for s in skeletons if s.xs[index] == s.xs[index]]
+        if placed:
+            xs[index] = estimator([s.xs[index] for s in placed])
+            ys[index] = estimator([s.ys[index] for s in placed])
+    return Skeleton(skeleton_id, xs, ys)
+
+
+def consolidate_skeletons(worker_skeletons, estimator="median"):
+    """Consolidates the skeletons submitted by several workers for one image.
+
+    Args:
+        worker_skeletons: list with one list of Skeleton per worker.
+        estimator: name of the estimator in ESTIMATORS used to merge keypoints.
+
+    Returns:
+        (skeletons, stats) where skeletons is the list of consolidated Skeleton
+        and stats holds one dict per consolidated skeleton with the indexes of
+        the workers who annotated it and the per-keypoint agreement.
+    """
+    estimate = ESTIMATORS[estimator]
+    worker_count = len(worker_skeletons)
+
+    # Start from the worker with the most skeletons so that the fewest
+    # clusters need to be created from unmatched skeletons.
+    order = sorted(range(worker_count), key=lambda w: -len(worker_skeletons[w]))
+    clusters = []
+    for worker_index in order:
+        skeletons = worker_skeletons[worker_index]
+        if not clusters:
+            clusters = [_Cluster(worker_index, s) for s in skeletons]
+            continue
+
+        matched = set()
+        for cluster_index, skeleton_index in match_skeletons(
+            [c.merged for c in clusters],
+            skeletons,
+            [MATCH_DISTANCE_RATIO * c.scale() for c in clusters],
+        ):
+            clusters[cluster_index].add(
+                worker_index, skeletons[skeleton_index], estimate
+            )
+            matched.add(skeleton_index)
+        clusters.extend(
+            _Cluster(worker_index, s)
+            for i, s in enumerate(skeletons)
+            if i not in matched
+        )
+
+    consolidated = []
+    stats = []
+    for cluster in clusters:
+        merged = cluster.merged
+        radius = AGREEMENT_DISTANCE_RATIO * cluster.scale()
+        agreement = {}
+        for index in merged.placed():
+            x, y = merged.xs[index], merged.ys[index]
+            agreeing = sum(
+                1
+                for _, s in cluster.members
+                if math.hypot(s.xs[index] - x, s.ys[index] - y) <= radius
+            )
+            agreement[KEYPOINT_LABELS[index]] = round(agreeing / worker_count, 3)
+        consolidated.append(merged)
+        stats.append(
+            {
+                "id": merged.id,
+                "worker_indexes": sorted(w for w, _ in cluster.members),
+                "worker_count": len(cluster.members),
+                "keypoint_agreement": agreement,
+            }
+        )
+    return consolidated, stats
@@ -11,9 +11,104 @@
     https://docs.aws.amazon.com/sagemaker/latest/dg/sms-annotation-consolidation.html
     for more details.
 """
-import json
+import os
+from functools import partial
+from itertools import islice
 
+from annotation_diff import diff_skeletons, is_modified
+from checkpoint import (
+    CHECKPOINT_KEY_PREFIX,
+    ConsolidationCheckpoint,
+    iter_checkpointed_responses,
+)
+from codec import DecodeCache, decode_annotation_content, encoded_size, loads
+from image_index import ImageIndex
+from image_transforms import ImageTransform
+from json_stream import iter_json_array
+from keypoint_consolidation import consolidate_skeletons
+from parallel_consolidation import (
+    consolidation_processes,
+    iter_parallel_consolidated_output,
+    resolve_annotation_data,
+)
+from response_spill import ResponseSpiller
+from result_cache import (
+    RESULT_CACHE_KEY_PREFIX,
+    MemoryResultCache,
+    ResultCache,
+    result_cache_key,
+)
 from s3_helper import S3Client
+from skeletons import encode_skeletons, format_skeletons, parse_skeletons
+from telemetry import MeteredStream, Metrics, PayloadLogger
+from tiles import Tile
+
+# When enabled the consolidation payload is parsed one data object at a time
+# rather than being read into memory in full.
+STREAMING_CONSOLIDATION = (
+    os.environ.get("STREAMING_CONSOLIDATION", "true").lower() == "true"
+)
+# Estimator used to merge keypoints when several workers annotate an object,
+# see keypoint_consolidation.ESTIMATORS.
+CONSOLIDATION_ESTIMATOR = os.environ.get("CONSOLIDATION_ESTIMATOR", "median")
+# Number of processes consolidating data objects in parallel. "auto" uses one
+# per full vCPU of the function's memory size (1769 MB each), and the serial
+# path below two, see parallel_consolidation.processes_for_memory. Machines
+# with a single CPU always use the serial path.
+CONSOLIDATION_PROCESSES = os.environ.get("CONSOLIDATION_PROCESSES", "auto")
+CONSOLIDATION_PROCESSES = consolidation_processes(
+    None if CONSOLIDATION_PROCESSES == "auto" else int(CONSOLIDATION_PROCESSES)
+)
+# Lambda responses are limited to 6 MB. Once the projected response crosses
+# this size, detailed labels are written to S3 and referenced from a compact
+# summary instead.
+RESPONSE_SPILL_THRESHOLD_BYTES = int(
+    os.environ.get("RESPONSE_SPILL_THRESHOLD_BYTES", str(5 * 1024 * 1024))
+)
+# Encoding of original_annotations and updated_annotations in the output
+# manifest: "ui" keeps the crowd-2d-skeleton format, "compact" writes the
+# compact form of skeletons.encode_skeletons.
+ANNOTATION_ENCODING = os.environ.get("ANNOTATION_ENCODING", "ui")
+# Decimals kept by the compact encoding. Unset keeps coordinates exactly.
+ANNOTATION_PRECISION = os.environ.get("ANNOTATION_PRECISION")
+ANNOTATION_PRECISION = (
+    int(ANNOTATION_PRECISION) if ANNOTATION_PRECISION not in (None, "") else None
+)
+# Retried requests with an unchanged payload return the consolidated output
+# stored by the first attempt, see result_cache.
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "true").lower() == "true"
+# S3 URI under which consolidated output is cached. Defaults to a prefix of
+# the labeling job's outputConfig; "none" caches in memory only.
+RESULT_CACHE_S3_URI = os.environ.get("RESULT_CACHE_S3_URI")
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "8"))
+RESULT_CACHE_MAX_BYTES = int(
+    os.environ.get("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+# Progress of long batches is checkpointed to S3 so that a request which
+# runs out of time resumes where it stopped when retried, see checkpoint.
+CHECKPOINTS_ENABLED = os.environ.get("CHECKPOINTS_ENABLED", "true").lower() == "true"
+# S3 URI under which checkpoints are stored. Defaults to a prefix of the
+# labeling job's outputConfig.
+CHECKPOINT_S3_URI = os.environ.get("CHECKPOINT_S3_URI")
+CHECKPOINT_CHUNK_SIZE = int(os.environ.get("CHECKPOINT_CHUNK_SIZE", "50"))
+# Time kept in reserve to checkpoint and fail cleanly before the timeout.
+DEADLINE_MARGIN_MS = int(os.environ.get("DEADLINE_MARGIN_MS", "5000"))
+
+# Image dimensions index published by scripts/index_image_dimensions.py.
+# Labels of indexed images record the image size and the number of
+# keypoints outside it. Unset or "none" disables.
+IMAGE_INDEX_S3_URI = os.environ.get("IMAGE_INDEX_S3_URI", "none")
+
+# Kept for the lifetime of the execution environment.
+memory_result_cache = MemoryResultCache(
+    RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES
+)
+image_index = (
+    None
+    if IMAGE_INDEX_S3_URI.lower() in ("", "none")
+    else ImageIndex(IMAGE_INDEX_S3_URI)
+)
 
 
 def lambda_handler(event, context):
@@ -75,8 +170,11 @@ def lambda_handler(event, context):
         Return doc: https://docs.aws.amazon.com/sagemaker/latest/dg/sms-custom-templates-step3.html
     """
 
+    metrics = Metrics()
+    payload_logger = PayloadLogger()
+
     # Event received
-    print("Received event: " + json.dumps(event, indent=2))
+    payload_logger.log("Received event", event)
 
     labeling_job_arn = event["labelingJobArn"]
     label_attribute_name = event["labelAttributeName"]
@@ -90,14 +188,96 @@ def lambda_handler(event, context):
     if "kmsKeyId" in event:
         kms_key_id = event["kmsKeyId"]
 
-    # Create s3 client object
-    s3_client = S3Client(role_arn, kms_key_id)
+    try:
+        # Create s3 client object
+        with metrics.timer("AssumeRole"):
+            s3_client = S3Client(role_arn, kms_key_id)
+
+        # Retries of a request share its key as long as the payload is unchanged.
+        checkpoint_s3_uri = None
+        if CHECKPOINTS_ENABLED:
+            checkpoint_s3_uri = output_prefix(
+                CHECKPOINT_S3_URI, event.get("outputConfig"), CHECKPOINT_KEY_PREFIX
+            )
+        request_key = None
+        if "s3Uri" in payload and (RESULT_CACHE_ENABLED or checkpoint_s3_uri):
+            with metrics.timer("S3Fetch"):
+                etag = s3_client.get_object_etag_from_s3(payload["s3Uri"])
+            if etag is not None:
+                request_key = result_cache_key(labeling_job_arn, payload["s3Uri"], etag)
+
+        result_cache = None
+        if RESULT_CACHE_ENABLED and request_key is not None:
+            cache_s3_uri = output_prefix(
+                RESULT_CACHE_S3_URI, event.get("outputConfig"), RESULT_CACHE_KEY_PREFIX
+            )
+            result_cache = ResultCache(
+                s3_client, memory_result_cache, request_key, cache_s3_uri
+            )
+
+        checkpoint = None
+        if request_key is not None and checkpoint_s3_uri:
+            checkpoint = ConsolidationCheckpoint(
+                s3_client,
+                "{}/{}".format(checkpoint_s3_uri, request_key),
+                CHECKPOINT_CHUNK_SIZE,
+            )
+
+        # Perform consolidation
+        return do_consolidation(
+            labeling_job_arn,
+            payload,
+            label_attribute_name,
+            s3_client,
+            streaming=STREAMING_CONSOLIDATION,
+            metrics=metrics,
+            payload_logger=payload_logger,
+            output_s3_uri=event.get("outputConfig"),
+            result_cache=result_cache,
+            checkpoint=checkpoint,
+            context=context,
+            image_index=image_index,
+        )
+    finally:
+        metrics.emit()
+
 
-    # Perform consolidation
-    return do_consolidation(labeling_job_arn, payload, label_attribute_name, s3_client)
+def output_prefix(configured_s3_uri, output_config, key_prefix):
+    """Returns the S3 URI for data the lambda stores next to its output.
 
+    Args:
+        configured_s3_uri: S3 URI set in the environment, "none" to disable
+        output_config: the labeling job's outputConfig, used when no URI is
+            configured
+        key_prefix: prefix appended to output_config
+    Return:
+        S3 URI without trailing slash, or None
+    """
+    if configured_s3_uri == "none":
+        return None
+    if configured_s3_uri:
+        return configured_s3_uri.rstrip("/")
+    if output_config:
+        return "{}/{}".format(output_config.rstrip("/"), key_prefix)
+    return None
 
-def do_consolidation(labeling_job_arn, payload, label_attribute_name, s3_client):
+
+def do_consolidation(
+    labeling_job_arn,
+    payload,
+    label_attribute_name,
+    s3_client,
+    streaming=False,
+    metrics=None,
+    payload_logger=None,
+    output_s3_uri=None,
+    spill_threshold_bytes=None,
+    processes=None,
+    result_cache=None,
+    checkpoint=None,
+    context=None,
+    image_index=None,
+):
     """Formats and augments the output manifest file annotations.
 
     Args:
@@ -105,96 +285,490 @@ def do_consolidation(labeling_job_arn, payload, label_attribute_name, s3_client)
         payload:  payload data for consolidation
         label_attribute_name: identifier for labels in output JSON
         s3_client: S3 helper class
+        streaming: when True, the payload referenced by payload.s3Uri is
+            parsed one data object at a time instead of being loaded whole.
+        metrics: optional telemetry.Metrics receiving phase timings and counts
+        payload_logger: optional telemetry.PayloadLogger for the payload and
+            consolidated output
+        output_s3_uri: S3 URI under which detailed labels are written once the
+            projected response size crosses spill_threshold_bytes. Spilling is
+            disabled when None.
+        spill_threshold_bytes: projected response size which switches on
+            spilling, defaults to RESPONSE_SPILL_THRESHOLD_BYTES
+        processes: number of worker processes consolidating data objects,
+            defaults to CONSOLIDATION_PROCESSES. 1 consolidates serially.
+        result_cache: optional result_cache.ResultCache for this request. Its
+            stored output is returned without consolidating when present, and
+            output without failures is stored in it.
+        checkpoint: optional checkpoint.ConsolidationCheckpoint for this
+            request. Data objects it covers are skipped and their responses
+            reused, and progress is saved to it as the batch is processed.
+        context: Lambda context. With a checkpoint, consolidation stops and
+            raises checkpoint.DeadlineExceeded once the remaining time runs
+            below DEADLINE_MARGIN_MS.
+        image_index: optional image_index.ImageIndex in which the size of
+            each data object's image is looked up
     Return:
         output JSON string
     """
 
+    if metrics is None:
+        metrics = Metrics()
+    if payload_logger is None:
+        payload_logger = PayloadLogger()
+    if spill_threshold_bytes is None:
+        spill_threshold_bytes = RESPONSE_SPILL_THRESHOLD_BYTES
+
+    if result_cache is not None:
+        with metrics.timer("ResultCache"):
+            cached_output = result_cache.load()
+        if cached_output is not None:
+            print(
+                f"Returning consolidated output cached in {result_cache.source} "
+                f"for {payload['s3Uri']}"
+            )
+            metrics.add("ResultCacheHit", 1)
+            metrics.add("DataObjects", len(cached_output))
+            return cached_output
+        metrics.add("ResultCacheHit", 0)
+
     # Extract payload data
     if "s3Uri" in payload:
         s3_ref = payload["s3Uri"]
-        payload = json.loads(s3_client.get_object_from_s3(s3_ref))
-    print("-" * 80)
-    print(payload)
-    print("-" * 80)
+        if streaming:
+            with metrics.timer("S3Fetch"):
+                body = s3_client.get_object_stream_from_s3(s3_ref)
+            payload = metrics.timed_iter(
+                "Parse",
+                iter_json_array(
+                    MeteredStream(body, metrics, "S3Fetch", "PayloadBytes")
+                ),
+            )
+        else:
+            with metrics.timer("S3Fetch"):
+                payload = s3_client.get_object_from_s3(s3_ref)
+            metrics.add("PayloadBytes", len(payload), "Bytes")
+            with metrics.timer("Parse"):
+                payload = loads(payload)
+    if not streaming:
+        payload_logger.log("Payload", payload)
 
     # Payload data contains a list of data objects.
     # Iterate over it to consolidate annotations for individual data object.
+    counts = {"success": 0, "failure": 0}
+    if checkpoint is not None:
+        with metrics.timer("Checkpoint"):
+            resume_index = checkpoint.load()
+        if resume_index:
+            print(f"Resuming from checkpoint after {resume_index} data objects")
+            counts = dict(checkpoint.counts)
+            payload = islice(payload, resume_index, None)
+    if image_index is not None:
+        payload = iter_with_image_sizes(payload, image_index, s3_client, metrics)
+    if processes is None:
+        processes = CONSOLIDATION_PROCESSES
+    if processes > 1:
+        responses = metrics.timed_iter(
+            "Consolidate",
+            iter_parallel_consolidated_output(
+                partial(
+                    consolidate_data_object,
+                    labeling_job_arn,
+                    label_attribute_name=label_attribute_name,
+                ),
+                payload,
+                s3_client,
+                counts,
+                processes,
+            ),
+        )
+    else:
+        responses = iter_consolidated_output(
+            labeling_job_arn, payload, label_attribute_name, counts, metrics, s3_client
+        )
+    if checkpoint is not None:
+        responses = iter_checkpointed_responses(
+            responses, checkpoint, counts, context, DEADLINE_MARGIN_MS, metrics
+        )
+
     consolidated_output = []
-    success_count = 0  # Number of data objects that were successfully consolidated
-    failure_count = 0  # Number of data objects that failed in consolidation
+    response_sizes = []
+    response_bytes = 0
+    spiller = None
+    try:
+        for response in responses:
+            # Track the projected size of the response returned to Ground Truth.
+            with metrics.timer("Serialize"):
+                size = encoded_size(response)
+            if (
+                spiller is None
+                and output_s3_uri
+                and response_bytes + size > spill_threshold_bytes
+            ):
+                print(
+                    f"Projected response exceeds {spill_threshold_bytes} bytes, "
+                    f"writing detailed labels to {output_s3_uri}"
+                )
+                spiller = ResponseSpiller(
+                    s3_client, output_s3_uri, label_attribute_name
+                )
+                consolidated_output = [spiller.spill(r) for r in consolidated_output]
+                with metrics.timer("Serialize"):
+                    response_sizes = [encoded_size(r) for r in consolidated_output]
+                response_bytes = sum(response_sizes)
+            if spiller is not None:
+                response = spiller.spill(response)
+                with metrics.timer("Serialize"):
+                    size = encoded_size(response)
+            consolidated_output.append(response)
+            response_sizes.append(size)
+            response_bytes += size
+    finally:
+        # Uploads still in flight when consolidation stops early, e.g. with
+        # DeadlineExceeded, finish before the invocation ends.
+        if spiller is not None:
+            with metrics.timer("SpillWait"):
+                failed = spiller.wait()
+
+    if spiller is not None:
+        metrics.add("SpilledObjects", len(consolidated_output))
+        if failed:
+            # Drop objects whose details could not be stored rather than
+            # returning a reference to a missing object.
+            kept = [
+                (r, size)
+                for r, size in zip(consolidated_output, response_sizes)
+                if r["datasetObjectId"] not in failed
+            ]
+            counts["success"] -= len(consolidated_output) - len(kept)
+            counts["failure"] += len(consolidated_output) - len(kept)
+            consolidated_output = [r for r, _ in kept]
+            response_bytes = sum(size for _, size in kept)
+    metrics.add("ResponseBytes", response_bytes, "Bytes")
+
+    # Output with failures is not cached so that a retry can recover them.
+    if result_cache is not None and not counts["failure"]:
+        with metrics.timer("ResultCache"):
+            try:
+                result_cache.store(consolidated_output)
+            except Exception as e:
+                print(" Failed to cache consolidated output")
+                print(" error: {}".format(e))
+
+    print(
+        f"Consolidation Complete. Success Count {counts['success']}  Failure Count {counts['failure']}"
+    )
+    metrics.add("DataObjects", counts["success"] + counts["failure"])
+    metrics.add("ConsolidationSuccess", counts["success"])
+    metrics.add("ConsolidationFailure", counts["failure"])
+
+    payload_logger.log("Consolidated Output", consolidated_output)
+    return consolidated_output
+
+
+def iter_with_image_sizes(data_objects, image_index, s3_client, metrics):
+    """Adds the image size from an image index to each data object.
+
+        Lookups run in this process, before data objects are handed to
+        worker processes, so that index shards stay cached for the lifetime
+        of the execution environment. Images missing from the index, or
+        whose lookup fails, are passed on without a size.
+
+    Args:
+        data_objects: iterable of payload data objects
+        image_index: image_index.ImageIndex
+        s3_client: S3 helper class used to read the index
+        metrics: telemetry.Metrics receiving ImageIndexTime
+    Yields:
+        data objects, with "image_size": {"width", "height"} when indexed
+    """
+    for data_object in data_objects:
+        s3_uri = data_object.get("dataObject", {}).get("s3Uri")
+        if s3_uri:
+            try:
+                with metrics.timer("ImageIndex"):
+                    image_size = image_index.image_size(
+                        s3_uri, s3_client.get_object_from_s3
+                    )
+            except Exception as e:
+                print(" Failed to look up the size of {}".format(s3_uri))
+                print(" error: {}".format(e))
+                image_size = None
+            if image_size is not None:
+                data_object["image_size"] = {
+                    "width": image_size[0],
+                    "height": image_size[1],
+                }
+        yield data_object
+
+
+def iter_consolidated_output(
+    labeling_job_arn,
+    data_objects,
+    label_attribute_name,
+    counts=None,
+    metrics=None,
+    s3_client=None,
+):
+    """Consolidates data objects one at a time.
+
+        Failures are isolated per data object: a data object which fails to
+        consolidate is logged, counted and skipped.
+
+    Args:
+        labeling_job_arn: labeling job ARN
+        data_objects: iterable of payload data objects
+        label_attribute_name: identifier for labels in output JSON
+        counts: optional dict updated with "success" and "failure" counts
+        metrics: optional telemetry.Metrics receiving ConsolidateTime
+        s3_client: optional S3 helper class used to fetch annotationData.s3Uri
+    Yields:
+        consolidation response for each successfully consolidated data object
+    """
+    if counts is None:
+        counts = {}
+    if metrics is None:
+        metrics = Metrics()
+    counts.setdefault(
+        "success", 0
+    )  # Number of data objects that were successfully consolidated
+    counts.setdefault(
+        "failure", 0
+    )  # Number of data objects that failed in consolidation
 
     # For each datasetObjectId
-    for i in range(len(payload)):
-        response = None
+    for i, data_object in enumerate(data_objects):
         try:
-            dataset_object_id = payload[i]["datasetObjectId"]
-            log_prefix = "[{}] data object id [{}] :".format(
-                labeling_job_arn, dataset_object_id
+            if s3_client is not None:
+                with metrics.timer("S3Fetch"):
+                    resolve_annotation_data([data_object], s3_client)
+            with metrics.timer("Consolidate"):
+                response = consolidate_data_object(
+                    labeling_job_arn, data_object, label_attribute_name
+                )
+        except Exception as e:
+            counts["failure"] += 1
+            print(" Consolidation failed for dataobject {}".format(i))
+            print(" error: {}".format(e))
+            continue
+
+        counts["success"] += 1
+        yield response
+
+
+def consolidate_data_object(labeling_job_arn, data_object, label_attribute_name):
+    """Builds the consolidation response for an individual data object.
+
+    Args:
+        labeling_job_arn: labeling job ARN
+        data_object: a single element of the consolidation payload
+        label_attribute_name: identifier for labels in output JSON
+    Return:
+        consolidation response dict
+    """
+    dataset_object_id = data_object["datasetObjectId"]
+    log_prefix = "[{}] data object id [{}] :".format(
+        labeling_job_arn, dataset_object_id
+    )
+    annotations = data_object["annotations"]
+    # Workers share the original annotations, which are decoded only once.
+    cache = DecodeCache()
+    annotation_contents = [
+        decode_annotation_content(annotation["annotationData"].get("content"), cache)
+        for annotation in annotations
+    ]
+    # All workers are shown the same image and original annotations.
+    annotation_content = annotation_contents[0]
+
+    label = {
+        "dataset_object_id": dataset_object_id,
+        "data_object_s3_uri": data_object["dataObject"]["s3Uri"],
+        "image_file_name": annotation_content["image_name"].split("?")[0],
+        "image_s3_location": annotation_content["image_s3_uri"].split("?")[0],
+    }
+    # Workers shown an image derivative submit its transform, through which
+    # annotations are mapped back into original image coordinates.
+    transform = ImageTransform.from_content(annotation_content)
+    if transform is not None:
+        label["image_file_name"] = label["data_object_s3_uri"].split("/")[-1]
+        label["image_s3_location"] = label["data_object_s3_uri"]
+        label["derivative_s3_location"] = annotation_content["image_s3_uri"].split("?")[
+            0
+        ]
+    image_size = data_object.get("image_size")
+    if transform is not None:
+        image_size = {"width": transform.width, "height": transform.height}
+    if image_size is not None:
+        label["image_size"] = image_size
+    # Workers shown a tile of a dense image annotate its whole region, but
+    # its label keeps only the instances the tile owns, see tiles.
+    tile = Tile.from_content(annotation_content)
+    if tile is not None:
+        label["tile"] = tile.to_dict()
+    original_annotations = annotation_content["original_annotations"]
+    original_skeletons, flat = parse_skeletons(original_annotations)
+    # Every instance shown to the worker, which decides the owner of those
+    # they kept.
+    shown_skeletons = original_skeletons
+    if transform is not None:
+        transform.to_original(original_skeletons)
+        if tile is not None:
+            original_skeletons = tile.owned(shown_skeletons)
+        original_annotations = format_skeletons(original_skeletons, flat)
+    label["original_annotations"] = encode_annotations(
+        original_annotations, original_skeletons
+    )
+    if len(annotations) > 1:
+        print(f"{log_prefix}consolidating {len(annotations)} worker responses")
+        label.update(
+            consolidate_worker_annotations(
+                annotations,
+                annotation_contents,
+                original_skeletons,
+                transform,
+                image_size,
+                tile,
+                shown_skeletons,
             )
-            annotations = payload[i]["annotations"]
-
-            if len(annotations) > 1:
-                msg = "Multiple Reviewers for same datasetObjectId is not " "supported "
-                print(f"{log_prefix}{msg}")
-                raise NotImplementedError(msg)
-
-            annotation = annotations[0]
-            worker_id = annotation["workerId"]
-            annotation_data = annotation["annotationData"]
-            annotation_content = annotation_data.get("content")
-            annotation_content = json.loads(annotation_content)
-
-            # Build consolidation response object for an individual data object
-            response = {
-                "datasetObjectId": dataset_object_id,
-                "consolidatedAnnotation": {
-                    "content": {
-                        label_attribute_name: {
-                            "dataset_object_id": dataset_object_id,
-                            "data_object_s3_uri": payload[i]["dataObject"]["s3Uri"],
-                            "image_file_name": annotation_content["image_name"].split(
-                                "?"
-                            )[0],
-                            "image_s3_location": annotation_content[
-                                "image_s3_uri"
-                            ].split("?")[0],
-                            "original_annotations": json.loads(
-                                annotation_content["original_annotations"]
-                            ),
-                            "updated_annotations": annotation_content[
-                                "updated_annotations"
-                            ],
-                            "worker_id": worker_id,
-                            "no_changes_needed": json.loads(
-                                annotation_content["no_changes_needed"]
-                            ),
-                            "was_modified": json.dumps(
-                                annotation_content["updated_annotations"]
-                            )
-                            != json.dumps(annotation_content["original_annotations"]),
-                            "total_time_in_seconds": annotation_content.get(
-                                "total_time_in_seconds", "null"
-                            ),
-                        }
-                    }
-                },
+        )
+    else:
+        updated_annotations = annotation_content["updated_annotations"]
+        updated_skeletons, flat = parse_skeletons(updated_annotations)
+        if transform is not None:
+            transform.to_original(updated_skeletons)
+            if tile is not None:
+                updated_skeletons = tile.owned(updated_skeletons, shown_skeletons)
+            updated_annotations = format_skeletons(updated_skeletons, flat)
+        changes = diff_skeletons(original_skeletons, updated_skeletons)
+        label.update(
+            {
+                "updated_annotations": encode_annotations(
+                    updated_annotations, updated_skeletons
+                ),
+                "worker_id": annotations[0]["workerId"],
+                "no_changes_needed": annotation_content["no_changes_needed"],
+                "was_modified": is_modified(changes),
+                "changes": changes,
+                "total_time_in_seconds": annotation_content.get(
+                    "total_time_in_seconds", "null"
+                ),
             }
+        )
+        if image_size is not None:
+            label["out_of_bounds_keypoints"] = count_out_of_bounds(
+                updated_skeletons, image_size
+            )
 
-            success_count += 1
-            # Append individual data object response to the list of responses.
-            if response is not None:
-                consolidated_output.append(response)
+    # Build consolidation response object for an individual data object
+    return {
+        "datasetObjectId": dataset_object_id,
+        "consolidatedAnnotation": {"content": {label_attribute_name: label}},
+    }
 
-        except Exception as e:
-            failure_count += 1
-            print(" Consolidation failed for dataobject {}".format(i))
-            print(" error: {}".format(e))
 
-    print(
-        f"Consolidation Complete. Success Count {success_count}  Failure Count {failure_count}"
+def encode_annotations(annotations, skeletons):
+    """Returns annotations as written to the output manifest.
+
+    Args:
+        annotations: annotations in the format submitted by the UI
+        skeletons: the same annotations parsed into Skeleton instances
+    Return:
+        annotations unchanged, or their compact form when ANNOTATION_ENCODING
+        is "compact"
+    """
+    if ANNOTATION_ENCODING == "compact":
+        return encode_skeletons(skeletons, ANNOTATION_PRECISION)
+    return annotations
+
+
+def count_out_of_bounds(skeletons, image_size):
+    """Returns the number of placed keypoints outside the image.
+
+    Args:
+        skeletons: list of Skeleton in original image coordinates
+        image_size: {"width", "height"} of the image as displayed
+    """
+    width, height = image_size["width"], image_size["height"]
+    return sum(
+        1
+        for skeleton in skeletons
+        for x, y in zip(skeleton.xs, skeleton.ys)
+        if x == x and not (0 <= x <= width and 0 <= y <= height)
     )
 
-    print(" -- Consolidated Output -- ")
-    print(consolidated_output)
-    print(" ------------------------- ")
-    return consolidated_output
+
+def consolidate_worker_annotations(
+    annotations,
+    annotation_contents,
+    original_skeletons,
+    transform=None,
+    image_size=None,
+    tile=None,
+    shown_skeletons=(),
+):
+    """Consolidates the skeletons submitted by multiple workers.
+
+    Args:
+        annotations: the data object's worker annotations
+        annotation_contents: decoded annotation content of each worker
+        original_skeletons: Skeleton instances the workers started from
+        transform: ImageTransform of the image derivative the workers were
+            shown, or None if they were shown the original
+        image_size: {"width", "height"} of the image, when known, to count
+            consolidated keypoints outside it
+        tile: tiles.Tile the workers were shown, whose consolidated
+            instances are kept only when the tile owns them
+        shown_skeletons: every Skeleton the workers started from, including
+            those of a tile owned by another tile
+    Return:
+        dict of label fields for the consolidated annotation
+    """
+    worker_ids = [annotation["workerId"] for annotation in annotations]
+    worker_skeletons = []
+    flat = False
+    for content in annotation_contents:
+        skeletons, flat = parse_skeletons(content["updated_annotations"])
+        if transform is not None:
+            transform.to_original(skeletons)
+        worker_skeletons.append(skeletons)
+
+    consolidated, stats = consolidate_skeletons(
+        worker_skeletons, estimator=CONSOLIDATION_ESTIMATOR
+    )
+    if tile is not None:
+        owned = tile.ownership(consolidated, shown_skeletons)
+        consolidated = [s for s, keep in zip(consolidated, owned) if keep]
+        stats = [s for s, keep in zip(stats, owned) if keep]
+    for skeleton_stats in stats:
+        skeleton_stats["worker_ids"] = [
+            worker_ids[i] for i in skeleton_stats.pop("worker_indexes")
+        ]
+    changes = diff_skeletons(original_skeletons, consolidated)
+
+    worker_times = [
+        content["total_time_in_seconds"]
+        for content in annotation_contents
+        if isinstance(content.get("total_time_in_seconds"), (int, float))
+    ]
+    label = {
+        "updated_annotations": encode_annotations(
+            format_skeletons(consolidated, flat), consolidated
+        ),
+        "worker_id": None,
+        "worker_ids": worker_ids,
+        "no_changes_needed": all(
+            content["no_changes_needed"] for content in annotation_contents
+        ),
+        "was_modified": is_modified(changes),
+        "changes": changes,
+        # Combined labeling time of all workers
+        "total_time_in_seconds": sum(worker_times) if worker_times else "null",
+        "consolidation": {
+            "worker_count": len(worker_ids),
+            "estimator": CONSOLIDATION_ESTIMATOR,
+            "skeletons": stats,
+        },
+    }
+    if image_size is not None:
+        label["out_of_bounds_keypoints"] = count_out_of_bounds(consolidated, image_size)
+    return label
@@ -0,0 +1,278 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Parallel consolidation of data objects.
+
+    Consolidation of an object is CPU bound once several workers' skeletons
+    need matching, while fetching annotationData.s3Uri is I/O bound. Data
+    objects are processed in windows: the annotation data referenced by S3
+    is fetched with a thread pool, then the window is split into chunks which
+    are consolidated by a pool of worker processes.
+
+    The Lambda execution environment has no /dev/shm, so
+    multiprocessing.Pool and concurrent.futures.ProcessPoolExecutor cannot
+    be used there. Worker processes are forked and fed through Pipes instead.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of data objects sent to a worker process at a time.
+DEFAULT_CHUNK_SIZE = 8
+# Number of concurrent S3 reads when resolving annotationData.s3Uri.
+DEFAULT_IO_WORKERS = 8
+# Memory size at which Lambda allocates one full vCPU. Lambda allocates CPU
+# in proportion to memory, while the vCPUs it reports stay at 2 or more
+# whatever the memory size.
+FULL_VCPU_MEMORY_MB = 1769
+
+
+def available_cpus():
+    """Returns the number of vCPUs available to this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def processes_for_memory(memory_size):
+    """Returns the number of consolidation processes worth running at a memory size.
+
+        One process per full vCPU the memory buys, and a single process, the
+        serial path, below two full vCPUs: extra processes would share the
+        same CPU time and only add fork and pipe overhead and memory.
+
+    Args:
+        memory_size: memory of the function in MB
+    """
+    return max(1, int(memory_size) // FULL_VCPU_MEMORY_MB)
+
+
+def consolidation_processes(processes=None):
+    """Returns the number of consolidation processes of the running function.
+
+    Sized from AWS_LAMBDA_FUNCTION_MEMORY_SIZE in Lambda, see
+    processes_for_memory, and from the available vCPUs elsewhere. A machine
+    with a single CPU always consolidates serially: on one vCPU the pool
+    only adds overhead.
+
+    Args:
+        processes: configured number of processes, None to size it
+    """
+    if (os.cpu_count() or 1) < 2:
+        return 1
+    if processes is not None:
+        return processes
+    memory_size = os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE")
+    if memory_size is None:
+        return available_cpus()
+    return min(processes_for_memory(memory_size), available_cpus())
+
+
+def resolve_annotation_data(data_objects, s3_client, max_workers=DEFAULT_IO_WORKERS):
+    """Inlines worker annotations which are stored in S3 rather than embedded.
+
+        Ground Truth passes large annotations as annotationData.s3Uri instead
+        of annotationData.content. Those are fetched concurrently and stored
+        as content, in place. Annotations which fail to fetch are left
+        without content so only their data object fails to consolidate.
+
+    Args:
+        data_objects: list of payload data objects
+        s3_client: S3 helper class
+        max_workers: number of concurrent S3 reads
+    """
+    pending = [
+        annotation["annotationData"]
+        for data_object in data_objects
+        for annotation in data_object.get("annotations", [])
+        if "content" not in annotation.get("annotationData", {})
+        and "s3Uri" in annotation.get("annotationData", {})
+    ]
+    if not pending:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+        futures = [
+            executor.submit(s3_client.get_object_from_s3, annotation_data["s3Uri"])
+            for annotation_data in pending
+        ]
+        for annotation_data, future in zip(pending, futures):
+            try:
+                content = future.result()
+            except Exception as e:
+                print(" Failed to fetch {}".format(annotation_data["s3Uri"]))
+                print(" error: {}".format(e))
+                continue
+            if content is not None:
+                annotation_data["content"] = content
+
+
+def _consolidate_chunk(consolidate, chunk):
+    results = []
+    for data_object in chunk:
+        try:
+            results.append((True, consolidate(data_object)))
+        except Exception as e:
+            results.append((False, str(e)))
+    return results
+
+
+def _worker(connection, consolidate):
+    while True:
+        chunk = connection.recv()
+        if chunk is None:
+            break
+        connection.send(_consolidate_chunk(consolidate, chunk))
+    connection.close()
+
+
+class ConsolidationPool(object):
+    """A pool of forked processes consolidating chunks of data objects.
+
+    Args:
+        consolidate: callable taking a data object and returning its
+            consolidation response. It is inherited by the forked workers
+            and never pickled.
+        processes: number of worker processes
+    """
+
+    def __init__(self, consolidate, processes):
+        self._context = multiprocessing.get_context("fork")
+        self._consolidate = consolidate
+        self.connections = []
+        self.processes = []
+        for _ in range(processes):
+            connection, process = self._start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def _start(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker, args=(child_connection, self._consolidate), daemon=True
+        )
+        process.start()
+        child_connection.close()
+        return parent_connection, process
+
+    def _restart(self, slot):
+        """Replaces the worker of a slot, which exited, e.g. killed for memory."""
+        self.connections[slot].close()
+        self.processes[slot].join(timeout=1)
+        if self.processes[slot].is_alive():
+            self.processes[slot].terminate()
+        self.connections[slot], self.processes[slot] = self._start()
+
+    def _send(self, slot, chunk):
+        """Sends a chunk to a worker, restarting it once if it exited.
+
+        Returns:
+            True when the chunk was sent
+        """
+        for _ in range(2):
+            try:
+                self.connections[slot].send(chunk)
+                return True
+            except (BrokenPipeError, OSError):
+                self._restart(slot)
+        return False
+
+    def map_chunks(self, chunks):
+        """Consolidates chunks across the workers, preserving order.
+
+            The data objects of a chunk whose worker exits fail, and the
+            worker is replaced for the chunks that follow.
+
+        Returns:
+            list with one list of (ok, response or error message) per chunk
+        """
+        results = []
+        for batch in iter_windows(chunks, len(self.connections)):
+            sent = [self._send(slot, chunk) for slot, chunk in enumerate(batch)]
+            for slot, chunk in enumerate(batch):
+                if sent[slot]:
+                    try:
+                        results.append(self.connections[slot].recv())
+                        continue
+                    except EOFError:
+                        self._restart(slot)
+                results.append([(False, "worker process exited")] * len(chunk))
+        return results
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_windows(items, size):
+    """Groups an iterable into lists of up to size items."""
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def iter_parallel_consolidated_output(
+    consolidate,
+    data_objects,
+    s3_client=None,
+    counts=None,
+    processes=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """Consolidates data objects with a pool of worker processes.
+
+        Output order matches input order and failures stay isolated per
+        data object, as in lambda_function.iter_consolidated_output.
+
+    Args:
+        consolidate: callable taking a data object and returning its response
+        data_objects: iterable of payload data objects
+        s3_client: S3 helper class used to resolve annotationData.s3Uri
+        counts: optional dict updated with "success" and "failure" counts
+        processes: number of worker processes, defaults to
+            consolidation_processes()
+        chunk_size: number of data objects sent to a worker at a time
+    Yields:
+        consolidation response for each successfully consolidated data object
+    """
+    if counts is None:
+        counts = {}
+    counts.setdefault("success", 0)
+    counts.setdefault("failure", 0)
+    if processes is None:
+        processes = consolidation_processes()
+
+    index = 0
+    with ConsolidationPool(consolidate, processes) as pool:
+        for window in iter_windows(data_objects, processes * chunk_size):
+            if s3_client is not None:
+                resolve_annotation_data(window, s3_client)
+            chunks = list(iter_windows(window, chunk_size))
+            for chunk_results in pool.map_chunks(chunks):
+                for ok, result in chunk_results:
+                    if ok:
+                        counts["success"] += 1
+                        yield result
+                    else:
+                        counts["failure"] += 1
+                        print(" Consolidation failed for dataobject {}".format(index))
+                        print(" error: {}".format(result))
+                    index += 1
@@ -0,0 +1,106 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Spilling of detailed consolidation results to S3.
+
+    The response of the post-annotation lambda is limited in size, and every
+    consolidated object carries its original and updated annotations inline.
+    Once the projected response grows past a threshold, the detailed label of
+    each object is written to S3 and the response carries a compact summary
+    with a reference to it instead.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from codec import dumps_bytes
+from s3_helper import S3Client
+
+# Label fields which are moved to S3 when a response is spilled.
+DETAILED_FIELDS = ("original_annotations", "updated_annotations")
+SPILL_KEY_PREFIX = "consolidation_details"
+
+
+class ResponseSpiller(object):
+    """Writes detailed labels to S3 in parallel and returns compact responses.
+
+    Args:
+        s3_client: S3Client used for the writes; its kms_key_id is honoured.
+        output_s3_uri: S3 URI under which the detailed labels are written,
+            usually the labeling job's outputConfig.
+        label_attribute_name: identifier for labels in output JSON
+        max_workers: number of concurrent S3 writes
+        max_queued: number of encoded labels waiting for a write. spill
+            blocks once they are all taken, so that slow writes bound the
+            memory held by labels instead of letting them pile up.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        output_s3_uri,
+        label_attribute_name,
+        max_workers=16,
+        max_queued=64,
+    ):
+        self.s3_client = s3_client
+        self.bucket, prefix = S3Client.bucket_key_from_s3_uri(output_s3_uri)
+        self.prefix = "/".join(p for p in (prefix.strip("/"), SPILL_KEY_PREFIX) if p)
+        self.label_attribute_name = label_attribute_name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = []
+        self._slots = threading.Semaphore(max_workers + max_queued)
+
+    def spill(self, response):
+        """Starts writing the detailed label of response to S3.
+
+        Returns:
+            the compact response to return in place of response
+        """
+        label = response["consolidatedAnnotation"]["content"][self.label_attribute_name]
+        key = "{}/{}.json".format(self.prefix, response["datasetObjectId"])
+        self._slots.acquire()
+        future = self.executor.submit(
+            self.s3_client.put_object_to_s3,
+            dumps_bytes(label),
+            self.bucket,
+            key,
+            "application/json",
+        )
+        future.add_done_callback(lambda _: self._slots.release())
+        self.pending.append((response["datasetObjectId"], future))
+
+        summary = {k: v for k, v in label.items() if k not in DETAILED_FIELDS}
+        if "changes" in summary:
+            summary["changes"] = {
+                k: v for k, v in summary["changes"].items() if k != "changed_skeletons"
+            }
+        if "consolidation" in summary:
+            summary["consolidation"] = {
+                k: v for k, v in summary["consolidation"].items() if k != "skeletons"
+            }
+        summary["annotations_s3_uri"] = "s3://{}/{}".format(self.bucket, key)
+        return {
+            "datasetObjectId": response["datasetObjectId"],
+            "consolidatedAnnotation": {"content": {self.label_attribute_name: summary}},
+        }
+
+    def wait(self):
+        """Waits for all writes to finish.
+
+        Returns:
+            set of datasetObjectIds whose detailed label failed to be written
+        """
+        failed = set()
+        for dataset_object_id, future in self.pending:
+            try:
+                future.result()
+            except Exception as e:
+                print(
+                    " Failed to write consolidation details for data object {}".format(
+                        dataset_object_id
+                    )
+                )
+                print(" error: {}".format(e))
+                failed.add(dataset_object_id)
+        self.executor.shutdown()
+        self.pending = []
+        return failed
@@ -0,0 +1,130 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Cache of consolidated output for retried consolidation requests.
+
+    Ground Truth retries a consolidation request which failed or timed out
+    with the same payload. Consolidated output is stored keyed by the
+    labeling job ARN, the payload s3Uri and the payload's ETag, so a retry
+    with an unchanged payload returns the stored output instead of
+    consolidating the batch again.
+
+    Output is looked up in memory first, which survives between invocations
+    of a warm execution environment, and then in S3. Objects written to S3
+    are tagged with CACHE_OBJECT_TAGGING so a bucket lifecycle rule can
+    expire them.
+"""
+import hashlib
+from collections import OrderedDict
+
+from codec import dumps_bytes, loads
+from s3_helper import S3Client
+
+RESULT_CACHE_KEY_PREFIX = "consolidation_cache"
+CACHE_OBJECT_TAGGING = "consolidation-cache=true"
+
+
+def result_cache_key(labeling_job_arn, payload_s3_uri, etag):
+    """Returns the cache key of a consolidation request."""
+    text = "\n".join((labeling_job_arn, payload_s3_uri, etag))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class MemoryResultCache(object):
+    """Least recently used cache of encoded consolidated output.
+
+    Args:
+        max_entries: number of outputs kept
+        max_bytes: total encoded size of the outputs kept. Larger outputs
+            are not cached in memory at all.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes or self.max_entries < 1:
+            return
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self.size += len(data)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+class ResultCache(object):
+    """Consolidated output of one consolidation request, in memory and S3.
+
+    Args:
+        s3_client: S3Client used for the S3 tier
+        memory: MemoryResultCache shared across invocations
+        key: result_cache_key of the request
+        cache_s3_uri: S3 URI under which outputs are stored, or None to only
+            cache in memory
+    """
+
+    def __init__(self, s3_client, memory, key, cache_s3_uri=None):
+        self.s3_client = s3_client
+        self.memory = memory
+        self.key = key
+        self.cache_s3_uri = cache_s3_uri
+        # Tier the last load was answered from: "memory", "s3" or None.
+        self.source = None
+
+    def _cache_object(self):
+        bucket, prefix = S3Client.bucket_key_from_s3_uri(self.cache_s3_uri)
+        key = "/".join(p for p in (prefix.strip("/"), f"{self.key}.json") if p)
+        return bucket, key
+
+    def load(self):
+        """Returns the stored consolidated output, or None on a miss.
+
+        Output which cannot be read from S3 is a miss too: without
+        s3:ListBucket, S3 answers a read of a key not stored yet with
+        AccessDenied rather than NoSuchKey.
+        """
+        self.source = None
+        data = self.memory.get(self.key)
+        if data is not None:
+            self.source = "memory"
+            return loads(data)
+        if not self.cache_s3_uri:
+            return None
+        bucket, key = self._cache_object()
+        try:
+            data = self.s3_client.get_object_from_s3(f"s3://{bucket}/{key}")
+            if data is None:
+                return None
+            data = data.encode("utf-8")
+            output = loads(data)
+        except Exception as e:
+            print(" Failed to read cached output from s3://{}/{}".format(bucket, key))
+            print(" error: {}".format(e))
+            return None
+        self.memory.put(self.key, data)
+        self.source = "s3"
+        return output
+
+    def store(self, consolidated_output):
+        """Stores consolidated output for the request."""
+        data = dumps_bytes(consolidated_output)
+        self.memory.put(self.key, data)
+        if self.cache_s3_uri:
+            bucket, key = self._cache_object()
+            self.s3_client.put_object_to_s3(
+                data, bucket, key, "application/json", tagging=CACHE_OBJECT_TAGGING
+            )
@@ -5,63 +5,164 @@
     https://github.com/aws-samples/aws-sagemaker-ground-truth-recipe/blob/master\
     /aws_sagemaker_ground_truth_sample_lambda/s3_helper.py
 """
+import threading
+from datetime import datetime, timedelta, timezone
+
 import boto3
 from botocore.exceptions import ClientError
 
+DEFAULT_SESSION = "Custom_Annotation_Consolidation_Lambda_Session"
+# Cached credentials are refreshed once they are this close to expiring.
+CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+EXPIRED_CREDENTIAL_ERROR_CODES = ("ExpiredToken", "ExpiredTokenException")
+
+
+class RoleSession(object):
+    """S3 client created from the assumed-role credentials of a single role.
+
+    The client is created on first use. Only the low-level client is
+    used; the resource layer is slower to load and adds nothing here.
+    """
+
+    def __init__(self, role_arn, credentials):
+        self.role_arn = role_arn
+        self.credentials = credentials
+        self.expiration = credentials["Expiration"]
+        self._s3_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            with self._lock:
+                if self._s3_client is None:
+                    self._s3_client = self._create_s3_client()
+        return self._s3_client
+
+    def _create_s3_client(self):
+        return boto3.client(
+            "s3",
+            aws_access_key_id=self.credentials["AccessKeyId"],
+            aws_secret_access_key=self.credentials["SecretAccessKey"],
+            aws_session_token=self.credentials["SessionToken"],
+        )
+
+    def is_fresh(self, now=None):
+        """Returns True while the credentials are not about to expire."""
+        if now is None:
+            now = datetime.now(timezone.utc)
+        return now < self.expiration - CREDENTIAL_REFRESH_MARGIN
+
+
+class RoleSessionCache(object):
+    """Thread-safe cache of RoleSession keyed by role ARN.
+
+        Lives for the lifetime of the Lambda execution environment so warm
+        invocations reuse the assumed-role credentials and clients instead of
+        calling STS on every batch.
+
+    Args:
+        sts_client_factory: callable returning the STS client used to assume
+            roles. Defaults to boto3.client("sts").
+    """
+
+    def __init__(self, sts_client_factory=None):
+        self._sts_client_factory = sts_client_factory or (lambda: boto3.client("sts"))
+        self._sts_client = None
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, role_arn, refresh=False):
+        """Returns the RoleSession for role_arn, assuming the role if needed.
+
+        Args:
+            role_arn: role to assume
+            refresh: assume the role again even if cached credentials are fresh
+        """
+        with self._lock:
+            cached = self._sessions.get(role_arn)
+            if cached is None or refresh or not cached.is_fresh():
+                if self._sts_client is None:
+                    self._sts_client = self._sts_client_factory()
+                assume_role_object = self._sts_client.assume_role(
+                    RoleArn=role_arn, RoleSessionName=DEFAULT_SESSION
+                )
+                cached = RoleSession(role_arn, assume_role_object["Credentials"])
+                self._sessions[role_arn] = cached
+            return cached
+
+    def clear(self):
+        """Drops all cached sessions."""
+        with self._lock:
+            self._sessions.clear()
+
+
+role_session_cache = RoleSessionCache()
+
 
 class S3Client(object):
     """
     Helper Class for S3 operations
     """
 
-    s3_client = boto3.client("s3")
-    s3 = boto3.resource("s3")
-
     def __init__(self, role_arn=None, kms_key_id=None):
         """
         Initialize the S3 resource using provided Role and Kms Key
 
+        Credentials for the role are taken from role_session_cache and only
+        re-assumed shortly before they expire. The S3 client is created on
+        first use.
+
         :param role_arn: Role which have access to consolidation request S3 payload file.
         :param kms_key_id: KMS key if S3 bucket is encrypted
         :return:
         """
-        DEFAULT_SESSION = "Custom_Annotation_Consolidation_Lambda_Session"
-        sts_connection = boto3.client("sts")
-        assume_role_object = sts_connection.assume_role(
-            RoleArn=role_arn, RoleSessionName=DEFAULT_SESSION
-        )
-        session = boto3.Session(
-            aws_access_key_id=assume_role_object["Credentials"]["AccessKeyId"],
-            aws_secret_access_key=assume_role_object["Credentials"]["SecretAccessKey"],
-            aws_session_token=assume_role_object["Credentials"]["SessionToken"],
-        )
-        self.s3 = session.resource("s3")
-        self.s3_client = session.client("s3")
+        self.role_arn = role_arn
         self.kms_key_id = kms_key_id
+        self.role_session = role_session_cache.get(role_arn)
+
+    @property
+    def s3_client(self):
+        return self.role_session.s3_client
+
+    def refresh_credentials(self):
+        """Assumes the role again, replacing the cached credentials."""
+        self.role_session = role_session_cache.get(self.role_arn, refresh=True)
 
-    def put_object_to_s3(self, data, bucket, key, content_type):
+    def _call_with_refresh(self, operation):
+        """Runs operation(), retrying once with fresh credentials if they expired."""
+        try:
+            return operation()
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in EXPIRED_CREDENTIAL_ERROR_CODES:
+                raise
+            self.refresh_credentials()
+            return operation()
+
+    def put_object_to_s3(self, data, bucket, key, content_type, tagging=None):
         """
         Helper function to persist data in S3
+
+        :param tagging: optional object tags as a URL query string, e.g. "key=value"
         """
         try:
             if not content_type:
                 # Default content type
                 content_type = "application/octet-stream"
-            image_object = self.s3.Object(bucket, key)
+            put_kwargs = {"Body": data, "ContentType": content_type}
+            if tagging:
+                put_kwargs["Tagging"] = tagging
             if self.kms_key_id:
-                image_object.put(
-                    Body=data,
-                    ContentType=content_type,
-                    SSEKMSKeyId=self.kms_key_id,
-                    ServerSideEncryption="aws:kms",
-                )
-            else:
-                image_object.put(Body=data, ContentType=content_type)
+                put_kwargs["SSEKMSKeyId"] = self.kms_key_id
+                put_kwargs["ServerSideEncryption"] = "aws:kms"
+            self._call_with_refresh(
+                lambda: self.s3_client.put_object(Bucket=bucket, Key=key, **put_kwargs)
+            )
         except ClientError as e:
             raise ValueError(
                 "Failed to put data in bucket: {}  with key {}.".format(bucket, key), e
             )
-        return "s3://" + image_object.bucket_name + "/" + image_object.key
+        return "s3://" + bucket + "/" + key
 
     def get_object_from_s3(self, s3_url):
         """Helper function to retrieve data from S3"""
@@ -69,7 +170,9 @@ class S3Client(object):
 
         try:
             payload = (
-                self.s3_client.get_object(Bucket=bucket, Key=path)
+                self._call_with_refresh(
+                    lambda: self.s3_client.get_object(Bucket=bucket, Key=path)
+                )
                 .get("Body")
                 .read()
                 .decode("utf-8")
@@ -86,6 +189,53 @@ class S3Client(object):
 
         return payload
 
+    def get_object_stream_from_s3(self, s3_url):
+        """Helper function to open a streaming body for an S3 object
+
+        Unlike get_object_from_s3 the object is not read into memory; the
+        returned body can be consumed incrementally with read(size).
+        """
+        bucket, path = S3Client.bucket_key_from_s3_uri(s3_url)
+
+        try:
+            body = self._call_with_refresh(
+                lambda: self.s3_client.get_object(Bucket=bucket, Key=path)
+            ).get("Body")
+        except ClientError as e:
+            print(e)
+            if (
+                e.response["Error"]["Code"] == "404"
+                or e.response["Error"]["Code"] == "NoSuchKey"
+            ):
+                return None
+            else:
+                raise ValueError("Failed to retrieve data from {}.".format(s3_url), e)
+
+        return body
+
+    def get_object_etag_from_s3(self, s3_url):
+        """Helper function to retrieve the ETag of an S3 object
+
+        Returns None when the object does not exist.
+        """
+        bucket, path = S3Client.bucket_key_from_s3_uri(s3_url)
+
+        try:
+            response = self._call_with_refresh(
+                lambda: self.s3_client.head_object(Bucket=bucket, Key=path)
+            )
+        except ClientError as e:
+            print(e)
+            if (
+                e.response["Error"]["Code"] == "404"
+                or e.response["Error"]["Code"] == "NoSuchKey"
+            ):
+                return None
+            else:
+                raise ValueError("Failed to retrieve data from {}.".format(s3_url), e)
+
+        return response["ETag"]
+
     @staticmethod
     def bucket_key_from_s3_uri(s3_path):
         """Return bucket and key from s3 URL
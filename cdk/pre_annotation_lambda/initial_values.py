@@ -0,0 +1,63 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Compaction of the annotations passed to the UI as initial_values.
+
+    initial_values is embedded in the task page as the initialValues
+    attribute of the crowd-2d-skeleton element, so its size adds to the load
+    time of every task. Annotations are passed through the skeleton model,
+    which keeps only what the UI shows: the skeleton id and the label, x and
+    y of every keypoint of a known keypoint class. Other fields, keypoints of
+    unknown classes and keypoints without coordinates are dropped.
+    Coordinates are rounded to a number of decimals, and skeleton instances
+    with no keypoint within the image are dropped.
+"""
+from skeletons import format_skeletons, parse_skeletons
+
+
+def _inside(x, y, image_size):
+    return 0 <= x <= image_size[0] and 0 <= y <= image_size[1]
+
+
+def compact_annotations(annotations, precision=None, image_size=None):
+    """Returns annotations with only the data the UI shows.
+
+    Args:
+        annotations: annotations of a manifest item, in UI or compact form
+        precision: number of decimals coordinates are rounded to, None to
+            keep them as is
+        image_size: (width, height) of the image in pixels, None when not
+            known. Instances without a keypoint inside the image are dropped;
+            when the size is not known only instances without any keypoint.
+
+    Returns:
+        (annotations, dropped) where annotations are in the UI format, flat
+        if they were given flat, and dropped is the number of skeleton
+        instances removed
+    """
+    skeletons, flat = parse_skeletons(annotations)
+    kept = []
+    for skeleton in skeletons:
+        placed = [(x, y) for x, y in zip(skeleton.xs, skeleton.ys) if x == x]
+        if image_size is not None:
+            placed = [(x, y) for x, y in placed if _inside(x, y, image_size)]
+        if not placed:
+            continue
+        if precision is not None:
+            for i, (x, y) in enumerate(zip(skeleton.xs, skeleton.ys)):
+                skeleton.xs[i] = round(x, precision)
+                skeleton.ys[i] = round(y, precision)
+        kept.append(skeleton)
+    return format_skeletons(kept, flat), len(skeletons) - len(kept)
+
+
+def image_size_of(data_object):
+    """Returns (width, height) from a manifest item's image_size, or None.
+
+    Args:
+        data_object: manifest item, optionally with
+            "image_size": {"width": <int>, "height": <int>}
+    """
+    image_size = data_object.get("image_size")
+    if not image_size:
+        return None
+    return image_size["width"], image_size["height"]
@@ -7,7 +7,77 @@
      is to format input manifest item into the format that the custom UI
      template expects.
 """
-import json
+import os
+
+from codec import encode_initial_values, encoded_size
+from image_index import ImageIndex
+from image_transforms import select_derivative
+from initial_values import compact_annotations, image_size_of
+from skeletons import format_skeletons, is_compact, parse_skeletons
+from telemetry import Metrics, PayloadLogger
+from tiles import select_tile
+
+# "true" compacts annotations before they are passed to the UI, see
+# initial_values. Compacting makes task pages smaller at the cost of a few
+# milliseconds per item, so it is off by default.
+# INITIAL_VALUES_PRECISION is the number of decimals coordinates are
+# rounded to, "none" keeps them as is.
+COMPACT_INITIAL_VALUES = (
+    os.environ.get("COMPACT_INITIAL_VALUES", "false").lower() == "true"
+)
+INITIAL_VALUES_PRECISION = os.environ.get("INITIAL_VALUES_PRECISION", "2")
+INITIAL_VALUES_PRECISION = (
+    None
+    if INITIAL_VALUES_PRECISION.lower() in ("", "none")
+    else int(INITIAL_VALUES_PRECISION)
+)
+# Longest side in pixels of the image derivative shown to workers, see
+# image_transforms. "none" always shows the original.
+DERIVATIVE_MAX_DIMENSION = os.environ.get("DERIVATIVE_MAX_DIMENSION", "2048")
+DERIVATIVE_MAX_DIMENSION = (
+    None
+    if DERIVATIVE_MAX_DIMENSION.lower() in ("", "none")
+    else int(DERIVATIVE_MAX_DIMENSION)
+)
+# Image dimensions index published by scripts/index_image_dimensions.py,
+# used for manifest items without an image_size. Unset or "none" disables.
+IMAGE_INDEX_S3_URI = os.environ.get("IMAGE_INDEX_S3_URI", "none")
+
+# Kept for the lifetime of the execution environment.
+image_index = (
+    None
+    if IMAGE_INDEX_S3_URI.lower() in ("", "none")
+    else ImageIndex(IMAGE_INDEX_S3_URI)
+)
+_s3_client = None
+
+
+def read_s3_object(s3_uri):
+    """Returns the content of an S3 object, or None if it does not exist."""
+    global _s3_client
+    # boto3 is imported on first use as most items need no S3 reads.
+    import boto3
+    from botocore.exceptions import ClientError
+
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    bucket, key = s3_uri.replace("s3://", "").split("/", 1)
+    try:
+        return _s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+
+def lookup_image_size(s3_uri):
+    """Returns (width, height) of an image from the image index, or None."""
+    try:
+        return image_index.image_size(s3_uri, read_s3_object)
+    except Exception as e:
+        print(f"Failed to look up the size of {s3_uri} in the image index")
+        print(" error: {}".format(e))
+        return None
 
 
 def lambda_handler(event, context):
@@ -37,22 +107,84 @@ def lambda_handler(event, context):
                 "image_name": data_object["source-ref"].split("/")[-1],
                 "annotations": annotations,
                 "annotation_issues": data_object["annotation_issues"],
-                "initial_values": json.dumps(annotations),
+                "initial_values": encode_initial_values(annotations),
            },
            "isHumanAnnotationRequired":"true"
         }
     """
     print("Pre-Annotation Lambda Triggered")
-    data_object = event["dataObject"]  # this comes directly from the manifest file
-    annotations = data_object["annotations"]
-
-    taskInput = {
-        "image_s3_uri": data_object["source-ref"],
-        "initial_values": json.dumps(annotations),
-    }
-    print("-" * 50)
-    print(event["dataObject"])
-    print("-" * 50)
-    print(taskInput)
-    print("-" * 80)
+    metrics = Metrics()
+    payload_logger = PayloadLogger()
+    try:
+        data_object = event["dataObject"]  # this comes directly from the manifest file
+        annotations = data_object["annotations"]
+        payload_logger.log("Data object", data_object)
+
+        if COMPACT_INITIAL_VALUES:
+            with metrics.timer("Serialize"):
+                # Size of the task input with the annotations passed
+                # verbatim, to report the bytes saved by compacting.
+                raw_size = encoded_size(
+                    {
+                        "image_s3_uri": data_object["source-ref"],
+                        "initial_values": encode_initial_values(annotations),
+                    }
+                )
+            metrics.add("TaskInputRawBytes", raw_size, "Bytes")
+        image_s3_uri = data_object["source-ref"]
+        image_size = image_size_of(data_object)
+        if image_size is None and image_index is not None:
+            with metrics.timer("ImageIndex"):
+                image_size = lookup_image_size(image_s3_uri)
+        with metrics.timer("SelectImage"):
+            # Tiles of a dense image are served as a crop of their region,
+            # with the instances which have a keypoint in it.
+            transform = tile = None
+            selected = select_tile(data_object)
+            if selected is not None:
+                image_s3_uri, transform, tile = selected
+            else:
+                derivative = select_derivative(data_object, DERIVATIVE_MAX_DIMENSION)
+                if derivative is not None:
+                    image_s3_uri, transform = derivative
+            if transform is not None:
+                image_size = transform.derivative_size()
+                skeletons, flat = parse_skeletons(annotations)
+                if tile is not None:
+                    skeletons = tile.visible(skeletons)
+                annotations = format_skeletons(transform.to_derivative(skeletons), flat)
+        with metrics.timer("Compact"):
+            # Output manifests of earlier jobs may hold skeletons in the
+            # compact form, which the UI does not understand. Compacting
+            # expands them too.
+            if COMPACT_INITIAL_VALUES:
+                annotations, dropped = compact_annotations(
+                    annotations, INITIAL_VALUES_PRECISION, image_size
+                )
+                metrics.add("DroppedInstances", dropped)
+            elif is_compact(annotations):
+                annotations = format_skeletons(parse_skeletons(annotations)[0])
+        with metrics.timer("Serialize"):
+            taskInput = {
+                "image_s3_uri": image_s3_uri,
+                "initial_values": encode_initial_values(annotations),
+            }
+            # Submitted back by the UI template so the post-annotation lambda
+            # can map annotations back into original image coordinates.
+            if transform is not None:
+                taskInput["image_transform"] = transform.encode()
+            if tile is not None:
+                taskInput["tile"] = tile.encode()
+            task_input_size = encoded_size(taskInput)
+        metrics.add("Annotations", len(annotations))
+        metrics.add("InitialValuesBytes", len(taskInput["initial_values"]), "Bytes")
+        metrics.add("TaskInputBytes", task_input_size, "Bytes")
+        metrics.add("Success", 1)
+    except Exception:
+        metrics.add("Failure", 1)
+        raise
+    finally:
+        metrics.emit()
+
+    payload_logger.log("Task input", taskInput)
     return {"taskInput": taskInput, "humanAnnotationRequired": "true"}
@@ -0,0 +1,156 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures JSON parse and serialize time per batch for each codec backend.
+
+    For every backend in --backends a fresh subprocess, with JSON_BACKEND
+    set accordingly, runs:
+
+    * decode: the annotation content of every data object decoded with
+      codec.decode_annotation_content, next to the previous approach of
+      decoding the content, original_annotations and no_changes_needed of
+      every worker separately with the json module.
+    * encode: every consolidated response sized with codec.encoded_size,
+      next to len(json.dumps(response)).
+    * consolidation: do_consolidation over the buffered payload, reporting
+      its Parse, Consolidate and Serialize phase times.
+
+    Times are the best of --repeat runs, in milliseconds per batch.
+
+Example
+    python scripts/benchmarks/bench_codec.py --objects 200 --workers-per-object 3
+"""
+import argparse
+import json
+import os
+import subprocess  # nosec B404
+import sys
+import time
+
+from synthetic import InMemoryS3Client, add_lambda_paths, make_payload
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+
+
+def _best_ms(function, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+
+def _decode_separately(data_objects: list) -> None:
+    for data_object in data_objects:
+        for annotation in data_object["annotations"]:
+            content = json.loads(annotation["annotationData"]["content"])
+            json.loads(content["original_annotations"])
+            json.loads(content["no_changes_needed"])
+
+
+def run_child(backend: str, args: argparse.Namespace) -> dict:
+    """Measures one backend inside the current (fresh) process."""
+    os.environ["JSON_BACKEND"] = backend
+    os.environ["CONSOLIDATION_PROCESSES"] = "1"
+    add_lambda_paths()
+    import codec
+    from lambda_function import do_consolidation
+    from telemetry import Metrics
+
+    payload = make_payload(
+        args.objects,
+        skeletons_per_image=args.skeletons_per_image,
+        workers_per_object=args.workers_per_object,
+    )
+    data_objects = json.loads(payload)
+
+    def decode_with_codec():
+        for data_object in data_objects:
+            cache = codec.DecodeCache()
+            for annotation in data_object["annotations"]:
+                codec.decode_annotation_content(
+                    annotation["annotationData"]["content"], cache
+                )
+
+    metrics = Metrics()
+    s3_client = InMemoryS3Client({PAYLOAD_URI: payload})
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            responses = do_consolidation(
+                "arn",
+                {"s3Uri": PAYLOAD_URI},
+                "label-results",
+                s3_client,
+                metrics=metrics,
+                processes=1,
+            )
+            consolidation_ms = {
+                phase: round(metrics.values.get(f"{phase}Time", 0.0), 2)
+                for phase in ("Parse", "Consolidate", "Serialize")
+            }
+        finally:
+            sys.stdout = stdout
+
+    return {
+        "backend": codec.JSON_BACKEND,
+        "objects": args.objects,
+        "payload_mb": round(len(payload) / 1024 / 1024, 2),
+        "decode_separately_ms": _best_ms(
+            lambda: _decode_separately(data_objects), args.repeat
+        ),
+        "decode_codec_ms": _best_ms(decode_with_codec, args.repeat),
+        "encode_json_dumps_ms": _best_ms(
+            lambda: [len(json.dumps(r)) for r in responses], args.repeat
+        ),
+        "encode_codec_ms": _best_ms(
+            lambda: [codec.encoded_size(r) for r in responses], args.repeat
+        ),
+        "consolidation_ms": consolidation_ms,
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    results = []
+    for backend in args.backends:
+        command = [sys.executable, __file__, "--child", backend]
+        for option in (
+            "objects",
+            "skeletons_per_image",
+            "workers_per_object",
+            "repeat",
+        ):
+            command += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+        completed = subprocess.run(  # nosec B603
+            command, capture_output=True, text=True
+        )
+        if completed.returncode:
+            print(
+                f"{backend}: {completed.stderr.strip().splitlines()[-1]}",
+                file=sys.stderr,
+            )
+            continue
+        result = json.loads(completed.stdout)
+        results.append(result)
+        print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--skeletons-per-image", type=int, default=20)
+    parser.add_argument("--workers-per-object", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["json", "orjson"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args.child, args)))
+    else:
+        main(args)
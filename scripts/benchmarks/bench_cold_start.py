@@ -0,0 +1,175 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures cold start of the annotation lambdas with local stand-ins.
+
+    Each run starts a fresh Python process which imports a lambda's
+    lambda_function module (the Lambda init phase) and invokes its handler
+    twice (the first, cold, invocation and a warm one). STS is replaced by
+    FakeSTSClient and S3 calls are answered by botocore's Stubber, so real
+    boto3 clients are still created but no network calls are made.
+
+    Results are the median over --runs processes. With --max-import-ms or
+    --max-first-invocation-ms the script exits with an error when a lambda
+    exceeds the budget, so it can gate a deploy.
+
+Example
+    python scripts/benchmarks/bench_cold_start.py --runs 5 --max-import-ms 500
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+import time
+
+from synthetic import (
+    POST_ANNOTATION_LAMBDA_DIR,
+    PRE_ANNOTATION_LAMBDA_DIR,
+    FakeSTSClient,
+    add_lambda_paths,
+    make_data_object,
+)
+
+LAMBDAS = {
+    "pre_annotation_lambda": PRE_ANNOTATION_LAMBDA_DIR,
+    "post_annotation_lambda": POST_ANNOTATION_LAMBDA_DIR,
+}
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+
+
+def _pre_annotation_event() -> dict:
+    return {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "dataObject": {
+            "source-ref": "s3://example-bucket/labeling_jobs/images/image_0.jpg",
+            "annotations": [],
+        },
+    }
+
+
+def _post_annotation_event() -> dict:
+    return {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+    }
+
+
+def _install_post_annotation_stand_ins(payload: bytes) -> None:
+    """Replaces STS and S3 with local stand-ins for the post-annotation lambda."""
+    import s3_helper
+    from botocore.response import StreamingBody
+    from botocore.stub import Stubber
+
+    s3_helper.role_session_cache = s3_helper.RoleSessionCache(FakeSTSClient)
+    create_s3_client = s3_helper.RoleSession._create_s3_client
+
+    def create_stubbed_s3_client(role_session):
+        client = create_s3_client(role_session)
+        stubber = Stubber(client)
+        for _ in range(2):
+            stubber.add_response(
+                "get_object",
+                {"Body": StreamingBody(io.BytesIO(payload), len(payload))},
+            )
+        stubber.activate()
+        return client
+
+    s3_helper.RoleSession._create_s3_client = create_stubbed_s3_client
+
+
+def run_child(lambda_name: str) -> dict:
+    """Measures import and invocation latency inside the current process."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # Repeated invocations would otherwise be answered from the result cache.
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    add_lambda_paths(LAMBDAS[lambda_name])
+
+    start = time.perf_counter()
+    import lambda_function
+
+    import_ms = (time.perf_counter() - start) * 1000
+
+    if lambda_name == "post_annotation_lambda":
+        import random
+
+        payload = json.dumps(
+            [make_data_object(random.Random(0), i) for i in range(5)]
+        ).encode("utf-8")
+        _install_post_annotation_stand_ins(payload)
+        event = _post_annotation_event()
+    else:
+        event = _pre_annotation_event()
+
+    timings = []
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            for _ in range(2):
+                start = time.perf_counter()
+                lambda_function.lambda_handler(event, None)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            sys.stdout = stdout
+
+    return {
+        "lambda": lambda_name,
+        "import_ms": import_ms,
+        "first_invocation_ms": timings[0],
+        "warm_invocation_ms": timings[1],
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    results = []
+    failed = False
+    for lambda_name in LAMBDAS:
+        runs = []
+        for _ in range(args.runs):
+            completed = subprocess.run(  # nosec B603
+                [sys.executable, __file__, "--child", lambda_name],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            runs.append(json.loads(completed.stdout))
+        result = {"lambda": lambda_name, "runs": args.runs}
+        for key in ("import_ms", "first_invocation_ms", "warm_invocation_ms"):
+            result[key] = round(statistics.median(r[key] for r in runs), 2)
+        results.append(result)
+        print(json.dumps(result))
+
+        for key, budget in (
+            ("import_ms", args.max_import_ms),
+            ("first_invocation_ms", args.max_first_invocation_ms),
+        ):
+            if budget is not None and result[key] > budget:
+                print(
+                    f"{lambda_name}: {key} {result[key]} exceeds the budget of {budget}",
+                    file=sys.stderr,
+                )
+                failed = True
+
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-invocation-ms", type=float)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args.child)))
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,243 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Benchmarks the post-annotation lambda over a grid of synthetic payloads.
+
+    Every combination of --objects, --skeletons-per-image,
+    --keypoints-per-skeleton and --workers-per-object is a scenario. Each
+    scenario runs in a fresh subprocess which invokes lambda_handler with
+    S3Client replaced by synthetic.InMemoryS3Client, so no AWS access is
+    needed. Reported per scenario:
+
+    * throughput in data objects and payload MB per second, best of --repeat
+    * p50 and p99 latency of consolidate_data_object per data object
+    * peak RSS of the process, and its growth during the invocations
+
+    Per-object latencies are only collected when consolidation runs in the
+    handler's process, i.e. with --processes 1 (the default).
+
+    Results are written as JSON together with the git commit and host they
+    were measured on. Passing an earlier results file as --baseline prints
+    the change per scenario, and --max-regression makes the script fail
+    when throughput drops by more than the given percentage.
+
+Example
+    python scripts/benchmarks/bench_consolidation.py --objects 100 \
+        --workers-per-object 1 3 --output results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess  # nosec B404
+import sys
+import time
+from datetime import datetime, timezone
+
+from synthetic import REPO_ROOT, InMemoryS3Client, add_lambda_paths, make_payload
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+OUTPUT_URI = "s3://example-bucket/labeling_jobs/output/example"
+SCENARIO_KEYS = (
+    "objects",
+    "skeletons_per_image",
+    "keypoints_per_skeleton",
+    "workers_per_object",
+)
+
+
+def _percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_child(scenario: dict, repeat: int, processes: int) -> dict:
+    """Runs one scenario inside the current (fresh) process."""
+    os.environ["CONSOLIDATION_PROCESSES"] = str(processes)
+    # Repeated invocations would otherwise be answered from the result cache.
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    add_lambda_paths()
+    import lambda_function
+
+    payload = make_payload(
+        scenario["objects"],
+        skeletons_per_image=scenario["skeletons_per_image"],
+        keypoints_per_skeleton=scenario["keypoints_per_skeleton"],
+        workers_per_object=scenario["workers_per_object"],
+    )
+    s3_client = InMemoryS3Client({PAYLOAD_URI: payload})
+    lambda_function.S3Client = lambda role_arn, kms_key_id: s3_client
+
+    latencies = []
+    consolidate_data_object = lambda_function.consolidate_data_object
+
+    def timed_consolidate_data_object(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return consolidate_data_object(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    lambda_function.consolidate_data_object = timed_consolidate_data_object
+    event = {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+        "outputConfig": OUTPUT_URI,
+    }
+
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    seconds = []
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = lambda_function.lambda_handler(event, None)
+                seconds.append(time.perf_counter() - start)
+        finally:
+            sys.stdout = stdout
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    best = min(seconds)
+    result = dict(scenario)
+    result.update(
+        {
+            "processes": processes,
+            "payload_mb": round(len(payload) / 1024 / 1024, 2),
+            "consolidated": len(output),
+            "seconds": round(best, 4),
+            "objects_per_second": round(scenario["objects"] / best, 1),
+            "mb_per_second": round(len(payload) / 1024 / 1024 / best, 2),
+            "p50_ms": None,
+            "p99_ms": None,
+            "peak_rss_mb": round(peak_kb / 1024, 1),
+            "rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1),
+        }
+    )
+    if latencies:
+        result["p50_ms"] = round(statistics.median(latencies) * 1000, 3)
+        result["p99_ms"] = round(_percentile(latencies, 0.99) * 1000, 3)
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline: dict, max_regression: float) -> bool:
+    """Prints the throughput change against a baseline results file.
+
+    Returns:
+        True when a scenario regressed by more than max_regression percent
+    """
+    previous = {
+        tuple(r[k] for k in SCENARIO_KEYS + ("processes",)): r
+        for r in baseline["results"]
+    }
+    regressed = False
+    for result in results:
+        before = previous.get(tuple(result[k] for k in SCENARIO_KEYS + ("processes",)))
+        if before is None:
+            continue
+        change = (result["objects_per_second"] / before["objects_per_second"] - 1) * 100
+        line = {k: result[k] for k in SCENARIO_KEYS}
+        line.update(
+            {
+                "objects_per_second_change_pct": round(change, 1),
+                "p99_ms_before": before["p99_ms"],
+                "p99_ms_after": result["p99_ms"],
+                "peak_rss_mb_before": before["peak_rss_mb"],
+                "peak_rss_mb_after": result["peak_rss_mb"],
+            }
+        )
+        print(json.dumps(line))
+        if max_regression is not None and change < -max_regression:
+            regressed = True
+    return regressed
+
+
+def main(args: argparse.Namespace) -> int:
+    results = []
+    for values in itertools.product(
+        args.objects,
+        args.skeletons_per_image,
+        args.keypoints_per_skeleton,
+        args.workers_per_object,
+    ):
+        scenario = dict(zip(SCENARIO_KEYS, values))
+        completed = subprocess.run(  # nosec B603
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                json.dumps(scenario),
+                "--repeat",
+                str(args.repeat),
+                "--processes",
+                str(args.processes),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        result = json.loads(completed.stdout)
+        results.append(result)
+        print(json.dumps(result))
+
+    report = {
+        "commit": _git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(report, file_handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file_handle:
+            if compare(results, json.load(file_handle), args.max_regression):
+                print("Throughput regressed beyond --max-regression", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, nargs="+", default=[200])
+    parser.add_argument("--skeletons-per-image", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--keypoints-per-skeleton", type=int, nargs="+", default=[18])
+    parser.add_argument("--workers-per-object", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument(
+        "--baseline", help="Results file of an earlier run to compare to"
+    )
+    parser.add_argument(
+        "--max-regression", type=float, help="Allowed throughput drop in percent"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(
+            json.dumps(run_child(json.loads(args.child), args.repeat, args.processes))
+        )
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,116 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures how a batch too large for one invocation converges across retries.
+
+    lambda_handler is invoked with S3Client replaced by
+    synthetic.InMemoryS3Client and a Lambda context whose timeout is
+    --timeout-ms. Every invocation which stops with DeadlineExceeded is
+    retried, as Ground Truth would, until the batch completes or
+    --max-attempts is reached. The final output must match a run without a
+    deadline; the script exits with an error otherwise.
+
+Example
+    python scripts/benchmarks/bench_deadline_resume.py --objects 300 --timeout-ms 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from synthetic import InMemoryS3Client, add_lambda_paths, make_payload
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+OUTPUT_URI = "s3://example-bucket/labeling_jobs/output/example"
+
+
+class FakeLambdaContext(object):
+    """Lambda context stand-in with a fixed timeout from its creation."""
+
+    def __init__(self, timeout_ms: int):
+        self.deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def main(args: argparse.Namespace) -> int:
+    os.environ["CONSOLIDATION_PROCESSES"] = "1"
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["CHECKPOINT_CHUNK_SIZE"] = str(args.chunk_size)
+    os.environ["DEADLINE_MARGIN_MS"] = str(args.margin_ms)
+    add_lambda_paths()
+    import lambda_function
+    from checkpoint import DeadlineExceeded
+
+    payload = make_payload(
+        args.objects,
+        skeletons_per_image=args.skeletons_per_image,
+        workers_per_object=args.workers_per_object,
+    )
+    s3_client = InMemoryS3Client({PAYLOAD_URI: payload})
+    lambda_function.S3Client = lambda role_arn, kms_key_id: s3_client
+    event = {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+        "outputConfig": OUTPUT_URI,
+    }
+
+    attempts = []
+    output = None
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            expected = lambda_function.do_consolidation(
+                event["labelingJobArn"],
+                event["payload"],
+                event["labelAttributeName"],
+                InMemoryS3Client({PAYLOAD_URI: payload}),
+                output_s3_uri=OUTPUT_URI,
+            )
+            while output is None and len(attempts) < args.max_attempts:
+                start = time.perf_counter()
+                try:
+                    output = lambda_function.lambda_handler(
+                        event, FakeLambdaContext(args.timeout_ms)
+                    )
+                    outcome = "completed"
+                except DeadlineExceeded:
+                    outcome = "checkpointed"
+                attempts.append(
+                    {
+                        "outcome": outcome,
+                        "ms": round((time.perf_counter() - start) * 1000, 2),
+                    }
+                )
+        finally:
+            sys.stdout = stdout
+
+    results = {
+        "objects": args.objects,
+        "timeout_ms": args.timeout_ms,
+        "attempts": attempts,
+        "completed": output is not None,
+        "consistent": output == expected,
+    }
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if results["consistent"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, default=300)
+    parser.add_argument("--skeletons-per-image", type=int, default=20)
+    parser.add_argument("--workers-per-object", type=int, default=3)
+    parser.add_argument("--timeout-ms", type=int, default=1000)
+    parser.add_argument("--margin-ms", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=25)
+    parser.add_argument("--max-attempts", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
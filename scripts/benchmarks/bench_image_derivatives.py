@@ -0,0 +1,278 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures image derivative creation and checks coordinates map through it.
+
+    Synthetic JPEG originals are written with every combination of EXIF
+    orientation and image_details.csv Rotation, each with markers drawn at
+    known positions of the image as displayed. Then:
+
+    * derivatives are created by create_example_labeling_job with one
+      process and with --processes, reporting the time taken and the bytes
+      an annotator downloads with and without derivatives;
+    * every marker must be found in every derivative at the position the
+      derivative's ImageTransform maps it to;
+    * the marker positions are passed as annotations through the
+      pre-annotation lambda and, unchanged by the worker, through the
+      post-annotation lambda, and must come back at their original
+      coordinates.
+
+    The script exits with an error when a check fails. Requires Pillow.
+
+Example
+    python scripts/benchmarks/bench_image_derivatives.py --images 16 --processes 4
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from synthetic import (
+    LAMBDA_LAYER_DIR,
+    POST_ANNOTATION_LAMBDA_DIR,
+    PRE_ANNOTATION_LAMBDA_DIR,
+    REPO_ROOT,
+)
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+from create_example_labeling_job import make_all_derivatives  # noqa: E402
+
+ORIENTATIONS = (1, 3, 6, 8)
+ROTATIONS = (0, 90, 180, 270)
+MARKER_RADIUS = 24
+
+
+def load_lambda(name: str, lambda_dir: str):
+    """Imports a lambda_function module under another name.
+
+    Both lambdas have a lambda_function module; loading them under distinct
+    names lets one process use both.
+    """
+    for path in (LAMBDA_LAYER_DIR, lambda_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(lambda_dir, "lambda_function.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_original(
+    path: str, rng: random.Random, size: tuple, orientation: int
+) -> list:
+    """Writes a JPEG whose displayed image has markers at random positions.
+
+    Returns:
+        [(x, y)] of the markers in the image as displayed
+    """
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    displayed = Image.merge(
+        "RGB",
+        [
+            Image.effect_noise((width, height), 40).point(lambda v: v // 2 + 40),
+            Image.linear_gradient("L").resize((width, height)),
+            Image.effect_noise((width, height), 60).point(lambda v: v // 3),
+        ],
+    )
+    draw = ImageDraw.Draw(displayed)
+    markers = []
+    for _ in range(6):
+        x = rng.uniform(2 * MARKER_RADIUS, width - 2 * MARKER_RADIUS)
+        y = rng.uniform(2 * MARKER_RADIUS, height - 2 * MARKER_RADIUS)
+        draw.ellipse(
+            (
+                x - MARKER_RADIUS,
+                y - MARKER_RADIUS,
+                x + MARKER_RADIUS,
+                y + MARKER_RADIUS,
+            ),
+            fill=(255, 0, 255),
+        )
+        markers.append((x, y))
+    # Stores the image so that applying its EXIF orientation displays it.
+    inverse = {
+        3: Image.Transpose.ROTATE_180,
+        6: Image.Transpose.ROTATE_90,
+        8: Image.Transpose.ROTATE_270,
+    }
+    stored = (
+        displayed.transpose(inverse[orientation]) if orientation != 1 else displayed
+    )
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    stored.save(path, "JPEG", quality=92, exif=exif)
+    return markers
+
+
+def marker_found(image, x: float, y: float) -> bool:
+    """Checks that the pixel at (x, y) is the marker colour."""
+    red, green, blue = image.getpixel(
+        (min(int(x), image.width - 1), min(int(y), image.height - 1))
+    )
+    return red > 180 and green < 90 and blue > 180
+
+
+def main(args: argparse.Namespace) -> int:
+    from PIL import Image
+
+    sys.path.insert(0, LAMBDA_LAYER_DIR)
+    from image_transforms import ImageTransform
+    from skeletons import Skeleton, format_skeletons, parse_skeletons
+
+    pre_lambda = load_lambda("pre_lambda_function", PRE_ANNOTATION_LAMBDA_DIR)
+    post_lambda = load_lambda("post_lambda_function", POST_ANNOTATION_LAMBDA_DIR)
+
+    rng = random.Random(args.seed)  # nosec B311
+    work_dir = tempfile.mkdtemp()
+    try:
+        img_paths, rotations, markers = [], {}, {}
+        for i in range(args.images):
+            orientation = ORIENTATIONS[i % len(ORIENTATIONS)]
+            rotation = ROTATIONS[i // len(ORIENTATIONS) % len(ROTATIONS)]
+            path = os.path.join(work_dir, f"image_{i}.jpg")
+            markers[path] = write_original(
+                path, rng, (args.width, args.height), orientation
+            )
+            rotations[os.path.basename(path)] = rotation
+            img_paths.append(path)
+
+        timings = {}
+        for name, processes in (("one_process_s", 1), ("pool_s", args.processes)):
+            derivative_dir = os.path.join(work_dir, f"derivatives_{name}")
+            start = time.perf_counter()
+            results = make_all_derivatives(
+                img_paths, derivative_dir, args.sizes, rotations, processes
+            )
+            timings[name] = round(time.perf_counter() - start, 3)
+
+        failures = []
+        original_bytes = sum(os.path.getsize(path) for path in img_paths)
+        served_bytes = 0
+        for path, result in zip(img_paths, results):
+            image_size = result["image_size"]
+            if (image_size["width"], image_size["height"]) != (args.width, args.height):
+                failures.append(f"{path}: displayed size {image_size}")
+            for derivative in result["derivatives"]:
+                transform = ImageTransform(
+                    image_size["width"],
+                    image_size["height"],
+                    derivative["rotation"],
+                    derivative["scale"],
+                )
+                skeleton = Skeleton.from_points("markers", markers[path])
+                transform.to_derivative([skeleton])
+                with Image.open(derivative["path"]) as image:
+                    if image.size != transform.derivative_size():
+                        failures.append(f"{derivative['path']}: size {image.size}")
+                        continue
+                    for x, y in skeleton.points:
+                        if not marker_found(image.convert("RGB"), x, y):
+                            failures.append(f"{derivative['path']}: marker at {x}, {y}")
+
+            # Round trip of the markers as annotations through both lambdas.
+            manifest_item = {
+                "source-ref": f"s3://example-bucket/images/{os.path.basename(path)}",
+                "annotations": format_skeletons(
+                    [Skeleton.from_points("markers", markers[path])]
+                ),
+                "image_size": image_size,
+                "derivatives": [
+                    {
+                        "source-ref": "s3://example-bucket/images/derivatives/"
+                        + os.path.basename(d["path"]),
+                        "rotation": d["rotation"],
+                        "scale": d["scale"],
+                    }
+                    for d in result["derivatives"]
+                ],
+            }
+            with open(os.devnull, "w") as sink:
+                stdout, sys.stdout = sys.stdout, sink
+                try:
+                    task_input = pre_lambda.lambda_handler(
+                        {"dataObject": manifest_item}, None
+                    )["taskInput"]
+                finally:
+                    sys.stdout = stdout
+            served = task_input["image_s3_uri"].split("/")[-1]
+            served_path = next(
+                (
+                    d["path"]
+                    for d in result["derivatives"]
+                    if d["path"].endswith(served)
+                ),
+                path,
+            )
+            served_bytes += os.path.getsize(served_path)
+            content = {
+                "image_name": served,
+                "image_s3_uri": task_input["image_s3_uri"] + "?X-Amz-Signature=abc",
+                "original_annotations": task_input["initial_values"],
+                "updated_annotations": json.loads(task_input["initial_values"]),
+                "no_changes_needed": "true",
+                "image_transform": task_input.get("image_transform", ""),
+            }
+            response = post_lambda.consolidate_data_object(
+                "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+                {
+                    "datasetObjectId": "0",
+                    "dataObject": {"s3Uri": manifest_item["source-ref"]},
+                    "annotations": [
+                        {
+                            "workerId": "worker-0",
+                            "annotationData": {"content": json.dumps(content)},
+                        }
+                    ],
+                },
+                "label-results",
+            )
+            label = response["consolidatedAnnotation"]["content"]["label-results"]
+            returned = parse_skeletons(label["updated_annotations"])[0][0].points
+            for (x, y), (other_x, other_y) in zip(markers[path], returned):
+                if abs(x - other_x) > 0.05 or abs(y - other_y) > 0.05:
+                    failures.append(
+                        f"{path}: round trip of {x}, {y} gave {other_x}, {other_y}"
+                    )
+            if label["image_s3_location"] != manifest_item["source-ref"]:
+                failures.append(
+                    f"{path}: image_s3_location {label['image_s3_location']}"
+                )
+    finally:
+        shutil.rmtree(work_dir)
+
+    results = {
+        "images": args.images,
+        "original_size": [args.width, args.height],
+        "sizes": args.sizes,
+        "processes": args.processes,
+        **timings,
+        "original_bytes": original_bytes,
+        "served_bytes": served_bytes,
+        "failures": failures[:10],
+        "consistent": not failures,
+    }
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 2048])
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,289 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks and measures scripts/download_example_images.py on a local server.
+
+    --images random images are served by a local HTTP server which answers
+    every request after --latency-ms and honours Range requests. The script
+    runs download_images_from_csv:
+
+    * serial: with a single worker and no faults, as the script did before
+    * concurrent: with --workers workers while the server drops the
+      connection halfway through some images and answers 503 for others.
+      Dropped images must be resumed with a Range request, the server
+      sending their bytes once but for those of the chunk being received
+      when the connection dropped
+    * rerun: which must send no request
+    * damaged: after one image was corrupted and another truncated on disk,
+      which must download the first again and resume the second
+    * bad_md5: with an image whose MD5 in the CSV is wrong, which must fail
+      after --max-attempts attempts and leave no image behind
+    * thumbnails: with --thumbnails, which must fetch the thumbnails only
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_image_download.py --images 60 --workers 8
+"""
+import argparse
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+import download_example_images  # noqa: E402
+
+
+class ImageServer(object):
+    """A local HTTP server of in-memory files which can inject faults.
+
+    Faults are consumed one per request of a file: "drop" closes the
+    connection halfway through the body, "503" answers 503.
+    """
+
+    def __init__(self, files: dict, latency_ms: float):
+        self.files = files
+        self.latency = latency_ms / 1000
+        self.faults = {}
+        self.requests = 0
+        self.range_requests = 0
+        self.bytes_sent = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        time.sleep(self.latency)
+        name = handler.path.lstrip("/")
+        with self._lock:
+            self.requests += 1
+            faults = self.faults.get(name)
+            fault = faults.pop(0) if faults else None
+        data = self.files.get(name)
+        if data is None or fault == "503":
+            handler.send_response(404 if data is None else 503)
+            handler.send_header("Content-Length", "0")
+            if fault == "503":
+                handler.send_header("Retry-After", "0")
+            handler.end_headers()
+            return
+        start = 0
+        range_header = handler.headers.get("Range")
+        if range_header:
+            with self._lock:
+                self.range_requests += 1
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(data):
+                handler.send_response(416)
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            handler.send_response(206)
+            handler.send_header(
+                "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"
+            )
+        else:
+            handler.send_response(200)
+        body = memoryview(data)[start:]
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if fault == "drop":
+            stop = len(body) // 2
+            body = body[:stop]
+            handler.close_connection = True
+        handler.wfile.write(body)
+        handler.wfile.flush()
+        with self._lock:
+            self.bytes_sent[name] = self.bytes_sent.get(name, 0) + len(body)
+
+
+def write_csv(path: str, base_url: str, files: dict, md5_overrides=()) -> None:
+    with open(path, "w", newline="") as file_handle:
+        writer = csv.DictWriter(
+            file_handle,
+            ["OriginalURL", "OriginalSize", "OriginalMD5", "Thumbnail300KURL"],
+        )
+        writer.writeheader()
+        for name, data in files.items():
+            if name.endswith("_z.jpg"):
+                continue
+            md5 = hashlib.md5(data).digest()
+            if name in md5_overrides:
+                md5 = hashlib.md5(b"another image").digest()
+            writer.writerow(
+                {
+                    "OriginalURL": f"{base_url}/{name}",
+                    "OriginalSize": len(data),
+                    "OriginalMD5": base64.b64encode(md5).decode("ascii"),
+                    "Thumbnail300KURL": f"{base_url}/{name[:-6]}_z.jpg",
+                }
+            )
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)  # nosec B311
+    download_example_images.BACKOFF_SECONDS = 0.01
+    files = {}
+    for i in range(args.images):
+        files[f"image_{i}_o.jpg"] = rng.randbytes(rng.randint(200000, 2000000))
+        files[f"image_{i}_z.jpg"] = rng.randbytes(rng.randint(20000, 60000))
+    originals = [name for name in files if name.endswith("_o.jpg")]
+    failures = []
+    results = {"images": args.images, "workers": args.workers}
+    work_dir = tempfile.mkdtemp()
+    try:
+        with ImageServer(files, args.latency_ms) as server:
+            csv_path = os.path.join(work_dir, "image_details.csv")
+            write_csv(csv_path, server.url, files)
+
+            def run(name, image_dir, workers, **kwargs):
+                requests_before = server.requests
+                start = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    counts = download_example_images.download_images_from_csv(
+                        kwargs.pop("csv_file", csv_path),
+                        image_dir,
+                        workers,
+                        max_attempts=args.max_attempts,
+                        **kwargs,
+                    )
+                counts["seconds"] = round(time.perf_counter() - start, 3)
+                counts["requests"] = server.requests - requests_before
+                results[name] = counts
+                return counts
+
+            serial_files = originals[: args.serial_images]
+            serial_csv = os.path.join(work_dir, "serial.csv")
+            write_csv(serial_csv, server.url, {n: files[n] for n in serial_files})
+            serial = run(
+                "serial", os.path.join(work_dir, "serial"), 1, csv_file=serial_csv
+            )
+            serial["images_per_second"] = round(
+                len(serial_files) / serial["seconds"], 1
+            )
+
+            dropped = rng.sample(originals, args.dropped)
+            unavailable = rng.sample(originals, args.unavailable)
+            for name in dropped:
+                server.faults.setdefault(name, []).append("drop")
+            for name in unavailable:
+                server.faults.setdefault(name, []).append("503")
+            server.bytes_sent.clear()
+            image_dir = os.path.join(work_dir, "images")
+            concurrent = run("concurrent", image_dir, args.workers)
+            concurrent["images_per_second"] = round(
+                args.images / concurrent["seconds"], 1
+            )
+            concurrent["range_requests"] = server.range_requests
+            if concurrent["failed"] or concurrent["skipped"]:
+                failures.append(f"concurrent: {concurrent}")
+            if concurrent["resumed"] != len(set(dropped)):
+                failures.append(f"concurrent: {len(set(dropped))} images dropped")
+            # Bytes received in the chunk a connection drops in are lost.
+            resent = {
+                name: server.bytes_sent.get(name, 0) - len(files[name])
+                for name in originals
+            }
+            concurrent["resent_bytes"] = sum(resent.values())
+            for name, extra in resent.items():
+                limit = download_example_images.CHUNK_SIZE if name in dropped else 1
+                if not 0 <= extra < limit:
+                    failures.append(f"{name}: sent {extra} bytes more than its size")
+
+            rerun = run("rerun", image_dir, args.workers)
+            if rerun["requests"] or rerun["skipped"] != args.images:
+                failures.append(f"rerun: {rerun}")
+
+            corrupted, truncated = originals[0], originals[1]
+            with open(os.path.join(image_dir, corrupted), "r+b") as file_handle:
+                file_handle.seek(100)
+                file_handle.write(b"corrupted")
+            with open(os.path.join(image_dir, truncated), "r+b") as file_handle:
+                file_handle.truncate(len(files[truncated]) // 3)
+            damaged = run("damaged", image_dir, args.workers)
+            if damaged["downloaded"] != 1 or damaged["resumed"] != 1:
+                failures.append(f"damaged: {damaged}")
+
+            bad_csv = os.path.join(work_dir, "bad_md5.csv")
+            write_csv(bad_csv, server.url, files, md5_overrides=(originals[2],))
+            bad_dir = os.path.join(work_dir, "bad_md5")
+            bad = run("bad_md5", bad_dir, args.workers, csv_file=bad_csv)
+            if bad["failed"] != 1 or os.path.exists(
+                os.path.join(bad_dir, originals[2])
+            ):
+                failures.append(f"bad MD5: {bad}")
+
+            thumbnails_dir = os.path.join(work_dir, "thumbnails")
+            thumbnails = run(
+                "thumbnails", thumbnails_dir, args.workers, thumbnails=True
+            )
+            if thumbnails["downloaded"] != args.images or thumbnails["bytes"] != sum(
+                len(data) for name, data in files.items() if name.endswith("_z.jpg")
+            ):
+                failures.append(f"thumbnails: {thumbnails}")
+
+            for directory in (image_dir, thumbnails_dir):
+                for name in os.listdir(directory):
+                    with open(os.path.join(directory, name), "rb") as file_handle:
+                        if file_handle.read() != files.get(name):
+                            failures.append(f"{directory}/{name} differs")
+    finally:
+        shutil.rmtree(work_dir)
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--images", type=int, default=60)
+    parser.add_argument("--serial-images", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--dropped", type=int, default=8)
+    parser.add_argument("--unavailable", type=int, default=8)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
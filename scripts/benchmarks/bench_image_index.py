@@ -0,0 +1,316 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures the image dimension indexer and lookups of the published index.
+
+    index_image_dimensions is run against an in-memory S3 stand-in holding
+    --images synthetic JPEG and PNG objects. Their headers are real, with
+    EXIF orientations and, for some, a large EXIF thumbnail, but the rest of
+    each object is produced on demand so that realistic object sizes cost
+    no memory. Every S3 request sleeps for --latency-ms. The script runs:
+
+    * full: the first indexing run, with --workers threads
+    * serial: the same with a single thread, on --serial-images images
+    * incremental: a rerun after --changed-percent of the images were
+      rewritten and as many deleted, which must read only those
+    * publish: sharded upload of the index, then a republish which must
+      upload only the shards that changed
+    * lookup: image_index.ImageIndex lookups of every image, as the lambdas
+      do them, which must match the synthetic dimensions
+
+    Headers of real files written by Pillow are also checked when Pillow is
+    installed. The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_image_index.py --images 20000 --workers 64
+"""
+import argparse
+import io
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from synthetic import LAMBDA_LAYER_DIR, REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+import index_image_dimensions  # noqa: E402
+
+BUCKET = "example-bucket"
+PREFIX = "labeling_jobs/images/"
+INDEX_URI = f"s3://{BUCKET}/labeling_jobs/image_index"
+
+
+def jpeg_header(
+    width: int, height: int, orientation: int, thumbnail: int, icc_profile: int = 0
+) -> bytes:
+    """Returns the start of a JPEG file up to and including its frame header."""
+    tiff = b"MM\x00\x2a\x00\x00\x00\x08" + struct.pack(
+        ">HHHIHxxI", 1, 0x0112, 3, 1, orientation, 0
+    )
+    app1 = b"Exif\x00\x00" + tiff + b"\x00" * thumbnail
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00" * 3
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + (b"\xff\xe2" + struct.pack(">H", icc_profile + 2) + b"\x00" * icc_profile)
+        * bool(icc_profile)
+        + b"\xff\xdb\x00\x43"
+        + b"\x01" * 65
+        + b"\xff\xc0"
+        + struct.pack(">H", len(sof) + 2)
+        + sof
+    )
+
+
+def png_header(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + ihdr + b"\x00" * 4
+
+
+class SyntheticObject(object):
+    """An object made of a header followed by zeros up to its size."""
+
+    __slots__ = ("header", "size", "etag")
+
+    def __init__(self, header: bytes, size: int, etag: str):
+        self.header = header
+        self.size = size
+        self.etag = etag
+
+    def read(self, start: int, end: int) -> bytes:
+        stop = end + 1
+        data = self.header[start:stop]
+        return data + b"\x00" * (min(end + 1, self.size) - start - len(data))
+
+
+class LatencyS3Client(object):
+    """The subset of the boto3 S3 client used by the indexer and lookups."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.objects = {}
+        self.requests = {"list": 0, "get": 0, "put": 0}
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str, size: int = 0) -> None:
+        with self._lock:
+            self.requests[kind] += 1
+            self.bytes_read += size
+        time.sleep(self.latency)
+
+    def get_paginator(self, name: str):
+        client = self
+
+        class Paginator(object):
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(k for k in client.objects if k.startswith(Prefix))
+                for start in range(0, len(keys), 1000):
+                    stop = start + 1000
+                    page = keys[start:stop]
+                    client._count("list")
+                    yield {
+                        "Contents": [
+                            {
+                                "Key": key,
+                                "ETag": client.objects[key].etag,
+                                "Size": client.objects[key].size,
+                            }
+                            for key in page
+                        ]
+                    }
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key, Range=None):
+        obj = self.objects[Key]
+        if isinstance(obj, bytes):
+            data = obj
+        else:
+            start, end = (int(v) for v in Range.replace("bytes=", "").split("-"))
+            data = obj.read(start, end)
+        self._count("get", len(data))
+        return {"Body": io.BytesIO(data)}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self._count("put")
+        self.objects[Key] = Body
+
+    def read_object(self, s3_uri: str):
+        """Reader for image_index.ImageIndex, as the lambdas use."""
+        key = s3_uri.replace(f"s3://{BUCKET}/", "", 1)
+        if key not in self.objects:
+            return None
+        return self.get_object(BUCKET, key)["Body"].read()
+
+
+def add_images(client: LatencyS3Client, rng: random.Random, count: int, start=0):
+    """Adds synthetic images and returns their dimensions by S3 URI."""
+    truth = {}
+    for i in range(start, start + count):
+        width, height = rng.randint(300, 6000), rng.randint(300, 6000)
+        if i % 5 == 4:
+            key = f"{PREFIX}image_{i}.png"
+            header, orientation = png_header(width, height), 1
+        else:
+            key = f"{PREFIX}image_{i}.jpg"
+            orientation = rng.choice((1, 1, 1, 3, 6, 8))
+            # One in fifty JPEGs has its frame header beyond the first range,
+            # after a large thumbnail and colour profile.
+            large = i % 50 == 0
+            header = jpeg_header(
+                width,
+                height,
+                orientation,
+                60000 if large else rng.randint(0, 8000),
+                30000 if large else 0,
+            )
+        size = len(header) + rng.randint(200000, 7000000)
+        client.objects[key] = SyntheticObject(
+            header, size, f'"{rng.getrandbits(64):x}"'
+        )
+        truth[f"s3://{BUCKET}/{key}"] = (width, height, orientation)
+    return truth
+
+
+def check_pillow_headers() -> list:
+    """Checks read_image_header against files written by Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return []
+    from image_headers import read_image_header
+
+    failures = []
+    for fmt, orientation in (("JPEG", 1), ("JPEG", 6), ("PNG", 1)):
+        buffer = io.BytesIO()
+        image = Image.new("RGB", (321, 123))
+        kwargs = {}
+        if orientation != 1:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            kwargs["exif"] = exif
+        image.save(buffer, fmt, **kwargs)
+        header = read_image_header(buffer.getvalue()[:4096])
+        if header != (321, 123, orientation):
+            failures.append(f"Pillow {fmt}: {header}")
+    return failures
+
+
+def main(args: argparse.Namespace) -> int:
+    sys.path.insert(0, LAMBDA_LAYER_DIR)
+    from image_index import ImageIndex
+
+    rng = random.Random(args.seed)  # nosec B311
+    failures = check_pillow_headers()
+    results = {"images": args.images, "latency_ms": args.latency_ms}
+    source = [f"s3://{BUCKET}/{PREFIX}"]
+    index_dir = tempfile.mkdtemp()
+
+    def run(client, workers, directory=index_dir):
+        index = index_image_dimensions.LocalIndex(directory)
+        client.requests = dict.fromkeys(client.requests, 0)
+        client.bytes_read = 0
+        start = time.perf_counter()
+        with open(os.devnull, "w") as sink:
+            stdout, sys.stdout = sys.stdout, sink
+            try:
+                counts = index_image_dimensions.update_index(
+                    client, index, source, workers, args.range_bytes, 4 << 20
+                )
+            finally:
+                sys.stdout = stdout
+                index.close()
+        counts["seconds"] = round(time.perf_counter() - start, 3)
+        counts["get_requests"] = client.requests["get"]
+        counts["bytes_read"] = client.bytes_read
+        return index, counts
+
+    serial_client = LatencyS3Client(args.latency_ms)
+    add_images(serial_client, random.Random(args.seed), args.serial_images)
+    _, results["serial"] = run(serial_client, 1, tempfile.mkdtemp())
+
+    client = LatencyS3Client(args.latency_ms)
+    truth = add_images(client, rng, args.images)
+    object_bytes = sum(obj.size for obj in client.objects.values())
+    index, results["full"] = run(client, args.workers)
+    results["full"]["object_bytes"] = object_bytes
+    results["full"]["images_per_second"] = round(
+        args.images / results["full"]["seconds"], 1
+    )
+    results["serial"]["images_per_second"] = round(
+        args.serial_images / results["serial"]["seconds"], 1
+    )
+
+    changed = max(1, args.images * args.changed_percent // 100)
+    uris = sorted(truth)
+    for s3_uri in rng.sample(uris, 2 * changed):
+        key = s3_uri.replace(f"s3://{BUCKET}/", "", 1)
+        if len(truth) > args.images - changed:
+            del client.objects[key], truth[s3_uri]
+        else:
+            client.objects[key].etag = '"changed"'
+    truth.update(add_images(client, rng, changed, start=args.images))
+    index, results["incremental"] = run(client, args.workers)
+    expected_reads = 2 * changed
+    if (
+        results["incremental"]["read"] + results["incremental"]["failed"]
+        != expected_reads
+    ):
+        failures.append(f"incremental run read {results['incremental']}")
+    if results["incremental"]["deleted"] != changed:
+        failures.append(f"incremental run deleted {results['incremental']['deleted']}")
+
+    publish = {}
+    for name in ("first", "unchanged"):
+        client.requests = dict.fromkeys(client.requests, 0)
+        publish[f"{name}_shards_uploaded"] = index_image_dimensions.publish_index(
+            client, index, index_dir, INDEX_URI, args.shards, args.workers
+        )
+    if publish["unchanged_shards_uploaded"]:
+        failures.append("republishing an unchanged index uploaded shards")
+    results["publish"] = publish
+
+    image_index = ImageIndex(INDEX_URI, max_shards=args.shards)
+    client.latency = 0
+    client.requests = dict.fromkeys(client.requests, 0)
+    start = time.perf_counter()
+    for s3_uri, expected in truth.items():
+        if image_index.lookup(s3_uri, client.read_object) != expected:
+            failures.append(f"lookup of {s3_uri}")
+    elapsed = time.perf_counter() - start
+    results["lookup"] = {
+        "lookups": len(truth),
+        "us_per_lookup": round(elapsed * 1e6 / len(truth), 2),
+        "objects_read": client.requests["get"],
+    }
+    if image_index.lookup(f"s3://{BUCKET}/{PREFIX}missing.jpg", client.read_object):
+        failures.append("lookup of a missing image")
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--images", type=int, default=20000)
+    parser.add_argument("--serial-images", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--range-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--changed-percent", type=int, default=1)
+    parser.add_argument("--shards", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
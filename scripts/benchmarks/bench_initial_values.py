@@ -0,0 +1,193 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures the task input size with and without compacted initial_values.
+
+    Manifest items are generated with crowd scenes as the UI writes them:
+    coordinates at full float precision, keypoints carrying extra fields and
+    some skeleton instances outside the image. The pre-annotation lambda is
+    invoked for each item with compaction off and on, in separate
+    subprocesses since its settings are read at import.
+
+    The compacted initial_values must show the same data in the UI as the
+    verbatim ones: the same skeleton ids, and for each the same keypoint
+    labels at coordinates within half a unit of --precision, with only the
+    instances outside the image removed. The script exits with an error
+    otherwise.
+
+Example
+    python scripts/benchmarks/bench_initial_values.py --skeletons-per-image 60
+"""
+import argparse
+import json
+import os
+import random
+import subprocess  # nosec B404
+import sys
+import time
+
+from synthetic import PRE_ANNOTATION_LAMBDA_DIR, add_lambda_paths
+
+IMAGE_WIDTH = 4000
+IMAGE_HEIGHT = 3000
+
+
+def make_manifest_item(
+    rng: random.Random, index: int, skeletons_per_image: int, flat: bool
+) -> dict:
+    """Creates a manifest item with verbose annotations."""
+    add_lambda_paths(PRE_ANNOTATION_LAMBDA_DIR)
+    from skeletons import KEYPOINT_LABELS
+
+    skeletons = []
+    for s in range(skeletons_per_image):
+        # One in ten instances lies entirely to the right of the image.
+        offset = IMAGE_WIDTH + 1000 if s % 10 == 9 else 0
+        center_x = rng.uniform(200, IMAGE_WIDTH - 200) + offset
+        center_y = rng.uniform(400, IMAGE_HEIGHT - 400)
+        keypoints = [
+            {
+                "id": f"{s:08x}-{k:04x}-4000-8000-{rng.getrandbits(48):012x}",
+                "label": label,
+                "color": "#FF7F0E",
+                "x": center_x + rng.uniform(-150, 150),
+                "y": center_y + rng.uniform(-300, 300),
+            }
+            for k, label in enumerate(KEYPOINT_LABELS)
+            if rng.random() < 0.9
+        ]
+        skeletons.append({"id": f"skeleton-{s}", "keypoints": keypoints})
+    if flat:
+        skeletons = [
+            dict(keypoint, skeletonId=skeleton["id"])
+            for skeleton in skeletons
+            for keypoint in skeleton["keypoints"]
+        ]
+    return {
+        "source-ref": f"s3://example-bucket/labeling_jobs/images/image_{index}.jpg",
+        "image_size": {"width": IMAGE_WIDTH, "height": IMAGE_HEIGHT},
+        "annotations": skeletons,
+    }
+
+
+def visible(initial_values: str) -> dict:
+    """Returns {skeleton id: {label: (x, y)}} of the keypoints inside the image."""
+    from skeletons import parse_skeletons
+
+    instances = {}
+    for skeleton in parse_skeletons(json.loads(initial_values))[0]:
+        points = {
+            i: point
+            for i, point in enumerate(skeleton.points)
+            if point is not None
+            and 0 <= point[0] <= IMAGE_WIDTH
+            and 0 <= point[1] <= IMAGE_HEIGHT
+        }
+        if points:
+            instances[skeleton.id] = points
+    return instances
+
+
+def same_visible_data(verbatim: str, compacted: str, precision: int) -> bool:
+    """Checks that both initial_values show the same data in the UI."""
+    expected = visible(verbatim)
+    actual = visible(compacted)
+    if expected.keys() != actual.keys():
+        return False
+    tolerance = 0.5 * 10**-precision + 1e-9
+    for skeleton_id, points in expected.items():
+        if points.keys() != actual[skeleton_id].keys():
+            return False
+        for i, (x, y) in points.items():
+            other_x, other_y = actual[skeleton_id][i]
+            if abs(x - other_x) > tolerance or abs(y - other_y) > tolerance:
+                return False
+    return True
+
+
+def run_child(args: argparse.Namespace) -> dict:
+    """Invokes the pre-annotation lambda for every item, in this process."""
+    add_lambda_paths(PRE_ANNOTATION_LAMBDA_DIR)
+    import lambda_function
+    from codec import encoded_size
+
+    rng = random.Random(args.seed)  # nosec B311
+    items = [
+        make_manifest_item(rng, i, args.skeletons_per_image, i % 2 == 1)
+        for i in range(args.items)
+    ]
+    task_inputs = []
+    elapsed = 0.0
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            for item in items:
+                event = {"version": "2018-10-16", "dataObject": item}
+                start = time.perf_counter()
+                task_inputs.append(lambda_function.lambda_handler(event, None))
+                elapsed += time.perf_counter() - start
+        finally:
+            sys.stdout = stdout
+    return {
+        "task_input_bytes": sum(encoded_size(t["taskInput"]) for t in task_inputs),
+        "invocation_ms": round(elapsed * 1000 / len(items), 3),
+        "initial_values": [t["taskInput"]["initial_values"] for t in task_inputs],
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    runs = {}
+    for name, compact in (("verbatim", "false"), ("compacted", "true")):
+        env = dict(
+            os.environ,
+            COMPACT_INITIAL_VALUES=compact,
+            INITIAL_VALUES_PRECISION=str(args.precision),
+        )
+        completed = subprocess.run(  # nosec B603
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs[name] = json.loads(completed.stdout)
+
+    add_lambda_paths(PRE_ANNOTATION_LAMBDA_DIR)
+    consistent = all(
+        same_visible_data(verbatim, compacted, args.precision)
+        for verbatim, compacted in zip(
+            runs["verbatim"]["initial_values"], runs["compacted"]["initial_values"]
+        )
+    )
+    before = runs["verbatim"]["task_input_bytes"]
+    after = runs["compacted"]["task_input_bytes"]
+    results = {
+        "items": args.items,
+        "skeletons_per_image": args.skeletons_per_image,
+        "precision": args.precision,
+        "task_input_bytes_before": before,
+        "task_input_bytes_after": after,
+        "reduction": round(1 - after / before, 3),
+        "invocation_ms_before": runs["verbatim"]["invocation_ms"],
+        "invocation_ms_after": runs["compacted"]["invocation_ms"],
+        "consistent": consistent,
+    }
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--skeletons-per-image", type=int, default=60)
+    parser.add_argument("--precision", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args)))
+        sys.exit(0)
+    sys.exit(main(args))
@@ -0,0 +1,160 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks the crowd-2d-skeleton.js asset pipeline and measures its variants.
+
+    A synthetic, unminified bundle of about --kb kilobytes, with comments,
+    indentation, strings and template literals, is built by
+    cdk.libs.assets.build_javascript_assets, or the bundle given with
+    --bundle. The script checks that:
+
+    * template literals and strings survive minification unchanged
+    * the hosted variant decodes to the minified code
+    * building again gives the same file name and bytes
+    * building an unchanged bundle again rewrites nothing
+    * changing the bundle changes its name
+
+    and reports the size of the hosted variant, and the bytes an annotator
+    downloads over --loads task loads: up to the whole gzipped bundle on
+    each load when it is hosted unversioned without Cache-Control, and the
+    hosted variant once when it is content-hashed and immutable.
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_javascript_assets.py --kb 800 --loads 50
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+from cdk.libs import assets  # noqa: E402
+
+TEMPLATE_LITERAL = '`<div class="keypoint">\n    ${label}   ${index}\n  </div>`'
+
+
+def make_bundle(rng: random.Random, kilobytes: int) -> bytes:
+    """Returns JavaScript shaped like an unminified web component bundle."""
+    parts = []
+    i = 0
+    while sum(len(p) for p in parts) < kilobytes * 1024:
+        parts.append(
+            f"""
+/**
+ * Draws keypoint {i} of the skeleton and its rig lines.
+ */
+export function drawKeypoint{i}(context, label, index) {{
+    // Scale the keypoint with the zoom level
+    const radius   = {rng.randint(2, 9)} * context.zoom;
+    const html = {TEMPLATE_LITERAL};
+    if (index > {rng.randint(0, 40)}) {{
+        context.arc(label.x, label.y, radius, 0, 2 * Math.PI);
+    }}
+    return {{ html: html, name: "keypoint  {i}" }};
+}}
+"""
+        )
+        i += 1
+    return "".join(parts).encode("utf-8")
+
+
+def hosted_path(build_dir: str, manifest: dict) -> str:
+    return os.path.join(build_dir, manifest["encoding"], manifest["file"])
+
+
+def read_hosted(build_dir: str, manifest: dict) -> bytes:
+    """Returns the decoded content of the hosted variant."""
+    with open(hosted_path(build_dir, manifest), "rb") as file_handle:
+        data = file_handle.read()
+    if manifest["encoding"] == "br":
+        return assets.brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)  # nosec B311
+    failures = []
+    work_dir = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(work_dir, "crowd-2d-skeleton.js")
+        if args.bundle:
+            shutil.copy(args.bundle, source_path)
+        else:
+            with open(source_path, "wb") as file_handle:
+                file_handle.write(make_bundle(rng, args.kb))
+        build_dir = os.path.join(work_dir, "build")
+        manifest = assets.build_javascript_assets(source_path, build_dir)
+
+        with open(source_path, "rb") as file_handle:
+            source = file_handle.read()
+        minified = assets.minify_javascript(source)
+        if not args.bundle:
+            literals = source.count(TEMPLATE_LITERAL.encode("utf-8"))
+            if minified.count(TEMPLATE_LITERAL.encode("utf-8")) != literals:
+                failures.append("template literals changed by minification")
+            if minified.count(b'"keypoint  ') != source.count(b'"keypoint  '):
+                failures.append("strings changed by minification")
+        if read_hosted(build_dir, manifest) != minified:
+            failures.append("the hosted variant differs from the minified code")
+
+        again_dir = os.path.join(work_dir, "again")
+        again = assets.build_javascript_assets(source_path, again_dir)
+        if again != manifest:
+            failures.append("a second build differs")
+        with open(hosted_path(build_dir, manifest), "rb") as first:
+            with open(hosted_path(again_dir, manifest), "rb") as second:
+                if first.read() != second.read():
+                    failures.append("a second build differs")
+
+        built_at = os.stat(hosted_path(build_dir, manifest)).st_mtime_ns
+        if assets.build_javascript_assets(source_path, build_dir) != manifest:
+            failures.append("building an unchanged bundle again changed it")
+        if os.stat(hosted_path(build_dir, manifest)).st_mtime_ns != built_at:
+            failures.append("an unchanged bundle was built again")
+
+        with open(source_path, "ab") as file_handle:
+            file_handle.write(b"\nexport const version = 2;\n")
+        changed = assets.build_javascript_assets(source_path, again_dir)
+        if changed["file"] == manifest["file"]:
+            failures.append("a changed bundle kept its name")
+    finally:
+        shutil.rmtree(work_dir)
+
+    results = {
+        "minifier": assets.rjsmin is not None,
+        "brotli": assets.brotli is not None,
+        "file": assets.hosted_asset_key(manifest),
+        "encoding": manifest["encoding"],
+        "source_bytes": len(source),
+        "minified_bytes": len(minified),
+        "hosted_bytes": manifest["size"],
+        "loads": args.loads,
+        "bytes_over_loads": {
+            "unversioned": len(gzip.compress(source)) * args.loads,
+            "hashed_immutable": manifest["size"],
+        },
+    }
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--bundle", help="Build this bundle instead of a synthetic one")
+    parser.add_argument("--kb", type=int, default=800)
+    parser.add_argument("--loads", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
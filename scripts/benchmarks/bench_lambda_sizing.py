@@ -0,0 +1,482 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Sizes the annotation lambdas from local runs against synthetic payloads.
+
+    Each handler is invoked with payloads of increasing size, every one in
+    a fresh subprocess so that its peak RSS is its own:
+
+    * pre_annotation_lambda: manifest items of --pre-sizes skeletons
+    * post_annotation_lambda: consolidation payloads of --post-sizes-mb MB,
+      served by a local S3 stand-in, consolidated in a single process. The
+      largest payload is also consolidated with each of --post-processes
+      worker processes
+
+    For each run the script records the import time, the CPU time and wall
+    time of the invocation, the peak RSS and the peak size of its temporary
+    directory. CPU time includes the worker processes, and the peak RSS
+    counts each worker at the peak RSS of the largest. From the largest
+    payload of each lambda it recommends a
+    cdk.libs.lambda_profiles.LambdaProfile:
+
+    * memory_size: the peak RSS with 50% headroom, raised until the
+      estimated duration fits in --pre-target-seconds or
+      --post-target-seconds. Lambda gives a function one full vCPU at 1769
+      MB and a proportional share of vCPUs at other sizes. At each memory
+      size the duration is estimated from the run with the number of
+      processes the lambda picks at that size, see
+      parallel_consolidation.processes_for_memory, as CPU time spread over
+      those processes. Memory sizes whose process count was not run are
+      not considered
+    * timeout_seconds: three times the estimated duration at that memory,
+      plus the import time, and at least 10 seconds for the S3 calls not
+      made locally
+    * ephemeral_storage_mb: twice the peak temporary directory size, at
+      least the 512 MB every function gets
+    * architecture: arm64, which costs less per GB-second, unless the
+      lambda or its layer ships compiled extension modules
+    * provisioned_concurrency: 1 when the import time alone exceeds the
+      target duration, so cold starts do not dominate. Reserved concurrency
+      depends on the traffic of labeling jobs, which is not measured here,
+      and is left unset
+
+    The results also report the number of consolidation processes the
+    post_annotation_lambda picks at its recommended memory size. With
+    --profiles-output the recommended profiles are written as JSON, ready
+    for cdk synth -c lambda_profiles=<path>.
+
+    The script exits with an error when an invocation fails.
+
+Example
+    python scripts/benchmarks/bench_lambda_sizing.py --post-sizes-mb 1 4 16 \\
+        --profiles-output lambda_profiles.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import subprocess  # nosec B404
+import sys
+import tempfile
+import threading
+import time
+
+from synthetic import (
+    LAMBDA_LAYER_DIR,
+    POST_ANNOTATION_LAMBDA_DIR,
+    PRE_ANNOTATION_LAMBDA_DIR,
+    REPO_ROOT,
+    add_lambda_paths,
+    write_payload,
+)
+
+LAMBDAS = {
+    "pre_annotation_lambda": PRE_ANNOTATION_LAMBDA_DIR,
+    "post_annotation_lambda": POST_ANNOTATION_LAMBDA_DIR,
+}
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+# Memory at which Lambda allocates one full vCPU.
+FULL_VCPU_MEMORY_MB = 1769
+MEMORY_STEP_MB = 64
+MEMORY_HEADROOM = 1.5
+TIMEOUT_HEADROOM = 3
+MIN_TIMEOUT_SECONDS = 10
+TMP_HEADROOM = 2
+TMP_SAMPLE_SECONDS = 0.02
+EXTENSION_SUFFIXES = (".so", ".pyd")
+
+
+class LambdaContext(object):
+    """The part of the Lambda context used by the handlers."""
+
+    def get_remaining_time_in_millis(self):
+        return 15 * 60 * 1000
+
+
+class TmpMonitor(object):
+    """Samples the size of a directory in a thread, keeping its peak."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _size(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _run(self):
+        while not self._stop.wait(TMP_SAMPLE_SECONDS):
+            self.peak_bytes = max(self.peak_bytes, self._size())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self._size())
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _pre_annotation_event(size: int, seed: int) -> dict:
+    from bench_initial_values import make_manifest_item
+
+    item = make_manifest_item(random.Random(seed), 0, size, False)  # nosec B311
+    return {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "dataObject": item,
+    }
+
+
+def _post_annotation_event(lambda_function, payload_path: str) -> dict:
+    """Serves the payload from a local file in place of S3."""
+    from synthetic import InMemoryS3Client
+
+    class PayloadS3Client(InMemoryS3Client):
+        def get_object_from_s3(self, s3_url):
+            with open(payload_path, "rb") as file_handle:
+                return file_handle.read().decode("utf-8")
+
+        def get_object_stream_from_s3(self, s3_url):
+            return open(payload_path, "rb")
+
+        def put_object_to_s3(self, data, bucket, key, content_type, tagging=None):
+            # Spilled labels are not kept, as S3 would not keep them in memory.
+            self._count("put_object_to_s3")
+            return "s3://" + bucket + "/" + key
+
+    s3_client = PayloadS3Client()
+    lambda_function.S3Client = lambda role_arn, kms_key_id=None: s3_client
+    return {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+        "outputConfig": "s3://example-bucket/output",
+    }
+
+
+def run_child(
+    lambda_name: str, size: float, payload_path: str, seed: int, processes: int
+) -> dict:
+    """Measures a single invocation inside the current (fresh) process."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+    os.environ["CHECKPOINTS_ENABLED"] = "false"
+    os.environ["CONSOLIDATION_PROCESSES"] = str(processes)
+    add_lambda_paths(LAMBDAS[lambda_name])
+
+    start = time.perf_counter()
+    import lambda_function
+
+    import_ms = (time.perf_counter() - start) * 1000
+    if lambda_name == "pre_annotation_lambda":
+        event = _pre_annotation_event(int(size), seed)
+    else:
+        event = _post_annotation_event(lambda_function, payload_path)
+
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            with TmpMonitor(tempfile.gettempdir()) as tmp_monitor:
+                cpu_start = cpu_seconds()
+                start = time.perf_counter()
+                response = lambda_function.lambda_handler(event, LambdaContext())
+                wall_seconds = time.perf_counter() - start
+                cpu = cpu_seconds() - cpu_start
+        finally:
+            sys.stdout = stdout
+
+    if lambda_name == "pre_annotation_lambda":
+        objects = len(event["dataObject"]["annotations"])
+    else:
+        objects = len(response)
+    # Worker processes are forked and joined by the handler. Their RSS is
+    # only known as the peak of the largest, which each worker is counted at.
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if processes > 1:
+        peak_rss_kb += (
+            processes * resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        )
+    return {
+        "size": size,
+        "processes": processes,
+        "objects": objects,
+        "import_ms": round(import_ms, 1),
+        "cpu_ms": round(cpu * 1000, 1),
+        "wall_ms": round(wall_seconds * 1000, 1),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "peak_tmp_mb": round(tmp_monitor.peak_bytes / 1024 / 1024, 1),
+    }
+
+
+def has_extension_modules(*directories: str) -> bool:
+    for directory in directories:
+        for _, _, files in os.walk(directory):
+            if any(name.endswith(EXTENSION_SUFFIXES) for name in files):
+                return True
+    return False
+
+
+def round_up(value: float, step: int) -> int:
+    return int(math.ceil(value / step) * step)
+
+
+def estimated_seconds(cpu_ms: float, memory_size: int, processes: int = 1) -> float:
+    """Estimates the duration of work spread over processes at a memory size."""
+    vcpus = memory_size / FULL_VCPU_MEMORY_MB
+    return cpu_ms / 1000 / min(processes, vcpus)
+
+
+def processes_at(lambda_name: str, memory_size: int) -> int:
+    """Returns the number of processes a lambda runs at a memory size."""
+    if lambda_name != "post_annotation_lambda":
+        return 1
+    from parallel_consolidation import processes_for_memory
+
+    return processes_for_memory(memory_size)
+
+
+def recommend_profile(lambda_name: str, runs: list, target_seconds: float):
+    """Recommends a profile able to handle the payload of runs.
+
+    Args:
+        lambda_name: name of the lambda, a key of LAMBDAS
+        runs: runs of the same payload, with different numbers of processes
+        target_seconds: duration the recommended memory size should reach
+
+    Returns:
+        the recommended LambdaProfile and the number of processes the
+        lambda runs at its memory size
+    """
+    from cdk.libs.lambda_profiles import (
+        MAX_MEMORY_SIZE,
+        MAX_TIMEOUT_SECONDS,
+        MIN_EPHEMERAL_STORAGE_MB,
+        MIN_MEMORY_SIZE,
+        LambdaProfile,
+    )
+
+    runs_by_processes = {run["processes"]: run for run in runs}
+    best = None
+    for memory_size in range(MIN_MEMORY_SIZE, MAX_MEMORY_SIZE + 1, MEMORY_STEP_MB):
+        run = runs_by_processes.get(processes_at(lambda_name, memory_size))
+        if run is None:
+            break
+        if memory_size < run["peak_rss_mb"] * MEMORY_HEADROOM:
+            continue
+        duration = estimated_seconds(run["cpu_ms"], memory_size, run["processes"])
+        if best is None or duration < best[1]:
+            best = (memory_size, duration, run)
+        if duration <= target_seconds:
+            break
+    if best is None:
+        # No memory size with a measured process count fits the peak RSS,
+        # so size a single process from its peak RSS alone.
+        run = runs_by_processes[1]
+        memory_size = min(
+            MAX_MEMORY_SIZE,
+            max(
+                MIN_MEMORY_SIZE,
+                round_up(run["peak_rss_mb"] * MEMORY_HEADROOM, MEMORY_STEP_MB),
+            ),
+        )
+        best = (memory_size, estimated_seconds(run["cpu_ms"], memory_size), run)
+    memory_size, duration, run = best
+    timeout_seconds = math.ceil(duration * TIMEOUT_HEADROOM + run["import_ms"] / 1000)
+    peak_tmp_mb = max(run["peak_tmp_mb"] for run in runs)
+    code_dir = LAMBDAS[lambda_name]
+    profile = LambdaProfile(
+        memory_size=memory_size,
+        architecture=(
+            "x86_64" if has_extension_modules(code_dir, LAMBDA_LAYER_DIR) else "arm64"
+        ),
+        timeout_seconds=min(
+            max(timeout_seconds, MIN_TIMEOUT_SECONDS), MAX_TIMEOUT_SECONDS
+        ),
+        reserved_concurrency=None,
+        provisioned_concurrency=1 if run["import_ms"] / 1000 > target_seconds else 0,
+        ephemeral_storage_mb=max(
+            MIN_EPHEMERAL_STORAGE_MB,
+            round_up(peak_tmp_mb * TMP_HEADROOM, MEMORY_STEP_MB),
+        ),
+    )
+    return profile, run["processes"]
+
+
+def run_lambda(
+    lambda_name: str, size: float, work_dir: str, seed: int, processes: int = 1
+) -> dict:
+    payload_path = os.path.join(work_dir, "payload.json")
+    if lambda_name == "post_annotation_lambda":
+        write_payload(
+            payload_path, int(size * 1024 * 1024), seed=seed, workers_per_object=3
+        )
+    # The temporary directory of the child stands in for /tmp.
+    tmp_dir = os.path.join(work_dir, "tmp")
+    os.makedirs(tmp_dir)
+    try:
+        completed = subprocess.run(  # nosec B603
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                lambda_name,
+                "--child-size",
+                str(size),
+                "--child-payload",
+                payload_path,
+                "--seed",
+                str(seed),
+                "--child-processes",
+                str(processes),
+            ],
+            capture_output=True,
+            text=True,
+            env=dict(os.environ, TMPDIR=tmp_dir),
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+        if os.path.exists(payload_path):
+            os.remove(payload_path)
+    if completed.returncode:
+        lines = completed.stderr.strip().splitlines()
+        return {
+            "size": size,
+            "processes": processes,
+            "error": lines[-1] if lines else completed.returncode,
+        }
+    return json.loads(completed.stdout)
+
+
+def main(args: argparse.Namespace) -> int:
+    sys.path.insert(0, REPO_ROOT)
+    sizes = {
+        "pre_annotation_lambda": args.pre_sizes,
+        "post_annotation_lambda": args.post_sizes_mb,
+    }
+    targets = {
+        "pre_annotation_lambda": args.pre_target_seconds,
+        "post_annotation_lambda": args.post_target_seconds,
+    }
+    add_lambda_paths(POST_ANNOTATION_LAMBDA_DIR)
+    from parallel_consolidation import processes_for_memory
+
+    from cdk.libs.lambda_profiles import MAX_MEMORY_SIZE
+
+    post_processes = args.post_processes
+    if post_processes is None:
+        post_processes = range(2, processes_for_memory(MAX_MEMORY_SIZE) + 1)
+    extra_processes = {
+        "pre_annotation_lambda": [],
+        "post_annotation_lambda": sorted(set(post_processes) - {1}),
+    }
+    failures = []
+    results = {"runs": {}, "profiles": {}, "consolidation_processes": {}}
+    work_dir = tempfile.mkdtemp()
+    try:
+        for lambda_name in LAMBDAS:
+            runs = [
+                run_lambda(lambda_name, size, work_dir, args.seed)
+                for size in sorted(sizes[lambda_name])
+            ]
+            largest = runs[-1]["size"]
+            runs.extend(
+                run_lambda(lambda_name, largest, work_dir, args.seed, processes)
+                for processes in extra_processes[lambda_name]
+            )
+            results["runs"][lambda_name] = runs
+            failed = [run for run in runs if "error" in run]
+            if failed:
+                failures.extend(f"{lambda_name}: {run}" for run in failed)
+                continue
+            profile, processes = recommend_profile(
+                lambda_name,
+                [run for run in runs if run["size"] == largest],
+                targets[lambda_name],
+            )
+            results["profiles"][lambda_name] = profile._asdict()
+            if lambda_name == "post_annotation_lambda":
+                results["consolidation_processes"][lambda_name] = processes
+    finally:
+        shutil.rmtree(work_dir)
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    if args.profiles_output and not failures:
+        with open(args.profiles_output, "w") as file_handle:
+            json.dump(results["profiles"], file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--pre-sizes",
+        type=int,
+        nargs="+",
+        default=[10, 50, 200, 800],
+        help="Skeletons per manifest item",
+    )
+    parser.add_argument(
+        "--post-sizes-mb",
+        type=float,
+        nargs="+",
+        default=[1, 4, 16],
+        help="Consolidation payload sizes",
+    )
+    parser.add_argument(
+        "--post-processes",
+        type=int,
+        nargs="+",
+        help="Worker processes to also consolidate the largest payload with, "
+        "by default every count the lambda picks up to the largest memory size",
+    )
+    parser.add_argument("--pre-target-seconds", type=float, default=0.5)
+    parser.add_argument("--post-target-seconds", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument(
+        "--profiles-output", help="Write the recommended profiles to this file"
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-size", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--child-payload", help=argparse.SUPPRESS)
+    parser.add_argument("--child-processes", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(
+            json.dumps(
+                run_child(
+                    args.child,
+                    args.child_size,
+                    args.child_payload,
+                    args.seed,
+                    args.child_processes,
+                )
+            )
+        )
+    else:
+        sys.exit(main(args))
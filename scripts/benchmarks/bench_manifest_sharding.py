@@ -0,0 +1,301 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures the streaming manifest writer and checks the job shard scheduler.
+
+    --items manifest items of about --item-bytes bytes each are written:
+
+    * joined: kept in a list and joined into one string, as the job script
+      did before, then sent with a single PUT
+    * streamed: through manifest_writer.S3ManifestWriter, as multipart parts
+    * sharded: through manifest_writer.ShardedManifestWriter, with at most
+      --shard-items items per manifest
+
+    The peak memory traced while writing is reported for each, the S3
+    stand-in keeping only the size and hash of what it is sent. The sharded
+    manifests are then checked to hold every item once, in order and within
+    the limits, and job_shards.schedule runs the batch against a SageMaker
+    stand-in whose jobs complete after a few polls. The number of jobs
+    running at once must never exceed --max-concurrent-jobs, and the merged
+    output manifest must hold every item. The script exits with an error
+    when a check fails.
+
+Example
+    python scripts/benchmarks/bench_manifest_sharding.py --items 100000
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+import job_shards  # noqa: E402
+from manifest_writer import (  # noqa: E402
+    S3ManifestWriter,
+    ShardedManifestWriter,
+    split_s3_uri,
+)
+
+BUCKET = "example-bucket"
+
+
+class Body(object):
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def iter_lines(self):
+        for line in self._stream:
+            yield line.rstrip(b"\n")
+
+
+class ManifestS3Client(object):
+    """The subset of the boto3 S3 client used to write and read manifests.
+
+    Args:
+        keep: keep the objects, rather than their size and hash only
+    """
+
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.objects = {}
+        self.requests = 0
+        self._uploads = {}
+
+    def _part(self, body: bytes):
+        return body if self.keep else len(body)
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.requests += 1
+        if self.keep:
+            self.objects[Key] = bytes(Body)
+        else:
+            self.objects[Key] = (len(Body), hashlib.sha256(Body).hexdigest())
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        self.requests += 1
+        upload_id = f"upload-{len(self._uploads)}"
+        self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.requests += 1
+        self._uploads[UploadId][PartNumber] = self._part(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.requests += 1
+        parts = self._uploads.pop(UploadId)
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        ordered = [parts[number] for number in numbers]
+        if self.keep:
+            self.objects[Key] = b"".join(ordered)
+        else:
+            self.objects[Key] = (sum(ordered), None)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.requests += 1
+        self._uploads.pop(UploadId)
+
+    def get_object(self, Bucket, Key):
+        self.requests += 1
+        return {"Body": Body(self.objects[Key])}
+
+
+class JobsClient(object):
+    """The subset of the boto3 SageMaker client used by job_shards.
+
+    Each job is Initializing, then InProgress, and completes once it has
+    been described polls times.
+    """
+
+    def __init__(self, s3_client: ManifestS3Client, polls: int):
+        self.s3_client = s3_client
+        self.polls = polls
+        self.jobs = {}
+        self.max_running = 0
+
+    def _running(self) -> int:
+        return sum(
+            1
+            for job in self.jobs.values()
+            if job["status"] in job_shards.ACTIVE_STATUSES
+        )
+
+    def create_labeling_job(self, **request):
+        name = request["LabelingJobName"]
+        if name in self.jobs:
+            raise ValueError(f"{name} already exists")
+        self.jobs[name] = {"status": "Initializing", "described": 0, "request": request}
+        self.max_running = max(self.max_running, self._running())
+
+    def describe_labeling_job(self, LabelingJobName):
+        job = self.jobs[LabelingJobName]
+        job["described"] += 1
+        if job["described"] < self.polls:
+            job["status"] = "InProgress"
+        elif job["status"] != "Completed":
+            # The job labels its input manifest and writes it back out.
+            request = job["request"]
+            bucket, key = split_s3_uri(
+                request["InputConfig"]["DataSource"]["S3DataSource"]["ManifestS3Uri"]
+            )
+            output_key = f"output/{LabelingJobName}/manifests/output/output.manifest"
+            lines = self.s3_client.objects[key].split(b"\n")
+            self.s3_client.objects[output_key] = b"\n".join(
+                line[:-1] + b',"label-results":{}}' for line in lines
+            )
+            job["status"] = "Completed"
+            job["output"] = {"OutputDatasetS3Uri": f"s3://{bucket}/{output_key}"}
+        response = {"LabelingJobStatus": job["status"]}
+        if job["status"] == "Completed":
+            response["LabelingJobOutput"] = job["output"]
+        return response
+
+
+def make_item(i: int, item_bytes: int) -> dict:
+    return {
+        "source-ref": f"s3://{BUCKET}/labeling_jobs/images/image_{i}.jpg",
+        "index": i,
+        "annotations": "x" * max(item_bytes - 80, 0),
+    }
+
+
+def measure(function, *args):
+    """Returns the result, peak traced bytes and seconds of function."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak, seconds
+
+
+def write_joined(s3_client, count: int, item_bytes: int):
+    manifest_lines = [
+        json.dumps(make_item(i, item_bytes), separators=(",", ":"))
+        for i in range(count)
+    ]
+    s3_client.put_object(
+        Bucket=BUCKET,
+        Key="joined.manifest",
+        Body="\n".join(manifest_lines).encode("utf-8"),
+    )
+
+
+def write_streamed(s3_client, count: int, item_bytes: int):
+    with S3ManifestWriter(s3_client, f"s3://{BUCKET}/streamed.manifest") as writer:
+        for i in range(count):
+            writer.write(make_item(i, item_bytes))
+
+
+def write_sharded(s3_client, count: int, item_bytes: int, shard_items: int):
+    writer = ShardedManifestWriter(s3_client, f"s3://{BUCKET}/sharded", shard_items)
+    with writer:
+        for i in range(count):
+            writer.write(make_item(i, item_bytes))
+    return writer.shards
+
+
+def main(args: argparse.Namespace) -> int:
+    failures = []
+    results = {"items": args.items, "item_bytes": args.item_bytes}
+    for name, function, extra in (
+        ("joined", write_joined, ()),
+        ("streamed", write_streamed, ()),
+        ("sharded", write_sharded, (args.shard_items,)),
+    ):
+        s3_client = ManifestS3Client(keep=False)
+        _, peak, seconds = measure(
+            function, s3_client, args.items, args.item_bytes, *extra
+        )
+        results[name] = {
+            "peak_mb": round(peak / 1024 / 1024, 1),
+            "seconds": round(seconds, 2),
+            "requests": s3_client.requests,
+            "bytes": sum(size for size, _ in s3_client.objects.values()),
+        }
+    if results["streamed"]["bytes"] != results["joined"]["bytes"]:
+        failures.append(f"streamed manifest differs: {results['streamed']}")
+
+    # The sharded manifests hold every item once, in order.
+    s3_client = ManifestS3Client()
+    shards = write_sharded(s3_client, args.items, args.item_bytes, args.shard_items)
+    expected = 0
+    for shard in shards:
+        _, key = split_s3_uri(shard["manifest_s3_uri"])
+        data = s3_client.objects[key]
+        lines = data.split(b"\n")
+        if len(lines) != shard["items"] or len(data) != shard["bytes"]:
+            failures.append(f"shard {shard['index']}: {shard} has {len(lines)} lines")
+        if shard["items"] > args.shard_items:
+            failures.append(f"shard {shard['index']}: {shard['items']} items")
+        for line in lines:
+            if json.loads(line)["index"] != expected:
+                failures.append(f"shard {shard['index']}: item {expected} misplaced")
+                break
+            expected += 1
+    if expected != args.items:
+        failures.append(f"sharded manifests hold {expected} items")
+    results["shards"] = len(shards)
+
+    # The jobs are launched without ever exceeding the limit.
+    sagemaker_client = JobsClient(s3_client, args.polls)
+    with tempfile.TemporaryDirectory() as work_dir:
+        batch_path = os.path.join(work_dir, "batch.json")
+        job_shards.save_batch(
+            batch_path,
+            job_shards.new_batch(
+                "example-batch",
+                {"InputConfig": {"DataSource": {"S3DataSource": {}}}},
+                shards,
+                args.max_concurrent_jobs,
+            ),
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            statuses = job_shards.schedule(
+                sagemaker_client, batch_path, wait=True, poll_seconds=0
+            )
+        batch = job_shards.load_batch(batch_path)
+    results["statuses"] = statuses
+    results["max_running_jobs"] = sagemaker_client.max_running
+    if sagemaker_client.max_running > args.max_concurrent_jobs:
+        failures.append(f"{sagemaker_client.max_running} jobs ran at once")
+    if statuses != {"Completed": len(shards)}:
+        failures.append(f"job statuses: {statuses}")
+
+    merged_uri = f"s3://{BUCKET}/merged/output.manifest"
+    counts = job_shards.merge_output_manifests(s3_client, batch, merged_uri)
+    results["merged"] = counts
+    merged = s3_client.objects[split_s3_uri(merged_uri)[1]].split(b"\n")
+    indexes = [json.loads(line)["index"] for line in merged]
+    if indexes != list(range(args.items)):
+        failures.append(f"merged manifest holds {len(indexes)} items out of order")
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--item-bytes", type=int, default=600)
+    parser.add_argument("--shard-items", type=int, default=7000)
+    parser.add_argument("--max-concurrent-jobs", type=int, default=4)
+    parser.add_argument("--polls", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,319 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks and measures scripts/index_output_manifests.py.
+
+    --jobs output manifests of --rows labels each are written locally, in
+    the layout Ground Truth writes under S3OutputPath, with labels as the
+    post-annotation lambda writes them, and one of them is also served by an
+    S3 stand-in. The script runs:
+
+    * ingest: the first ingestion of every manifest
+    * rerun: a second ingestion, which must read no manifest
+    * changed: after one manifest was rewritten and another deleted, which
+      must only read the first and drop the rows of the second
+    * queries: the labels a worker modified, those created since a date and
+      those of an image, through the index and by scanning every manifest
+      as before. Both must return what was written.
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_output_index.py --jobs 20 --rows 50000
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+import index_output_manifests  # noqa: E402
+
+BUCKET = "example-bucket"
+LABEL = "label-results"
+START = datetime(2026, 10, 1)
+
+
+class ListingS3Client(object):
+    """The subset of the boto3 S3 client used to list and read manifests."""
+
+    def __init__(self, objects: dict):
+        self.objects = objects
+        self.gets = 0
+
+    def get_paginator(self, name: str):
+        client = self
+
+        class Paginator(object):
+            def paginate(self, Bucket, Prefix):
+                yield {
+                    "Contents": [
+                        {"Key": key, "ETag": f'"{hash(data)}"', "Size": len(data)}
+                        for key, data in client.objects.items()
+                        if key.startswith(Prefix)
+                    ]
+                }
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+
+        class Body(object):
+            def __init__(self, data):
+                self._stream = io.BytesIO(data)
+
+            def iter_lines(self):
+                for line in self._stream:
+                    yield line.rstrip(b"\n")
+
+            def close(self):
+                pass
+
+        return {"Body": Body(self.objects[Key])}
+
+
+class DescribingSageMakerClient(object):
+    def __init__(self):
+        self.describes = 0
+
+    def describe_labeling_job(self, LabelingJobName):
+        self.describes += 1
+        return {
+            "LabelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:"
+            f"labeling-job/{LabelingJobName}"
+        }
+
+
+def make_line(rng: random.Random, job: str, i: int, workers: list) -> tuple:
+    """Returns a manifest line and the row it should be indexed as."""
+    created = START + timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+    image = f"image_{rng.randint(0, 200000)}.jpg"
+    several = rng.random() < 0.2
+    worker_ids = rng.sample(workers, 3) if several else [rng.choice(workers)]
+    label = {
+        "dataset_object_id": str(i),
+        "data_object_s3_uri": f"s3://{BUCKET}/images/{image}",
+        "image_file_name": image,
+        "image_s3_location": f"s3://{BUCKET}/images/{image}",
+        "updated_annotations": [
+            {"id": f"p{k}", "points": [[rng.random() * 1000, 0]] * 19} for k in range(2)
+        ],
+        "worker_id": None if several else worker_ids[0],
+        "no_changes_needed": rng.choice(["true", "false"]),
+        "was_modified": rng.random() < 0.4,
+        "changes": {"moved_keypoints": 1},
+        "total_time_in_seconds": rng.uniform(5, 300),
+    }
+    if several:
+        label["worker_ids"] = worker_ids
+    item = {
+        "source-ref": label["data_object_s3_uri"],
+        LABEL: label,
+        f"{LABEL}-metadata": {
+            "job-name": f"labeling-job/{job}",
+            "type": "groundtruth/custom",
+            "human-annotated": "yes",
+            "creation-date": created.isoformat(),
+        },
+    }
+    row = {
+        "job": job,
+        "id": str(i),
+        "image": image,
+        "workers": worker_ids,
+        "modified": label["was_modified"],
+        "created": created.isoformat(),
+    }
+    return json.dumps(item).encode("utf-8"), row
+
+
+def write_manifest(path: str, rng: random.Random, job: str, rows: int, workers):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    expected = []
+    with open(path, "wb") as file_handle:
+        for i in range(rows):
+            line, row = make_line(rng, job, i, workers)
+            file_handle.write(line + b"\n")
+            expected.append(row)
+    return expected
+
+
+def scan(paths: list, predicate) -> set:
+    """Finds labels by reading every manifest, as before the index."""
+    found = set()
+    for path in paths:
+        with open(path, "rb") as file_handle:
+            for line in file_handle:
+                item = json.loads(line)
+                if predicate(item):
+                    found.add(
+                        (
+                            item[f"{LABEL}-metadata"]["job-name"].split("/")[1],
+                            item[LABEL]["dataset_object_id"],
+                        )
+                    )
+    return found
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)  # nosec B311
+    workers = [f"worker-{i}" for i in range(args.workers)]
+    failures = []
+    results = {"jobs": args.jobs, "rows": args.jobs * args.rows}
+    work_dir = tempfile.mkdtemp()
+    try:
+        output_dir = os.path.join(work_dir, "output")
+        paths, expected = {}, {}
+        for j in range(args.jobs):
+            job = f"example-job-{j:03d}"
+            paths[job] = os.path.join(
+                output_dir, job, index_output_manifests.OUTPUT_MANIFEST_SUFFIX
+            )
+            expected[job] = write_manifest(paths[job], rng, job, args.rows, workers)
+        results["manifest_mb"] = round(
+            sum(os.path.getsize(p) for p in paths.values()) / 1024 / 1024, 1
+        )
+        s3_job = "example-job-s3"
+        s3_lines = [make_line(rng, s3_job, i, workers) for i in range(1000)]
+        s3_key = f"output/{s3_job}/{index_output_manifests.OUTPUT_MANIFEST_SUFFIX}"
+        s3_client = ListingS3Client({s3_key: b"\n".join(line for line, _ in s3_lines)})
+        expected[s3_job] = [row for _, row in s3_lines]
+        sources = [output_dir, f"s3://{BUCKET}/output/"]
+
+        db_path = os.path.join(work_dir, "index.sqlite")
+        connection = index_output_manifests.connect(db_path)
+        sagemaker_client = DescribingSageMakerClient()
+
+        def ingest(name):
+            with redirect_stdout(io.StringIO()):
+                counts, seconds = timed(
+                    index_output_manifests.update_index,
+                    connection,
+                    s3_client,
+                    sources,
+                    index_output_manifests.OUTPUT_MANIFEST_SUFFIX,
+                    LABEL,
+                    sagemaker_client,
+                )
+            counts["seconds"] = seconds
+            results[name] = counts
+            return counts
+
+        ingest_counts = ingest("ingest")
+        ingest_counts["rows_per_second"] = round(
+            ingest_counts["rows"] / ingest_counts["seconds"]
+        )
+        total = sum(len(rows) for rows in expected.values())
+        if ingest_counts["rows"] != total or ingest_counts["ingested"] != args.jobs + 1:
+            failures.append(f"ingest: {ingest_counts}")
+        if sagemaker_client.describes != args.jobs + 1:
+            failures.append(f"{sagemaker_client.describes} jobs described")
+
+        rerun = ingest("rerun")
+        if rerun["ingested"] or rerun["unchanged"] != args.jobs + 1:
+            failures.append(f"rerun: {rerun}")
+
+        jobs = sorted(paths)
+        changed_job, deleted_job = jobs[0], jobs[1]
+        expected[changed_job] = write_manifest(
+            paths[changed_job], rng, changed_job, args.rows // 2, workers
+        )
+        os.remove(paths[deleted_job])
+        del expected[deleted_job], paths[deleted_job]
+        changed = ingest("changed")
+        if (changed["ingested"], changed["deleted"], changed["rows"]) != (
+            1,
+            1,
+            args.rows // 2,
+        ):
+            failures.append(f"changed: {changed}")
+        results["db_mb"] = round(os.path.getsize(db_path) / 1024 / 1024, 1)
+
+        # Every query through the index matches the rows written and a scan.
+        rows = [row for job_rows in expected.values() for row in job_rows]
+        worker = workers[0]
+        since = (START + timedelta(days=29)).isoformat()
+        image = rows[len(rows) // 2]["image"]
+        queries = {
+            "worker_modified": (
+                {"worker_id": worker, "was_modified": True},
+                lambda r: worker in r["workers"] and r["modified"],
+                lambda item: item[LABEL]["was_modified"]
+                and worker
+                in (item[LABEL].get("worker_ids") or [item[LABEL]["worker_id"]]),
+            ),
+            "since": (
+                {"since": since},
+                lambda r: r["created"] >= since,
+                lambda item: item[f"{LABEL}-metadata"]["creation-date"] >= since,
+            ),
+            "image": (
+                {"image_file_name": image},
+                lambda r: r["image"] == image,
+                lambda item: item[LABEL]["image_file_name"] == image,
+            ),
+        }
+        results["queries"] = {}
+        local_paths = list(paths.values())
+        for name, (filters, expect, predicate) in queries.items():
+            wanted = {(r["job"], r["id"]) for r in rows if expect(r)}
+            sql, parameters = index_output_manifests.label_query(connection, **filters)
+            indexed, index_seconds = timed(
+                lambda: {
+                    (row[0], row[2]) for row in connection.execute(sql, parameters)
+                }
+            )
+            scanned, scan_seconds = timed(scan, local_paths, predicate)
+            # The scan does not see the manifest only in S3.
+            if indexed != wanted or scanned != {k for k in wanted if k[0] != s3_job}:
+                failures.append(
+                    f"{name}: {len(indexed)} indexed, {len(scanned)} scanned, "
+                    f"{len(wanted)} written"
+                )
+            results["queries"][name] = {
+                "rows": len(indexed),
+                "index_ms": round(index_seconds * 1000, 1),
+                "scan_ms": round(scan_seconds * 1000, 1),
+            }
+        arn = connection.execute(
+            "SELECT job_arn FROM jobs WHERE job_name = ?", (s3_job,)
+        ).fetchone()[0]
+        sql, parameters = index_output_manifests.label_query(connection, job=arn)
+        if len(connection.execute(sql, parameters).fetchall()) != 1000:
+            failures.append(f"query by job ARN {arn}")
+        connection.close()
+    finally:
+        shutil.rmtree(work_dir)
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,123 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Compares serial and parallel consolidation of a synthetic batch.
+
+    The batch is consolidated with the serial loop and with the forked
+    worker pool at each process count, after a warm-up run of each, and
+    the speedup over the serial loop is reported with the CPU time of the
+    process and its workers. Multi-worker data objects are used by default
+    since they are the CPU bound case the worker pool is meant for.
+
+    Speedups are bounded by the vCPUs of the machine running the benchmark:
+    with fewer vCPUs than processes, workers share the same CPU time and the
+    pool is slower than the serial loop. In Lambda, CPU follows memory, so
+    the process count "auto" picks at each --memory-sizes is reported too.
+    The script exits with an error when an output differs from the serial
+    one.
+
+Example
+    python scripts/benchmarks/bench_parallel_consolidation.py --processes 2 4
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+
+from synthetic import add_lambda_paths, make_data_object
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+
+def consolidate(payload: list, processes: int) -> tuple:
+    """Returns the output, wall seconds and CPU seconds of a consolidation."""
+    from lambda_function import do_consolidation
+
+    data_objects = json.loads(json.dumps(payload))
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            cpu_start = cpu_seconds()
+            start = time.perf_counter()
+            output = do_consolidation(
+                "arn", data_objects, "label-results", None, processes=processes
+            )
+            return output, time.perf_counter() - start, cpu_seconds() - cpu_start
+        finally:
+            sys.stdout = stdout
+
+
+def best_run(payload: list, processes: int, repeat: int) -> tuple:
+    """Returns the output and the fastest of repeat runs, after a warm-up."""
+    output = consolidate(payload, processes)[0]
+    runs = [consolidate(payload, processes) for _ in range(repeat)]
+    _, seconds, cpu = min(runs, key=lambda run: run[1])
+    return output, seconds, cpu
+
+
+def main(args: argparse.Namespace) -> int:
+    add_lambda_paths()
+    rng = random.Random(0)
+    payload = [
+        make_data_object(
+            rng,
+            i,
+            skeletons_per_image=args.skeletons_per_image,
+            workers_per_object=args.workers_per_object,
+        )
+        for i in range(args.objects)
+    ]
+
+    from parallel_consolidation import available_cpus, processes_for_memory
+
+    failed = False
+    serial_output, serial_seconds, serial_cpu = best_run(payload, 1, args.repeat)
+    results = []
+    for processes in [1] + args.processes:
+        if processes == 1:
+            output, seconds, cpu = serial_output, serial_seconds, serial_cpu
+        else:
+            output, seconds, cpu = best_run(payload, processes, args.repeat)
+        result = {
+            "processes": processes,
+            "seconds": round(seconds, 3),
+            "cpu_seconds": round(cpu, 3),
+            "speedup": round(serial_seconds / seconds, 2),
+            "same_output": output == serial_output,
+            "objects": args.objects,
+            "available_cpus": available_cpus(),
+        }
+        failed = failed or not result["same_output"]
+        results.append(result)
+        print(json.dumps(result))
+    auto = {str(m): processes_for_memory(m) for m in args.memory_sizes}
+    print(json.dumps({"auto_processes_by_memory_mb": auto}))
+
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(
+                {"runs": results, "auto_processes_by_memory_mb": auto},
+                file_handle,
+                indent=2,
+            )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--skeletons-per-image", type=int, default=30)
+    parser.add_argument("--workers-per-object", type=int, default=3)
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--memory-sizes", type=int, nargs="+", default=[128, 1769, 3538, 10240]
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
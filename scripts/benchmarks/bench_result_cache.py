@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures retried consolidation requests served from the result cache.
+
+    lambda_handler is invoked with S3Client replaced by
+    synthetic.InMemoryS3Client for the following sequence:
+
+    * first: the initial request, which consolidates and stores its output
+    * warm_retry: the same request in the same execution environment,
+      answered from memory
+    * cold_retry: the same request after the in-memory cache is cleared, as
+      in a new execution environment, answered from S3
+    * changed_payload: the request after the payload object was rewritten,
+      which changes its ETag and consolidates again
+
+    Retries must return the output of the first request; the script exits
+    with an error otherwise.
+
+Example
+    python scripts/benchmarks/bench_result_cache.py --objects 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from synthetic import InMemoryS3Client, add_lambda_paths, make_payload
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+OUTPUT_URI = "s3://example-bucket/labeling_jobs/output/example"
+
+
+def main(args: argparse.Namespace) -> int:
+    os.environ["CONSOLIDATION_PROCESSES"] = "1"
+    add_lambda_paths()
+    import lambda_function
+
+    payload = make_payload(
+        args.objects,
+        skeletons_per_image=args.skeletons_per_image,
+        workers_per_object=args.workers_per_object,
+    )
+    s3_client = InMemoryS3Client({PAYLOAD_URI: payload})
+    lambda_function.S3Client = lambda role_arn, kms_key_id: s3_client
+    event = {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+        "outputConfig": OUTPUT_URI,
+    }
+
+    def invoke(name: str) -> dict:
+        with open(os.devnull, "w") as sink:
+            stdout, sys.stdout = sys.stdout, sink
+            try:
+                start = time.perf_counter()
+                output = lambda_function.lambda_handler(event, None)
+                elapsed = time.perf_counter() - start
+            finally:
+                sys.stdout = stdout
+        return name, output, round(elapsed * 1000, 2)
+
+    runs = [invoke("first"), invoke("warm_retry")]
+    lambda_function.memory_result_cache.clear()
+    runs.append(invoke("cold_retry"))
+    s3_client.objects[PAYLOAD_URI] = payload + b" "
+    runs.append(invoke("changed_payload"))
+
+    first_output = runs[0][1]
+    consistent = all(output == first_output for _, output, _ in runs)
+    results = {name: elapsed_ms for name, _, elapsed_ms in runs}
+    results.update(
+        {
+            "objects": args.objects,
+            "cached_objects": sum(
+                1 for uri in s3_client.objects if "/consolidation_cache/" in uri
+            ),
+            "consistent": consistent,
+        }
+    )
+    print(json.dumps(results))
+
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, default=200)
+    parser.add_argument("--skeletons-per-image", type=int, default=20)
+    parser.add_argument("--workers-per-object", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
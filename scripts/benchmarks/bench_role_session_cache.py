@@ -0,0 +1,195 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks the assumed-role credential cache of the post-annotation lambda.
+
+    s3_helper.RoleSessionCache is driven with a local STS stand-in whose
+    AssumeRole takes --assume-role-ms, and S3 clients are replaced by a
+    stand-in which can fail with ExpiredToken. The script checks that:
+
+    * concurrent: --threads callers getting the same role at once trigger
+      a single AssumeRole and share one session and one S3 client
+    * margin: credentials are reused while they are valid for more than
+      CREDENTIAL_REFRESH_MARGIN, and assumed again inside it
+    * forced: get(refresh=True) assumes the role again
+    * expired_token: an S3 call failing with ExpiredToken refreshes the
+      credentials and is retried once, with the new session
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_role_session_cache.py --threads 32
+"""
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from synthetic import FakeSTSClient, add_lambda_paths
+
+ROLE_ARN = "arn:aws:iam::111122223333:role/example"
+
+
+class SlowSTSClient(FakeSTSClient):
+    """FakeSTSClient whose AssumeRole takes a while, as it does over the network."""
+
+    def __init__(self, ttl: timedelta, seconds: float):
+        super().__init__(ttl)
+        self.seconds = seconds
+        self._lock = threading.Lock()
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        time.sleep(self.seconds)
+        with self._lock:
+            return super().assume_role(RoleArn, RoleSessionName)
+
+
+class ExpiringS3Client(object):
+    """The part of the boto3 S3 client used by get_object_from_s3.
+
+    The first get_object of the client created from the first credentials
+    fails with ExpiredToken.
+    """
+
+    def __init__(self, expired: bool):
+        from botocore.exceptions import ClientError
+
+        self._client_error = ClientError
+        self.expired = expired
+        self.calls = 0
+
+    def get_object(self, Bucket, Key):
+        self.calls += 1
+        if self.expired:
+            raise self._client_error(
+                {"Error": {"Code": "ExpiredToken", "Message": "expired"}}, "GetObject"
+            )
+        return {"Body": io.BytesIO(b"[]")}
+
+
+def main(args: argparse.Namespace) -> int:
+    add_lambda_paths()
+    import s3_helper
+
+    failures = []
+    results = {}
+    seconds = args.assume_role_ms / 1000
+    sts_clients = []
+
+    def make_cache(ttl: timedelta):
+        def sts_client_factory():
+            sts_clients.append(SlowSTSClient(ttl, seconds))
+            return sts_clients[-1]
+
+        sts_clients.clear()
+        return s3_helper.RoleSessionCache(sts_client_factory)
+
+    # Sessions create ExpiringS3Client in place of boto3 clients; the
+    # first one created expires on its first call.
+    s3_clients = []
+
+    def create_s3_client(role_session):
+        s3_clients.append(ExpiringS3Client(expired=not s3_clients))
+        return s3_clients[-1]
+
+    s3_helper.RoleSession._create_s3_client = create_s3_client
+
+    # Concurrent callers.
+    cache = make_cache(timedelta(hours=1))
+    barrier = threading.Barrier(args.threads)
+    sessions, clients = [], []
+
+    def call():
+        barrier.wait()
+        session = cache.get(ROLE_ARN)
+        sessions.append(session)
+        clients.append(session.s3_client)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=call) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    calls = sts_clients[0].assume_role_calls
+    results["concurrent"] = {
+        "threads": args.threads,
+        "assume_role_calls": calls,
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+    if len(sts_clients) != 1 or calls != 1:
+        failures.append(f"concurrent: {len(sts_clients)} STS clients, {calls} calls")
+    if len({id(s) for s in sessions}) != 1 or len({id(c) for c in clients}) != 1:
+        failures.append("concurrent: callers got different sessions or clients")
+    s3_clients.clear()
+
+    # Reuse outside the margin, refresh inside it.
+    session = cache.get(ROLE_ARN)
+    margin = s3_helper.CREDENTIAL_REFRESH_MARGIN
+    one_minute = timedelta(minutes=1)
+    if not session.is_fresh(session.expiration - margin - one_minute):
+        failures.append("margin: credentials outside the margin are not fresh")
+    if session.is_fresh(session.expiration - margin + one_minute):
+        failures.append("margin: credentials inside the margin are fresh")
+    if sts_clients[0].assume_role_calls != 1:
+        failures.append("margin: fresh credentials were assumed again")
+    cache = make_cache(margin - one_minute)
+    first = cache.get(ROLE_ARN)
+    second = cache.get(ROLE_ARN)
+    calls = sts_clients[0].assume_role_calls
+    results["margin"] = {"assume_role_calls": calls}
+    if calls != 2 or first is second:
+        failures.append(f"margin: {calls} calls for credentials inside the margin")
+
+    # Forced refresh.
+    cache = make_cache(timedelta(hours=1))
+    first = cache.get(ROLE_ARN)
+    forced = cache.get(ROLE_ARN, refresh=True)
+    calls = sts_clients[0].assume_role_calls
+    results["forced"] = {"assume_role_calls": calls}
+    if calls != 2 or forced is first or cache.get(ROLE_ARN) is not forced:
+        failures.append(f"forced: {calls} calls")
+
+    # ExpiredToken refreshes and retries.
+    s3_helper.role_session_cache = make_cache(timedelta(hours=1))
+    s3_client = s3_helper.S3Client(ROLE_ARN)
+    with io.StringIO() as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            payload = s3_client.get_object_from_s3("s3://example-bucket/payload.json")
+        except ValueError as e:
+            payload = str(e)
+        finally:
+            sys.stdout = stdout
+    calls = sts_clients[0].assume_role_calls
+    results["expired_token"] = {
+        "assume_role_calls": calls,
+        "s3_clients": len(s3_clients),
+        "get_object_calls": [c.calls for c in s3_clients],
+    }
+    if payload != "[]":
+        failures.append(f"expired_token: got {payload!r}")
+    if calls != 2 or [c.calls for c in s3_clients] != [1, 1]:
+        failures.append(f"expired_token: {results['expired_token']}")
+    if s3_client.role_session is not s3_helper.role_session_cache.get(ROLE_ARN):
+        failures.append("expired_token: the refreshed session is not cached")
+    if s3_client.role_session.expiration <= datetime.now(timezone.utc):
+        failures.append("expired_token: the refreshed credentials are expired")
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--assume-role-ms", type=float, default=100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,236 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures the incremental image upload of create_example_labeling_job.
+
+    s3_sync.sync_files uploads --files local files, a few of them larger
+    than the multipart threshold, to an in-memory S3 stand-in. Each upload
+    sleeps for --latency-ms plus the time to send the file at
+    --mbps-per-connection, and the stand-in computes ETags as S3 does,
+    multipart ones included. The script runs:
+
+    * serial: the first sync with a single worker, as the script did before
+    * concurrent: the first sync with --workers workers
+    * rerun: a second sync with the state file, which must upload nothing
+      and read no file
+    * no_state: a sync without the state file, which must upload nothing,
+      skipping files by their OriginalMD5 or by hashing them
+    * changed: a sync after --changed files were rewritten and as many
+      objects deleted, which must upload exactly those
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_s3_sync.py --files 400 --workers 32
+"""
+import argparse
+import builtins
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+import s3_sync  # noqa: E402
+
+BUCKET = "example-bucket"
+PREFIX = "labeling_jobs/images/"
+
+
+class TransferS3Client(object):
+    """The subset of the boto3 S3 client used by s3_sync."""
+
+    def __init__(self, latency_ms: float, mbps: float):
+        self.latency = latency_ms / 1000
+        self.bytes_per_second = mbps * 1e6 / 8
+        self.objects = {}
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def get_paginator(self, name: str):
+        client = self
+
+        class Paginator(object):
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(k for k in client.objects if k.startswith(Prefix))
+                for start in range(0, len(keys), 1000):
+                    stop = start + 1000
+                    yield {
+                        "Contents": [
+                            {
+                                "Key": key,
+                                "ETag": client.objects[key][0],
+                                "Size": client.objects[key][1],
+                            }
+                            for key in keys[start:stop]
+                        ]
+                    }
+
+        return Paginator()
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Config=None):
+        with open(Filename, "rb") as file_handle:
+            data = file_handle.read()
+        # Multipart uploads send their parts in parallel.
+        connections = 1
+        if len(data) >= Config.multipart_threshold:
+            chunk = Config.multipart_chunksize
+            view = memoryview(data)
+            parts = []
+            for start in range(0, len(data), chunk):
+                stop = start + chunk
+                parts.append(hashlib.md5(view[start:stop]).digest())
+            etag = f'"{hashlib.md5(b"".join(parts)).hexdigest()}-{len(parts)}"'
+            connections = min(len(parts), Config.max_concurrency)
+        else:
+            etag = f'"{hashlib.md5(data).hexdigest()}"'
+        time.sleep(self.latency + len(data) / self.bytes_per_second / connections)
+        with self._lock:
+            self.uploads += 1
+            self.objects[Key] = (etag, len(data))
+
+
+class CountingOpen(object):
+    """Counts the files opened for reading under a directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.reads = 0
+        self._open = builtins.open
+
+    def __call__(self, file, mode="r", *args, **kwargs):
+        if "r" in mode and str(file).startswith(self.directory):
+            self.reads += 1
+        return self._open(file, mode, *args, **kwargs)
+
+
+def write_files(directory: str, rng: random.Random, count: int) -> list:
+    files = []
+    for i in range(count):
+        # One file in fifty is above the multipart threshold.
+        size = (
+            rng.randint(17, 40) * 1024 * 1024
+            if i % 50 == 0
+            else rng.randint(200000, 3000000)
+        )
+        path = os.path.join(directory, f"image_{i}.jpg")
+        with open(path, "wb") as file_handle:
+            file_handle.write(rng.randbytes(size))
+        files.append(path)
+    return files
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)  # nosec B311
+    work_dir = tempfile.mkdtemp()
+    failures = []
+    results = {"files": args.files, "workers": args.workers}
+    try:
+        image_dir = os.path.join(work_dir, "images")
+        os.makedirs(image_dir)
+        paths = write_files(image_dir, rng, args.files)
+        results["bytes"] = sum(os.path.getsize(path) for path in paths)
+        # Half of the files have an OriginalMD5, as the example images do.
+        md5s = {}
+        for path in paths[::2]:
+            with open(path, "rb") as file_handle:
+                md5s[path] = hashlib.md5(file_handle.read()).hexdigest()
+
+        def files():
+            return [
+                s3_sync.SyncFile(
+                    path, PREFIX + os.path.basename(path), "image/jpeg", md5s.get(path)
+                )
+                for path in paths
+            ]
+
+        def run(client, state_path, workers, subset=None):
+            state = s3_sync.SyncState(state_path)
+            counting = CountingOpen(image_dir)
+            builtins.open = counting
+            start = time.perf_counter()
+            try:
+                counts = s3_sync.sync_files(
+                    client, BUCKET, subset or files(), state, workers
+                )
+            finally:
+                builtins.open = counting._open
+                state.close()
+            counts["seconds"] = round(time.perf_counter() - start, 3)
+            counts["files_read"] = counting.reads
+            return counts
+
+        serial_files = files()[: args.serial_files]
+        serial = TransferS3Client(args.latency_ms, args.mbps_per_connection)
+        results["serial"] = run(
+            serial, os.path.join(work_dir, "serial.jsonl"), 1, serial_files
+        )
+        results["serial"]["files_per_second"] = round(
+            len(serial_files) / results["serial"]["seconds"], 1
+        )
+
+        client = TransferS3Client(args.latency_ms, args.mbps_per_connection)
+        state_path = os.path.join(work_dir, "state.jsonl")
+        results["concurrent"] = run(client, state_path, args.workers)
+        results["concurrent"]["files_per_second"] = round(
+            args.files / results["concurrent"]["seconds"], 1
+        )
+        if results["concurrent"]["uploaded"] != args.files:
+            failures.append(f"first sync: {results['concurrent']}")
+
+        results["rerun"] = run(client, state_path, args.workers)
+        if results["rerun"]["uploaded"] or results["rerun"]["files_read"]:
+            failures.append(f"rerun: {results['rerun']}")
+
+        results["no_state"] = run(
+            client, os.path.join(work_dir, "fresh.jsonl"), args.workers
+        )
+        if results["no_state"]["uploaded"] or results["no_state"]["failed"]:
+            failures.append(f"sync without state: {results['no_state']}")
+
+        changed = rng.sample(paths, 2 * args.changed)
+        rewritten, deleted = changed[::2], changed[1::2]
+        for path in rewritten:
+            with open(path, "r+b") as file_handle:
+                file_handle.write(rng.randbytes(64))
+            md5s.pop(path, None)
+        for path in deleted:
+            del client.objects[PREFIX + os.path.basename(path)]
+        results["changed"] = run(client, state_path, args.workers)
+        if results["changed"]["uploaded"] != 2 * args.changed:
+            failures.append(f"sync after changes: {results['changed']}")
+        for path in paths:
+            with open(path, "rb") as file_handle:
+                data = file_handle.read()
+            etag, size = client.objects[PREFIX + os.path.basename(path)]
+            if size != len(data) or etag != s3_sync.local_etag(path):
+                failures.append(f"{path}: object {etag} differs from the file")
+    finally:
+        shutil.rmtree(work_dir)
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--serial-files", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--mbps-per-connection", type=float, default=200)
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
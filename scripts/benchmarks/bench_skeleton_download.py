@@ -0,0 +1,236 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks and measures cdk.libs.utils.download_crowd_2d_skeleton on a local server.
+
+    A local HTTP server stands in for the GitHub API: it serves releases of
+    the component, with ETags, answers 304 to a matching If-None-Match and
+    answers every request after --latency-ms. The script runs:
+
+    * cold: with an empty cache, which must look up the release and
+      download its asset, as every synth did before
+    * warm: within the max age of the latest release, which must send no
+      request
+    * revalidate: after the max age, which must only get a 304
+    * new_release: after a release, which must download the new asset
+    * pinned: with a release tag, which must only look the release up,
+      its asset being cached, and then send no request
+    * offline: which must use the cached asset, and fail without one
+    * slow: with a server slower than the read timeout, which must use the
+      cached asset once the timeout expires
+    * corrupted: after the cached asset was altered, which must download
+      it again
+    * integrity: with a release whose asset does not match its digest, or
+      with a wrong expected SHA-256, which must fail
+
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_skeleton_download.py --kb 800 --latency-ms 300
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from synthetic import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+from cdk.libs import utils  # noqa: E402
+
+
+class ReleaseServer(object):
+    """A local stand-in for the releases of a repository on the GitHub API."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.releases = {}
+        self.latest = None
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/repo"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def publish(self, tag: str, content: bytes, digest: str = None) -> str:
+        """Publishes a release, returning the SHA-256 of its asset."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        asset = {
+            "name": utils.ASSET_NAME,
+            "size": len(content),
+            "digest": f"sha256:{digest or sha256}",
+            "updated_at": f"2026-10-{len(self.releases) + 1:02d}T00:00:00Z",
+            "browser_download_url": f"{self.url}/download/{tag}/{utils.ASSET_NAME}",
+        }
+        body = json.dumps({"tag_name": tag, "assets": [asset]}).encode("utf-8")
+        self.releases[tag] = (body, content)
+        self.latest = tag
+        return sha256
+
+    def handle(self, handler: BaseHTTPRequestHandler) -> None:
+        prefix = len("/repo")
+        path = handler.path[prefix:]
+        with self._lock:
+            self.requests.append(path)
+        time.sleep(self.latency)
+        etag = None
+        if path == "/releases/latest":
+            tag = self.latest
+        else:
+            tag = path.split("/")[-2 if path.startswith("/download/") else -1]
+        if tag not in self.releases:
+            body, status = b"", 404
+        elif path.startswith("/download/"):
+            body, status = self.releases[tag][1], 200
+        else:
+            body = self.releases[tag][0]
+            etag = f'"{hashlib.md5(body).hexdigest()}"'  # nosec B324
+            status = 304 if handler.headers.get("If-None-Match") == etag else 200
+        if status == 304:
+            body = b""
+        handler.send_response(status)
+        if etag:
+            handler.send_header("ETag", etag)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+        handler.wfile.flush()
+
+
+def make_bundle(rng: random.Random, kilobytes: int) -> bytes:
+    lines = [f"const keypoint{i} = {rng.random()};" for i in range(kilobytes * 40)]
+    return "\n".join(lines).encode("utf-8")
+
+
+def main(args: argparse.Namespace) -> int:
+    rng = random.Random(args.seed)  # nosec B311
+    failures = []
+    results = {}
+    work_dir = tempfile.mkdtemp()
+    try:
+        cache_dir = os.path.join(work_dir, "cache")
+        local_file_path = os.path.join(work_dir, utils.ASSET_NAME)
+        with ReleaseServer(args.latency_ms) as server:
+            v1 = server.publish("v1.0.0", make_bundle(rng, args.kb))
+
+            def run(name, expected=None, **kwargs):
+                """Runs a download, checking the requests sent and the asset written."""
+                expected_requests = kwargs.pop("requests", None)
+                options = {
+                    "version": "latest",
+                    "expected_sha256": "",
+                    "offline": False,
+                    "cache_dir": cache_dir,
+                    "local_file_path": local_file_path,
+                    "max_age_seconds": 3600,
+                    "api_url": server.url,
+                    "timeout": (1, args.timeout),
+                }
+                options.update(kwargs)
+                server.requests.clear()
+                start = time.perf_counter()
+                try:
+                    with redirect_stdout(io.StringIO()):
+                        sha256 = utils.download_crowd_2d_skeleton(**options)
+                except RuntimeError as e:
+                    sha256 = None
+                    error = str(e)
+                else:
+                    error = None
+                seconds = time.perf_counter() - start
+                results[name] = {
+                    "requests": len(server.requests),
+                    "ms": round(seconds * 1000, 1),
+                }
+                if expected_requests is not None and (
+                    len(server.requests) != expected_requests
+                ):
+                    failures.append(f"{name}: sent {server.requests}")
+                if expected is None:
+                    if error is None:
+                        failures.append(f"{name}: did not fail")
+                elif sha256 != expected:
+                    failures.append(f"{name}: got {sha256}, {error}")
+                elif utils.file_sha256(local_file_path) != expected:
+                    failures.append(f"{name}: wrote another asset")
+                return seconds
+
+            run("cold", v1, requests=2)
+            run("warm", v1, requests=0)
+            run("revalidate", v1, max_age_seconds=0, requests=1)
+            v2 = server.publish("v2.0.0", make_bundle(rng, args.kb))
+            run("new_release", v2, max_age_seconds=0, requests=2)
+            run("pinned", v1, version="v1.0.0", requests=1)
+            run("pinned_cached", v1, version="v1.0.0", requests=0)
+
+            run("offline", v1, version="v1.0.0", offline=True, requests=0)
+            run("offline_uncached", None, version="v3.0.0", offline=True, requests=0)
+
+            server.latency = args.timeout * 2
+            slow = run("slow", v2, max_age_seconds=0, requests=1)
+            if slow > args.timeout + 1:
+                failures.append(f"slow: took {slow:.1f}s")
+            server.latency = args.latency_ms / 1000
+
+            blob = os.path.join(cache_dir, "blobs", f"{v2}.js")
+            with open(blob, "ab") as file_handle:
+                file_handle.write(b"\nalert(1);\n")
+            run("corrupted", v2, requests=2, max_age_seconds=0)
+
+            v4 = server.publish("v4.0.0", make_bundle(rng, args.kb), digest="0" * 64)
+            run("bad_digest", None, version="v4.0.0")
+            if os.path.exists(os.path.join(cache_dir, "blobs", f"{v4}.js")):
+                failures.append("bad_digest: cached the asset")
+            run("wrong_sha256", None, version="v2.0.0", expected_sha256="0" * 64)
+    finally:
+        shutil.rmtree(work_dir)
+
+    results["speedup_warm"] = round(results["cold"]["ms"] / results["warm"]["ms"])
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--kb", type=int, default=800)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--timeout", type=float, default=2, help="Read timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
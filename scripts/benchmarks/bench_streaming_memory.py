@@ -0,0 +1,145 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Measures peak memory of the post-annotation consolidation as payloads grow.
+
+    Every (mode, payload size) pair runs in a fresh subprocess so that the
+    reported peak RSS is not polluted by earlier runs. Modes:
+
+    * buffered: do_consolidation with the payload read and parsed in full.
+    * streaming: do_consolidation with the payload parsed incrementally and
+      no output location. The returned list holds every consolidated label,
+      so memory grows with the output, which is about the size of the
+      payload.
+    * spilled: do_consolidation as lambda_handler runs it, streaming and
+      with the labeling job's output location. Once the response would
+      cross the spill threshold, labels are written to S3 and the response
+      holds small summaries, so memory stays flat as the payload grows.
+    * parse: json_stream.iter_json_array alone, as do_consolidation uses it
+      to read the payload, with each data object dropped once parsed.
+
+    The peak RSS above the baseline of each --bounded-modes mode may grow by
+    at most --max-growth-mb from the smallest payload to the largest; the
+    script exits with an error otherwise.
+
+Example
+    python scripts/benchmarks/bench_streaming_memory.py --sizes-mb 20 60
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess  # nosec B404
+import sys
+import tempfile
+import time
+
+from synthetic import add_lambda_paths, write_payload
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+OUTPUT_URI = "s3://example-bucket/labeling_jobs/output/example"
+MODES = ["buffered", "streaming", "spilled", "parse"]
+
+
+def run_child(mode: str, payload_path: str) -> dict:
+    """Runs a single measurement inside the current (fresh) process."""
+    add_lambda_paths()
+    from json_stream import iter_json_array
+    from lambda_function import do_consolidation
+    from synthetic import LocalFileS3Client
+
+    s3_client = LocalFileS3Client({PAYLOAD_URI: payload_path})
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "parse":
+        objects = 0
+        with s3_client.get_object_stream_from_s3(PAYLOAD_URI) as stream:
+            for _ in iter_json_array(stream):
+                objects += 1
+    else:
+        # Keep the consolidation logs out of the measurement output.
+        with open(os.devnull, "w") as sink:
+            stdout, sys.stdout = sys.stdout, sink
+            try:
+                output = do_consolidation(
+                    "arn",
+                    {"s3Uri": PAYLOAD_URI},
+                    "label-results",
+                    s3_client,
+                    streaming=mode != "buffered",
+                    output_s3_uri=OUTPUT_URI if mode == "spilled" else None,
+                )
+            finally:
+                sys.stdout = stdout
+        objects = len(output)
+    return {
+        "mode": mode,
+        "objects": objects,
+        "seconds": round(time.perf_counter() - start, 3),
+        "baseline_rss_mb": round(baseline_kb / 1024, 1),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    sizes_mb = sorted(args.sizes_mb)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size_mb in sizes_mb:
+            payload_path = os.path.join(tmp_dir, f"payload_{size_mb}.json")
+            write_payload(payload_path, size_mb * 1024 * 1024)
+            payload_mb = round(os.path.getsize(payload_path) / 1024 / 1024, 1)
+            for mode in args.modes:
+                completed = subprocess.run(  # nosec B603
+                    [sys.executable, __file__, "--child", mode, payload_path],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                result = json.loads(completed.stdout)
+                result["payload_mb"] = payload_mb
+                results.append(result)
+                print(json.dumps(result))
+            os.remove(payload_path)
+
+    failures = []
+    for mode in args.bounded_modes:
+        growth = [
+            r["peak_rss_mb"] - r["baseline_rss_mb"]
+            for r in results
+            if r["mode"] == mode
+        ]
+        if len(growth) > 1 and growth[-1] - growth[0] > args.max_growth_mb:
+            failures.append(
+                f"{mode}: peak RSS grew by {growth[-1] - growth[0]:.1f} MB from "
+                f"{sizes_mb[0]} to {sizes_mb[-1]} MB payloads"
+            )
+    summary = {"failures": failures, "consistent": not failures}
+    print(json.dumps(summary))
+
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump({"runs": results, **summary}, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[20, 60])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument(
+        "--bounded-modes",
+        nargs="*",
+        default=["spilled", "parse"],
+        choices=MODES,
+        help="Modes whose peak memory must not grow with the payload",
+    )
+    parser.add_argument("--max-growth-mb", type=float, default=16)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+    else:
+        sys.exit(main(args))
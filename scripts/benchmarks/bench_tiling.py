@@ -0,0 +1,339 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Checks that tiled images stitch back together and measures the tasks.
+
+    A synthetic crowd of --people skeletons is placed on a --width x
+    --height image, which is split into tiles both on an even grid and
+    around the crowd. For each plan:
+
+    * every tile is passed through the pre-annotation lambda, reporting the
+      initial_values bytes and crop pixels of the largest task against
+      those of the whole image;
+    * a simulated worker moves every keypoint it is shown by up to
+      --jitter pixels and adds the people of a hidden set whose keypoints
+      fall in its region, then the post-annotation lambda consolidates
+      every tile;
+    * the labels of all tiles, stitched together, must hold every existing
+      person exactly once, at their original coordinates give or take the
+      jitter, and every added person exactly once. Added people are matched
+      to the hidden set by id. An added person whose centre lies within
+      --jitter of the edge between two cores is drawn on either side of it
+      by the workers of the two tiles, which cannot agree on its owner; such
+      people are reported as added_at_cut rather than checked.
+
+    With Pillow installed, crops written by create_example_labeling_job are
+    also checked to show marked keypoints where their transform maps them.
+    The script exits with an error when a check fails.
+
+Example
+    python scripts/benchmarks/bench_tiling.py --people 600 --tile-size 2048
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from bench_image_derivatives import load_lambda, marker_found
+from synthetic import (
+    LAMBDA_LAYER_DIR,
+    POST_ANNOTATION_LAMBDA_DIR,
+    PRE_ANNOTATION_LAMBDA_DIR,
+    REPO_ROOT,
+)
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "scripts"))
+from create_example_labeling_job import make_tiles  # noqa: E402
+
+JOB_ARN = "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example"
+
+
+def make_person(rng: random.Random, skeleton_id: str, width: int, height: int):
+    """Returns a skeleton of about 120 x 320 pixels at a random position."""
+    from skeletons import KEYPOINT_LABELS, Skeleton
+
+    x = rng.uniform(60, width - 60)
+    y = rng.uniform(160, height - 160)
+    return Skeleton.from_points(
+        skeleton_id,
+        [
+            (x + rng.uniform(-60, 60), y + 320 * (i / len(KEYPOINT_LABELS) - 0.5))
+            for i in range(len(KEYPOINT_LABELS))
+        ],
+    )
+
+
+def run_quiet(function, *args):
+    with open(os.devnull, "w") as sink:
+        stdout, sys.stdout = sys.stdout, sink
+        try:
+            return function(*args)
+        finally:
+            sys.stdout = stdout
+
+
+def stitch(args, pre_lambda, post_lambda, tiles, people, hidden, seed):
+    """Labels every tile with a simulated worker and stitches the labels."""
+    from skeletons import format_skeletons, parse_skeletons
+
+    rng = random.Random(seed)  # nosec B311
+    image_size = {"width": args.width, "height": args.height}
+    manifest_annotations = format_skeletons(people)
+    stats = {"tiles": len(tiles), "max_initial_values_bytes": 0, "max_crop_pixels": 0}
+    stitched = []
+    for tile in tiles:
+        manifest_item = {
+            "source-ref": "s3://example-bucket/images/crowd.jpg",
+            "annotations": manifest_annotations,
+            "image_size": image_size,
+            "tile": dict(
+                tile.to_dict(),
+                **{"source-ref": f"s3://example-bucket/tiles/crowd_{tile.index}.jpg"},
+                rotation=0,
+                scale=1.0,
+            ),
+        }
+        task_input = run_quiet(
+            pre_lambda.lambda_handler, {"dataObject": manifest_item}, None
+        )["taskInput"]
+        stats["max_initial_values_bytes"] = max(
+            stats["max_initial_values_bytes"], len(task_input["initial_values"])
+        )
+        stats["max_crop_pixels"] = max(
+            stats["max_crop_pixels"], tile.region[2] * tile.region[3]
+        )
+
+        # The worker edits what they are shown and adds the hidden people in
+        # their region, in the coordinates of the crop.
+        shown, _ = parse_skeletons(json.loads(task_input["initial_values"]))
+        for skeleton in shown:
+            for i in skeleton.placed():
+                skeleton.xs[i] += rng.uniform(-args.jitter, args.jitter)
+                skeleton.ys[i] += rng.uniform(-args.jitter, args.jitter)
+        x, y = tile.region[0], tile.region[1]
+        for person in tile.visible(hidden):
+            added = [None if p is None else (p[0] - x, p[1] - y) for p in person.points]
+            skeleton = type(person).from_points(f"tile-{tile.index}-{person.id}", added)
+            for i in skeleton.placed():
+                skeleton.xs[i] += rng.uniform(-args.jitter, args.jitter)
+                skeleton.ys[i] += rng.uniform(-args.jitter, args.jitter)
+            shown.append(skeleton)
+
+        content = {
+            "image_name": task_input["image_s3_uri"].split("/")[-1],
+            "image_s3_uri": task_input["image_s3_uri"],
+            "original_annotations": task_input["initial_values"],
+            "updated_annotations": format_skeletons(shown),
+            "no_changes_needed": "false",
+            "image_transform": task_input["image_transform"],
+            "tile": task_input["tile"],
+        }
+        response = post_lambda.consolidate_data_object(
+            JOB_ARN,
+            {
+                "datasetObjectId": str(tile.index),
+                "dataObject": {"s3Uri": manifest_item["source-ref"]},
+                "annotations": [
+                    {
+                        "workerId": "worker-0",
+                        "annotationData": {"content": json.dumps(content)},
+                    }
+                ],
+            },
+            "label-results",
+        )
+        label = response["consolidatedAnnotation"]["content"]["label-results"]
+        stitched.extend(parse_skeletons(label["updated_annotations"])[0])
+    return stats, stitched
+
+
+def near_cut(person, tiles, distance: float) -> bool:
+    """Returns True when the centre of person is within distance of a core edge."""
+    bounds = person.bounds()
+    x, y = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+    return any(
+        edge is not None and abs(edge - value) <= distance
+        for tile in tiles
+        for edge, value in zip(tile.core, (x, y, x, y))
+    )
+
+
+def check_stitched(args, people, hidden, tiles, stitched, failures, name):
+    """Checks the stitched skeletons against the people on the image."""
+    # initial_values are rounded to two decimals.
+    tolerance = args.jitter + 0.01
+    by_id = {}
+    for skeleton in stitched:
+        by_id.setdefault(skeleton.id, []).append(skeleton)
+    for person in people:
+        found = by_id.get(person.id, [])
+        if len(found) != 1:
+            failures.append(f"{name}: {person.id} stitched {len(found)} times")
+            continue
+        for p, q in zip(person.points, found[0].points):
+            if abs(p[0] - q[0]) > tolerance or abs(p[1] - q[1]) > tolerance:
+                failures.append(f"{name}: {person.id} moved from {p} to {q}")
+                break
+
+    # Added people carry the id of the hidden person they stand for.
+    added = [s for s in stitched if s.id.startswith("tile-")]
+    counts = {person.id: 0 for person in hidden}
+    for skeleton in added:
+        person_id = skeleton.id.split("-", 2)[2]
+        counts[person_id] += 1
+    at_cut = {p.id for p in hidden if near_cut(p, tiles, args.jitter)}
+    stats = {
+        "added": len(hidden),
+        "added_at_cut": len(at_cut),
+        "added_duplicated": 0,
+        "added_missing": 0,
+    }
+    for person_id, count in counts.items():
+        if count == 1 or person_id in at_cut:
+            continue
+        stats["added_duplicated" if count > 1 else "added_missing"] += 1
+        failures.append(f"{name}: added {person_id} stitched {count} times")
+    return stats
+
+
+def check_crops(failures) -> int:
+    """Checks tile crops written by make_tiles against marked keypoints."""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return 0
+    from skeletons import Skeleton, format_skeletons
+    from tiles import Tile
+
+    work_dir = tempfile.mkdtemp()
+    rng = random.Random(1)  # nosec B311
+    checked = 0
+    try:
+        width, height = 3000, 2000
+        image = Image.new("RGB", (width, height), (30, 60, 30))
+        draw = ImageDraw.Draw(image)
+        points = [
+            (rng.uniform(30, width - 30), rng.uniform(30, height - 30))
+            for _ in range(40)
+        ]
+        for x, y in points:
+            draw.ellipse((x - 12, y - 12, x + 12, y + 12), fill=(255, 0, 255))
+        path = os.path.join(work_dir, "crowd.jpg")
+        image.save(path, "JPEG", quality=95)
+        annotations = format_skeletons(
+            [Skeleton.from_points(f"p{i}", [p]) for i, p in enumerate(points)]
+        )
+        for rotation in (0, 90):
+            tile_dir = os.path.join(work_dir, str(rotation))
+            os.makedirs(tile_dir)
+            result = make_tiles(path, tile_dir, 1024, 128, rotation, annotations)
+            for entry in result["tiles"]:
+                tile = Tile.from_dict(entry["tile"])
+                transform = tile.transform(result["image_size"], rotation)
+                markers = tile.visible([Skeleton.from_points("m", [p]) for p in points])
+                transform.to_derivative(markers)
+                with Image.open(entry["path"]) as crop:
+                    crop = crop.convert("RGB")
+                    if crop.size != transform.derivative_size():
+                        failures.append(f"crop {entry['path']}: size {crop.size}")
+                        continue
+                    for marker in markers:
+                        x, y = marker.points[0]
+                        # Markers cut by the crop's edge are not checked.
+                        if 12 <= x <= crop.width - 12 and 12 <= y <= crop.height - 12:
+                            checked += 1
+                            if not marker_found(crop, x, y):
+                                failures.append(f"crop {entry['path']}: {x}, {y}")
+    finally:
+        shutil.rmtree(work_dir)
+    return checked
+
+
+def main(args: argparse.Namespace) -> int:
+    sys.path.insert(0, LAMBDA_LAYER_DIR)
+    from skeletons import format_skeletons
+    from tiles import plan_tiles
+
+    pre_lambda = load_lambda("pre_lambda_function", PRE_ANNOTATION_LAMBDA_DIR)
+    post_lambda = load_lambda("post_lambda_function", POST_ANNOTATION_LAMBDA_DIR)
+
+    rng = random.Random(args.seed)  # nosec B311
+    people = [
+        make_person(rng, f"person-{i}", args.width, args.height)
+        for i in range(args.people)
+    ]
+    hidden = [
+        make_person(rng, f"hidden-{i}", args.width, args.height)
+        for i in range(args.hidden)
+    ]
+    whole = run_quiet(
+        pre_lambda.lambda_handler,
+        {
+            "dataObject": {
+                "source-ref": "s3://example-bucket/images/crowd.jpg",
+                "annotations": format_skeletons(people),
+                "image_size": {"width": args.width, "height": args.height},
+            }
+        },
+        None,
+    )["taskInput"]
+    results = {
+        "image_size": [args.width, args.height],
+        "people": args.people,
+        "whole_image": {
+            "initial_values_bytes": len(whole["initial_values"]),
+            "pixels": args.width * args.height,
+        },
+    }
+
+    failures = []
+    for name, skeletons in (("grid", ()), ("annotations", people)):
+        tiles = plan_tiles(
+            (args.width, args.height), args.tile_size, args.overlap, skeletons
+        )
+        # People not whole in any region are cut in every tile showing them.
+        cut = sum(
+            1
+            for person in people
+            if not any(
+                t.region[0] <= b[0]
+                and t.region[1] <= b[1]
+                and b[2] <= t.region[0] + t.region[2]
+                and b[3] <= t.region[1] + t.region[3]
+                for t in tiles
+                for b in [person.bounds()]
+            )
+        )
+        stats, stitched = stitch(
+            args, pre_lambda, post_lambda, tiles, people, hidden, args.seed
+        )
+        stats["people_cut"] = cut
+        stats.update(
+            check_stitched(args, people, hidden, tiles, stitched, failures, name)
+        )
+        results[name] = stats
+    results["crop_markers_checked"] = check_crops(failures)
+
+    results["failures"] = failures[:10]
+    results["consistent"] = not failures
+    print(json.dumps(results))
+    if args.output:
+        with open(args.output, "w") as file_handle:
+            json.dump(results, file_handle, indent=2)
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--width", type=int, default=8000)
+    parser.add_argument("--height", type=int, default=6000)
+    parser.add_argument("--people", type=int, default=600)
+    parser.add_argument("--hidden", type=int, default=200)
+    parser.add_argument("--tile-size", type=int, default=2048)
+    parser.add_argument("--overlap", type=int, default=256)
+    parser.add_argument("--jitter", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,252 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Synthetic consolidation payloads and local S3 stand-ins for benchmarks.
+
+    The generated payloads follow the format Ground Truth passes to the
+    post-annotation lambda (see cdk/post_annotation_lambda/lambda_function.py)
+    with the worker annotation content produced by the crowd_2d_skeleton
+    template.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+POST_ANNOTATION_LAMBDA_DIR = os.path.join(REPO_ROOT, "cdk", "post_annotation_lambda")
+PRE_ANNOTATION_LAMBDA_DIR = os.path.join(REPO_ROOT, "cdk", "pre_annotation_lambda")
+LAMBDA_LAYER_DIR = os.path.join(REPO_ROOT, "cdk", "lambda_layer", "python")
+
+KEYPOINT_LABELS = [
+    "top_of_head",
+    "front_of_face",
+    "right_shoulder",
+    "right_elbow",
+    "right_wrist",
+    "left_shoulder",
+    "left_elbow",
+    "left_wrist",
+    "left_hip",
+    "left_knee",
+    "left_ankle",
+    "left_heel",
+    "left_toe",
+    "right_hip",
+    "right_knee",
+    "right_ankle",
+    "right_heel",
+    "right_toe",
+]
+
+
+def add_lambda_paths(lambda_dir: str = POST_ANNOTATION_LAMBDA_DIR) -> None:
+    """Makes a lambda's modules importable the same way the runtime does.
+
+    Both lambdas have a lambda_function module, so only one lambda can be
+    imported per process.
+    """
+    for path in (LAMBDA_LAYER_DIR, lambda_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+def make_skeletons(
+    rng: random.Random, skeletons_per_image: int, keypoints_per_skeleton: int
+) -> list:
+    """Creates skeleton instances with randomly placed keypoints."""
+    skeletons = []
+    for s in range(skeletons_per_image):
+        center_x = rng.uniform(0, 4000)
+        center_y = rng.uniform(0, 3000)
+        skeletons.append(
+            {
+                "id": f"skeleton-{s}",
+                "keypoints": [
+                    {
+                        "label": KEYPOINT_LABELS[k % len(KEYPOINT_LABELS)],
+                        "x": round(center_x + rng.uniform(-150, 150), 2),
+                        "y": round(center_y + rng.uniform(-300, 300), 2),
+                    }
+                    for k in range(keypoints_per_skeleton)
+                ],
+            }
+        )
+    return skeletons
+
+
+def make_data_object(
+    rng: random.Random,
+    index: int,
+    skeletons_per_image: int = 20,
+    keypoints_per_skeleton: int = 18,
+    workers_per_object: int = 1,
+) -> dict:
+    """Creates a single consolidation payload data object."""
+    image_s3_uri = f"s3://example-bucket/labeling_jobs/images/image_{index}.jpg"
+    original = make_skeletons(rng, skeletons_per_image, keypoints_per_skeleton)
+    annotations = []
+    for w in range(workers_per_object):
+        updated = json.loads(json.dumps(original))
+        for skeleton in updated:
+            for keypoint in skeleton["keypoints"]:
+                keypoint["x"] = round(keypoint["x"] + rng.gauss(0, 2), 2)
+                keypoint["y"] = round(keypoint["y"] + rng.gauss(0, 2), 2)
+        content = {
+            "image_name": f"image_{index}.jpg?X-Amz-Signature=abc",
+            "image_s3_uri": f"{image_s3_uri}?X-Amz-Signature=abc",
+            "original_annotations": json.dumps(original),
+            "updated_annotations": updated,
+            "no_changes_needed": "false",
+            "total_time_in_seconds": round(rng.uniform(10, 600), 1),
+        }
+        annotations.append(
+            {
+                "workerId": f"worker-{w}",
+                "annotationData": {"content": json.dumps(content)},
+            }
+        )
+    return {
+        "datasetObjectId": str(index),
+        "dataObject": {"s3Uri": image_s3_uri},
+        "annotations": annotations,
+    }
+
+
+def write_payload(path: str, target_bytes: int, seed: int = 0, **object_kwargs) -> int:
+    """Writes a payload JSON array of roughly target_bytes to path.
+
+        Data objects are generated and written one at a time so that payloads
+        far larger than the generating process' memory can be produced.
+
+    Returns:
+        The number of data objects written.
+    """
+    rng = random.Random(seed)
+    written = 0
+    count = 0
+    with open(path, "w") as file_handle:
+        file_handle.write("[")
+        while written < target_bytes:
+            if count:
+                file_handle.write(",")
+            text = json.dumps(make_data_object(rng, count, **object_kwargs))
+            file_handle.write(text)
+            written += len(text) + 1
+            count += 1
+        file_handle.write("]")
+    return count
+
+
+def make_payload(objects: int, seed: int = 0, **object_kwargs) -> bytes:
+    """Returns an encoded payload JSON array of objects data objects."""
+    rng = random.Random(seed)
+    return json.dumps(
+        [make_data_object(rng, i, **object_kwargs) for i in range(objects)]
+    ).encode("utf-8")
+
+
+class LocalFileS3Client(object):
+    """S3Client stand-in which serves objects from local files.
+
+        Written objects are counted and dropped, as S3 would not keep them
+        in the lambda's memory.
+
+    Args:
+        objects: mapping of s3 URI to local file path.
+    """
+
+    def __init__(self, objects: dict):
+        self.objects = objects
+        self.kms_key_id = None
+        self.put_bytes = 0
+
+    def put_object_to_s3(self, data, bucket, key, content_type, tagging=None):
+        self.put_bytes += len(data)
+        return "s3://" + bucket + "/" + key
+
+    def get_object_from_s3(self, s3_url):
+        with open(self.objects[s3_url], "rb") as file_handle:
+            return file_handle.read().decode("utf-8")
+
+    def get_object_stream_from_s3(self, s3_url):
+        return open(self.objects[s3_url], "rb")
+
+
+class InMemoryS3Client(object):
+    """S3Client stand-in holding objects in memory.
+
+        Implements the interface of the lambdas' S3Client, so it can be
+        passed to do_consolidation or returned in place of S3Client from
+        lambda_handler. Calls are counted per operation.
+
+    Args:
+        objects: optional mapping of s3 URI to str or bytes content.
+    """
+
+    def __init__(self, objects: dict = None, role_arn=None, kms_key_id=None):
+        self.objects = {}
+        for s3_url, data in (objects or {}).items():
+            self.objects[s3_url] = (
+                data.encode("utf-8") if isinstance(data, str) else data
+            )
+        self.role_arn = role_arn
+        self.kms_key_id = kms_key_id
+        self.tags = {}
+        self.calls = {}
+
+    def _count(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def refresh_credentials(self):
+        self._count("refresh_credentials")
+
+    def put_object_to_s3(self, data, bucket, key, content_type, tagging=None):
+        self._count("put_object_to_s3")
+        s3_url = "s3://" + bucket + "/" + key
+        self.objects[s3_url] = data.encode("utf-8") if isinstance(data, str) else data
+        self.tags[s3_url] = tagging
+        return s3_url
+
+    def get_object_etag_from_s3(self, s3_url):
+        self._count("get_object_etag_from_s3")
+        data = self.objects.get(s3_url)
+        return (
+            None if data is None else '"{}"'.format(hashlib.md5(data).hexdigest())
+        )  # nosec B324
+
+    def get_object_from_s3(self, s3_url):
+        self._count("get_object_from_s3")
+        data = self.objects.get(s3_url)
+        return None if data is None else data.decode("utf-8")
+
+    def get_object_stream_from_s3(self, s3_url):
+        self._count("get_object_stream_from_s3")
+        data = self.objects.get(s3_url)
+        return None if data is None else io.BytesIO(data)
+
+    @staticmethod
+    def bucket_key_from_s3_uri(s3_path):
+        bucket, _, key = s3_path.replace("s3://", "").partition("/")
+        return bucket, key
+
+
+class FakeSTSClient(object):
+    """STS stand-in returning credentials valid for ttl."""
+
+    def __init__(self, ttl: timedelta = timedelta(hours=1)):
+        self.ttl = ttl
+        self.assume_role_calls = 0
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        self.assume_role_calls += 1
+        return {
+            "Credentials": {
+                "AccessKeyId": "ASIAEXAMPLE",
+                "SecretAccessKey": "secret",
+                "SessionToken": "token",
+                "Expiration": datetime.now(timezone.utc) + self.ttl,
+            }
+        }
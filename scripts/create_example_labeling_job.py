@@ -7,19 +7,76 @@
     download_example_images.py. This script requires the labeling workforce arn
     to be passed in.
 
+    Unless --no-derivatives is passed, web derivatives of every image are
+    created first: upright JPEGs, with the EXIF orientation and the Rotation
+    of scripts/image_details.csv applied, whose longest side is capped at
+    each of --derivative-sizes. They are created in a process pool, skipped
+    when newer than their original, uploaded next to the originals and
+    listed in the manifest so the pre-annotation lambda can serve them (see
+    cdk/lambda_layer/python/image_transforms.py). Creating them requires
+    Pillow.
+
+    With --tile-size, images larger than it are split into overlapping
+    regions labeled as separate tasks, and their labels stitched back
+    together by the post-annotation lambda (see
+    cdk/lambda_layer/python/tiles.py). Regions follow an even grid, or,
+    for images with annotations in the --annotations manifest, are cut
+    between the annotated people and grown to hold them whole. Crops of the
+    regions are uploaded next to the originals and listed in the manifest in
+    place of the whole image.
+
+    Images, derivatives and tiles are then synced to the bucket by
+    scripts/s3_sync.py: uploaded concurrently (see --upload-workers), and
+    skipped when their object already matches, so re-runs only upload what
+    changed. The sync state is kept in scripts/images/.s3_sync_state.jsonl.
+
 Example arguments
     python create_example_labeling_job.py \
         "arn:aws:sagemaker:us-west-2:<account #>:workteam/private-crowd/Crowd-2D-Component-Example" \
 
 """
 import argparse
+import csv
 import json
+import mimetypes
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Sequence
 
 import boto3
 from botocore.exceptions import ClientError
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cdk", "lambda_layer", "python"))
+
+from job_shards import (  # noqa: E402
+    DEFAULT_MAX_CONCURRENT_JOBS,
+    new_batch,
+    save_batch,
+    schedule,
+)
+from manifest_writer import ShardedManifestWriter  # noqa: E402
+from s3_sync import (  # noqa: E402
+    DEFAULT_WORKERS,
+    SyncFile,
+    SyncState,
+    make_s3_client,
+    md5_from_base64,
+    sync_files,
+)
+from skeletons import parse_skeletons  # noqa: E402
+from tiles import plan_tiles  # noqa: E402
+
+DERIVATIVE_SIZES = (1024, 2048)
+DERIVATIVE_QUALITY = 85
+TILE_OVERLAP = 256
+SYNC_STATE_FILE = ".s3_sync_state.jsonl"
+BATCH_DIR = "scripts/labeling_jobs"
+# EXIF orientations which swap the width and height of the stored image.
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
 
 def read_ssm_parameter(parameter_name: str) -> str:
     """
@@ -46,13 +103,326 @@ def read_ssm_parameter(parameter_name: str) -> str:
         raise ClientError(f"Failed to retrieve the SSM parameter: {str(e)}")
 
 
-def main(workteam_arn: str) -> None:
+def read_rotations(csv_file: str) -> Dict[str, int]:
+    """Reads the Rotation of each image in an image details CSV.
+
+    Args:
+        csv_file: CSV with OriginalURL, Thumbnail300KURL and Rotation
+            columns, see scripts/image_details.csv
+
+    Returns:
+        counter-clockwise rotation in degrees keyed by image file name, of
+        both the original and the thumbnail downloaded with
+        download_example_images.py --thumbnails
+    """
+    rotations = {}
+    if not os.path.exists(csv_file):
+        return rotations
+    with open(csv_file, "r") as file_handle:
+        for row in csv.DictReader(file_handle):
+            rotation = int(float(row.get("Rotation") or 0)) % 360
+            if rotation % 90:
+                print(f"Ignoring rotation {rotation} of {row['OriginalURL']}")
+                continue
+            rotations[row["OriginalURL"].split("/")[-1]] = rotation
+            if row.get("Thumbnail300KURL"):
+                rotations[row["Thumbnail300KURL"].split("/")[-1]] = rotation
+    return rotations
+
+
+def read_original_md5s(csv_file: str) -> Dict[str, str]:
+    """Reads the OriginalMD5 of each image in an image details CSV.
+
+    Returns:
+        hex MD5 keyed by image file name. Thumbnails have no MD5 in the CSV
+        and are left out, so their MD5 is computed from the file.
+    """
+    md5s = {}
+    if not os.path.exists(csv_file):
+        return md5s
+    with open(csv_file, "r") as file_handle:
+        for row in csv.DictReader(file_handle):
+            md5 = md5_from_base64(row.get("OriginalMD5") or "")
+            if md5:
+                md5s[row["OriginalURL"].split("/")[-1]] = md5
+    return md5s
+
+
+def make_derivatives(
+    img_path: str,
+    derivative_dir: str,
+    sizes: Sequence[int],
+    rotation: int = 0,
+    quality: int = DERIVATIVE_QUALITY,
+) -> dict:
+    """Creates the web derivatives of an image.
+
+    A derivative is created for every size smaller than the longest side of
+    the upright image. Images which need turning upright but are smaller
+    than every size get one derivative at their own size.
+
+    Args:
+        img_path: path of the original image
+        derivative_dir: directory the derivatives are written to
+        sizes: longest side in pixels of each derivative
+        rotation: counter-clockwise rotation in degrees which makes the
+            image upright once its EXIF orientation is applied
+        quality: JPEG quality of the derivatives
+
+    Returns:
+        {"image_size": {"width", "height"}, "derivatives": [{"path",
+        "rotation", "scale"}]} with the size of the original as displayed
+    """
+    from PIL import Image, ImageOps
+
+    rotations = {
+        90: Image.Transpose.ROTATE_90,
+        180: Image.Transpose.ROTATE_180,
+        270: Image.Transpose.ROTATE_270,
+    }
+    stem = os.path.splitext(os.path.basename(img_path))[0]
+    with Image.open(img_path) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        width, height = image.size
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        upright = (height, width) if rotation in (90, 270) else (width, height)
+        longest = max(upright)
+        levels = sorted((size for size in sizes if size < longest), reverse=True)
+        if not levels and (rotation or orientation != 1):
+            levels = [longest]
+
+        derivatives = []
+        source = None
+        for level in levels:
+            scale = level / longest
+            path = os.path.join(derivative_dir, f"{stem}_{level}.jpg")
+            derivatives.append({"path": path, "rotation": rotation, "scale": scale})
+            if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(
+                img_path
+            ):
+                continue
+            if source is None:
+                # Decodes JPEGs at a reduced scale when that still covers the
+                # largest derivative, which is much faster than a full decode.
+                stored = image.size
+                image.draft(
+                    "RGB", (int(stored[0] * scale) + 1, int(stored[1] * scale) + 1)
+                )
+                source = ImageOps.exif_transpose(image)
+                if rotation:
+                    source = source.transpose(rotations[rotation])
+                if source.mode != "RGB":
+                    source = source.convert("RGB")
+            size = (round(upright[0] * scale), round(upright[1] * scale))
+            source = source.resize(size, Image.Resampling.LANCZOS)
+            source.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    return {
+        "image_size": {"width": width, "height": height},
+        "derivatives": derivatives,
+    }
+
+
+def make_all_derivatives(
+    img_paths: List[str],
+    derivative_dir: str,
+    sizes: Sequence[int],
+    rotations: Dict[str, int],
+    processes: Optional[int] = None,
+) -> List[dict]:
+    """Creates the derivatives of many images in a process pool.
+
+    Returns:
+        the result of make_derivatives for each of img_paths, in order
+    """
+    os.makedirs(derivative_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                make_derivatives,
+                img_path,
+                derivative_dir,
+                sizes,
+                rotations.get(os.path.basename(img_path), 0),
+            )
+            for img_path in img_paths
+        ]
+        return [future.result() for future in futures]
+
+
+def read_annotations(manifest_file: str) -> Dict[str, list]:
+    """Reads the annotations of each image in an input or output manifest.
+
+    Args:
+        manifest_file: local manifest whose lines have the annotations of
+            their image in "annotations", or in the updated_annotations of
+            a label as written by the post-annotation lambda
+
+    Returns:
+        annotations keyed by image file name
+    """
+    annotations = {}
+    with open(manifest_file, "r") as file_handle:
+        for line in file_handle:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            found = item.get("annotations")
+            if found is None:
+                found = next(
+                    (
+                        value["updated_annotations"]
+                        for value in item.values()
+                        if isinstance(value, dict) and "updated_annotations" in value
+                    ),
+                    None,
+                )
+            if found:
+                annotations[item["source-ref"].split("/")[-1]] = found
+    return annotations
+
+
+def make_tiles(
+    img_path: str,
+    tile_dir: str,
+    tile_size: int,
+    overlap: int = TILE_OVERLAP,
+    rotation: int = 0,
+    annotations: Optional[list] = None,
+    quality: int = DERIVATIVE_QUALITY,
+) -> dict:
+    """Splits an image into overlapping tiles and writes a crop of each.
+
+    Args:
+        img_path: path of the original image
+        tile_dir: directory the crops are written to. Crops are named
+            after the region and rotation they show, so crops of an
+            earlier plan are never reused for a different one
+        tile_size: longest side of a tile in pixels, see tiles.plan_tiles
+        overlap: pixels shared by neighbouring tiles
+        rotation: counter-clockwise rotation in degrees which makes the
+            image upright once its EXIF orientation is applied
+        annotations: existing annotations of the image, which tiles are
+            planned around
+        quality: JPEG quality of the crops
+
+    Returns:
+        {"image_size": {"width", "height"}, "tiles": [{"path", "tile",
+        "rotation", "scale"}]} with the size of the original as displayed,
+        and no tiles when the image is not split
+    """
+    from PIL import Image, ImageOps
+
+    rotations = {
+        90: Image.Transpose.ROTATE_90,
+        180: Image.Transpose.ROTATE_180,
+        270: Image.Transpose.ROTATE_270,
+    }
+    stem = os.path.splitext(os.path.basename(img_path))[0]
+    with Image.open(img_path) as image:
+        orientation = image.getexif().get(0x0112, 1)
+        width, height = image.size
+        if orientation in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        skeletons = parse_skeletons(annotations)[0] if annotations else []
+        planned = plan_tiles((width, height), tile_size, overlap, skeletons)
+        if len(planned) < 2:
+            planned = []
+
+        tiles = []
+        source = None
+        for tile in planned:
+            x, y, region_width, region_height = tile.region
+            path = os.path.join(
+                tile_dir,
+                f"{stem}_tile_{x}_{y}_{region_width}x{region_height}_r{rotation}.jpg",
+            )
+            tiles.append(
+                {
+                    "path": path,
+                    "tile": tile.to_dict(),
+                    "rotation": rotation,
+                    "scale": 1.0,
+                }
+            )
+            if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(
+                img_path
+            ):
+                continue
+            if source is None:
+                source = ImageOps.exif_transpose(image)
+                if source.mode != "RGB":
+                    source = source.convert("RGB")
+            crop = source.crop((x, y, x + region_width, y + region_height))
+            if rotation:
+                crop = crop.transpose(rotations[rotation])
+            crop.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+    return {"image_size": {"width": width, "height": height}, "tiles": tiles}
+
+
+def make_all_tiles(
+    img_paths: List[str],
+    tile_dir: str,
+    tile_size: int,
+    overlap: int,
+    rotations: Dict[str, int],
+    annotations: Dict[str, list],
+    processes: Optional[int] = None,
+) -> List[dict]:
+    """Creates the tiles of many images in a process pool.
+
+    Returns:
+        the result of make_tiles for each of img_paths, in order
+    """
+    os.makedirs(tile_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                make_tiles,
+                img_path,
+                tile_dir,
+                tile_size,
+                overlap,
+                rotations.get(os.path.basename(img_path), 0),
+                annotations.get(os.path.basename(img_path)),
+            )
+            for img_path in img_paths
+        ]
+        return [future.result() for future in futures]
+
+
+def main(
+    workteam_arn: str,
+    derivative_sizes: Sequence[int] = DERIVATIVE_SIZES,
+    processes: Optional[int] = None,
+    tile_size: int = 0,
+    tile_overlap: int = TILE_OVERLAP,
+    annotations_manifest: Optional[str] = None,
+    upload_workers: int = DEFAULT_WORKERS,
+    shard_items: Optional[int] = None,
+    shard_bytes: Optional[int] = None,
+    max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+) -> None:
     """Creates an input manifest and launches a Ground Truth labeling job.
 
     Args:
         workteam_arn: a labeling workforce arn. See
             https://docs.aws.amazon.com/sagemaker/latest/dg/sms-workforce-create-private-console.html
             for more details.
+        derivative_sizes: longest side in pixels of each image derivative,
+            empty to show workers the original images
+        processes: number of processes creating derivatives and tiles,
+            defaults to the number of CPUs
+        tile_size: images larger than this are split into tiles of about
+            this size, 0 to never split images
+        tile_overlap: pixels shared by neighbouring tiles
+        annotations_manifest: manifest whose annotations of the images are
+            carried into the labeling job's manifest
+        upload_workers: number of images uploaded concurrently
+        shard_items: manifest items per labeling job, None for no limit
+        shard_bytes: manifest bytes per labeling job, None for no limit
+        max_concurrent_jobs: number of labeling jobs running at the same
+            time, see scripts/job_shards.py
 
     Returns:
 
@@ -60,7 +430,6 @@ def main(workteam_arn: str) -> None:
     # Setup/get variables values from our CDK stack
     s3_upload_prefix = "labeling_jobs"
     image_dir = "scripts/images"
-    manifest_file_name = "example_manifest.txt"
     s3_bucket_name = read_ssm_parameter("/crowd_2d_skeleton_example_stack/bucket_name")
     pre_annotation_lambda_arn = read_ssm_parameter(
         "/crowd_2d_skeleton_example_stack/pre_annotation_lambda_arn"
@@ -76,58 +445,165 @@ def main(workteam_arn: str) -> None:
     s3_manifest_upload_prefix = f"{s3_upload_prefix}/manifests"
     s3_output_prefix = f"{s3_upload_prefix}/output"
 
-    s3_client = boto3.client("s3")
+    s3_client = make_s3_client(upload_workers)
 
-    # For each image in the image directory lets create a manifest line
-    manifest_items = []
-    for filename in os.listdir(image_dir):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
-            img_path = os.path.join(image_dir, filename)
-            object_name = os.path.join(s3_image_upload_prefix, filename).replace(
-                "\\", "/"
-            )
+    img_paths = [
+        os.path.join(image_dir, filename)
+        for filename in sorted(os.listdir(image_dir))
+        if filename.endswith(".jpg") or filename.endswith(".png")
+    ]
+    rotations = read_rotations("scripts/image_details.csv")
+    annotations = read_annotations(annotations_manifest) if annotations_manifest else {}
+    tiles = [None] * len(img_paths)
+    if tile_size:
+        tiles = make_all_tiles(
+            img_paths,
+            os.path.join(image_dir, "tiles"),
+            tile_size,
+            tile_overlap,
+            rotations,
+            annotations,
+            processes,
+        )
+    derivatives = [None] * len(img_paths)
+    # Tiled images are only shown as tiles.
+    untiled = [
+        i
+        for i, image_tiles in enumerate(tiles)
+        if not image_tiles or not image_tiles["tiles"]
+    ]
+    if derivative_sizes and untiled:
+        for i, image_derivatives in zip(
+            untiled,
+            make_all_derivatives(
+                [img_paths[i] for i in untiled],
+                os.path.join(image_dir, "derivatives"),
+                derivative_sizes,
+                rotations,
+                processes,
+            ),
+        ):
+            derivatives[i] = image_derivatives
 
-            # upload to s3_bucket
-            s3_client.upload_file(img_path, s3_bucket_name, object_name)
+    # For each image in the image directory lets create a manifest line,
+    # streamed to S3 and split into shards of at most shard_items items and
+    # shard_bytes bytes.
+    now = int(round(datetime.now().timestamp()))
+    batch_name = f"crowd-2d-skeleton-example-{now}"
+    manifest_writer = ShardedManifestWriter(
+        s3_client,
+        f"s3://{s3_bucket_name}/{s3_manifest_upload_prefix}/{batch_name}",
+        shard_items,
+        shard_bytes,
+    )
+    # The manifest shards are deleted again if anything fails before they
+    # are all written and the images uploaded.
+    with manifest_writer:
+        uploads = []
+        original_md5s = read_original_md5s("scripts/image_details.csv")
+        for img_path, image_derivatives, image_tiles in zip(
+            img_paths, derivatives, tiles
+        ):
+            object_name = os.path.join(
+                s3_image_upload_prefix, os.path.basename(img_path)
+            ).replace("\\", "/")
 
-            # add it to manifest file
-            manifest_items.append(
-                {
-                    "source-ref": f"s3://{s3_bucket_name}/{object_name}",
-                    "annotations": [],
-                }
+            # upload to s3_bucket
+            uploads.append(
+                SyncFile(
+                    img_path,
+                    object_name,
+                    mimetypes.guess_type(img_path)[0],
+                    original_md5s.get(os.path.basename(img_path)),
+                )
             )
 
-    # Create Manifest file
-    manifest_file_contents = "\n".join([json.dumps(mi) for mi in manifest_items])
-    with open(manifest_file_name, "w") as file_handle:
-        file_handle.write(manifest_file_contents)
+            # add it to manifest file
+            manifest_item = {
+                "source-ref": f"s3://{s3_bucket_name}/{object_name}",
+                "annotations": annotations.get(os.path.basename(img_path), []),
+            }
+            if image_tiles and image_tiles["tiles"]:
+                # One manifest line per tile, each with the whole image's
+                # annotations and the crop of its region.
+                for image_tile in image_tiles["tiles"]:
+                    tile_object_name = "/".join(
+                        (
+                            s3_image_upload_prefix,
+                            "tiles",
+                            os.path.basename(image_tile["path"]),
+                        )
+                    )
+                    uploads.append(
+                        SyncFile(image_tile["path"], tile_object_name, "image/jpeg")
+                    )
+                    manifest_writer.write(
+                        dict(
+                            manifest_item,
+                            image_size=image_tiles["image_size"],
+                            tile=dict(
+                                image_tile["tile"],
+                                **{
+                                    "source-ref": f"s3://{s3_bucket_name}/{tile_object_name}"
+                                },
+                                rotation=image_tile["rotation"],
+                                scale=image_tile["scale"],
+                            ),
+                        )
+                    )
+                continue
+            if image_derivatives and image_derivatives["derivatives"]:
+                manifest_item["image_size"] = image_derivatives["image_size"]
+                manifest_item["derivatives"] = []
+                for derivative in image_derivatives["derivatives"]:
+                    derivative_object_name = "/".join(
+                        (
+                            s3_image_upload_prefix,
+                            "derivatives",
+                            os.path.basename(derivative["path"]),
+                        )
+                    )
+                    uploads.append(
+                        SyncFile(
+                            derivative["path"], derivative_object_name, "image/jpeg"
+                        )
+                    )
+                    manifest_item["derivatives"].append(
+                        {
+                            "source-ref": f"s3://{s3_bucket_name}/{derivative_object_name}",
+                            "rotation": derivative["rotation"],
+                            "scale": derivative["scale"],
+                        }
+                    )
+            manifest_writer.write(manifest_item)
 
-    # Upload manifest file
-    object_name = os.path.join(s3_manifest_upload_prefix, manifest_file_name).replace(
-        "\\", "/"
-    )
-    s3_client.upload_file(manifest_file_name, s3_bucket_name, object_name)
+        # Upload the images which are not in the bucket yet, or changed since
+        state = SyncState(os.path.join(image_dir, SYNC_STATE_FILE))
+        try:
+            counts = sync_files(
+                s3_client, s3_bucket_name, uploads, state, upload_workers
+            )
+        finally:
+            state.close()
+        print(f"Synced {len(uploads)} images: {counts}")
+        if counts["failed"]:
+            raise RuntimeError(f"{counts['failed']} images failed to upload")
 
-    # Create labeling job
-    client = boto3.client("sagemaker")
-    now = int(round(datetime.now().timestamp()))
-    response = client.create_labeling_job(
-        LabelingJobName=f"crowd-2d-skeleton-example-{now}",
-        LabelAttributeName="label-results",
-        InputConfig={
+    # Create labeling jobs, one per manifest shard
+    manifests = manifest_writer.shards
+    request = {
+        "LabelAttributeName": "label-results",
+        "InputConfig": {
             "DataSource": {
-                "S3DataSource": {
-                    "ManifestS3Uri": f"s3://{s3_bucket_name}/{object_name}"
-                },
+                "S3DataSource": {"ManifestS3Uri": None},
             },
             "DataAttributes": {},
         },
-        OutputConfig={
+        "OutputConfig": {
             "S3OutputPath": f"s3://{s3_bucket_name}/{s3_output_prefix}/",
         },
-        RoleArn=ground_truth_role_arn,
-        HumanTaskConfig={
+        "RoleArn": ground_truth_role_arn,
+        "HumanTaskConfig": {
             "WorkteamArn": workteam_arn,
             "UiConfig": {"UiTemplateS3Uri": ui_template_s3_uri},
             "PreHumanTaskLambdaArn": pre_annotation_lambda_arn,
@@ -142,12 +618,87 @@ def main(workteam_arn: str) -> None:
                 "AnnotationConsolidationLambdaArn": post_annotation_lambda_arn
             },
         },
+    }
+    batch_path = os.path.join(BATCH_DIR, f"{batch_name}.json")
+    save_batch(
+        batch_path, new_batch(batch_name, request, manifests, max_concurrent_jobs)
     )
-    print(response)
+    print(f"Wrote {len(manifests)} manifest shards, tracked in {batch_path}")
+    statuses = schedule(boto3.client("sagemaker"), batch_path)
+    print(f"Job statuses: {statuses}")
+    if len(manifests) > 1:
+        print(
+            f"Run python scripts/job_shards.py {batch_path} to launch the "
+            "remaining jobs and merge their output manifests"
+        )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create a labeling job")
     parser.add_argument("workteam_arn", help="SageMaker Ground Truth workforce arn")
+    parser.add_argument(
+        "--derivative-sizes",
+        type=int,
+        nargs="+",
+        default=list(DERIVATIVE_SIZES),
+        help="Longest side in pixels of each image derivative",
+    )
+    parser.add_argument(
+        "--no-derivatives",
+        action="store_true",
+        help="Show workers the original images",
+    )
+    parser.add_argument(
+        "--processes", type=int, help="Processes creating image derivatives and tiles"
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=0,
+        help="Split images larger than this many pixels into tiles of about this size",
+    )
+    parser.add_argument(
+        "--tile-overlap",
+        type=int,
+        default=TILE_OVERLAP,
+        help="Pixels shared by neighbouring tiles",
+    )
+    parser.add_argument(
+        "--annotations",
+        help="Input or output manifest with existing annotations of the images",
+    )
+    parser.add_argument(
+        "--shard-items",
+        type=int,
+        help="Split the manifest into labeling jobs of at most this many items",
+    )
+    parser.add_argument(
+        "--shard-mb",
+        type=int,
+        help="Split the manifest into labeling jobs of at most this many megabytes",
+    )
+    parser.add_argument(
+        "--max-concurrent-jobs",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_JOBS,
+        help="Labeling jobs running at the same time",
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Images uploaded concurrently",
+    )
     args = parser.parse_args()
-    main(args.workteam_arn)
+    main(
+        args.workteam_arn,
+        [] if args.no_derivatives else args.derivative_sizes,
+        args.processes,
+        args.tile_size,
+        args.tile_overlap,
+        args.annotations,
+        args.upload_workers,
+        args.shard_items,
+        args.shard_mb * 1024 * 1024 if args.shard_mb else None,
+        args.max_concurrent_jobs,
+    )
@@ -1,13 +1,281 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
-"""This script downloads the example images used in the example labeling job."""
+"""This script downloads the example images used in the example labeling job.
+
+    Images are downloaded in parallel by a bounded thread pool, each thread
+    keeping its own pooled requests session so connections to the image
+    hosts are reused. Every image is first written to a <name>.part file;
+    after a dropped connection, a timeout or a 429 or 5xx response the
+    download is retried with exponential backoff, resuming the partial
+    file with an HTTP Range request. Once complete, the file is checked
+    against the OriginalSize and OriginalMD5 of the CSV and only then
+    renamed to its final name, so images found under their final name and
+    matching the CSV are skipped by later runs.
+
+    --thumbnails downloads the Thumbnail300KURL of each image instead, whose
+    size and MD5 are not in the CSV and which is only checked against the
+    Content-Length of its response. Thumbnails keep the file name of their
+    URL; create_example_labeling_job.py maps them to their image's details.
+
+Example arguments
+    python scripts/download_example_images.py --workers 8
+"""
+import argparse
 import csv
+import hashlib
 import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
+from s3_sync import md5_from_base64
+
+DEFAULT_WORKERS = 8
+MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled for each further retry.
+BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+# Connect and read timeouts of each request.
+TIMEOUT = (10, 60)
+CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+_local = threading.local()
+
+
+class ImageDownload(NamedTuple):
+    """An image to download.
+
+    size and md5 (hex) are those of the file, when known.
+    """
+
+    url: str
+    path: str
+    size: Optional[int] = None
+    md5: Optional[str] = None
+
+
+class RetryableError(Exception):
+    """A response worth retrying, after retry_after seconds when given."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def read_downloads(
+    csv_file: str, image_dir: str, thumbnails: bool = False
+) -> List[ImageDownload]:
+    """Reads the images to download from an image details CSV.
+
+    Args:
+        csv_file: CSV with the OriginalURL, OriginalSize, OriginalMD5 and
+            Thumbnail300KURL of the images, see scripts/image_details.csv
+        image_dir: directory the images are saved in
+        thumbnails: download the thumbnails of the images instead, for
+            those which have one
+    """
+    downloads = []
+    with open(csv_file, "r") as file_handle:
+        for row in csv.DictReader(file_handle):
+            if thumbnails and row.get("Thumbnail300KURL"):
+                url, size, md5 = row["Thumbnail300KURL"], None, None
+            else:
+                url = row["OriginalURL"]
+                size = int(row["OriginalSize"]) if row.get("OriginalSize") else None
+                md5 = md5_from_base64(row.get("OriginalMD5") or "")
+            path = os.path.join(image_dir, url.split("/")[-1])
+            downloads.append(ImageDownload(url, path, size, md5))
+    return downloads
+
+
+def get_session(workers: int = DEFAULT_WORKERS) -> requests.Session:
+    """Returns the session of the current thread.
+
+    Sessions are not shared between threads, but each keeps its
+    connections to the image hosts open from one image to the next.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+def file_md5(path: str) -> str:
+    md5 = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as file_handle:
+        for chunk in iter(lambda: file_handle.read(CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def verify(
+    path: str, download: ImageDownload, expected_size: Optional[int] = None
+) -> Optional[str]:
+    """Returns why a file does not match its details, None if it does.
+
+    Args:
+        path: downloaded file
+        download: the image, with its size and MD5 from the CSV when known
+        expected_size: size announced by the server, when known
+    """
+    size = os.path.getsize(path)
+    if download.size is not None and size != download.size:
+        return f"size {size} instead of {download.size}"
+    if expected_size is not None and size != expected_size:
+        return f"size {size} instead of the {expected_size} announced"
+    if download.md5 is not None and file_md5(path) != download.md5:
+        return "MD5 mismatch"
+    return None
 
 
-def download_images_from_csv(csv_file: str, image_dir: str) -> None:
+def _backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    if retry_after is not None:
+        return min(retry_after, MAX_BACKOFF_SECONDS)
+    delay = min(BACKOFF_SECONDS * 2 ** (attempt - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.0)  # nosec B311
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _range_start(response: requests.Response) -> Optional[int]:
+    """Returns the first byte of a 206 response's Content-Range."""
+    content_range = response.headers.get("Content-Range", "")
+    try:
+        return int(content_range.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def _expected_size(response: requests.Response, offset: int) -> Optional[int]:
+    """Returns the size of the file a response completes, from its Content-Length.
+
+    None when the response has no Content-Length or when the body is
+    decoded from a Content-Encoding, which changes its length.
+    """
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    try:
+        length = int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+    return offset + length if offset else length
+
+
+def _fetch(
+    session: requests.Session, download: ImageDownload, partial_path: str
+) -> Tuple[bool, int, Optional[int]]:
+    """Downloads an image to its partial file, resuming what is there.
+
+    Returns:
+        (whether the download resumed a partial file, bytes received, size
+        of the complete file announced by the server or None)
+    """
+    offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+    if download.size is not None and offset >= download.size:
+        offset = 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(
+        download.url, headers=headers, stream=True, timeout=TIMEOUT
+    ) as response:
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableError(f"HTTP {response.status_code}", _retry_after(response))
+        if response.status_code == 416:
+            # The partial file is no prefix of the image; start over.
+            os.remove(partial_path)
+            raise RetryableError("HTTP 416")
+        response.raise_for_status()
+        resumed = response.status_code == 206 and _range_start(response) == offset
+        expected_size = _expected_size(response, offset if resumed else 0)
+        received = 0
+        with open(partial_path, "ab" if resumed else "wb") as file_handle:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                file_handle.write(chunk)
+                received += len(chunk)
+    return resumed, received, expected_size
+
+
+def download_image(
+    download: ImageDownload,
+    max_attempts: int = MAX_ATTEMPTS,
+    workers: int = DEFAULT_WORKERS,
+) -> Tuple[str, int]:
+    """Downloads an image unless a verified copy is already there.
+
+    Raises:
+        RuntimeError: when the image could not be downloaded and verified
+            in max_attempts attempts
+        requests.HTTPError: for responses other than those retried
+
+    Returns:
+        (outcome, bytes received) where outcome is "skipped", "downloaded"
+        or "resumed"
+    """
+    partial_path = download.path + PARTIAL_SUFFIX
+    if os.path.exists(download.path):
+        if verify(download.path, download) is None:
+            return "skipped", 0
+        # Earlier versions of this script left truncated images under their
+        # final name; those are resumed.
+        os.replace(download.path, partial_path)
+    elif os.path.exists(partial_path) and download.md5 is not None:
+        # Interrupted between the end of a download and its rename.
+        if verify(partial_path, download) is None:
+            os.replace(partial_path, download.path)
+            return "resumed", 0
+
+    session = get_session(workers)
+    resumed = False
+    received = 0
+    error = None
+    for attempt in range(1, max_attempts + 1):
+        if attempt > 1:
+            time.sleep(_backoff(attempt - 1, getattr(error, "retry_after", None)))
+        try:
+            attempt_resumed, attempt_received, expected_size = _fetch(
+                session, download, partial_path
+            )
+        except (
+            RetryableError,
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            error = e
+            continue
+        resumed = resumed or attempt_resumed
+        received += attempt_received
+        reason = verify(partial_path, download, expected_size)
+        if reason is None:
+            os.replace(partial_path, download.path)
+            return "resumed" if resumed else "downloaded", received
+        os.remove(partial_path)
+        error = ValueError(reason)
+    raise RuntimeError(f"{max_attempts} attempts failed, the last with: {error}")
+
+
+def download_images_from_csv(
+    csv_file: str,
+    image_dir: str,
+    workers: int = DEFAULT_WORKERS,
+    thumbnails: bool = False,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> dict:
     """
     Downloads images from a CSV file containing a column named "OriginalURL"
     and saves them in the specified image directory.
@@ -16,36 +284,62 @@ def download_images_from_csv(csv_file: str, image_dir: str) -> None:
         csv_file: Path to the CSV file containing images to download. See
             scripts/image_details.csv for CSV fields and examples.
         image_dir: Directory to save the images.
+        workers: number of images downloaded concurrently
+        thumbnails: download the Thumbnail300KURL of the images instead
+        max_attempts: attempts at each image before giving up on it
+
+    Returns:
+        counts of the images downloaded, resumed, skipped and failed, and
+        of the bytes received
     """
     # Create the image directory if it doesn't exist
     if not os.path.exists(image_dir):
         os.makedirs(image_dir)
 
-    # Read the CSV file and download the images
-    with open(csv_file, "r") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            image_url = row["OriginalURL"]
-            image_name = image_url.split("/")[-1]
-            image_path = os.path.join(image_dir, image_name)
-
+    counts = {"downloaded": 0, "resumed": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    downloads = read_downloads(csv_file, image_dir, thumbnails)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_image, download, max_attempts, workers): download
+            for download in downloads
+        }
+        for future in as_completed(futures):
+            image_name = os.path.basename(futures[future].path)
             try:
-                response = requests.get(image_url, stream=True)
-                response.raise_for_status()
-
-                with open(image_path, "wb") as image_file:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        image_file.write(chunk)
-
-                print(f"Downloaded image: {image_name}")
-
-            except requests.exceptions.RequestException as e:
+                outcome, received = future.result()
+            except (requests.exceptions.RequestException, RuntimeError) as e:
                 print(f"Error downloading image: {image_name}")
                 print(e)
+                counts["failed"] += 1
+                continue
+            counts[outcome] += 1
+            counts["bytes"] += received
+            if outcome != "skipped":
+                print(f"Downloaded image: {image_name}")
+    return counts
+
+
+def main(args: argparse.Namespace) -> int:
+    counts = download_images_from_csv(
+        args.csv, args.image_dir, args.workers, args.thumbnails, args.max_attempts
+    )
+    print(counts)
+    return 1 if counts["failed"] else 0
 
 
 if __name__ == "__main__":
-    # Directory to save the images
-    image_dir = "scripts/images"
-    csv_file = "scripts/image_details.csv"
-    download_images_from_csv(csv_file, image_dir)
+    parser = argparse.ArgumentParser(description="Download the example images")
+    parser.add_argument(
+        "--csv", default="scripts/image_details.csv", help="Image details CSV"
+    )
+    parser.add_argument(
+        "--image-dir", default="scripts/images", help="Directory to save the images"
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    parser.add_argument(
+        "--thumbnails",
+        action="store_true",
+        help="Download the Thumbnail300KURL of each image instead",
+    )
+    sys.exit(main(parser.parse_args()))
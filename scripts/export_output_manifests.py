@@ -0,0 +1,449 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This script exports labeling job output manifests for training.
+
+    Output manifests are read line by line, from S3 or local files, and the
+    consolidated label of each line is converted to COCO keypoints JSON
+    and/or columnar Parquet and Arrow files with one row per skeleton.
+
+    Manifests are split into byte range shards which are converted in
+    parallel by a pool of processes. Every shard is read with its own
+    streaming (ranged) GET and written to its own part files, so memory use
+    is bounded by --batch-rows per process whatever the size of the job.
+    COCO parts are merged into a single keypoints.json at the end.
+
+    Parquet and Arrow output requires pyarrow (pip install pyarrow).
+
+Example arguments
+    python scripts/export_output_manifests.py \
+        s3://<bucket>/labeling_jobs/output/ exports/ --formats coco parquet
+
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import boto3
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cdk", "lambda_layer", "python"))
+
+from skeletons import keypoint_labels_from_classes, parse_skeletons  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(
+    REPO_ROOT, "cdk", "ground_truth_templates", "crowd_2d_skeleton_template.html"
+)
+OUTPUT_MANIFEST_SUFFIX = "manifests/output/output.manifest"
+FORMATS = ("coco", "parquet", "arrow")
+COCO_CATEGORY_ID = 1
+
+_s3_client = None
+
+
+def s3_client():
+    """Returns the S3 client of the current process, created on first use."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
+def split_s3_uri(s3_uri: str) -> tuple:
+    bucket, _, key = s3_uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+def read_template_schema(template_path: str) -> tuple:
+    """Reads the keypoint classes and skeleton rig of the UI template.
+
+    Returns:
+        (labels, rig) where labels are the keypoint labels in template order
+        and rig is a list of [label, label] pairs
+    """
+    with open(template_path, "r") as file_handle:
+        template = file_handle.read()
+    keypoint_classes = re.search(r"keypointClasses='([^']*)'", template).group(1)
+    skeleton_rig = re.search(r"skeletonRig='([^']*)'", template).group(1)
+    labels = keypoint_labels_from_classes(json.loads(keypoint_classes))
+    rig = [line[:2] for line in json.loads(skeleton_rig)]
+    return labels, rig
+
+
+def list_manifests(sources: list, suffix: str) -> list:
+    """Expands S3 prefixes, local directories and files into manifest sizes.
+
+    Returns:
+        list of (location, size in bytes)
+    """
+    manifests = []
+    for source in sources:
+        if source.startswith("s3://"):
+            bucket, prefix = split_s3_uri(source)
+            paginator = s3_client().get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for item in page.get("Contents", []):
+                    if item["Key"] == prefix or item["Key"].endswith(suffix):
+                        manifests.append((f"s3://{bucket}/{item['Key']}", item["Size"]))
+        elif os.path.isdir(source):
+            for directory, _, filenames in os.walk(source):
+                for filename in sorted(filenames):
+                    path = os.path.join(directory, filename)
+                    if path.replace("\\", "/").endswith(suffix):
+                        manifests.append((path, os.path.getsize(path)))
+        else:
+            manifests.append((source, os.path.getsize(source)))
+    return manifests
+
+
+def plan_shards(manifests: list, shard_bytes: int) -> list:
+    """Splits manifests into (location, start, end) byte ranges."""
+    shards = []
+    for location, size in manifests:
+        for start in range(0, size, shard_bytes):
+            shards.append((location, start, min(start + shard_bytes, size)))
+    return shards
+
+
+def iter_shard_lines(location: str, start: int, end: int):
+    """Yields the manifest lines which start within [start, end).
+
+    Reading starts one byte before start, so a line belongs to the shard
+    its first byte is in, and continues past end to finish the last line.
+    """
+    offset = max(start - 1, 0)
+    if location.startswith("s3://"):
+        bucket, key = split_s3_uri(location)
+        stream = s3_client().get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={offset}-"
+        )["Body"]
+    else:
+        stream = open(location, "rb")
+        stream.seek(offset)
+    try:
+        if start > 0:
+            # Drop the tail of the line which belongs to the previous shard.
+            offset += len(stream.readline())
+        while offset < end:
+            line = stream.readline()
+            if not line:
+                break
+            offset += len(line)
+            if line.strip():
+                yield line
+    finally:
+        stream.close()
+
+
+def read_label(line: bytes, label_attribute_name: str) -> tuple:
+    """Decodes a manifest line into (source-ref, label, updated annotations).
+
+    Labels spilled by the post-annotation lambda carry an
+    annotations_s3_uri instead of the annotations themselves, in which
+    case the detailed label is fetched from S3.
+    """
+    item = json.loads(line)
+    label = item.get(label_attribute_name) or {}
+    if "updated_annotations" not in label and "annotations_s3_uri" in label:
+        bucket, key = split_s3_uri(label["annotations_s3_uri"])
+        body = s3_client().get_object(Bucket=bucket, Key=key)["Body"]
+        label = dict(label, **json.loads(body.read()))
+    return item.get("source-ref"), label, label.get("updated_annotations") or []
+
+
+def _image_record(source_ref: str, label: dict) -> dict:
+    return {
+        "file_name": label.get("image_file_name", source_ref.split("/")[-1]),
+        "source_ref": source_ref,
+        "image_s3_location": label.get("image_s3_location", source_ref),
+        "dataset_object_id": label.get("dataset_object_id"),
+        "worker_id": label.get("worker_id"),
+        "worker_ids": label.get("worker_ids"),
+        "total_time_in_seconds": _number_or_none(label.get("total_time_in_seconds")),
+        "was_modified": label.get("was_modified"),
+        "no_changes_needed": label.get("no_changes_needed"),
+    }
+
+
+def _number_or_none(value):
+    return value if isinstance(value, (int, float)) else None
+
+
+def _coco_annotation(skeleton) -> dict:
+    keypoints = []
+    for x, y in zip(skeleton.xs, skeleton.ys):
+        # NaN marks keypoints which are not placed.
+        keypoints.extend((x, y, 2) if x == x else (0, 0, 0))
+    bounds = skeleton.bounds() or (0.0, 0.0, 0.0, 0.0)
+    width, height = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    return {
+        "category_id": COCO_CATEGORY_ID,
+        "keypoints": keypoints,
+        "num_keypoints": len(skeleton.placed()),
+        "bbox": [bounds[0], bounds[1], width, height],
+        "area": width * height,
+        "iscrowd": 0,
+        "skeleton_id": skeleton.id,
+    }
+
+
+def _arrow_schema(labels: tuple, rig: list, label_attribute_name: str):
+    coordinates = pyarrow.list_(pyarrow.float32(), len(labels))
+    return pyarrow.schema(
+        [
+            ("file_name", pyarrow.string()),
+            ("source_ref", pyarrow.string()),
+            ("image_s3_location", pyarrow.string()),
+            ("dataset_object_id", pyarrow.string()),
+            ("worker_id", pyarrow.string()),
+            ("worker_ids", pyarrow.list_(pyarrow.string())),
+            ("total_time_in_seconds", pyarrow.float64()),
+            ("was_modified", pyarrow.bool_()),
+            ("no_changes_needed", pyarrow.bool_()),
+            ("skeleton_id", pyarrow.string()),
+            ("x", coordinates),
+            ("y", coordinates),
+        ],
+        metadata={
+            "keypoint_labels": json.dumps(labels),
+            "skeleton_rig": json.dumps(rig),
+            "label_attribute_name": label_attribute_name,
+        },
+    )
+
+
+class ArrowPartWriter(object):
+    """Writes skeleton rows to Parquet and/or Arrow part files in batches."""
+
+    def __init__(self, paths: dict, schema, batch_rows: int):
+        self.schema = schema
+        self.batch_rows = batch_rows
+        self.columns = {name: [] for name in schema.names}
+        self.writers = []
+        if "parquet" in paths:
+            self.writers.append(pyarrow.parquet.ParquetWriter(paths["parquet"], schema))
+        if "arrow" in paths:
+            self.writers.append(pyarrow.ipc.new_file(paths["arrow"], schema))
+
+    def add(self, image: dict, skeleton) -> None:
+        for name, value in image.items():
+            self.columns[name].append(value)
+        self.columns["skeleton_id"].append(
+            None if skeleton.id is None else str(skeleton.id)
+        )
+        self.columns["x"].append([x if x == x else None for x in skeleton.xs])
+        self.columns["y"].append([y if y == y else None for y in skeleton.ys])
+        if len(self.columns["x"]) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.columns["x"]:
+            return
+        table = pyarrow.table(self.columns, schema=self.schema)
+        for writer in self.writers:
+            writer.write_table(table)
+        self.columns = {name: [] for name in self.schema.names}
+
+    def close(self) -> None:
+        self.flush()
+        for writer in self.writers:
+            writer.close()
+
+
+def export_shard(
+    shard_index: int,
+    shard: tuple,
+    output_dir: str,
+    formats: tuple,
+    labels: tuple,
+    rig: list,
+    label_attribute_name: str,
+    batch_rows: int,
+) -> dict:
+    """Converts one manifest shard into part files.
+
+    Returns:
+        dict with the shard index and its number of images, skeletons and
+        lines which failed to convert
+    """
+    name = f"part-{shard_index:05d}"
+    coco_images = coco_annotations = arrow_writer = None
+    if "coco" in formats:
+        coco_images = open(
+            os.path.join(output_dir, "coco", f"{name}.images.jsonl"), "w"
+        )
+        coco_annotations = open(
+            os.path.join(output_dir, "coco", f"{name}.annotations.jsonl"), "w"
+        )
+    arrow_paths = {
+        f: os.path.join(output_dir, f, f"{name}.{f}")
+        for f in ("parquet", "arrow")
+        if f in formats
+    }
+    if arrow_paths:
+        arrow_writer = ArrowPartWriter(
+            arrow_paths, _arrow_schema(labels, rig, label_attribute_name), batch_rows
+        )
+
+    counts = {"shard": shard_index, "images": 0, "skeletons": 0, "failures": 0}
+    try:
+        for line in iter_shard_lines(*shard):
+            try:
+                source_ref, label, annotations = read_label(line, label_attribute_name)
+                skeletons = parse_skeletons(annotations, labels)[0]
+            except Exception as e:
+                print(f"Failed to convert a line of {shard[0]}: {e}", file=sys.stderr)
+                counts["failures"] += 1
+                continue
+            image = _image_record(source_ref, label)
+            if coco_images is not None:
+                # Ids are local to the shard until the parts are merged.
+                coco_images.write(json.dumps(dict(image, id=counts["images"])) + "\n")
+                for skeleton in skeletons:
+                    annotation = _coco_annotation(skeleton)
+                    annotation["image_id"] = counts["images"]
+                    coco_annotations.write(json.dumps(annotation) + "\n")
+            if arrow_writer is not None:
+                for skeleton in skeletons:
+                    arrow_writer.add(image, skeleton)
+            counts["images"] += 1
+            counts["skeletons"] += len(skeletons)
+    finally:
+        for handle in (coco_images, coco_annotations, arrow_writer):
+            if handle is not None:
+                handle.close()
+    return counts
+
+
+def merge_coco_parts(
+    output_dir: str, shard_counts: list, labels: tuple, rig: list
+) -> str:
+    """Streams the COCO part files into a single keypoints.json.
+
+    Image and annotation ids are renumbered to be unique across shards.
+    """
+    coco_dir = os.path.join(output_dir, "coco")
+    path = os.path.join(coco_dir, "keypoints.json")
+    category = {
+        "id": COCO_CATEGORY_ID,
+        "name": "person",
+        "supercategory": "person",
+        "keypoints": list(labels),
+        "skeleton": [[labels.index(a) + 1, labels.index(b) + 1] for a, b in rig],
+    }
+    image_offsets = []
+    offset = 0
+    for counts in shard_counts:
+        image_offsets.append(offset)
+        offset += counts["images"]
+
+    with open(path, "w") as output:
+        output.write('{"info": {"description": "crowd-2d-skeleton export"}, ')
+        output.write(f'"categories": [{json.dumps(category)}], "images": [')
+        first = True
+        for counts, image_offset in zip(shard_counts, image_offsets):
+            part = os.path.join(coco_dir, f"part-{counts['shard']:05d}.images.jsonl")
+            with open(part, "r") as lines:
+                for line in lines:
+                    image = json.loads(line)
+                    image["id"] += image_offset
+                    output.write(("" if first else ", ") + json.dumps(image))
+                    first = False
+            os.remove(part)
+        output.write('], "annotations": [')
+        annotation_id = 0
+        for counts, image_offset in zip(shard_counts, image_offsets):
+            part = os.path.join(
+                coco_dir, f"part-{counts['shard']:05d}.annotations.jsonl"
+            )
+            with open(part, "r") as lines:
+                for line in lines:
+                    annotation = json.loads(line)
+                    annotation["image_id"] += image_offset
+                    annotation["id"] = annotation_id
+                    output.write(
+                        ("" if annotation_id == 0 else ", ") + json.dumps(annotation)
+                    )
+                    annotation_id += 1
+            os.remove(part)
+        output.write("]}")
+    return path
+
+
+def main(args: argparse.Namespace) -> int:
+    formats = tuple(args.formats)
+    if pyarrow is None and ("parquet" in formats or "arrow" in formats):
+        print(
+            "Parquet and Arrow output requires pyarrow: pip install pyarrow",
+            file=sys.stderr,
+        )
+        return 1
+
+    labels, rig = read_template_schema(args.template)
+    shards = plan_shards(
+        list_manifests(args.sources, args.suffix), args.shard_mb * 1024 * 1024
+    )
+    for output_format in formats:
+        directory = os.path.join(args.output_dir, output_format)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                export_shard,
+                i,
+                shard,
+                args.output_dir,
+                formats,
+                labels,
+                rig,
+                args.label_attribute_name,
+                args.batch_rows,
+            )
+            for i, shard in enumerate(shards)
+        ]
+        shard_counts = [future.result() for future in futures]
+
+    if "coco" in formats:
+        print(f"Wrote {merge_coco_parts(args.output_dir, shard_counts, labels, rig)}")
+    totals = {
+        "shards": len(shards),
+        "images": sum(c["images"] for c in shard_counts),
+        "skeletons": sum(c["skeletons"] for c in shard_counts),
+        "failures": sum(c["failures"] for c in shard_counts),
+    }
+    print(json.dumps(totals))
+    return 1 if totals["failures"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export output manifests for training")
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="Output manifest files, directories or S3 prefixes",
+    )
+    parser.add_argument("output_dir", help="Directory to write the exports to")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["coco"])
+    parser.add_argument("--label-attribute-name", default="label-results")
+    parser.add_argument(
+        "--suffix",
+        default=OUTPUT_MANIFEST_SUFFIX,
+        help="Only manifests ending with this are read from prefixes and directories",
+    )
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-mb", type=int, default=64)
+    parser.add_argument("--batch-rows", type=int, default=50000)
+    sys.exit(main(parser.parse_args()))
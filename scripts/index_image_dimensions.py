@@ -0,0 +1,356 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This script indexes the dimensions of the images under S3 prefixes.
+
+    Only the first bytes of every JPEG and PNG are read, with ranged GETs
+    issued in parallel by a thread pool, and the width, height and EXIF
+    orientation found in them are recorded (see
+    cdk/lambda_layer/python/image_headers.py). A further range is read only
+    for the few JPEGs whose EXIF data holds a large thumbnail.
+
+    The index is kept locally in --index-dir as an append-only JSON lines
+    file with the ETag of every image, so later runs only read images which
+    are new or changed since, and drop images which were deleted. Results
+    are appended as they arrive, so an interrupted run loses little work.
+    Hundreds of thousands of images are indexed this way without holding
+    more than their entries in memory.
+
+    --publish writes the index to S3 in hash shards which both annotation
+    lambdas read for O(1) lookups (see
+    cdk/lambda_layer/python/image_index.py and IMAGE_INDEX_S3_URI). Only
+    shards whose content changed are uploaded again. --manifest adds the
+    image_size of every indexed image to the lines of an input manifest.
+
+Example arguments
+    python scripts/index_image_dimensions.py s3://<bucket>/labeling_jobs/images/ \
+        --publish s3://<bucket>/labeling_jobs/image_index
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cdk", "lambda_layer", "python"))
+
+from image_headers import displayed_size, read_image_header  # noqa: E402
+from image_index import INDEX_FORMAT, INDEX_NAME, shard_name, shard_of  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+ENTRIES_FILE = "images.jsonl"
+PUBLISHED_FILE = "published.json"
+DEFAULT_SHARDS = 256
+
+
+def split_s3_uri(s3_uri: str) -> tuple:
+    bucket, _, key = s3_uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+def list_images(s3_client, sources: List[str]) -> Iterator[Tuple[str, str, int]]:
+    """Lists the JPEG and PNG images under S3 prefixes.
+
+    Yields:
+        (s3 uri, ETag, size in bytes) of every image
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for source in sources:
+        bucket, prefix = split_s3_uri(source)
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                if item["Key"].lower().endswith(IMAGE_EXTENSIONS):
+                    yield f"s3://{bucket}/{item['Key']}", item["ETag"], item["Size"]
+
+
+def read_header(
+    s3_client, s3_uri: str, size: int, range_bytes: int, max_bytes: int
+) -> Optional[tuple]:
+    """Reads an image's dimensions with as few ranged GETs as needed.
+
+    Each further GET reads up to twice as much as read so far.
+
+    Returns:
+        (width, height, orientation), or None when the dimensions are not
+        within the first max_bytes
+    """
+    if not size:
+        return None
+    bucket, key = split_s3_uri(s3_uri)
+    data = b""
+    end = min(range_bytes, size, max_bytes)
+    while True:
+        response = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={len(data)}-{end - 1}"
+        )
+        data += response["Body"].read()
+        header = read_image_header(data)
+        if header is not None or len(data) >= min(size, max_bytes):
+            return header
+        end = min(2 * len(data), size, max_bytes)
+
+
+class LocalIndex(object):
+    """Image entries kept in an append-only JSON lines file.
+
+    Args:
+        index_dir: directory holding the index files
+    """
+
+    def __init__(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        self.path = os.path.join(index_dir, ENTRIES_FILE)
+        self.entries: Dict[str, dict] = {}
+        self.lines = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file_handle:
+                for line in file_handle:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    self.lines += 1
+                    if entry.get("deleted"):
+                        self.entries.pop(entry["uri"], None)
+                    else:
+                        self.entries[entry["uri"]] = entry
+        self._file = open(self.path, "a")
+
+    def add(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.lines += 1
+        if entry.get("deleted"):
+            self.entries.pop(entry["uri"], None)
+        else:
+            self.entries[entry["uri"]] = entry
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes the file, rewriting it first if most lines are superseded."""
+        self._file.close()
+        if self.lines > 2 * len(self.entries) + 1000:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as file_handle:
+                for entry in self.entries.values():
+                    file_handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            os.replace(temp_path, self.path)
+
+
+def update_index(
+    s3_client,
+    index: LocalIndex,
+    sources: List[str],
+    workers: int,
+    range_bytes: int,
+    max_bytes: int,
+) -> dict:
+    """Indexes new and changed images under sources and drops deleted ones.
+
+    Returns:
+        counts of the images listed, read, failed, unchanged and deleted
+    """
+    counts = {"listed": 0, "read": 0, "failed": 0, "unchanged": 0, "deleted": 0}
+    seen = set()
+
+    def index_image(s3_uri: str, etag: str, size: int) -> dict:
+        entry = {"uri": s3_uri, "etag": etag, "size": size}
+        try:
+            header = read_header(s3_client, s3_uri, size, range_bytes, max_bytes)
+            if header is None:
+                entry["error"] = f"No dimensions in the first {max_bytes} bytes"
+            else:
+                entry["width"], entry["height"], entry["orientation"] = header
+        except Exception as e:
+            entry["error"] = str(e)
+        return entry
+
+    def collect(done) -> None:
+        for future in done:
+            entry = future.result()
+            index.add(entry)
+            counts["failed" if "error" in entry else "read"] += 1
+            if (counts["read"] + counts["failed"]) % 1000 == 0:
+                index.flush()
+                print(f"Indexed {counts['read'] + counts['failed']} images")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for s3_uri, etag, size in list_images(s3_client, sources):
+            counts["listed"] += 1
+            seen.add(s3_uri)
+            previous = index.entries.get(s3_uri)
+            if (
+                previous is not None
+                and previous["etag"] == etag
+                and "error" not in previous
+            ):
+                counts["unchanged"] += 1
+                continue
+            pending.add(executor.submit(index_image, s3_uri, etag, size))
+            # Bounds the futures held for very large listings.
+            if len(pending) >= 4 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+
+    prefixes = [f"s3://{'/'.join(split_s3_uri(source))}" for source in sources]
+    for s3_uri in [u for u in index.entries if u not in seen]:
+        if any(s3_uri.startswith(prefix) for prefix in prefixes):
+            index.add({"uri": s3_uri, "deleted": True})
+            counts["deleted"] += 1
+    index.flush()
+    return counts
+
+
+def build_shards(entries: Dict[str, dict], shards: int) -> Dict[int, bytes]:
+    """Encodes the entries with dimensions into shard objects."""
+    grouped: Dict[int, dict] = {shard: {} for shard in range(shards)}
+    for s3_uri, entry in entries.items():
+        if "width" in entry:
+            grouped[shard_of(s3_uri, shards)][s3_uri] = [
+                entry["width"],
+                entry["height"],
+                entry["orientation"],
+            ]
+    return {
+        shard: json.dumps(values, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        for shard, values in grouped.items()
+    }
+
+
+def publish_index(
+    s3_client,
+    index: LocalIndex,
+    index_dir: str,
+    index_s3_uri: str,
+    shards: int,
+    workers: int,
+) -> int:
+    """Uploads the shards which changed since the last publish to S3.
+
+    Returns:
+        number of shards uploaded
+    """
+    published_path = os.path.join(index_dir, PUBLISHED_FILE)
+    published = {}
+    if os.path.exists(published_path):
+        with open(published_path, "r") as file_handle:
+            published = json.load(file_handle)
+    if published.get("s3_uri") != index_s3_uri or published.get("shards") != shards:
+        published = {"s3_uri": index_s3_uri, "shards": shards, "digests": {}}
+
+    bucket, prefix = split_s3_uri(index_s3_uri.rstrip("/"))
+    changed = {}
+    for shard, data in build_shards(index.entries, shards).items():
+        digest = hashlib.sha256(data).hexdigest()
+        if published["digests"].get(str(shard)) != digest:
+            changed[shard] = (data, digest)
+
+    def upload(shard: int, data: bytes) -> None:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=f"{prefix}/{shard_name(shard)}",
+            Body=data,
+            ContentType="application/json",
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            shard: executor.submit(upload, shard, data)
+            for shard, (data, _) in changed.items()
+        }
+        for shard, future in futures.items():
+            future.result()
+            published["digests"][str(shard)] = changed[shard][1]
+    # Written last, so lambdas never see shards of an incomplete index.
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/{INDEX_NAME}",
+        Body=json.dumps({"format": INDEX_FORMAT, "shards": shards}).encode("utf-8"),
+        ContentType="application/json",
+    )
+    with open(published_path, "w") as file_handle:
+        json.dump(published, file_handle)
+    return len(changed)
+
+
+def annotate_manifest(index: LocalIndex, manifest_path: str, output_path: str) -> int:
+    """Adds the image_size of indexed images to the lines of a manifest.
+
+    Returns:
+        number of lines annotated
+    """
+    annotated = 0
+    with open(manifest_path, "r") as source, open(output_path, "w") as target:
+        for line in source:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            entry = index.entries.get(item.get("source-ref"))
+            if "image_size" not in item and entry is not None and "width" in entry:
+                width, height = displayed_size(
+                    entry["width"], entry["height"], entry["orientation"]
+                )
+                item["image_size"] = {"width": width, "height": height}
+                annotated += 1
+            target.write(json.dumps(item) + "\n")
+    return annotated
+
+
+def main(args: argparse.Namespace) -> int:
+    s3_client = boto3.client("s3", config=Config(max_pool_connections=args.workers))
+    index = LocalIndex(args.index_dir)
+    start = time.perf_counter()
+    try:
+        results = update_index(
+            s3_client,
+            index,
+            args.sources,
+            args.workers,
+            args.range_bytes,
+            args.max_header_bytes,
+        )
+    finally:
+        index.close()
+    results["indexed"] = sum(1 for e in index.entries.values() if "width" in e)
+    results["seconds"] = round(time.perf_counter() - start, 3)
+    if args.publish:
+        results["shards_uploaded"] = publish_index(
+            s3_client, index, args.index_dir, args.publish, args.shards, args.workers
+        )
+    if args.manifest:
+        results["manifest_lines_annotated"] = annotate_manifest(
+            index, args.manifest, args.manifest_out or args.manifest + ".indexed"
+        )
+    print(json.dumps(results))
+    return 1 if results["failed"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index image dimensions in S3")
+    parser.add_argument("sources", nargs="+", help="S3 prefixes holding images")
+    parser.add_argument(
+        "--index-dir", default="image_index", help="Directory of the local index"
+    )
+    parser.add_argument("--publish", help="S3 URI to publish the sharded index to")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--manifest", help="Input manifest to add image sizes to")
+    parser.add_argument(
+        "--manifest-out", help="Annotated manifest, defaults to <manifest>.indexed"
+    )
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument(
+        "--range-bytes",
+        type=int,
+        default=64 * 1024,
+        help="Bytes read by the first ranged GET of each image",
+    )
+    parser.add_argument("--max-header-bytes", type=int, default=4 * 1024 * 1024)
+    sys.exit(main(parser.parse_args()))
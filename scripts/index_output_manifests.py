@@ -0,0 +1,525 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This script indexes labeling job output manifests in a local SQLite file.
+
+    "ingest" reads the output manifests under S3 prefixes, local
+    directories or files and records one row per labeled data object,
+    keyed by labeling job and dataset_object_id, with its image_file_name,
+    worker_id, was_modified, no_changes_needed, total_time_in_seconds and
+    creation date. Every worker of a consolidated label is recorded too,
+    so labels can be looked up by any of their workers. The annotations
+    themselves are not stored; see scripts/export_output_manifests.py.
+
+    The ETag of every manifest ingested is kept with its rows, so later
+    runs only read the manifests which are new or changed since, replacing
+    their rows in one transaction, and drop the rows of manifests which
+    were deleted. Each job's ARN is looked up once with
+    DescribeLabelingJob, unless --no-describe is given.
+
+    "query" filters the rows by job, worker, image, modification and
+    creation date through the indexes of the SQLite file, and prints them
+    as JSON lines or their count only.
+
+Example arguments
+    python scripts/index_output_manifests.py ingest s3://<bucket>/labeling_jobs/output/
+    python scripts/index_output_manifests.py query --worker-id <worker id> \
+        --modified true --since 2026-10-16
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import boto3
+
+DEFAULT_DB = "output_index.sqlite"
+OUTPUT_MANIFEST_SUFFIX = "manifests/output/output.manifest"
+# Rows inserted per executemany call.
+BATCH_ROWS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    job_name TEXT NOT NULL UNIQUE,
+    job_arn TEXT
+);
+CREATE TABLE IF NOT EXISTS manifests (
+    manifest_id INTEGER PRIMARY KEY,
+    uri TEXT NOT NULL UNIQUE,
+    etag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS labels (
+    job_id INTEGER NOT NULL,
+    dataset_object_id TEXT NOT NULL,
+    manifest_id INTEGER NOT NULL,
+    image_file_name TEXT,
+    source_ref TEXT,
+    worker_id TEXT,
+    was_modified INTEGER,
+    no_changes_needed INTEGER,
+    total_time_in_seconds REAL,
+    creation_date TEXT,
+    PRIMARY KEY (job_id, dataset_object_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS label_workers (
+    worker_id TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    dataset_object_id TEXT NOT NULL,
+    manifest_id INTEGER NOT NULL,
+    PRIMARY KEY (worker_id, job_id, dataset_object_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS labels_manifest ON labels (manifest_id);
+CREATE INDEX IF NOT EXISTS labels_image ON labels (image_file_name);
+CREATE INDEX IF NOT EXISTS labels_creation_date ON labels (creation_date);
+CREATE INDEX IF NOT EXISTS label_workers_manifest ON label_workers (manifest_id);
+"""
+
+QUERY_COLUMNS = (
+    "job_name",
+    "job_arn",
+    "dataset_object_id",
+    "image_file_name",
+    "source_ref",
+    "worker_id",
+    "was_modified",
+    "no_changes_needed",
+    "total_time_in_seconds",
+    "creation_date",
+)
+
+
+def split_s3_uri(s3_uri: str) -> tuple:
+    bucket, _, key = s3_uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Opens the index, creating its tables on first use."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def list_manifests(s3_client, sources: List[str], suffix: str) -> List[tuple]:
+    """Expands S3 prefixes, local directories and files into manifests.
+
+    Local files are given an ETag made of their size and modification time.
+
+    Returns:
+        list of (location, ETag, size in bytes)
+    """
+    manifests = []
+    for source in sources:
+        if source.startswith("s3://"):
+            bucket, prefix = split_s3_uri(source)
+            paginator = s3_client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                for item in page.get("Contents", []):
+                    if item["Key"] == prefix or item["Key"].endswith(suffix):
+                        manifests.append(
+                            (f"s3://{bucket}/{item['Key']}", item["ETag"], item["Size"])
+                        )
+            continue
+        if os.path.isdir(source):
+            paths = [
+                os.path.join(directory, filename)
+                for directory, _, filenames in os.walk(source)
+                for filename in sorted(filenames)
+                if os.path.join(directory, filename).replace("\\", "/").endswith(suffix)
+            ]
+        else:
+            paths = [source]
+        for path in paths:
+            stat = os.stat(path)
+            manifests.append(
+                (
+                    os.path.abspath(path),
+                    f"{stat.st_size}-{stat.st_mtime_ns}",
+                    stat.st_size,
+                )
+            )
+    return manifests
+
+
+def iter_manifest_lines(s3_client, location: str) -> Iterator[bytes]:
+    if location.startswith("s3://"):
+        bucket, key = split_s3_uri(location)
+        body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+        lines = body.iter_lines()
+    else:
+        lines = open(location, "rb")
+    try:
+        for line in lines:
+            if line.strip():
+                yield line
+    finally:
+        lines.close()
+
+
+def _flag(value) -> Optional[int]:
+    """Returns 1 or 0 for booleans, including "true" and "false" strings."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str) and value.lower() in ("true", "false"):
+        return int(value.lower() == "true")
+    return None
+
+
+def _number(value) -> Optional[float]:
+    return value if isinstance(value, (int, float)) else None
+
+
+def _job_name(location: str) -> Optional[str]:
+    """Returns the job name in an <S3OutputPath>/<job name>/manifests/ path."""
+    head, found, _ = location.replace("\\", "/").rpartition("/manifests/")
+    return head.rsplit("/", 1)[-1] if found else None
+
+
+def read_row(line: bytes, label_attribute_name: str, default_job: Optional[str]):
+    """Decodes a manifest line into its row and its workers.
+
+    Returns:
+        (job name, row values after job_id and manifest_id, worker ids), or
+        None for lines without a label
+    """
+    item = json.loads(line)
+    label = item.get(label_attribute_name)
+    if not isinstance(label, dict) or label.get("dataset_object_id") is None:
+        return None
+    metadata = item.get(f"{label_attribute_name}-metadata") or {}
+    job_name = metadata.get("job-name", "").replace("labeling-job/", "") or default_job
+    source_ref = item.get("source-ref")
+    worker_ids = label.get("worker_ids") or (
+        [label["worker_id"]] if label.get("worker_id") else []
+    )
+    values = (
+        str(label["dataset_object_id"]),
+        label.get("image_file_name")
+        or (source_ref.split("/")[-1] if source_ref else None),
+        source_ref,
+        label.get("worker_id"),
+        _flag(label.get("was_modified")),
+        _flag(label.get("no_changes_needed")),
+        _number(label.get("total_time_in_seconds")),
+        metadata.get("creation-date"),
+    )
+    return job_name, values, worker_ids
+
+
+class JobIds(object):
+    """Ids of the jobs in the index, with their ARNs looked up once.
+
+    Args:
+        connection: index connection
+        sagemaker_client: boto3 SageMaker client, None not to look up ARNs
+    """
+
+    def __init__(self, connection: sqlite3.Connection, sagemaker_client=None):
+        self.connection = connection
+        self.sagemaker_client = sagemaker_client
+        self.ids = dict(connection.execute("SELECT job_name, job_id FROM jobs"))
+
+    def get(self, job_name: str) -> int:
+        job_id = self.ids.get(job_name)
+        if job_id is None:
+            job_id = self.connection.execute(
+                "INSERT INTO jobs (job_name, job_arn) VALUES (?, ?)",
+                (job_name, self._describe(job_name)),
+            ).lastrowid
+            self.ids[job_name] = job_id
+        return job_id
+
+    def _describe(self, job_name: str) -> Optional[str]:
+        if self.sagemaker_client is None:
+            return None
+        try:
+            return self.sagemaker_client.describe_labeling_job(
+                LabelingJobName=job_name
+            )["LabelingJobArn"]
+        except Exception as e:
+            print(f"Could not describe labeling job {job_name}: {e}")
+            return None
+
+
+def _delete_manifest_rows(connection: sqlite3.Connection, manifest_id: int) -> None:
+    connection.execute("DELETE FROM labels WHERE manifest_id = ?", (manifest_id,))
+    connection.execute(
+        "DELETE FROM label_workers WHERE manifest_id = ?", (manifest_id,)
+    )
+
+
+def ingest_manifest(
+    connection: sqlite3.Connection,
+    s3_client,
+    job_ids: JobIds,
+    manifest: tuple,
+    label_attribute_name: str,
+    batch_rows: int = BATCH_ROWS,
+) -> int:
+    """Replaces the rows of a manifest in one transaction.
+
+    Returns:
+        the number of rows ingested
+    """
+    location, etag, size = manifest
+    default_job = _job_name(location) or location
+    rows = 0
+    with connection:
+        row = connection.execute(
+            "SELECT manifest_id FROM manifests WHERE uri = ?", (location,)
+        ).fetchone()
+        if row is None:
+            manifest_id = connection.execute(
+                "INSERT INTO manifests (uri, etag, size, rows, ingested_at)"
+                " VALUES (?, '', 0, 0, '')",
+                (location,),
+            ).lastrowid
+        else:
+            manifest_id = row[0]
+            _delete_manifest_rows(connection, manifest_id)
+        labels, workers = [], []
+        for line in iter_manifest_lines(s3_client, location):
+            decoded = read_row(line, label_attribute_name, default_job)
+            if decoded is None:
+                continue
+            job_name, values, worker_ids = decoded
+            job_id = job_ids.get(job_name)
+            labels.append((job_id, manifest_id) + values)
+            for worker_id in worker_ids:
+                workers.append((worker_id, job_id, values[0], manifest_id))
+            if len(labels) >= batch_rows:
+                rows += _insert(connection, labels, workers)
+                labels, workers = [], []
+        rows += _insert(connection, labels, workers)
+        connection.execute(
+            "UPDATE manifests SET etag = ?, size = ?, rows = ?, ingested_at = ?"
+            " WHERE manifest_id = ?",
+            (etag, size, rows, time.strftime("%Y-%m-%dT%H:%M:%S"), manifest_id),
+        )
+    return rows
+
+
+def _insert(connection: sqlite3.Connection, labels: list, workers: list) -> int:
+    # A data object labeled again in a later manifest of its job replaces
+    # the earlier label.
+    connection.executemany(
+        "INSERT OR REPLACE INTO labels (job_id, manifest_id, dataset_object_id,"
+        " image_file_name, source_ref, worker_id, was_modified, no_changes_needed,"
+        " total_time_in_seconds, creation_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        labels,
+    )
+    connection.executemany(
+        "INSERT OR REPLACE INTO label_workers (worker_id, job_id, dataset_object_id,"
+        " manifest_id) VALUES (?, ?, ?, ?)",
+        workers,
+    )
+    return len(labels)
+
+
+def update_index(
+    connection: sqlite3.Connection,
+    s3_client,
+    sources: List[str],
+    suffix: str = OUTPUT_MANIFEST_SUFFIX,
+    label_attribute_name: str = "label-results",
+    sagemaker_client=None,
+) -> dict:
+    """Ingests the manifests which are new or changed since the last run.
+
+    Manifests found before under a source but no longer there have their
+    rows deleted.
+
+    Returns:
+        counts of the manifests ingested, unchanged, deleted and failed,
+        and of the rows ingested
+    """
+    counts = {"ingested": 0, "unchanged": 0, "deleted": 0, "failed": 0, "rows": 0}
+    known = dict(connection.execute("SELECT uri, etag FROM manifests"))
+    manifests = list_manifests(s3_client, sources, suffix)
+    job_ids = JobIds(connection, sagemaker_client)
+    for manifest in manifests:
+        if known.get(manifest[0]) == manifest[1]:
+            counts["unchanged"] += 1
+            continue
+        try:
+            counts["rows"] += ingest_manifest(
+                connection, s3_client, job_ids, manifest, label_attribute_name
+            )
+        except Exception as e:
+            print(f"Failed to ingest {manifest[0]}: {e}")
+            counts["failed"] += 1
+            # Jobs added by the rolled back transaction are gone.
+            job_ids = JobIds(connection, sagemaker_client)
+            continue
+        counts["ingested"] += 1
+
+    listed = {manifest[0] for manifest in manifests}
+    prefixes = [
+        source if source.startswith("s3://") else os.path.abspath(source)
+        for source in sources
+    ]
+    with connection:
+        for uri, manifest_id in connection.execute(
+            "SELECT uri, manifest_id FROM manifests"
+        ).fetchall():
+            if uri not in listed and any(uri.startswith(p) for p in prefixes):
+                _delete_manifest_rows(connection, manifest_id)
+                connection.execute(
+                    "DELETE FROM manifests WHERE manifest_id = ?", (manifest_id,)
+                )
+                counts["deleted"] += 1
+    return counts
+
+
+def label_query(
+    connection: sqlite3.Connection,
+    job: Optional[str] = None,
+    worker_id: Optional[str] = None,
+    image_file_name: Optional[str] = None,
+    dataset_object_id: Optional[str] = None,
+    was_modified: Optional[bool] = None,
+    no_changes_needed: Optional[bool] = None,
+    since: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, list]:
+    """Returns the SQL and parameters selecting the labels matching filters.
+
+    Args:
+        job: job name or ARN
+        worker_id: any of the workers of the label
+        since: earliest creation date, as an ISO 8601 date or date and time
+    """
+    joins = ["JOIN jobs ON jobs.job_id = labels.job_id"]
+    conditions, parameters = [], []
+    if worker_id is not None:
+        joins.insert(
+            0,
+            "JOIN label_workers ON label_workers.job_id = labels.job_id"
+            " AND label_workers.dataset_object_id = labels.dataset_object_id",
+        )
+        conditions.append("label_workers.worker_id = ?")
+        parameters.append(worker_id)
+    if job is not None:
+        conditions.append("(jobs.job_name = ? OR jobs.job_arn = ?)")
+        parameters.extend((job, job))
+    for column, value in (
+        ("image_file_name", image_file_name),
+        ("dataset_object_id", dataset_object_id),
+        ("was_modified", None if was_modified is None else int(was_modified)),
+        (
+            "no_changes_needed",
+            None if no_changes_needed is None else int(no_changes_needed),
+        ),
+    ):
+        if value is not None:
+            conditions.append(f"labels.{column} = ?")
+            parameters.append(value)
+    if since is not None:
+        conditions.append("labels.creation_date >= ?")
+        parameters.append(since)
+    columns = ", ".join(
+        f"jobs.{c}" if c.startswith("job_") else f"labels.{c}" for c in QUERY_COLUMNS
+    )
+    sql = f"SELECT {columns} FROM labels {' '.join(joins)}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if limit is not None:
+        sql += " LIMIT ?"
+        parameters.append(limit)
+    return sql, parameters
+
+
+def main(args: argparse.Namespace) -> int:
+    connection = connect(args.db)
+    try:
+        if args.command == "ingest":
+            start = time.perf_counter()
+            counts = update_index(
+                connection,
+                boto3.client("s3"),
+                args.sources,
+                args.suffix,
+                args.label_attribute_name,
+                None if args.no_describe else boto3.client("sagemaker"),
+            )
+            counts["seconds"] = round(time.perf_counter() - start, 3)
+            print(json.dumps(counts))
+            return 1 if counts["failed"] else 0
+
+        sql, parameters = label_query(
+            connection,
+            args.job,
+            args.worker_id,
+            args.image_file_name,
+            args.dataset_object_id,
+            args.modified,
+            args.no_changes_needed,
+            args.since,
+            args.limit,
+        )
+        if args.count:
+            count = connection.execute(
+                f"SELECT COUNT(*) FROM ({sql})", parameters  # nosec B608
+            ).fetchone()[0]
+            print(count)
+            return 0
+        for row in connection.execute(sql, parameters):
+            print(json.dumps(dict(zip(QUERY_COLUMNS, row))))
+        return 0
+    finally:
+        connection.close()
+
+
+def _bool_argument(value: str) -> bool:
+    return value.lower() in ("true", "1", "yes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index output manifests in SQLite")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Path of the SQLite index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest output manifests")
+    ingest_parser.add_argument(
+        "sources", nargs="+", help="Output manifest files, directories or S3 prefixes"
+    )
+    ingest_parser.add_argument("--label-attribute-name", default="label-results")
+    ingest_parser.add_argument(
+        "--suffix",
+        default=OUTPUT_MANIFEST_SUFFIX,
+        help="Only manifests ending with this are read from prefixes and directories",
+    )
+    ingest_parser.add_argument(
+        "--no-describe", action="store_true", help="Do not look up job ARNs"
+    )
+
+    query_parser = subparsers.add_parser("query", help="Query the indexed labels")
+    query_parser.add_argument("--job", help="Job name or ARN")
+    query_parser.add_argument("--worker-id")
+    query_parser.add_argument("--image-file-name")
+    query_parser.add_argument("--dataset-object-id")
+    query_parser.add_argument(
+        "--modified",
+        type=_bool_argument,
+        help="true for labels whose annotations were modified, false for the others",
+    )
+    query_parser.add_argument("--no-changes-needed", type=_bool_argument)
+    query_parser.add_argument(
+        "--since", help="Earliest creation date, such as 2026-10-16 or 2026-10-16T12:00"
+    )
+    query_parser.add_argument("--limit", type=int)
+    query_parser.add_argument(
+        "--count", action="store_true", help="Print the number of labels only"
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,233 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""This script launches and tracks labeling jobs over manifest shards.
+
+    scripts/create_example_labeling_job.py can split its manifest into
+    shards (see scripts/manifest_writer.py) and label each with its own
+    labeling job. The shards, the labeling job request they share and the
+    state of each shard's job are kept in a local batch file:
+
+        {"batch": <name>, "request": <CreateLabelingJob request>,
+         "max_concurrent_jobs": <int>,
+         "shards": [{"index", "manifest_s3_uri", "items", "bytes",
+                     "job_name", "status", "output_manifest_s3_uri"}]}
+
+    Each run of this script refreshes the status of the batch's jobs and
+    launches jobs for the next shards while fewer than max_concurrent_jobs
+    are running, so it can be run again at any time, from cron for
+    instance, or left running with --wait until every job has finished.
+    --merge then concatenates the output manifests of the completed jobs
+    into one, streamed to S3.
+
+Example arguments
+    python scripts/job_shards.py scripts/labeling_jobs/<batch>.json --wait
+    python scripts/job_shards.py scripts/labeling_jobs/<batch>.json \
+        --merge s3://<bucket>/labeling_jobs/output/<batch>/output.manifest
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+from manifest_writer import S3ManifestWriter, split_s3_uri
+
+ACTIVE_STATUSES = ("Initializing", "InProgress", "Stopping")
+FINAL_STATUSES = ("Completed", "Failed", "Stopped")
+DEFAULT_MAX_CONCURRENT_JOBS = 4
+POLL_SECONDS = 300
+
+
+def new_batch(
+    batch: str, request: dict, shards: list, max_concurrent_jobs: int
+) -> dict:
+    """Returns a batch with no job launched yet.
+
+    Args:
+        batch: name of the batch, from which job names are derived
+        request: CreateLabelingJob request shared by the jobs, whose
+            LabelingJobName and ManifestS3Uri are set for each shard
+        shards: shards written by manifest_writer.ShardedManifestWriter
+        max_concurrent_jobs: number of jobs running at the same time
+    """
+    return {
+        "batch": batch,
+        "request": request,
+        "max_concurrent_jobs": max_concurrent_jobs,
+        "shards": [
+            dict(shard, job_name=None, status=None, output_manifest_s3_uri=None)
+            for shard in shards
+        ],
+    }
+
+
+def load_batch(path: str) -> dict:
+    with open(path, "r") as file_handle:
+        return json.load(file_handle)
+
+
+def save_batch(path: str, batch: dict) -> None:
+    """Writes the batch file, replacing it only once it is written in full."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file_handle:
+        json.dump(batch, file_handle, indent=2)
+    os.replace(temp_path, path)
+
+
+def job_name(batch: dict, shard: dict) -> str:
+    if len(batch["shards"]) == 1:
+        return batch["batch"]
+    return f"{batch['batch']}-{shard['index']:03d}"
+
+
+def shard_request(batch: dict, shard: dict) -> dict:
+    """Returns the CreateLabelingJob request of a shard."""
+    request = copy.deepcopy(batch["request"])
+    request["LabelingJobName"] = job_name(batch, shard)
+    request["InputConfig"]["DataSource"]["S3DataSource"]["ManifestS3Uri"] = shard[
+        "manifest_s3_uri"
+    ]
+    return request
+
+
+def refresh(sagemaker_client, batch: dict) -> None:
+    """Updates the status and output manifest of the batch's running jobs."""
+    for shard in batch["shards"]:
+        if shard["job_name"] is None or shard["status"] in FINAL_STATUSES:
+            continue
+        response = sagemaker_client.describe_labeling_job(
+            LabelingJobName=shard["job_name"]
+        )
+        shard["status"] = response["LabelingJobStatus"]
+        output = response.get("LabelingJobOutput") or {}
+        shard["output_manifest_s3_uri"] = output.get("OutputDatasetS3Uri")
+
+
+def launch(sagemaker_client, batch: dict, max_concurrent_jobs: int) -> int:
+    """Launches jobs for the next shards while fewer than the limit run.
+
+    Returns:
+        the number of jobs launched
+    """
+    running = sum(1 for s in batch["shards"] if s["status"] in ACTIVE_STATUSES)
+    launched = 0
+    for shard in batch["shards"]:
+        if running >= max_concurrent_jobs:
+            break
+        if shard["job_name"] is not None:
+            continue
+        request = shard_request(batch, shard)
+        sagemaker_client.create_labeling_job(**request)
+        shard["job_name"] = request["LabelingJobName"]
+        shard["status"] = "Initializing"
+        running += 1
+        launched += 1
+        print(f"Launched {shard['job_name']} on {shard['manifest_s3_uri']}")
+    return launched
+
+
+def schedule(
+    sagemaker_client,
+    path: str,
+    max_concurrent_jobs: Optional[int] = None,
+    wait: bool = False,
+    poll_seconds: float = POLL_SECONDS,
+) -> dict:
+    """Refreshes a batch and launches its next jobs.
+
+    Args:
+        sagemaker_client: boto3 SageMaker client
+        path: path of the batch file, which is updated
+        max_concurrent_jobs: overrides the batch's limit
+        wait: keep polling and launching until every job has finished
+        poll_seconds: time between polls when waiting
+
+    Returns:
+        the number of shards in each job status, None for shards not
+        launched yet
+    """
+    batch = load_batch(path)
+    if max_concurrent_jobs is not None:
+        batch["max_concurrent_jobs"] = max_concurrent_jobs
+    while True:
+        refresh(sagemaker_client, batch)
+        try:
+            launch(sagemaker_client, batch, batch["max_concurrent_jobs"])
+        finally:
+            # Jobs launched before a failure are recorded all the same.
+            save_batch(path, batch)
+        statuses = {}
+        for shard in batch["shards"]:
+            statuses[shard["status"]] = statuses.get(shard["status"], 0) + 1
+        if not wait or all(s["status"] in FINAL_STATUSES for s in batch["shards"]):
+            return statuses
+        time.sleep(poll_seconds)
+
+
+def merge_output_manifests(s3_client, batch: dict, s3_uri: str) -> dict:
+    """Concatenates the output manifests of the batch's completed jobs.
+
+    Returns:
+        counts of the shards merged and skipped and of the lines written
+    """
+    counts = {"merged": 0, "skipped": 0, "lines": 0}
+    with S3ManifestWriter(s3_client, s3_uri) as writer:
+        for shard in batch["shards"]:
+            if shard["status"] != "Completed" or not shard["output_manifest_s3_uri"]:
+                counts["skipped"] += 1
+                continue
+            bucket, key = split_s3_uri(shard["output_manifest_s3_uri"])
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+            for line in body.iter_lines():
+                if line.strip():
+                    writer.write_line(line)
+            counts["merged"] += 1
+        counts["lines"] = writer.items
+    return counts
+
+
+def main(args: argparse.Namespace) -> int:
+    sagemaker_client = boto3.client(
+        "sagemaker", config=Config(retries={"max_attempts": 10, "mode": "adaptive"})
+    )
+    statuses = schedule(
+        sagemaker_client,
+        args.batch_file,
+        args.max_concurrent_jobs,
+        args.wait,
+        args.poll_seconds,
+    )
+    print(f"Job statuses: {statuses}")
+    if args.merge:
+        counts = merge_output_manifests(
+            boto3.client("s3"), load_batch(args.batch_file), args.merge
+        )
+        print(f"Merged output manifests into {args.merge}: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Launch and track labeling jobs over manifest shards"
+    )
+    parser.add_argument("batch_file", help="Batch file written by the job script")
+    parser.add_argument(
+        "--max-concurrent-jobs",
+        type=int,
+        help="Overrides the number of jobs running at the same time",
+    )
+    parser.add_argument(
+        "--wait", action="store_true", help="Wait until every job has finished"
+    )
+    parser.add_argument("--poll-seconds", type=float, default=POLL_SECONDS)
+    parser.add_argument(
+        "--merge", help="S3 URI to merge the completed jobs' output manifests into"
+    )
+    sys.exit(main(parser.parse_args()))
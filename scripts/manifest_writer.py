@@ -0,0 +1,210 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Streaming writers of JSON lines manifests to S3.
+
+    S3ManifestWriter encodes manifest items as they are produced and sends
+    them to S3 as the parts of a multipart upload, so memory use stays at
+    one part whatever the size of the manifest. Manifests smaller than a
+    part are written with a single PUT.
+
+    ShardedManifestWriter splits a stream of items into several manifests,
+    starting a new one once the current one holds --shard-items items or
+    --shard-mb megabytes, so that a large dataset can be labeled by several
+    labeling jobs (see scripts/job_shards.py). Aborting it deletes the
+    manifests it completed, so no partial set of shards is left behind.
+"""
+import json
+from typing import List, Optional
+
+# S3 parts other than the last must be at least 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# Keys per DeleteObjects request.
+MAX_DELETE_KEYS = 1000
+
+
+def split_s3_uri(s3_uri: str) -> tuple:
+    bucket, _, key = s3_uri.replace("s3://", "", 1).partition("/")
+    return bucket, key
+
+
+class S3ManifestWriter(object):
+    """Writes a JSON lines manifest to S3 as it is produced.
+
+    The manifest only exists in S3 once the writer is closed; leaving its
+    context with an exception aborts the upload.
+
+    Args:
+        s3_client: boto3 S3 client
+        s3_uri: S3 URI of the manifest
+        part_size: bytes buffered before a part is uploaded
+    """
+
+    def __init__(self, s3_client, s3_uri: str, part_size: int = DEFAULT_PART_SIZE):
+        self.s3_client = s3_client
+        self.s3_uri = s3_uri
+        self.bucket, self.key = split_s3_uri(s3_uri)
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.items = 0
+        self.bytes = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, item: dict) -> None:
+        """Appends a manifest item."""
+        self.write_line(json.dumps(item, separators=(",", ":")).encode("utf-8"))
+
+    def write_line(self, line: bytes) -> None:
+        """Appends an encoded manifest line, without its line break."""
+        if self.items:
+            self._buffer += b"\n"
+        self._buffer += line
+        self.items += 1
+        self.bytes += len(line) + (self.items > 1)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def _upload_part(self) -> None:
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType="application/jsonlines"
+            )["UploadId"]
+        number = len(self._parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=number,
+            Body=bytes(self._buffer),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": number})
+        self._buffer = bytearray()
+
+    def close(self) -> None:
+        """Uploads what is buffered and completes the manifest."""
+        if self._upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                ContentType="application/jsonlines",
+            )
+            self._buffer = bytearray()
+            return
+        if self._buffer:
+            self._upload_part()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self) -> None:
+        """Discards the manifest."""
+        self._buffer = bytearray()
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
+
+
+class ShardedManifestWriter(object):
+    """Writes manifest items to a series of manifests of bounded size.
+
+    Args:
+        s3_client: boto3 S3 client
+        s3_prefix: S3 URI prefix of the manifests, which are named
+            shard-<index>.manifest under it
+        max_items: items per manifest, None for no limit
+        max_bytes: bytes per manifest, None for no limit
+        part_size: see S3ManifestWriter
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        s3_prefix: str,
+        max_items: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        part_size: int = DEFAULT_PART_SIZE,
+    ):
+        self.s3_client = s3_client
+        self.s3_prefix = s3_prefix.rstrip("/")
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.part_size = part_size
+        self.shards: List[dict] = []
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _finish_shard(self) -> None:
+        self._writer.close()
+        self.shards.append(
+            {
+                "index": len(self.shards),
+                "manifest_s3_uri": self._writer.s3_uri,
+                "items": self._writer.items,
+                "bytes": self._writer.bytes,
+            }
+        )
+        self._writer = None
+
+    def write(self, item: dict) -> None:
+        line = json.dumps(item, separators=(",", ":")).encode("utf-8")
+        writer = self._writer
+        if writer is not None and (
+            (self.max_items and writer.items >= self.max_items)
+            or (self.max_bytes and writer.bytes + len(line) + 1 > self.max_bytes)
+        ):
+            self._finish_shard()
+        if self._writer is None:
+            self._writer = S3ManifestWriter(
+                self.s3_client,
+                f"{self.s3_prefix}/shard-{len(self.shards):05d}.manifest",
+                self.part_size,
+            )
+        self._writer.write_line(line)
+
+    def abort(self) -> None:
+        """Discards the manifest being written and deletes the completed ones."""
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+        bucket, _ = split_s3_uri(self.s3_prefix)
+        keys = [split_s3_uri(shard["manifest_s3_uri"])[1] for shard in self.shards]
+        while keys:
+            batch, keys = keys[:MAX_DELETE_KEYS], keys[MAX_DELETE_KEYS:]
+            self.s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        self.shards = []
+
+    def close(self) -> List[dict]:
+        """Completes the last manifest.
+
+        Returns:
+            one {"index", "manifest_s3_uri", "items", "bytes"} per manifest
+        """
+        if self._writer is not None:
+            self._finish_shard()
+        return self.shards
@@ -5,16 +5,21 @@ from botocore.exceptions import ClientError
 
 
 def update_custom_template_with_the_hosted_javascript_url(
-    bucket_name: str, cloudfront_domain_name: str
+    bucket_name: str,
+    cloudfront_domain_name: str,
+    javascript_key: str = "infrastructure/ground_truth_templates/crowd-2d-skeleton.js",
 ) -> None:
     """Updates the example template with the created Cloudfront distribution URL.
 
         This process is needed to update the template to point to the newly
-        hosted JavaScript file.
+        hosted JavaScript file. The stack hosts the bundle under a name
+        holding the hash of its content, with an immutable Cache-Control, so
+        annotators download it once per release of the bundle.
 
     Args:
         bucket_name: Name of the bucket to upload the updated template
         cloudfront_domain_name: The domain name of the CloudFront distribution.
+        javascript_key: S3 key of the hosted JavaScript file.
 
     Returns:
         None
@@ -25,7 +30,7 @@ def update_custom_template_with_the_hosted_javascript_url(
         file_content = input_file.read()
 
     string_to_replace = "URL_TO_HOSTED_JS_GOES_HERE"
-    replacement_string = f"https://{cloudfront_domain_name}/infrastructure/ground_truth_templates/crowd-2d-skeleton.js"
+    replacement_string = f"https://{cloudfront_domain_name}/{javascript_key}"
     modified_content = file_content.replace(string_to_replace, replacement_string)
 
     try:
@@ -73,8 +78,14 @@ def main():
     cloudfront_domain_name = read_ssm_parameter(
         "/crowd_2d_skeleton_example_stack/cloudfront_domain_name"
     )
+    # <domain>/<key> of the content-hashed bundle deployed by the stack
+    hosted_javascript_url = read_ssm_parameter(
+        "/crowd_2d_skeleton_example_stack/hosted_javascript_url"
+    )
     update_custom_template_with_the_hosted_javascript_url(
-        bucket_name, cloudfront_domain_name
+        bucket_name,
+        cloudfront_domain_name,
+        hosted_javascript_url.partition("/")[2],
     )
 
 
@@ -0,0 +1,285 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Incremental, concurrent upload of local files to S3.
+
+    sync_files uploads a list of local files from a thread pool sharing one
+    S3 client, whose connection pool is sized for all of them, and large
+    files are uploaded in parallel multipart chunks. A file is skipped when
+    its object already matches, which is decided without reading the file
+    whenever possible:
+
+    * the local state file records the size, modification time and ETag
+      of every file synced before, so a file unchanged since its last sync
+      is skipped when its object still has that ETag;
+    * a file with a known MD5, such as the OriginalMD5 of
+      scripts/image_details.csv, is skipped when its object has the same
+      size and that MD5 as its ETag;
+    * otherwise the file's ETag is computed, for multipart objects with the
+      chunk size used here, and compared with the object's.
+
+    The objects are listed once per prefix, rather than one request per
+    file. The state file is an append-only JSON lines file, so an
+    interrupted sync keeps the files it already uploaded.
+"""
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+DEFAULT_WORKERS = 32
+# Concurrent part uploads of each multipart upload.
+PART_CONCURRENCY = 4
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+
+class SyncFile(NamedTuple):
+    """A local file to upload.
+
+    md5 is the hex MD5 of the file, when known without reading it.
+    """
+
+    path: str
+    key: str
+    content_type: Optional[str] = None
+    md5: Optional[str] = None
+
+
+def make_s3_client(workers: int = DEFAULT_WORKERS):
+    """Returns an S3 client with connections for workers concurrent uploads."""
+    return boto3.client(
+        "s3",
+        config=Config(
+            max_pool_connections=workers * PART_CONCURRENCY,
+            retries={"max_attempts": 10, "mode": "adaptive"},
+        ),
+    )
+
+
+def transfer_config() -> TransferConfig:
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNK_SIZE,
+        max_concurrency=PART_CONCURRENCY,
+    )
+
+
+def md5_from_base64(value: str) -> Optional[str]:
+    """Returns the hex form of a base64 MD5 such as OriginalMD5, or None."""
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except ValueError:
+        return None
+    return digest.hex() if len(digest) == 16 else None
+
+
+def local_etag(path: str) -> str:
+    """Returns the ETag S3 gives the file when it is uploaded by sync_files.
+
+    Files below MULTIPART_THRESHOLD get the MD5 of their content, larger
+    ones the MD5 of the MD5s of their MULTIPART_CHUNK_SIZE parts and the
+    number of parts.
+    """
+    size = os.path.getsize(path)
+    whole = hashlib.md5(usedforsecurity=False)
+    parts = []
+    with open(path, "rb") as file_handle:
+        while True:
+            part = hashlib.md5(usedforsecurity=False)
+            remaining = MULTIPART_CHUNK_SIZE
+            while remaining:
+                data = file_handle.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                part.update(data)
+                if size < MULTIPART_THRESHOLD:
+                    whole.update(data)
+                remaining -= len(data)
+            if remaining == MULTIPART_CHUNK_SIZE:
+                break
+            parts.append(part.digest())
+    if size < MULTIPART_THRESHOLD:
+        return f'"{whole.hexdigest()}"'
+    combined = hashlib.md5(b"".join(parts), usedforsecurity=False).hexdigest()
+    return f'"{combined}-{len(parts)}"'
+
+
+class SyncState(object):
+    """Files synced before, kept in an append-only JSON lines file.
+
+    Args:
+        path: path of the state file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.lines = 0
+        if os.path.exists(path):
+            with open(path, "r") as file_handle:
+                for line in file_handle:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    self.entries[entry["uri"]] = entry
+                    self.lines += 1
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a")
+
+    def get(self, uri: str) -> Optional[dict]:
+        return self.entries.get(uri)
+
+    def add(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self.lines += 1
+        self.entries[entry["uri"]] = entry
+
+    def close(self) -> None:
+        """Closes the file, rewriting it first if most lines are superseded."""
+        self._file.close()
+        if self.lines > 2 * len(self.entries) + 1000:
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as file_handle:
+                for entry in self.entries.values():
+                    file_handle.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            os.replace(temp_path, self.path)
+
+
+def list_objects(s3_client, bucket: str, prefixes: List[str]) -> Dict[str, tuple]:
+    """Returns (ETag, size) of the objects under prefixes, keyed by key."""
+    objects = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for prefix in prefixes:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                objects[item["Key"]] = (item["ETag"], item["Size"])
+    return objects
+
+
+def _common_prefixes(keys: List[str]) -> List[str]:
+    """Returns the distinct directories of keys, without nested ones."""
+    prefixes = sorted({key.rpartition("/")[0] + "/" for key in keys})
+    kept = []
+    for prefix in prefixes:
+        if not kept or not prefix.startswith(kept[-1]):
+            kept.append(prefix)
+    return kept
+
+
+def _sync_file(
+    s3_client,
+    bucket: str,
+    sync_file: SyncFile,
+    remote: Optional[Tuple[str, int]],
+    previous: Optional[dict],
+    config: TransferConfig,
+) -> Tuple[str, dict]:
+    """Uploads a file unless its object matches.
+
+    Returns:
+        (outcome, state entry) where outcome is "uploaded" or the reason the
+        file was skipped: "state", "md5" or "etag"
+    """
+    stat = os.stat(sync_file.path)
+    entry = {
+        "uri": f"s3://{bucket}/{sync_file.key}",
+        "path": sync_file.path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    if remote is not None and remote[1] == stat.st_size:
+        etag = remote[0]
+        if (
+            previous is not None
+            and previous.get("etag") == etag
+            and previous["size"] == stat.st_size
+            and previous["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return "state", dict(entry, etag=etag)
+        if sync_file.md5 and etag.strip('"') == sync_file.md5:
+            return "md5", dict(entry, etag=etag)
+        entry["etag"] = local_etag(sync_file.path)
+        if entry["etag"] == etag:
+            return "etag", entry
+    else:
+        entry["etag"] = local_etag(sync_file.path)
+
+    extra_args = {"ContentType": sync_file.content_type}
+    s3_client.upload_file(
+        sync_file.path,
+        bucket,
+        sync_file.key,
+        ExtraArgs=extra_args if sync_file.content_type else None,
+        Config=config,
+    )
+    return "uploaded", entry
+
+
+def sync_files(
+    s3_client,
+    bucket: str,
+    files: List[SyncFile],
+    state: SyncState,
+    workers: int = DEFAULT_WORKERS,
+) -> dict:
+    """Uploads the files whose objects are missing or differ.
+
+    Args:
+        s3_client: boto3 S3 client, see make_s3_client
+        bucket: bucket to upload to
+        files: files to upload
+        state: state of earlier syncs, updated as files are synced
+        workers: number of files uploaded concurrently
+
+    Returns:
+        counts of the files uploaded, skipped for each reason and failed,
+        and the bytes uploaded
+    """
+    counts = {
+        "uploaded": 0,
+        "state": 0,
+        "md5": 0,
+        "etag": 0,
+        "failed": 0,
+        "uploaded_bytes": 0,
+    }
+    if not files:
+        return counts
+    remote = list_objects(s3_client, bucket, _common_prefixes([f.key for f in files]))
+    config = transfer_config()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                _sync_file,
+                s3_client,
+                bucket,
+                sync_file,
+                remote.get(sync_file.key),
+                state.get(f"s3://{bucket}/{sync_file.key}"),
+                config,
+            ): sync_file
+            for sync_file in files
+        }
+        for future, sync_file in futures.items():
+            try:
+                outcome, entry = future.result()
+            except Exception as e:
+                print(f"Failed to upload {sync_file.path}: {e}")
+                counts["failed"] += 1
+                continue
+            counts[outcome] += 1
+            if outcome == "uploaded":
+                counts["uploaded_bytes"] += entry["size"]
+            if outcome != "state":
+                state.add(entry)
+    return counts
@@ -0,0 +1,187 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+"""Fixtures shared by the tests.
+
+    The lambdas, their layer and the scripts are made importable the same
+    way the Lambda runtime and the scripts do. Both lambdas have a
+    lambda_function module, so they are loaded under their own names with
+    load_lambda_function.
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_LAYER_DIR = os.path.join(REPO_ROOT, "cdk", "lambda_layer", "python")
+POST_ANNOTATION_LAMBDA_DIR = os.path.join(REPO_ROOT, "cdk", "post_annotation_lambda")
+PRE_ANNOTATION_LAMBDA_DIR = os.path.join(REPO_ROOT, "cdk", "pre_annotation_lambda")
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+
+for path in (
+    SCRIPTS_DIR,
+    PRE_ANNOTATION_LAMBDA_DIR,
+    POST_ANNOTATION_LAMBDA_DIR,
+    LAMBDA_LAYER_DIR,
+):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+PAYLOAD_URI = "s3://example-bucket/consolidation/payload.json"
+OUTPUT_URI = "s3://example-bucket/labeling_jobs/output/example"
+
+
+def load_lambda_function(lambda_dir, name):
+    """Imports the lambda_function module of a lambda as name."""
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(lambda_dir, "lambda_function.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+
+class FakeSTSClient(object):
+    """STS stand-in returning credentials valid for ttl."""
+
+    def __init__(self, ttl=timedelta(hours=1)):
+        self.ttl = ttl
+        self.assume_role_calls = 0
+
+    def assume_role(self, RoleArn, RoleSessionName):
+        self.assume_role_calls += 1
+        return {
+            "Credentials": {
+                "AccessKeyId": f"key-{self.assume_role_calls}",
+                "SecretAccessKey": "secret",
+                "SessionToken": "token",
+                "Expiration": datetime.now(timezone.utc) + self.ttl,
+            }
+        }
+
+
+class FakeBotoS3Client(object):
+    """The part of the boto3 S3 client used by s3_helper.S3Client.
+
+    Objects are held in memory by s3 URI. Like S3 for a role without
+    s3:ListBucket, reads of missing keys fail with AccessDenied, or 403 for
+    HEAD requests, rather than NoSuchKey.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    @staticmethod
+    def _denied(code, operation):
+        return ClientError(
+            {"Error": {"Code": code, "Message": "Access Denied"}}, operation
+        )
+
+    def get_object(self, Bucket, Key):
+        self.calls.append(("get_object", f"s3://{Bucket}/{Key}"))
+        data = self.objects.get(f"s3://{Bucket}/{Key}")
+        if data is None:
+            raise self._denied("AccessDenied", "GetObject")
+        return {"Body": io.BytesIO(data)}
+
+    def head_object(self, Bucket, Key):
+        self.calls.append(("head_object", f"s3://{Bucket}/{Key}"))
+        data = self.objects.get(f"s3://{Bucket}/{Key}")
+        if data is None:
+            raise self._denied("403", "HeadObject")
+        return {"ETag": '"{}"'.format(hashlib.md5(data).hexdigest())}  # nosec B324
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append(("put_object", f"s3://{Bucket}/{Key}"))
+        self.objects[f"s3://{Bucket}/{Key}"] = (
+            Body.encode("utf-8") if isinstance(Body, str) else Body
+        )
+        return {}
+
+
+def make_data_object(index, skeletons=2):
+    """Returns a data object of the consolidation payload, with one worker."""
+    image_s3_uri = f"s3://example-bucket/labeling_jobs/images/image_{index}.jpg"
+    original = [
+        {
+            "id": f"skeleton-{s}",
+            "keypoints": [
+                {"label": "top_of_head", "x": 100.0 * s + index, "y": 50.0},
+                {"label": "right_shoulder", "x": 100.0 * s + index, "y": 80.0},
+            ],
+        }
+        for s in range(skeletons)
+    ]
+    updated = json.loads(json.dumps(original))
+    updated[0]["keypoints"][0]["x"] += 1
+    content = {
+        "image_name": f"image_{index}.jpg",
+        "image_s3_uri": image_s3_uri,
+        "original_annotations": json.dumps(original),
+        "updated_annotations": updated,
+        "no_changes_needed": "false",
+        "total_time_in_seconds": 12.5,
+    }
+    return {
+        "datasetObjectId": str(index),
+        "dataObject": {"s3Uri": image_s3_uri},
+        "annotations": [
+            {"workerId": "worker-0", "annotationData": {"content": json.dumps(content)}}
+        ],
+    }
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """FakeBotoS3Client behind every s3_helper.S3Client of the test."""
+    import s3_helper
+
+    client = FakeBotoS3Client()
+    monkeypatch.setattr(
+        s3_helper, "role_session_cache", s3_helper.RoleSessionCache(FakeSTSClient)
+    )
+    monkeypatch.setattr(
+        s3_helper.RoleSession, "_create_s3_client", lambda role_session: client
+    )
+    return client
+
+
+@pytest.fixture
+def post_lambda(monkeypatch):
+    """lambda_function of the post-annotation lambda, consolidating serially."""
+    module = load_lambda_function(POST_ANNOTATION_LAMBDA_DIR, "post_lambda_function")
+    monkeypatch.setattr(module, "CONSOLIDATION_PROCESSES", 1)
+    module.memory_result_cache.clear()
+    return module
+
+
+@pytest.fixture
+def pre_lambda():
+    """lambda_function of the pre-annotation lambda."""
+    return load_lambda_function(PRE_ANNOTATION_LAMBDA_DIR, "pre_lambda_function")
+
+
+@pytest.fixture
+def consolidation_event(s3):
+    """Consolidation request of a payload of three data objects stored in s3."""
+    s3.objects[PAYLOAD_URI] = json.dumps(
+        [make_data_object(i) for i in range(3)]
+    ).encode("utf-8")
+    return {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "labelAttributeName": "label-results",
+        "roleArn": "arn:aws:iam::111122223333:role/example",
+        "payload": {"s3Uri": PAYLOAD_URI},
+        "outputConfig": OUTPUT_URI,
+    }
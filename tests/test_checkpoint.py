@@ -0,0 +1,114 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import json
+import time
+
+import pytest
+from checkpoint import ConsolidationCheckpoint, DeadlineExceeded
+from conftest import OUTPUT_URI, PAYLOAD_URI, make_data_object
+from s3_helper import S3Client
+
+CHECKPOINT_URI = f"{OUTPUT_URI}/consolidation_checkpoints/key"
+ANNOTATION_URI = "s3://example-bucket/labeling_jobs/annotations/1.json"
+
+
+class ExpiringContext(object):
+    """Lambda context with time for the first checks only."""
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def get_remaining_time_in_millis(self):
+        self.checks -= 1
+        return 15 * 60 * 1000 if self.checks >= 0 else 0
+
+
+@pytest.fixture(autouse=True)
+def without_result_cache(post_lambda, monkeypatch):
+    monkeypatch.setattr(post_lambda, "RESULT_CACHE_ENABLED", False)
+
+
+def test_first_request_consolidates_when_the_manifest_is_denied(
+    post_lambda, s3, consolidation_event
+):
+    output = post_lambda.lambda_handler(consolidation_event, None)
+
+    assert [r["datasetObjectId"] for r in output] == ["0", "1", "2"]
+
+
+def test_unreadable_manifest_is_no_checkpoint(s3):
+    s3.objects[f"{CHECKPOINT_URI}/checkpoint.json"] = b'{"processed": '
+    checkpoint = ConsolidationCheckpoint(
+        S3Client("arn:aws:iam::111122223333:role/example"), CHECKPOINT_URI
+    )
+
+    assert checkpoint.load() == 0
+    assert list(checkpoint.iter_resumed_responses()) == []
+
+
+def test_progress_stops_at_the_first_failure(s3):
+    s3_client = S3Client("arn:aws:iam::111122223333:role/example")
+    checkpoint = ConsolidationCheckpoint(s3_client, CHECKPOINT_URI, chunk_size=10)
+    checkpoint.add({"datasetObjectId": "0"}, {"success": 1, "failure": 0})
+    checkpoint.add({"datasetObjectId": "1"}, {"success": 2, "failure": 0})
+    # Data object 2 failed before data object 3 was consolidated.
+    checkpoint.add({"datasetObjectId": "3"}, {"success": 3, "failure": 1})
+    checkpoint.save({"success": 3, "failure": 1})
+
+    resumed = ConsolidationCheckpoint(s3_client, CHECKPOINT_URI)
+    assert resumed.load() == 2
+    assert resumed.counts == {"success": 2, "failure": 0}
+    assert [r["datasetObjectId"] for r in resumed.iter_resumed_responses()] == [
+        "0",
+        "1",
+    ]
+
+
+def test_retry_consolidates_failed_data_objects_again(
+    post_lambda, s3, consolidation_event
+):
+    data_objects = [make_data_object(i) for i in range(4)]
+    # The annotation of data object 1 cannot be read on the first attempt.
+    annotation_data = data_objects[1]["annotations"][0]["annotationData"]
+    content = annotation_data.pop("content")
+    annotation_data["s3Uri"] = ANNOTATION_URI
+    s3.objects[PAYLOAD_URI] = json.dumps(data_objects).encode("utf-8")
+
+    with pytest.raises(DeadlineExceeded):
+        post_lambda.lambda_handler(consolidation_event, ExpiringContext(2))
+    s3.objects[ANNOTATION_URI] = content.encode("utf-8")
+    output = post_lambda.lambda_handler(consolidation_event, None)
+
+    assert sorted(r["datasetObjectId"] for r in output) == ["0", "1", "2", "3"]
+
+
+def test_spilled_labels_are_written_before_a_deadline_fails(
+    post_lambda, s3, consolidation_event, monkeypatch
+):
+    put_object = s3.put_object
+
+    def slow_put_object(**kwargs):
+        time.sleep(0.05)
+        return put_object(**kwargs)
+
+    monkeypatch.setattr(s3, "put_object", slow_put_object)
+    s3_client = S3Client(consolidation_event["roleArn"])
+    checkpoint = ConsolidationCheckpoint(s3_client, CHECKPOINT_URI)
+
+    with pytest.raises(DeadlineExceeded):
+        post_lambda.do_consolidation(
+            consolidation_event["labelingJobArn"],
+            consolidation_event["payload"],
+            consolidation_event["labelAttributeName"],
+            s3_client,
+            output_s3_uri=OUTPUT_URI,
+            spill_threshold_bytes=0,
+            checkpoint=checkpoint,
+            context=ExpiringContext(2),
+        )
+
+    details = [uri for uri in s3.objects if "/consolidation_details/" in uri]
+    assert sorted(details) == [
+        f"{OUTPUT_URI}/consolidation_details/0.json",
+        f"{OUTPUT_URI}/consolidation_details/1.json",
+    ]
@@ -0,0 +1,125 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import hashlib
+
+import download_example_images
+import pytest
+from create_example_labeling_job import read_original_md5s, read_rotations
+from download_example_images import ImageDownload, download_image
+
+IMAGE = bytes(range(256)) * 40
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, body, headers):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), chunk_size):
+            end = start + chunk_size
+            yield self.body[start:end]
+
+
+class FakeSession(object):
+    """Serves IMAGE, honouring Range requests, cut short by truncate bytes."""
+
+    def __init__(self, truncate=()):
+        self.truncate = list(truncate)
+        self.ranges = []
+
+    def get(self, url, headers, stream, timeout):
+        offset = 0
+        if "Range" in headers:
+            offset = int(headers["Range"].split("=")[1].rstrip("-"))
+        self.ranges.append(offset)
+        body = IMAGE[offset:]
+        headers = {"Content-Length": str(len(body))}
+        if offset:
+            headers["Content-Range"] = f"bytes {offset}-{len(IMAGE) - 1}/{len(IMAGE)}"
+        if self.truncate:
+            body = body[: len(body) - self.truncate.pop(0)]
+        return FakeResponse(206 if offset else 200, body, headers)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = FakeSession()
+    monkeypatch.setattr(download_example_images, "get_session", lambda workers: session)
+    monkeypatch.setattr(download_example_images.time, "sleep", lambda seconds: None)
+    return session
+
+
+def image(tmp_path, known=True):
+    path = str(tmp_path / "image.jpg")
+    if not known:
+        return ImageDownload("https://example.com/image.jpg", path)
+    md5 = hashlib.md5(IMAGE, usedforsecurity=False).hexdigest()
+    return ImageDownload("https://example.com/image.jpg", path, len(IMAGE), md5)
+
+
+def test_partial_file_is_resumed(tmp_path, session):
+    download = image(tmp_path)
+    with open(download.path + ".part", "wb") as file_handle:
+        file_handle.write(IMAGE[:1000])
+
+    assert download_image(download) == ("resumed", len(IMAGE) - 1000)
+    assert session.ranges == [1000]
+    assert open(download.path, "rb").read() == IMAGE
+
+
+def test_verified_image_is_skipped(tmp_path, session):
+    download = image(tmp_path)
+    with open(download.path, "wb") as file_handle:
+        file_handle.write(IMAGE)
+
+    assert download_image(download) == ("skipped", 0)
+    assert session.ranges == []
+
+
+def test_truncated_image_under_its_final_name_is_resumed(tmp_path, session):
+    download = image(tmp_path)
+    with open(download.path, "wb") as file_handle:
+        file_handle.write(IMAGE[:1000])
+
+    assert download_image(download)[0] == "resumed"
+    assert open(download.path, "rb").read() == IMAGE
+
+
+def test_image_without_details_is_checked_against_content_length(tmp_path, session):
+    download = image(tmp_path, known=False)
+    session.truncate = [100]
+
+    assert download_image(download)[0] == "downloaded"
+    assert session.ranges == [0, 0]
+    assert open(download.path, "rb").read() == IMAGE
+
+
+def test_image_failing_every_check_is_not_kept(tmp_path, session):
+    download = image(tmp_path, known=False)
+    session.truncate = [100, 100]
+
+    with pytest.raises(RuntimeError, match="announced"):
+        download_image(download, max_attempts=2)
+    assert not (tmp_path / "image.jpg").exists()
+
+
+def test_thumbnails_map_to_the_details_of_their_image(tmp_path):
+    csv_file = tmp_path / "image_details.csv"
+    csv_file.write_text(
+        "OriginalURL,OriginalMD5,Thumbnail300KURL,Rotation\n"
+        "https://example.com/a_o.jpg,tZ6Sa3LQdasKV8xxbHSl4w==,https://example.com/a_z.jpg,90.0\n"
+    )
+
+    assert read_rotations(str(csv_file)) == {"a_o.jpg": 90, "a_z.jpg": 90}
+    assert list(read_original_md5s(str(csv_file))) == ["a_o.jpg"]
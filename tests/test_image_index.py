@@ -0,0 +1,71 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import json
+
+import pytest
+from image_index import INDEX_FORMAT, ImageIndex, shard_name, shard_of
+
+INDEX_URI = "s3://example-bucket/labeling_jobs/image_index"
+IMAGE_URI = "s3://example-bucket/labeling_jobs/images/image_0.jpg"
+
+
+class Reader(object):
+    """read_object over a dict of objects, counting reads.
+
+    Reads of the URIs in denied fail as S3Client.get_object_from_s3 does.
+    """
+
+    def __init__(self, objects, denied=()):
+        self.objects = objects
+        self.denied = set(denied)
+        self.reads = []
+
+    def __call__(self, s3_uri):
+        self.reads.append(s3_uri)
+        if s3_uri in self.denied:
+            raise ValueError(f"Failed to retrieve data from {s3_uri}.")
+        return self.objects.get(s3_uri)
+
+
+def published_index(shards=4):
+    shard = shard_of(IMAGE_URI, shards)
+    return {
+        f"{INDEX_URI}/index.json": json.dumps(
+            {"format": INDEX_FORMAT, "shards": shards}
+        ),
+        f"{INDEX_URI}/{shard_name(shard)}": json.dumps({IMAGE_URI: [4000, 3000, 6]}),
+    }
+
+
+def test_lookup_reads_one_shard_once():
+    reader = Reader(published_index())
+    index = ImageIndex(INDEX_URI)
+
+    assert index.lookup(IMAGE_URI, reader) == (4000, 3000, 6)
+    assert index.image_size(IMAGE_URI, reader) == (3000, 4000)
+    assert len(reader.reads) == 2
+
+
+@pytest.mark.parametrize(
+    "reader",
+    [Reader({}), Reader({}, denied=[f"{INDEX_URI}/index.json"])],
+    ids=["missing", "denied"],
+)
+def test_unreadable_index_is_read_once(reader):
+    index = ImageIndex(INDEX_URI)
+
+    assert index.lookup(IMAGE_URI, reader) is None
+    assert index.lookup(IMAGE_URI, reader) is None
+    assert reader.reads == [f"{INDEX_URI}/index.json"]
+    assert index.shards == 0
+
+
+def test_unreadable_shard_is_read_once():
+    objects = published_index()
+    shard_uri = f"{INDEX_URI}/{shard_name(shard_of(IMAGE_URI, 4))}"
+    reader = Reader(objects, denied=[shard_uri])
+    index = ImageIndex(INDEX_URI)
+
+    assert index.lookup(IMAGE_URI, reader) is None
+    assert index.lookup(IMAGE_URI, reader) is None
+    assert reader.reads == [f"{INDEX_URI}/index.json", shard_uri]
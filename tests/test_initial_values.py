@@ -0,0 +1,112 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import json
+
+import pytest
+from initial_values import compact_annotations
+from skeletons import encode_skeletons, parse_skeletons
+
+IMAGE_SIZE = (400, 300)
+
+
+def annotations(flat=False):
+    skeletons = [
+        {
+            "id": "inside",
+            "keypoints": [
+                {
+                    "id": "a",
+                    "label": "top_of_head",
+                    "color": "#FF7F0E",
+                    "x": 10.123456,
+                    "y": 20.987654,
+                },
+                {"label": "right_shoulder", "x": 30.5, "y": 40.25},
+                {"label": "unknown", "x": 1.0, "y": 2.0},
+                {"label": "left_shoulder", "x": None, "y": None},
+            ],
+        },
+        {
+            "id": "outside",
+            "keypoints": [{"label": "top_of_head", "x": 900.0, "y": 20.0}],
+        },
+    ]
+    if flat:
+        return [
+            dict(keypoint, skeletonId=s["id"])
+            for s in skeletons
+            for keypoint in s["keypoints"]
+        ]
+    return skeletons
+
+
+def shown(annotations):
+    """Returns {skeleton id: {label: (x, y)}}, what the UI shows."""
+    return {
+        skeleton.id: {
+            i: point for i, point in enumerate(skeleton.points) if point is not None
+        }
+        for skeleton in parse_skeletons(annotations)[0]
+    }
+
+
+@pytest.mark.parametrize("flat", [False, True])
+def test_round_trip_keeps_what_the_ui_shows(flat):
+    compacted, dropped = compact_annotations(annotations(flat), 2, IMAGE_SIZE)
+
+    assert dropped == 1
+    assert parse_skeletons(compacted)[1] == flat
+    expected = shown(annotations(flat))
+    del expected["outside"]
+    actual = shown(json.loads(json.dumps(compacted)))
+    assert actual.keys() == expected.keys()
+    for skeleton_id, points in expected.items():
+        assert actual[skeleton_id].keys() == points.keys()
+        for i, (x, y) in points.items():
+            assert actual[skeleton_id][i] == pytest.approx((x, y), abs=0.005)
+
+
+def test_round_trip_is_stable():
+    compacted, _ = compact_annotations(annotations(), 2, IMAGE_SIZE)
+
+    assert compact_annotations(compacted, 2, IMAGE_SIZE) == (compacted, 0)
+
+
+def test_without_precision_or_image_size_coordinates_are_kept():
+    compacted, dropped = compact_annotations(annotations())
+
+    assert dropped == 0
+    assert shown(compacted) == shown(annotations())
+
+
+def test_compact_form_is_expanded():
+    skeletons = parse_skeletons(annotations())[0]
+
+    compacted, dropped = compact_annotations(encode_skeletons(skeletons))
+
+    assert dropped == 0
+    assert shown(compacted) == shown(annotations())
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_handler_passes_annotations_through_unless_compacting(
+    pre_lambda, monkeypatch, compact
+):
+    monkeypatch.setattr(pre_lambda, "COMPACT_INITIAL_VALUES", compact)
+    event = {
+        "version": "2018-10-16",
+        "dataObject": {
+            "source-ref": "s3://example-bucket/labeling_jobs/images/image_0.jpg",
+            "image_size": {"width": IMAGE_SIZE[0], "height": IMAGE_SIZE[1]},
+            "annotations": annotations(),
+        },
+    }
+
+    initial_values = json.loads(
+        pre_lambda.lambda_handler(event, None)["taskInput"]["initial_values"]
+    )
+
+    if compact:
+        assert initial_values == compact_annotations(annotations(), 2, IMAGE_SIZE)[0]
+    else:
+        assert initial_values == annotations()
@@ -0,0 +1,78 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import io
+import json
+
+import pytest
+from json_stream import iter_json_array
+
+ELEMENTS = [
+    {"datasetObjectId": "0", "content": 'quote " backslash \\ tab \t'},
+    {"label": "épaule", "emoji": "\U0001f9cd", "escaped": "\\u00e9"},
+    [[1, [2, [3]]], [], {}],
+    12345.678e-2,
+    -0.5,
+    "a string with ] and , inside",
+    True,
+    None,
+]
+
+
+def parse(data, chunk_size):
+    return list(iter_json_array(io.BytesIO(data), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 64 * 1024])
+def test_elements_across_chunk_boundaries(chunk_size):
+    data = json.dumps(ELEMENTS, ensure_ascii=False).encode("utf-8")
+
+    assert parse(data, chunk_size) == ELEMENTS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64 * 1024])
+def test_whitespace_between_elements(chunk_size):
+    data = json.dumps(ELEMENTS, indent=4).encode("utf-8")
+
+    assert parse(b"\n  " + data + b"\n", chunk_size) == ELEMENTS
+
+
+def test_element_larger_than_the_chunk_size():
+    element = {"annotations": ["x" * 1000] * 100}
+    data = json.dumps([element, element]).encode("utf-8")
+
+    assert parse(data, 16) == [element, element]
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ \n ]  "])
+def test_empty_array(data):
+    assert parse(data, 1) == []
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b'[{"a": 1}, {"b": ', b'[{"a": 1}', b'[{"a": 1},', b"[", b'["unterminated'],
+)
+@pytest.mark.parametrize("chunk_size", [1, 64 * 1024])
+def test_truncated_input(data, chunk_size):
+    with pytest.raises(ValueError):
+        parse(data, chunk_size)
+
+
+@pytest.mark.parametrize("data", [b"", b'{"a": 1}', b"[1 2]", b"[1;2]"])
+def test_malformed_input(data):
+    with pytest.raises(ValueError):
+        parse(data, 64 * 1024)
+
+
+def test_elements_are_yielded_before_the_stream_ends():
+    class Stream(io.BytesIO):
+        def read(self, size=-1):
+            self.reads += 1
+            return super().read(size)
+
+    stream = Stream(json.dumps(list(range(1000))).encode("utf-8"))
+    stream.reads = 0
+    elements = iter_json_array(stream, chunk_size=16)
+
+    assert next(elements) == 0
+    assert stream.reads == 1
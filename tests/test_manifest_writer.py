@@ -0,0 +1,77 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import manifest_writer
+import pytest
+from manifest_writer import ShardedManifestWriter
+
+PREFIX = "s3://example-bucket/labeling_jobs/manifests/batch"
+
+
+class ManifestS3Client(object):
+    """The part of the boto3 S3 client used by the manifest writers."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.delete_requests = 0
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.objects[Key] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = []
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId].append(bytes(Body))
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.objects[Key] = b"".join(self.uploads.pop(UploadId))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def delete_objects(self, Bucket, Delete):
+        self.delete_requests += 1
+        for key in Delete["Objects"]:
+            self.objects.pop(key["Key"], None)
+
+
+def test_items_are_split_into_shards():
+    s3_client = ManifestS3Client()
+
+    with ShardedManifestWriter(s3_client, PREFIX, max_items=2) as writer:
+        for i in range(5):
+            writer.write({"source-ref": f"s3://example-bucket/image_{i}.jpg"})
+
+    assert [shard["items"] for shard in writer.shards] == [2, 2, 1]
+    assert len(s3_client.objects) == 3
+
+
+def test_abort_deletes_completed_shards():
+    s3_client = ManifestS3Client()
+
+    with pytest.raises(RuntimeError):
+        with ShardedManifestWriter(s3_client, PREFIX, max_items=2) as writer:
+            for i in range(5):
+                writer.write({"source-ref": f"s3://example-bucket/image_{i}.jpg"})
+            raise RuntimeError("images failed to upload")
+
+    assert s3_client.objects == {}
+    assert s3_client.uploads == {}
+    assert writer.shards == []
+
+
+def test_abort_deletes_in_batches(monkeypatch):
+    monkeypatch.setattr(manifest_writer, "MAX_DELETE_KEYS", 2)
+    s3_client = ManifestS3Client()
+    writer = ShardedManifestWriter(s3_client, PREFIX, max_items=1)
+    for i in range(5):
+        writer.write({"source-ref": f"s3://example-bucket/image_{i}.jpg"})
+
+    writer.abort()
+
+    assert s3_client.objects == {}
+    assert s3_client.delete_requests == 2
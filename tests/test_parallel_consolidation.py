@@ -0,0 +1,76 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import os
+
+import parallel_consolidation
+import pytest
+from parallel_consolidation import (
+    ConsolidationPool,
+    consolidation_processes,
+    iter_parallel_consolidated_output,
+)
+
+
+def consolidate(data_object):
+    if data_object == "crash":
+        os._exit(1)
+    if data_object == "fail":
+        raise ValueError("cannot consolidate")
+    return data_object.upper()
+
+
+def test_output_keeps_the_order_and_isolates_failures():
+    counts = {}
+    output = list(
+        iter_parallel_consolidated_output(
+            consolidate,
+            ["a", "fail", "b", "c"],
+            counts=counts,
+            processes=2,
+            chunk_size=1,
+        )
+    )
+
+    assert output == ["A", "B", "C"]
+    assert counts == {"success": 3, "failure": 1}
+
+
+def test_worker_exiting_fails_its_chunk_only():
+    with ConsolidationPool(consolidate, 2) as pool:
+        results = pool.map_chunks([["a"], ["crash"], ["b"], ["c"], ["d"]])
+
+    assert results == [
+        [(True, "A")],
+        [(False, "worker process exited")],
+        [(True, "B")],
+        [(True, "C")],
+        [(True, "D")],
+    ]
+
+
+def test_worker_exited_before_a_send_is_replaced():
+    with ConsolidationPool(consolidate, 2) as pool:
+        pool.processes[0].kill()
+        pool.processes[0].join()
+        results = pool.map_chunks([["a"], ["b"]])
+
+    assert results == [[(True, "A")], [(True, "B")]]
+
+
+@pytest.mark.parametrize("processes", [None, 4])
+def test_single_cpu_consolidates_serially(monkeypatch, processes):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "10240")
+
+    assert consolidation_processes(processes) == 1
+
+
+@pytest.mark.parametrize(
+    "memory_size, expected", [("1024", 1), ("3538", 2), ("10240", 4)]
+)
+def test_processes_follow_the_memory_size(monkeypatch, memory_size, expected):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(parallel_consolidation, "available_cpus", lambda: 4)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", memory_size)
+
+    assert consolidation_processes() == expected
@@ -0,0 +1,33 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import json
+
+from codec import encoded_size
+
+
+def emitted_metrics(capsys):
+    lines = capsys.readouterr().out.splitlines()
+    return next(json.loads(line) for line in lines if line.startswith('{"_aws"'))
+
+
+def test_each_phase_has_its_own_timer(pre_lambda, capsys):
+    event = {
+        "version": "2018-10-16",
+        "labelingJobArn": "arn:aws:sagemaker:us-west-2:111122223333:labeling-job/example",
+        "dataObject": {
+            "source-ref": "s3://example-bucket/labeling_jobs/images/image_0.jpg",
+            "annotations": [
+                {
+                    "id": "skeleton-0",
+                    "keypoints": [{"label": "top_of_head", "x": 10.0, "y": 20.0}],
+                }
+            ],
+        },
+    }
+
+    response = pre_lambda.lambda_handler(event, None)
+
+    metrics = emitted_metrics(capsys)
+    assert {"SelectImageTime", "CompactTime", "SerializeTime"} <= set(metrics)
+    assert "ImageIndexTime" not in metrics
+    assert metrics["TaskInputBytes"] == encoded_size(response["taskInput"])
@@ -0,0 +1,82 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import pytest
+from result_cache import MemoryResultCache, ResultCache
+from s3_helper import S3Client
+
+CACHE_URI = "s3://example-bucket/labeling_jobs/output/example/consolidation_cache"
+
+
+@pytest.fixture(autouse=True)
+def without_checkpoints(post_lambda, monkeypatch):
+    monkeypatch.setattr(post_lambda, "CHECKPOINTS_ENABLED", False)
+
+
+def test_first_request_consolidates_when_the_cache_key_is_denied(
+    post_lambda, s3, consolidation_event
+):
+    output = post_lambda.lambda_handler(consolidation_event, None)
+
+    assert [r["datasetObjectId"] for r in output] == ["0", "1", "2"]
+    cached = [uri for uri in s3.objects if uri.startswith(CACHE_URI)]
+    assert len(cached) == 1
+
+
+def test_retry_is_answered_from_the_cache(post_lambda, s3, consolidation_event):
+    first = post_lambda.lambda_handler(consolidation_event, None)
+    post_lambda.memory_result_cache.clear()
+    calls = len(s3.calls)
+
+    assert post_lambda.lambda_handler(consolidation_event, None) == first
+    # Only the ETag of the payload and the cached output are read.
+    assert [call for call, _ in s3.calls[calls:]] == ["head_object", "get_object"]
+
+
+def test_load_denied_is_a_miss(s3):
+    cache = ResultCache(
+        S3Client("arn:aws:iam::111122223333:role/example"),
+        MemoryResultCache(8, 1024),
+        "key",
+        CACHE_URI,
+    )
+
+    assert cache.load() is None
+    assert cache.source is None
+
+
+def test_load_from_s3_fills_memory(s3):
+    s3_client = S3Client("arn:aws:iam::111122223333:role/example")
+    memory = MemoryResultCache(8, 1024)
+    ResultCache(s3_client, MemoryResultCache(8, 1024), "key", CACHE_URI).store(
+        [{"datasetObjectId": "0"}]
+    )
+    cache = ResultCache(s3_client, memory, "key", CACHE_URI)
+
+    assert cache.load() == [{"datasetObjectId": "0"}]
+    assert cache.source == "s3"
+    assert cache.load() == [{"datasetObjectId": "0"}]
+    assert cache.source == "memory"
+
+
+def test_corrupt_output_is_a_miss(s3):
+    s3.objects[f"{CACHE_URI}/key.json"] = b'[{"datasetObjectId": '
+    cache = ResultCache(
+        S3Client("arn:aws:iam::111122223333:role/example"),
+        MemoryResultCache(8, 1024),
+        "key",
+        CACHE_URI,
+    )
+
+    assert cache.load() is None
+
+
+def test_memory_cache_evicts_least_recently_used():
+    memory = MemoryResultCache(max_entries=2, max_bytes=1024)
+    memory.put("a", b"1")
+    memory.put("b", b"2")
+    memory.get("a")
+    memory.put("c", b"3")
+
+    assert memory.get("b") is None
+    assert memory.get("a") == b"1"
+    assert memory.size == 2
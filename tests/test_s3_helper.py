@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import s3_helper
+from botocore.exceptions import ClientError
+from conftest import PAYLOAD_URI, FakeSTSClient
+from s3_helper import CREDENTIAL_REFRESH_MARGIN, RoleSessionCache, S3Client
+
+ROLE_ARN = "arn:aws:iam::111122223333:role/example"
+
+
+def make_cache(ttl=timedelta(hours=1)):
+    sts_client = FakeSTSClient(ttl)
+    return RoleSessionCache(lambda: sts_client), sts_client
+
+
+def test_concurrent_callers_assume_the_role_once():
+    cache, sts_client = make_cache()
+    barrier = threading.Barrier(8)
+    sessions = []
+
+    def get():
+        barrier.wait()
+        sessions.append(cache.get(ROLE_ARN))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sts_client.assume_role_calls == 1
+    assert len({id(session) for session in sessions}) == 1
+
+
+def test_each_role_has_its_own_session():
+    cache, sts_client = make_cache()
+
+    cache.get(ROLE_ARN)
+    cache.get(ROLE_ARN + "-other")
+    cache.get(ROLE_ARN)
+
+    assert sts_client.assume_role_calls == 2
+
+
+def test_credentials_within_the_refresh_margin_are_replaced():
+    cache, sts_client = make_cache(ttl=CREDENTIAL_REFRESH_MARGIN - timedelta(seconds=1))
+
+    first = cache.get(ROLE_ARN)
+    second = cache.get(ROLE_ARN)
+
+    assert sts_client.assume_role_calls == 2
+    assert second is not first
+
+
+def test_freshness_ends_at_the_refresh_margin():
+    cache, _ = make_cache()
+    session = cache.get(ROLE_ARN)
+    end = session.expiration - CREDENTIAL_REFRESH_MARGIN
+
+    assert session.is_fresh(end - timedelta(seconds=1))
+    assert not session.is_fresh(end)
+    assert session.is_fresh(datetime.now(timezone.utc))
+
+
+def test_refresh_assumes_the_role_again():
+    cache, sts_client = make_cache()
+
+    first = cache.get(ROLE_ARN)
+    second = cache.get(ROLE_ARN, refresh=True)
+
+    assert sts_client.assume_role_calls == 2
+    assert cache.get(ROLE_ARN) is second is not first
+
+
+def test_clear_drops_cached_sessions():
+    cache, sts_client = make_cache()
+
+    cache.get(ROLE_ARN)
+    cache.clear()
+    cache.get(ROLE_ARN)
+
+    assert sts_client.assume_role_calls == 2
+
+
+def expire_once(s3, code):
+    get_object = s3.get_object
+    calls = []
+
+    def expiring_get_object(Bucket, Key):
+        calls.append(Key)
+        if len(calls) == 1:
+            raise ClientError(
+                {"Error": {"Code": code, "Message": "expired"}}, "GetObject"
+            )
+        return get_object(Bucket, Key)
+
+    s3.get_object = expiring_get_object
+
+
+@pytest.mark.parametrize("code", ["ExpiredToken", "ExpiredTokenException"])
+def test_expired_token_refreshes_and_retries(s3, code):
+    s3.objects[PAYLOAD_URI] = b"payload"
+    client = S3Client(ROLE_ARN)
+    expire_once(s3, code)
+
+    assert client.get_object_from_s3(PAYLOAD_URI) == "payload"
+    assert s3_helper.role_session_cache._sts_client.assume_role_calls == 2
+
+
+def test_other_errors_are_not_retried(s3):
+    client = S3Client(ROLE_ARN)
+
+    with pytest.raises(ValueError):
+        client.get_object_from_s3(PAYLOAD_URI)
+    assert s3_helper.role_session_cache._sts_client.assume_role_calls == 1
+    assert [call for call, _ in s3.calls] == ["get_object"]
@@ -0,0 +1,86 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import random
+
+from skeletons import Skeleton
+from tiles import Tile, plan_tiles
+
+# Three tiles side by side on a 1200 x 100 image.
+LAYOUT = [
+    ((0, 0, 600, 100), (None, None, 500, None)),
+    ((450, 0, 400, 100), (500, None, 800, None)),
+    ((750, 0, 450, 100), (800, None, None, None)),
+]
+
+
+def layout_tiles():
+    return [
+        Tile(region, core, index, len(LAYOUT), LAYOUT)
+        for index, (region, core) in enumerate(LAYOUT)
+    ]
+
+
+def test_every_instance_is_owned_once():
+    rng = random.Random(0)
+    skeletons = [
+        Skeleton.from_points(
+            f"p{i}",
+            [(rng.uniform(0, 5000), rng.uniform(0, 4000)) for _ in range(3)],
+        )
+        for i in range(300)
+    ]
+    for planned_around in ((), skeletons):
+        tiles = plan_tiles((5000, 4000), 1500, 200, planned_around)
+        owners = [tile.ownership(skeletons) for tile in tiles]
+
+        assert len(tiles) > 1
+        assert [sum(column) for column in zip(*owners)] == [1] * len(skeletons)
+
+
+def test_instance_is_owned_by_the_tile_whose_core_holds_its_centre():
+    skeleton = Skeleton.from_points("p", [(560, 50), (600, 60)])
+
+    assert [tile.ownership([skeleton]) for tile in layout_tiles()] == [
+        [False],
+        [True],
+        [False],
+    ]
+
+
+def test_instance_not_shown_by_its_core_tile_falls_back_to_a_tile_showing_it():
+    # The centre, at x 650, is in the core of the middle tile, whose region
+    # holds neither keypoint.
+    skeleton = Skeleton.from_points("p", [(300, 50), (1000, 50)])
+
+    assert [tile.ownership([skeleton]) for tile in layout_tiles()] == [
+        [True],
+        [False],
+        [False],
+    ]
+
+
+def test_instance_is_assigned_by_its_original():
+    original = Skeleton.from_points("p", [(560, 50)])
+    moved = Skeleton.from_points("p", [(480, 50)])
+    added = Skeleton.from_points("q", [(480, 50)])
+    first, middle, _ = layout_tiles()
+
+    assert first.ownership([moved, added], [original]) == [False, True]
+    assert middle.ownership([moved, added], [original]) == [True, False]
+
+
+def test_layout_survives_encoding():
+    tile = layout_tiles()[1]
+
+    decoded = Tile.from_content({"tile": tile.encode()})
+
+    assert decoded.layout == tile.layout
+    assert decoded.to_dict() == tile.to_dict()
+
+
+def test_tile_without_layout_assigns_by_centre_alone():
+    tile = Tile(*LAYOUT[1])
+    skeleton = Skeleton.from_points("p", [(300, 50), (1000, 50)])
+
+    assert "layout" not in tile.to_dict()
+    assert tile.ownership([skeleton]) == [True]